@@ -0,0 +1,101 @@
+import jax
+import jax.numpy as jnp
+import numpy as np
+import pandas as pd
+import tqdm
+from random_events.interval import closed
+from random_events.product_algebra import SimpleEvent
+
+from probabilistic_model.learning.jpt.jpt import JPT
+from probabilistic_model.learning.jpt.variables import infer_variables_from_dataframe
+from probabilistic_model.probabilistic_circuit.jax.coupling_circuit import (CouplingCircuit, LinearConditioner,
+                                                                            MLPConditioner, ResidualConditioner)
+from probabilistic_model.probabilistic_circuit.jax.probabilistic_circuit import ProbabilisticCircuit
+from probabilistic_model.utils import timeit
+
+np.random.seed(69)
+
+# training
+number_of_variables = 4
+number_of_samples = 2000
+min_samples_leaf = 0.1
+
+# performance evaluation
+batch_size = 1000
+number_of_nx_evaluations = 10
+number_of_iterations = 15
+warmup_iterations = 5
+
+mean = np.zeros(number_of_variables)
+cov = np.random.uniform(0, 1, (number_of_variables, number_of_variables))
+cov = np.dot(cov, cov.T)
+samples = np.random.multivariate_normal(mean, cov, number_of_samples)
+df = pd.DataFrame(samples, columns=[f"x_{i}" for i in range(number_of_variables)])
+variables = infer_variables_from_dataframe(df, min_samples_per_quantile=30)
+
+# the circuit models the second half of the variables, the conditioner gets the first half
+jpt = JPT(variables, min_samples_leaf=min_samples_leaf)
+jpt.fit(df)
+jpt = jpt.marginal(variables[number_of_variables // 2:])
+circuit = ProbabilisticCircuit.from_nx(jpt, False)
+conditioner_columns = jnp.arange(number_of_variables // 2)
+circuit_columns = jnp.arange(number_of_variables // 2, number_of_variables)
+number_of_parameters = circuit.root.number_of_trainable_parameters
+
+conditioners = {"linear": LinearConditioner(len(conditioner_columns), number_of_parameters),
+                "mlp": MLPConditioner(len(conditioner_columns), number_of_parameters),
+                "residual": ResidualConditioner(len(conditioner_columns), number_of_parameters)}
+
+# full rows, the coupling circuit selects the conditioner columns itself
+x = jnp.asarray(samples[:batch_size])
+key = jax.random.PRNGKey(69)
+intervals = jnp.array([[-1., 1.]] * len(circuit_columns))
+event = SimpleEvent({variable: closed(-1., 1.) for variable in jpt.variables})
+
+
+def nx_path(cc: CouplingCircuit, x: jax.Array):
+    """
+    Build the conditional circuit of every input, convert it to networkx and sample it and evaluate the event there.
+    """
+    for row in x:
+        conditional_circuit = cc.create_circuit_from_parameters(cc.conditioner.generate_parameters(row[cc.conditioner_columns]))
+        nx_circuit = ProbabilisticCircuit(circuit.variables, conditional_circuit).to_nx(progress_bar=False)
+        nx_circuit.sample(1)
+        nx_circuit.probability_of_simple_event(event)
+
+
+def jax_path(cc: CouplingCircuit, x: jax.Array):
+    """
+    Sample and evaluate the event for the entire batch at once.
+    """
+    jax.block_until_ready((cc.conditional_sample(key, x), cc.conditional_probability(x, intervals)))
+
+
+def eval_performance(method, args, number_of_iterations=15, warmup_iterations=5):
+
+    @timeit
+    def timed_method():
+        return method(*args)
+
+    times = []
+    for i in tqdm.trange(number_of_iterations, desc="Evaluating performance"):
+        _, time = timed_method()
+        if i >= warmup_iterations:
+            times.append(time.total_seconds())
+    return times
+
+
+for name, conditioner in conditioners.items():
+    cc = CouplingCircuit(conditioner, conditioner_columns, circuit.root, circuit_columns)
+    cc.validate()
+
+    times_jax = eval_performance(jax_path, (cc, x), number_of_iterations, warmup_iterations)
+    times_nx = eval_performance(nx_path, (cc, x[:number_of_nx_evaluations]), 3, 1)
+
+    # compare the throughput in inputs per second
+    throughput_jax = batch_size / np.mean(times_jax)
+    throughput_nx = number_of_nx_evaluations / np.mean(times_nx)
+    print(f"{name} conditioner")
+    print("Jax inputs/s:", throughput_jax)
+    print("Networkx inputs/s:", throughput_nx)
+    print("Jax/Networkx:", throughput_jax / throughput_nx)
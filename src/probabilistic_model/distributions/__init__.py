@@ -1,3 +1,5 @@
 from .distributions import *
 from .uniform import *
-from .gaussian import *
\ No newline at end of file
+from .gaussian import *
+from .piecewise_uniform import *
+from .poisson import *
@@ -1,7 +1,7 @@
 from __future__ import annotations
 from numpy import nextafter
 
-from scipy.stats import gamma, norm
+from scipy.stats import gamma, norm, lognorm
 
 from .distributions import *
 from ..utils import simple_interval_as_array
@@ -101,6 +101,9 @@ class GaussianDistribution(ContinuousDistribution):
     def __eq__(self, other: Self):
         return super().__eq__(other) and self.location == other.location and self.scale == other.scale
 
+    def __hash__(self):
+        return hash((self.variable, self.location, self.scale))
+
     @property
     def representation(self):
         return f"N({self.variable.name} | {self.location}, {self.scale})"
@@ -254,6 +257,9 @@ class TruncatedGaussianDistribution(ContinuousDistributionWithFiniteSupport, Gau
     def __eq__(self, other):
         return super().__eq__(other) and self.interval == other.interval
 
+    def __hash__(self):
+        return hash((self.variable, self.location, self.scale, self.interval))
+
     @property
     def representation(self):
         return f"N({self.variable.name} | {self.location}, {self.scale}, {self.interval})"
@@ -367,4 +373,92 @@ class TruncatedGaussianDistribution(ContinuousDistributionWithFiniteSupport, Gau
 
     def scale(self, scale: VariableMap[Variable, float]):
         super().scale(scale)
-        GaussianDistribution.scale(self, scale)
\ No newline at end of file
+        GaussianDistribution.scale(self, scale)
+
+class LogNormalDistribution(ContinuousDistribution):
+    """
+    Class for log-normal distributions.
+    The location and scale are the parameters of the Gaussian distribution of the logarithm of the variable.
+    """
+
+    location: float
+    """
+    The mean of the logarithm of the variable.
+    """
+
+    scale: float
+    """
+    The standard deviation of the logarithm of the variable.
+    """
+
+    def __init__(self, variable: Continuous, location: float, scale: float):
+        super().__init__()
+        self.variable = variable
+        self.location = location
+        self.scale = scale
+
+    @property
+    def univariate_support(self) -> Interval:
+        return open(0, np.inf)
+
+    def log_likelihood(self, x: np.array) -> np.array:
+        return lognorm.logpdf(x[:, 0], s=self.scale, scale=np.exp(self.location))
+
+    def cdf(self, x: np.array) -> np.array:
+        return lognorm.cdf(x[:, 0], s=self.scale, scale=np.exp(self.location))
+
+    def univariate_log_mode(self) -> Tuple[AbstractCompositeSet, float]:
+        mode = np.exp(self.location - self.scale ** 2)
+        return singleton(mode), self.log_likelihood(np.array([[mode]]))[0]
+
+    def sample(self, amount: int) -> np.array:
+        return lognorm.rvs(s=self.scale, scale=np.exp(self.location), size=(amount, 1))
+
+    def raw_moment(self, order: int) -> float:
+        r"""
+        Helper method to calculate the raw moment of a log-normal distribution.
+
+        .. math::
+
+            E(X^n) = \exp \left( n\mu + \frac{n^2\sigma^2}{2} \right).
+
+        """
+        return np.exp(order * self.location + order ** 2 * self.scale ** 2 / 2)
+
+    def moment(self, order: OrderType, center: CenterType) -> MomentType:
+        order = order[self.variable]
+        center = center[self.variable]
+        moment = sum(math.comb(order, order_) * self.raw_moment(order_) * (-center) ** (order - order_)
+                     for order_ in range(order + 1))
+        return VariableMap({self.variable: moment})
+
+    def __eq__(self, other: Self):
+        return super().__eq__(other) and self.location == other.location and self.scale == other.scale
+
+    def __hash__(self):
+        return hash((self.variable, self.location, self.scale))
+
+    @property
+    def representation(self):
+        return f"LogN({self.variable.name} | {self.location}, {self.scale})"
+
+    def __repr__(self):
+        return f"LogN({self.variable.name})"
+
+    def __copy__(self):
+        return self.__class__(self.variable, self.location, self.scale)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {**super().to_json(), "location": self.location, "scale": self.scale}
+
+    @classmethod
+    def _from_json(cls, data: Dict[str, Any]) -> Self:
+        variable = Continuous.from_json(data["variable"])
+        return cls(variable, data["location"], data["scale"])
+
+    @property
+    def abbreviated_symbol(self) -> str:
+        return "LogN"
+
+    def scale(self, scaling: VariableMap[Variable, float]):
+        self.location += np.log(scaling[self.variable])
@@ -0,0 +1,307 @@
+import numpy as np
+
+from .distributions import *
+from ..constants import PDF_TRACE_NAME, PDF_TRACE_COLOR, CDF_TRACE_NAME, CDF_TRACE_COLOR
+from ..utils import interval_as_array
+
+
+class PiecewiseUniformDistribution(ContinuousDistribution):
+    """
+    Class for deterministic mixtures of uniform distributions over consecutive bins, stored in two arrays.
+
+    The bins are the right-open intervals between consecutive breakpoints, except for the last one, which is closed.
+    This describes the same function as a :class:`NygaDistribution` with a fraction of its memory.
+    """
+
+    breakpoints: np.ndarray
+    """
+    The strictly increasing breakpoints of the bins.
+    """
+
+    probabilities: np.ndarray
+    """
+    The probability mass of every bin.
+    """
+
+    def __init__(self, variable: Continuous, breakpoints: np.ndarray, probabilities: np.ndarray):
+        super().__init__()
+        self.variable = variable
+        self.breakpoints = np.asarray(breakpoints, dtype=np.float64)
+        self.probabilities = np.asarray(probabilities, dtype=np.float64)
+        assert len(self.breakpoints) == len(self.probabilities) + 1, \
+            "There has to be exactly one more breakpoint than probabilities."
+
+    @property
+    def lower(self) -> float:
+        return float(self.breakpoints[0])
+
+    @property
+    def upper(self) -> float:
+        return float(self.breakpoints[-1])
+
+    @property
+    def widths(self) -> np.ndarray:
+        """
+        :return: The width of every bin.
+        """
+        return np.diff(self.breakpoints)
+
+    @property
+    def densities(self) -> np.ndarray:
+        """
+        :return: The density of every bin.
+        """
+        return self.probabilities / self.widths
+
+    @property
+    def cumulative_probabilities(self) -> np.ndarray:
+        """
+        :return: The probability mass left of every breakpoint.
+        """
+        return np.concatenate(([0.], np.cumsum(self.probabilities)))
+
+    def bin_indices(self, x: np.ndarray) -> np.ndarray:
+        """
+        Find the bins that values fall into.
+
+        :param x: The values.
+        :return: The index of the bin of every value, clipped to the first and last bin.
+        """
+        indices = np.searchsorted(self.breakpoints, x, side="right") - 1
+        return np.clip(indices, 0, len(self.probabilities) - 1)
+
+    def densities_at(self, x: np.ndarray) -> np.ndarray:
+        """
+        Evaluate the density function at x.
+
+        :param x: The values.
+        :return: The density of every value.
+        """
+        inside = (self.lower <= x) & (x <= self.upper)
+        return np.where(inside, self.densities[self.bin_indices(x)], 0.)
+
+    def log_likelihood(self, x: np.array) -> np.array:
+        with np.errstate(divide="ignore"):
+            return np.log(self.densities_at(x[:, 0]))
+
+    def cdf(self, x: np.array) -> np.array:
+        x = x[:, 0]
+        indices = self.bin_indices(x)
+        result = self.cumulative_probabilities[indices] + self.densities[indices] * (x - self.breakpoints[indices])
+        return np.clip(result, 0., 1.)
+
+    def inverse_cdf(self, q: np.ndarray) -> np.ndarray:
+        """
+        Calculate the quantile function at q.
+
+        :param q: The probabilities in [0, 1].
+        :return: The smallest values whose cdf is q.
+        """
+        cumulative_probabilities = self.cumulative_probabilities
+        indices = np.searchsorted(cumulative_probabilities, q, side="right") - 1
+        indices = np.clip(indices, 0, len(self.probabilities) - 1)
+
+        # bins without mass are never selected, except for q at the very end of the cdf
+        with np.errstate(divide="ignore", invalid="ignore"):
+            offsets = (q - cumulative_probabilities[indices]) / self.densities[indices]
+        return np.minimum(self.breakpoints[indices] + np.nan_to_num(offsets), self.upper)
+
+    def sample(self, amount: int) -> np.array:
+        return self.inverse_cdf(np.random.uniform(0., 1., amount)).reshape(-1, 1)
+
+    @staticmethod
+    def interval_of_segments(breakpoints: np.ndarray, mask: np.ndarray) -> Interval:
+        """
+        Construct the interval that is covered by a selection of the segments between breakpoints.
+
+        :param breakpoints: The sorted breakpoints of the segments.
+        :param mask: Whether every segment is selected.
+        :return: The union of the selected segments, where adjacent segments are merged.
+        """
+        mask = np.concatenate(([False], mask, [False]))
+        changes = np.flatnonzero(mask[1:] != mask[:-1])
+        begins, ends = changes[::2], changes[1::2]
+        simple_intervals = [SimpleInterval(breakpoints[begin], breakpoints[end], Bound.CLOSED,
+                                           Bound.CLOSED if end == len(breakpoints) - 1 else Bound.OPEN)
+                            for begin, end in zip(begins.tolist(), ends.tolist())]
+        return Interval(*simple_intervals)
+
+    def interval_of_bins(self, mask: np.ndarray) -> Interval:
+        """
+        Construct the interval that is covered by a selection of bins.
+
+        :param mask: Whether every bin is selected.
+        :return: The union of the selected bins, where adjacent bins are merged.
+        """
+        return self.interval_of_segments(self.breakpoints, mask)
+
+    @property
+    def univariate_support(self) -> Interval:
+        return self.interval_of_bins(self.probabilities > 0)
+
+    def univariate_log_mode(self) -> Tuple[AbstractCompositeSet, float]:
+        densities = self.densities
+        maximum = densities.max()
+        return self.interval_of_bins(densities == maximum), np.log(maximum)
+
+    def log_conditional_from_simple_interval(self, interval: SimpleInterval) -> Tuple[Optional[Self], float]:
+        lower = max(interval.lower, self.lower)
+        upper = min(interval.upper, self.upper)
+        if lower >= upper:
+            return None, -np.inf
+
+        # slice the bins that overlap with the interval and cut the outer ones
+        begin = np.searchsorted(self.breakpoints, lower, side="right") - 1
+        end = np.searchsorted(self.breakpoints, upper, side="left")
+        breakpoints = np.concatenate(([lower], self.breakpoints[begin + 1:end], [upper]))
+        probabilities = self.densities[begin:end] * np.diff(breakpoints)
+        return self.from_unnormalized_probabilities(breakpoints, probabilities)
+
+    def log_conditional_from_interval(self, interval: Interval) -> Tuple[Optional[Self], float]:
+        bounds = np.clip(interval_as_array(interval), self.lower, self.upper)
+
+        # split the bins at the bounds of the interval and drop the mass of the segments outside the interval
+        breakpoints = np.union1d(self.breakpoints, bounds.reshape(-1))
+        centers = (breakpoints[:-1] + breakpoints[1:]) / 2
+        inside = ((bounds[:, 0] <= centers[:, None]) & (centers[:, None] <= bounds[:, 1])).any(axis=1)
+        probabilities = np.where(inside, self.densities[self.bin_indices(centers)] * np.diff(breakpoints), 0.)
+
+        # remove the segments outside the interval from both ends
+        mass = np.flatnonzero(probabilities > 0)
+        if len(mass) == 0:
+            return None, -np.inf
+        return self.from_unnormalized_probabilities(breakpoints[mass[0]:mass[-1] + 2],
+                                                    probabilities[mass[0]:mass[-1] + 1])
+
+    def from_unnormalized_probabilities(self, breakpoints: np.ndarray, probabilities: np.ndarray) \
+            -> Tuple[Optional[Self], float]:
+        """
+        Create a distribution over the same variable from unnormalized masses.
+
+        :param breakpoints: The breakpoints of the bins.
+        :param probabilities: The unnormalized probability mass of every bin.
+        :return: The normalized distribution and the logarithm of the total mass.
+        """
+        total = probabilities.sum()
+        if total <= 0:
+            return None, -np.inf
+        return self.__class__(self.variable, breakpoints, probabilities / total), np.log(total)
+
+    def densities_on_common_segments(self, other: Self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Evaluate this and another distribution on the segments between the breakpoints of both.
+
+        Both densities are constant on every segment.
+
+        :param other: The other distribution.
+        :return: The merged breakpoints, the densities of this and the densities of the other distribution on every
+            segment.
+        """
+        breakpoints = np.union1d(self.breakpoints, other.breakpoints)
+        centers = (breakpoints[:-1] + breakpoints[1:]) / 2
+        return breakpoints, self.densities_at(centers), other.densities_at(centers)
+
+    def l1_distance(self, other: Self) -> float:
+        """
+        Calculate the exact L1 distance between the density functions of this and another distribution.
+
+        :param other: The other distribution.
+        :return: The L1 distance.
+        """
+        breakpoints, own_densities, other_densities = self.densities_on_common_segments(other)
+        return float(np.sum(np.abs(own_densities - other_densities) * np.diff(breakpoints)))
+
+    def total_variation_distance(self, other: Self) -> float:
+        """
+        Calculate the exact total variation distance between this and another distribution.
+
+        :param other: The other distribution.
+        :return: The total variation distance, which is half the L1 distance.
+        """
+        return self.l1_distance(other) / 2
+
+    def kl_divergence(self, other: Self) -> float:
+        """
+        Calculate the exact Kullback-Leibler divergence of another distribution from this distribution.
+
+        :param other: The other distribution.
+        :return: The divergence, which is infinite if this distribution has mass where the other one has none.
+        """
+        breakpoints, own_densities, other_densities = self.densities_on_common_segments(other)
+        own_probabilities = own_densities * np.diff(breakpoints)
+        has_mass = own_probabilities > 0
+        if np.any(other_densities[has_mass] == 0):
+            return np.inf
+        return float(np.sum(own_probabilities[has_mass] *
+                            np.log(own_densities[has_mass] / other_densities[has_mass])))
+
+    def event_of_higher_density(self, other: Self, own_scale: float = 1., other_scale: float = 1.) -> Event:
+        """
+        Construct the event where the density of this distribution is higher than the density of another one.
+
+        :param other: The other distribution.
+        :param own_scale: The factor to scale the density of this distribution with.
+        :param other_scale: The factor to scale the density of the other distribution with.
+        :return: The event.
+        """
+        breakpoints, own_densities, other_densities = self.densities_on_common_segments(other)
+        interval = self.interval_of_segments(breakpoints, own_densities * own_scale > other_densities * other_scale)
+        return SimpleEvent({self.variable: interval}).as_composite_set()
+
+    def moment(self, order: OrderType, center: CenterType) -> MomentType:
+        order = order[self.variable]
+        center = center[self.variable]
+
+        # the integral of (x - center)^order over every bin, weighted with its density
+        antiderivative = (self.breakpoints - center) ** (order + 1) / (order + 1)
+        result = np.sum(self.densities * np.diff(antiderivative))
+        return VariableMap({self.variable: float(result)})
+
+    def __eq__(self, other):
+        return (isinstance(other, self.__class__) and self.variable == other.variable and
+                np.array_equal(self.breakpoints, other.breakpoints) and
+                np.array_equal(self.probabilities, other.probabilities))
+
+    def __hash__(self):
+        return hash((self.variable.name, self.breakpoints.tobytes(), self.probabilities.tobytes()))
+
+    @property
+    def representation(self):
+        return f"PU({self.variable.name} | {len(self.probabilities)} bins)"
+
+    @property
+    def abbreviated_symbol(self) -> str:
+        return "PU"
+
+    def __repr__(self):
+        return f"PU({self.variable.name})"
+
+    def __copy__(self):
+        return self.__class__(self.variable, self.breakpoints.copy(), self.probabilities.copy())
+
+    def to_json(self) -> Dict[str, Any]:
+        return {**super().to_json(), "breakpoints": self.breakpoints.tolist(),
+                "probabilities": self.probabilities.tolist()}
+
+    @classmethod
+    def _from_json(cls, data: Dict[str, Any]) -> Self:
+        variable = Continuous.from_json(data["variable"])
+        return cls(variable, data["breakpoints"], data["probabilities"])
+
+    def plot(self, **kwargs) -> List:
+        x = np.repeat(self.breakpoints, 2)
+        pdf_values = np.concatenate(([0.], np.repeat(self.densities, 2), [0.]))
+        pdf_trace = go.Scatter(x=x, y=pdf_values, mode="lines", name=PDF_TRACE_NAME, line=dict(color=PDF_TRACE_COLOR))
+        cdf_trace = go.Scatter(x=self.breakpoints, y=self.cumulative_probabilities, mode="lines", name=CDF_TRACE_NAME,
+                               line=dict(color=CDF_TRACE_COLOR))
+
+        height = self.densities.max() * SCALING_FACTOR_FOR_EXPECTATION_IN_PLOT
+        mode_trace = self.univariate_mode_traces(self.mode()[0], height)
+        expectation_trace = self.univariate_expectation_trace(height)
+        return [pdf_trace, cdf_trace, expectation_trace] + mode_trace
+
+    def translate(self, translation: Dict[Variable, float]):
+        self.breakpoints = self.breakpoints + translation[self.variable]
+
+    def scale(self, scaling: Dict[Variable, float]):
+        self.breakpoints = self.breakpoints * scaling[self.variable]
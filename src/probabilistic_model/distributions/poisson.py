@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+from scipy.stats import poisson
+
+from .distributions import *
+
+
+class PoissonDistribution(ContinuousDistribution):
+    """
+    Class for Poisson distributions over the non-negative integers.
+    Like integer distributions, Poisson distributions implement the methods of continuous distributions.
+    """
+
+    variable: Integer
+
+    rate: float
+    """
+    The rate (expectation) of the Poisson distribution.
+    """
+
+    tail_probability: float = 1e-12
+    """
+    The fraction of the probability mass of an unbounded interval that is neglected in its upper tail when a
+    truncation has to enumerate the integers of the interval.
+    """
+
+    def __init__(self, variable: Integer, rate: float):
+        super().__init__()
+        self.variable = variable
+        self.rate = rate
+
+    @property
+    def univariate_support(self) -> Interval:
+        return closed(0, np.inf)
+
+    def log_likelihood(self, x: np.array) -> np.array:
+        return poisson.logpmf(x[:, 0], self.rate)
+
+    def cdf(self, x: np.array) -> np.array:
+        return poisson.cdf(x[:, 0], self.rate)
+
+    def probability_of_simple_event(self, event: SimpleEvent) -> float:
+        return sum(self.probability_of_simple_interval(simple_interval)
+                   for simple_interval in event[self.variable].simple_sets)
+
+    @staticmethod
+    def integer_bounds(interval: SimpleInterval) -> Tuple[float, float]:
+        """
+        Calculate the smallest and the largest non-negative integer inside a simple interval.
+
+        :param interval: The simple interval
+        :return: The bounds, where the upper bound may be infinite.
+        """
+        lower, upper = np.ceil(interval.lower), np.floor(interval.upper)
+        if interval.left == Bound.OPEN and lower == interval.lower:
+            lower += 1
+        if interval.right == Bound.OPEN and upper == interval.upper:
+            upper -= 1
+        return max(lower, 0.), upper
+
+    def probability_of_simple_interval(self, interval: SimpleInterval) -> float:
+        """
+        Calculate the probability of the integers inside a simple interval.
+
+        :param interval: The simple interval
+        :return: The probability of the interval.
+        """
+        lower, upper = self.integer_bounds(interval)
+        if lower > upper:
+            return 0.
+
+        # the survival function does not cancel in the upper tail like the cdf does
+        return float(poisson.sf(lower - 1, self.rate) - poisson.sf(upper, self.rate))
+
+    def univariate_log_mode(self) -> Tuple[AbstractCompositeSet, float]:
+        mode = singleton(np.floor(self.rate))
+
+        # integer rates have two modes
+        if self.rate == np.floor(self.rate) and self.rate > 0:
+            mode |= singleton(self.rate - 1)
+        return mode, poisson.logpmf(np.floor(self.rate), self.rate)
+
+    def log_truncated(self, event: Event) -> Tuple[Optional[IntegerDistribution], float]:
+        if event.is_empty():
+            return None, -np.inf
+
+        interval = self.composite_set_from_event(event)
+        probability = sum(self.probability_of_simple_interval(simple_interval)
+                          for simple_interval in interval.simple_sets)
+        if probability <= 0:
+            return None, -np.inf
+
+        # enumerate the integers of the event, where unbounded intervals are cut at a negligible tail
+        values = []
+        for simple_interval in interval.simple_sets:
+            interval_probability = self.probability_of_simple_interval(simple_interval)
+            if interval_probability <= 0:
+                continue
+            lower, upper = self.integer_bounds(simple_interval)
+            if upper == np.inf:
+                # the inverse survival function is imprecise far in the tail, hence the cut is checked and extended
+                tail_probability = self.tail_probability * interval_probability
+                upper, step = max(lower, poisson.isf(tail_probability, self.rate)), 1
+                while poisson.sf(upper, self.rate) > tail_probability:
+                    upper, step = upper + step, 2 * step
+            values.append(np.arange(lower, upper + 1))
+        values = np.concatenate(values)
+        probabilities = poisson.pmf(values, self.rate)
+        result = IntegerDistribution(self.variable, MissingDict(float, zip(values.tolist(), probabilities.tolist())))
+        result.normalize()
+        return result, np.log(probability)
+
+    def log_conditional(self, point: Dict[Variable, Any]) -> Tuple[Optional[IntegerDistribution], float]:
+        value = point[self.variable]
+        log_probability = self.log_likelihood(np.array([[value]]))[0]
+        if log_probability == -np.inf:
+            return None, -np.inf
+        return IntegerDistribution(self.variable, MissingDict(float, {value: 1.})), log_probability
+
+    def sample(self, amount: int) -> np.array:
+        return poisson.rvs(self.rate, size=(amount, 1))
+
+    def moment(self, order: OrderType, center: CenterType) -> MomentType:
+        order = order[self.variable]
+        center = center[self.variable]
+
+        # expand the central moment into the raw moments of the Poisson distribution
+        result = sum(math.comb(order, order_) * poisson.moment(order_, self.rate) * (-center) ** (order - order_)
+                     for order_ in range(order + 1))
+        return VariableMap({self.variable: result})
+
+    def plot(self, **kwargs) -> List[go.Bar]:
+        values = np.arange(poisson.ppf(0.999, self.rate) + 1)
+        probabilities = poisson.pmf(values, self.rate)
+        height = max(probabilities) * SCALING_FACTOR_FOR_EXPECTATION_IN_PLOT
+        return [go.Bar(x=values, y=probabilities, name="Probability"), self.univariate_expectation_trace(height)]
+
+    def scale(self, scaling: Dict[Variable, float]):
+        raise NotImplementedError("Scaled Poisson distributions are no Poisson distributions.")
+
+    def __eq__(self, other: Self):
+        return super().__eq__(other) and self.rate == other.rate
+
+    def __hash__(self):
+        return hash((self.variable, self.rate))
+
+    @property
+    def representation(self):
+        return f"Poi({self.variable.name} | {self.rate})"
+
+    def __repr__(self):
+        return f"Poi({self.variable.name})"
+
+    def __copy__(self):
+        return self.__class__(self.variable, self.rate)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {**super().to_json(), "rate": self.rate}
+
+    @classmethod
+    def _from_json(cls, data: Dict[str, Any]) -> Self:
+        variable = Integer.from_json(data["variable"])
+        return cls(variable, data["rate"])
+
+    @property
+    def abbreviated_symbol(self) -> str:
+        return "Poi"
@@ -0,0 +1,155 @@
+from typing import Dict, Any, List, Tuple
+
+import numpy as np
+from typing_extensions import Self
+
+
+class DecisionTree:
+    """
+    The splits of a JPT as a compact, array-based binary tree.
+
+    Every node is an index into the arrays. Inner nodes split on a column of the preprocessed data.
+    Numeric splits send samples with values less or equal to the value of the split to the left child,
+    symbolic splits send samples that have exactly the value of the split to the left child.
+    Leaf nodes refer to the leaves of the JPT by their position in the subcircuits of the root.
+    """
+
+    variables: np.ndarray
+    """
+    The column that every node splits on, -1 for leaf nodes.
+    """
+
+    values: np.ndarray
+    """
+    The value that every node splits at.
+    """
+
+    symbolic: np.ndarray
+    """
+    Whether the split of every node is symbolic.
+    """
+
+    left: np.ndarray
+    """
+    The left child of every node, -1 for leaf nodes.
+    """
+
+    right: np.ndarray
+    """
+    The right child of every node, -1 for leaf nodes.
+    """
+
+    leaves: np.ndarray
+    """
+    The position of the leaf of every node in the subcircuits of the root, -1 for inner nodes.
+    """
+
+    def __init__(self, variables: np.ndarray, values: np.ndarray, symbolic: np.ndarray, left: np.ndarray,
+                 right: np.ndarray, leaves: np.ndarray):
+        self.variables = np.asarray(variables, dtype=np.int64)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.symbolic = np.asarray(symbolic, dtype=bool)
+        self.left = np.asarray(left, dtype=np.int64)
+        self.right = np.asarray(right, dtype=np.int64)
+        self.leaves = np.asarray(leaves, dtype=np.int64)
+
+    @classmethod
+    def from_nodes(cls, nodes: List[Tuple[int, float, bool, int, int]]) -> Self:
+        """
+        Create a tree from the nodes of an induction.
+
+        The leaves are numbered in the order of the nodes, which is the order in which the induction creates them.
+
+        :param nodes: The variable, value, symbolic flag, left and right child of every node.
+        :return: The tree.
+        """
+        variables, values, symbolic, left, right = (np.array(column) for column in zip(*nodes))
+        is_leaf = variables < 0
+        leaves = np.where(is_leaf, np.cumsum(is_leaf) - 1, -1)
+        return cls(variables, values, symbolic, left, right, leaves)
+
+    def __len__(self):
+        return len(self.variables)
+
+    @property
+    def number_of_leaves(self) -> int:
+        return int(np.count_nonzero(self.leaves >= 0))
+
+    def route(self, data: np.ndarray) -> np.ndarray:
+        """
+        Route samples to the leaves of the tree, descending one level for all samples at once.
+
+        :param data: The preprocessed samples.
+        :return: The position of the leaf of every sample.
+        """
+        node = np.zeros(len(data), dtype=np.int64)
+        active = np.flatnonzero(self.variables[node] >= 0)
+        while len(active) > 0:
+            current = node[active]
+            values = data[active, self.variables[current]]
+            goes_left = np.where(self.symbolic[current], values == self.values[current],
+                                 values <= self.values[current])
+            node[active] = np.where(goes_left, self.left[current], self.right[current])
+            active = active[self.variables[node[active]] >= 0]
+        return self.leaves[node]
+
+    def leaves_of_point(self, point: Dict[int, float]) -> np.ndarray:
+        """
+        Find the leaves that a partially known sample can be in.
+
+        :param point: The known values by column.
+        :return: The sorted positions of the leaves whose region contains the point.
+        """
+        result = []
+        stack = [0]
+        while stack:
+            node = stack.pop()
+            variable = self.variables[node]
+            if variable < 0:
+                result.append(self.leaves[node])
+            elif variable in point:
+                value = point[variable]
+                goes_left = value == self.values[node] if self.symbolic[node] else value <= self.values[node]
+                stack.append(self.left[node] if goes_left else self.right[node])
+            else:
+                stack.extend((self.left[node], self.right[node]))
+        return np.sort(np.array(result, dtype=np.int64))
+
+    def replace_leaf(self, position: int, subtree: Self) -> Self:
+        """
+        Replace a leaf by a tree.
+
+        The positions of the leaves match a root from which the leaf is removed and to which the leaves of the
+        subtree are appended in their order.
+
+        :param position: The position of the leaf to replace.
+        :param subtree: The tree to put in place of the leaf.
+        :return: The new tree.
+        """
+        node = int(np.flatnonzero(self.leaves == position)[0])
+        node_map = np.concatenate(([node], np.arange(len(self), len(self) + len(subtree) - 1)))
+
+        leaves = self.leaves.copy()
+        leaves[leaves > position] -= 1
+        subtree_leaves = np.where(subtree.leaves >= 0, subtree.leaves + self.number_of_leaves - 1, -1)
+        subtree_left = np.where(subtree.left >= 0, node_map[subtree.left], -1)
+        subtree_right = np.where(subtree.right >= 0, node_map[subtree.right], -1)
+
+        columns = []
+        for own, other in [(self.variables, subtree.variables), (self.values, subtree.values),
+                           (self.symbolic, subtree.symbolic), (self.left, subtree_left),
+                           (self.right, subtree_right), (leaves, subtree_leaves)]:
+            column = np.concatenate((own, other[1:]))
+            column[node] = other[0]
+            columns.append(column)
+        return self.__class__(*columns)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {"variables": self.variables.tolist(), "values": self.values.tolist(),
+                "symbolic": self.symbolic.tolist(), "left": self.left.tolist(), "right": self.right.tolist(),
+                "leaves": self.leaves.tolist()}
+
+    @classmethod
+    def from_json(cls, data: Dict[str, Any]) -> Self:
+        return cls(data["variables"], data["values"], data["symbolic"], data["left"], data["right"],
+                   data["leaves"])
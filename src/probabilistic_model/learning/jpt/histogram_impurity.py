@@ -0,0 +1,423 @@
+from typing import Tuple, Optional, List, Dict
+
+import numpy as np
+
+
+def quantize(column: np.ndarray, max_bins: int) -> np.ndarray:
+    """
+    Calculate the edges of the bins of a numeric column.
+
+    If the column has at most `max_bins` distinct values, every value gets its own bin.
+    Otherwise, the edges are quantiles of the column, such that the bins contain roughly the same number of samples.
+
+    :param column: The values of the column.
+    :param max_bins: The maximum number of bins.
+    :return: The sorted edges between the bins. A value `x` falls into bin `np.searchsorted(edges, x, side="right")`.
+    """
+    values = np.unique(column)
+    if len(values) <= max_bins:
+        return values[1:]
+    return np.unique(np.quantile(column, np.linspace(0, 1, max_bins + 1)[1:-1]))
+
+
+class HistogramFamily:
+    """
+    The histogram of a node that was split and the histograms of its children.
+
+    The histogram of the smaller child is calculated from the samples and the histogram of the larger child is
+    obtained by subtracting it from the histogram of the parent.
+    """
+
+    parent: Optional[np.ndarray]
+    """
+    The histogram of the split node. It is dropped once the histograms of the children are known.
+    """
+
+    children: Tuple[Tuple[int, int], Tuple[int, int]]
+    """
+    The ranges in the indices of the left and right child.
+    """
+
+    histograms: Dict[Tuple[int, int], np.ndarray]
+    """
+    The histograms of the children that are not evaluated yet.
+    """
+
+    def __init__(self, parent: np.ndarray, children: Tuple[Tuple[int, int], Tuple[int, int]]):
+        self.parent = parent
+        self.children = children
+        self.histograms = dict()
+
+
+class HistogramImpurity:
+    """
+    Impurity calculations on histograms of binned features, in the style of LightGBM.
+
+    Numeric features are quantized once into at most `max_bins` bins (see :func:`quantize`).
+    Instead of sorting the samples of a node by every feature, the statistics of the targets are accumulated per bin
+    and every bin boundary is evaluated as split from the cumulative sums of the bins.
+    Symbolic features are binned by their values and split one value versus the rest.
+
+    The impurity improvement of a split is the same as in :class:`jpt.learning.impurity.Impurity`, i.e. the mean
+    relative reduction of the variances of the numeric targets and the gini impurities of the symbolic targets, weighted
+    by the fraction of numeric and symbolic targets.
+    Only the targets that depend on the feature are taken into account.
+
+    This class has the same interface as :class:`jpt.learning.impurity.Impurity`, such that it can be used in the
+    induction of a JPT.
+    """
+
+    min_samples_leaf: int
+    """
+    The minimum number of samples in each side of a split.
+    """
+
+    numeric_targets: np.ndarray
+    """
+    The columns of the numeric targets.
+    """
+
+    symbolic_targets: np.ndarray
+    """
+    The columns of the symbolic targets.
+    """
+
+    features: np.ndarray
+    """
+    The columns of the features, numeric features first.
+    """
+
+    number_of_numeric_features: int
+    """
+    The number of numeric features.
+    """
+
+    symbols: Dict[int, int]
+    """
+    The size of the domain of every symbolic column.
+    """
+
+    dependencies: Dict[int, List[int]]
+    """
+    The columns of the targets that every feature column depends on.
+    """
+
+    max_bins: int
+    """
+    The maximum number of bins of a numeric feature.
+    """
+
+    min_impurity_improvement: float
+    """
+    The minimum impurity improvement of a split that is induced. Histograms are only kept for the children of such
+    splits.
+    """
+
+    max_depth: float
+    """
+    The maximum depth of the tree. Histograms are only kept for children that can be split further.
+    """
+
+    data: Optional[np.ndarray] = None
+    """
+    The preprocessed data.
+    """
+
+    indices: Optional[np.ndarray] = None
+    """
+    The indices of the samples. They are reordered by every split, such that the samples of every node are contiguous.
+    """
+
+    bin_edges: List[np.ndarray]
+    """
+    The edges of the bins of every numeric feature.
+    """
+
+    binned_features: Optional[np.ndarray] = None
+    """
+    The bins of the features of every sample. Numeric features have at most 256 bins and are stored as uint8.
+    """
+
+    bin_offsets: np.ndarray
+    """
+    The position of the first bin of every feature in a histogram.
+    """
+
+    families: Dict[Tuple[int, int], Tuple[int, HistogramFamily]]
+    """
+    The depth and histogram family of every node range that will be evaluated.
+    """
+
+    best_var: int = -1
+    """
+    The column of the feature of the best split.
+    """
+
+    best_split_pos: int = -1
+    """
+    The position of the last sample of the left side of the best split, relative to the start of the node.
+    """
+
+    max_impurity_improvement: float = -float("inf")
+    """
+    The impurity improvement of the best split.
+    """
+
+    def __init__(self, min_samples_leaf: int, numeric_targets: np.ndarray, symbolic_targets: np.ndarray,
+                 numeric_features: np.ndarray, symbolic_features: np.ndarray, symbols: Dict[int, int],
+                 dependencies: Dict[int, List[int]], max_bins: int = 256, min_impurity_improvement: float = 0.,
+                 max_depth: float = float("inf")):
+        if not 2 <= max_bins <= 256:
+            raise ValueError(f"The maximum number of bins has to be between 2 and 256, got {max_bins}.")
+        self.min_samples_leaf = min_samples_leaf
+        self.numeric_targets = np.asarray(numeric_targets, dtype=int)
+        self.symbolic_targets = np.asarray(symbolic_targets, dtype=int)
+        self.features = np.concatenate((numeric_features, symbolic_features)).astype(int)
+        self.number_of_numeric_features = len(numeric_features)
+        self.symbols = symbols
+        self.dependencies = dependencies
+        self.max_bins = max_bins
+        self.min_impurity_improvement = min_impurity_improvement
+        self.max_depth = max_depth
+        self.bin_edges = []
+        self.families = dict()
+
+        # the columns of a histogram are the count, the sums and the squared sums of the numeric targets and the counts
+        # of every symbol of the symbolic targets
+        number_of_numeric_targets = len(self.numeric_targets)
+        self.symbol_offsets = 1 + 2 * number_of_numeric_targets + np.cumsum(
+            [0] + [symbols[column] for column in self.symbolic_targets[:-1]], dtype=int)
+        self.number_of_statistics = 1 + 2 * number_of_numeric_targets + sum(symbols[column]
+                                                                            for column in self.symbolic_targets)
+        self.w_numeric = number_of_numeric_targets / (number_of_numeric_targets + len(self.symbolic_targets))
+
+    @property
+    def number_of_bins(self) -> np.ndarray:
+        """
+        :return: The number of bins of every feature.
+        """
+        return np.array([len(edges) + 1 for edges in self.bin_edges] +
+                        [self.symbols[column] for column in self.features[self.number_of_numeric_features:]], dtype=int)
+
+    def setup(self, data: np.ndarray, indices: np.ndarray):
+        """
+        Quantize the features of the data.
+
+        :param data: The preprocessed data.
+        :param indices: The indices of the samples that are reordered in place by the splits.
+        """
+        self.data = data
+        self.indices = indices
+        self.families = dict()
+
+        self.bin_edges = [quantize(data[:, column], self.max_bins)
+                          for column in self.features[:self.number_of_numeric_features]]
+        number_of_bins = self.number_of_bins
+        self.bin_offsets = np.concatenate(([0], np.cumsum(number_of_bins)[:-1]))
+
+        self.binned_features = np.empty((len(data), len(self.features)),
+                                        dtype=np.min_scalar_type(max(number_of_bins, default=1) - 1))
+        for index, column in enumerate(self.features):
+            if index < self.number_of_numeric_features:
+                self.binned_features[:, index] = np.searchsorted(self.bin_edges[index], data[:, column], side="right")
+            else:
+                self.binned_features[:, index] = data[:, column]
+
+    def statistics(self, samples: np.ndarray) -> np.ndarray:
+        """
+        :param samples: The indices of the samples.
+        :return: The statistics of every sample that are accumulated in the histograms.
+        """
+        data = self.data[samples]
+        result = np.zeros((len(samples), self.number_of_statistics))
+        result[:, 0] = 1
+        number_of_numeric_targets = len(self.numeric_targets)
+        result[:, 1:1 + number_of_numeric_targets] = data[:, self.numeric_targets]
+        result[:, 1 + number_of_numeric_targets:1 + 2 * number_of_numeric_targets] = data[:, self.numeric_targets] ** 2
+        for offset, column in zip(self.symbol_offsets, self.symbolic_targets):
+            result[np.arange(len(samples)), offset + data[:, column].astype(int)] = 1
+        return result
+
+    def histogram(self, start: int, end: int) -> np.ndarray:
+        """
+        Calculate the histogram of a node from its samples.
+
+        :param start: Starting index of the node in the indices.
+        :param end: Ending index of the node in the indices.
+        :return: The histogram with one row per bin of every feature and one column per statistic.
+        """
+        samples = self.indices[start:end]
+        statistics = self.statistics(samples).ravel()
+        number_of_bins = self.number_of_bins
+        binned_features = self.binned_features[samples]
+        statistic_index = np.arange(self.number_of_statistics)
+
+        result = np.empty((number_of_bins.sum(), self.number_of_statistics))
+        for index, (offset, bins) in enumerate(zip(self.bin_offsets, number_of_bins)):
+            flat_index = (binned_features[:, index, None].astype(int) * self.number_of_statistics +
+                          statistic_index).ravel()
+            result[offset:offset + bins] = np.bincount(flat_index, statistics, bins * self.number_of_statistics
+                                                       ).reshape(bins, self.number_of_statistics)
+        return result
+
+    def node_histogram(self, start: int, end: int) -> Tuple[int, np.ndarray]:
+        """
+        Get the histogram of a node, using the histogram of its parent if the node is a child of a split.
+
+        :param start: Starting index of the node in the indices.
+        :param end: Ending index of the node in the indices.
+        :return: The depth and the histogram of the node.
+        """
+        node = (start, end)
+        if node not in self.families:
+            return 0, self.histogram(start, end)
+
+        depth, family = self.families.pop(node)
+        if family.parent is not None:
+            smaller, larger = sorted(family.children, key=lambda child: child[1] - child[0])
+            smaller_histogram = self.histogram(*smaller)
+            family.histograms = {smaller: smaller_histogram, larger: family.parent - smaller_histogram}
+            family.parent = None
+        return depth, family.histograms.pop(node)
+
+    def impurity_improvements(self, left: np.ndarray, total: np.ndarray, feature_index: int) -> np.ndarray:
+        """
+        Calculate the impurity improvements of many splits on the same feature.
+
+        :param left: The statistics of the left side of every split.
+        :param total: The statistics of the node.
+        :param feature_index: The index of the feature in the features.
+        :return: The impurity improvement of every split, -inf for inadmissible splits.
+        """
+        right = total - left
+        number_of_samples = total[0]
+        samples_left = left[:, 0]
+        samples_right = right[:, 0]
+        feature = self.features[feature_index]
+        dependent_columns = self.dependencies.get(feature, [])
+        result = np.zeros(len(left))
+        number_of_numeric_targets = len(self.numeric_targets)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if number_of_numeric_targets:
+                variances_total = self.variances(total[None, :], np.array([number_of_samples]))[0]
+                considered = (np.isin(self.numeric_targets, dependent_columns) & (self.numeric_targets != feature) &
+                              (variances_total != 0))
+                if considered.any():
+                    variances_left = self.variances(left, samples_left)
+                    variances_right = self.variances(right, samples_right)
+                    improvements = (variances_total - (variances_left * samples_left[:, None] +
+                                                       variances_right * samples_right[:, None]) / number_of_samples
+                                    ) / variances_total
+                    result += improvements[:, considered].mean(axis=1) * self.w_numeric
+
+            considered = np.isin(self.symbolic_targets, dependent_columns)
+            if considered.any():
+                gini_total = self.gini_impurities(total[None, :], np.array([number_of_samples]))[0, considered].mean()
+                if gini_total:
+                    gini_left = self.gini_impurities(left, samples_left)[:, considered].mean(axis=1)
+                    gini_right = self.gini_impurities(right, samples_right)[:, considered].mean(axis=1)
+                    result += ((gini_total - gini_left * samples_left / number_of_samples -
+                                gini_right * samples_right / number_of_samples) / gini_total * (1 - self.w_numeric))
+
+        admissible = (samples_left >= self.min_samples_leaf) & (samples_right >= self.min_samples_leaf)
+        return np.where(admissible & ~np.isnan(result), result, -float("inf"))
+
+    def variances(self, statistics: np.ndarray, number_of_samples: np.ndarray) -> np.ndarray:
+        """
+        :param statistics: The statistics of some sets of samples.
+        :param number_of_samples: The number of samples in every set.
+        :return: The variance of every numeric target in every set. Sets of at most one sample have variance 0.
+        """
+        number_of_numeric_targets = len(self.numeric_targets)
+        sums = statistics[:, 1:1 + number_of_numeric_targets]
+        squared_sums = statistics[:, 1 + number_of_numeric_targets:1 + 2 * number_of_numeric_targets]
+        number_of_samples = number_of_samples[:, None]
+        result = (squared_sums - sums ** 2 / number_of_samples) / number_of_samples
+        return np.where(number_of_samples > 1, result, 0.)
+
+    def gini_impurities(self, statistics: np.ndarray, number_of_samples: np.ndarray) -> np.ndarray:
+        """
+        :param statistics: The statistics of some sets of samples.
+        :param number_of_samples: The number of samples in every set.
+        :return: The gini impurity of every symbolic target in every set, normalized to [0, 1].
+        """
+        result = np.zeros((len(statistics), len(self.symbolic_targets)))
+        for index, (offset, column) in enumerate(zip(self.symbol_offsets, self.symbolic_targets)):
+            number_of_symbols = self.symbols[column]
+            if number_of_symbols < 2:
+                continue
+            counts = statistics[:, offset:offset + number_of_symbols]
+            result[:, index] = (((counts ** 2).sum(axis=1) / number_of_samples ** 2 - 1) /
+                                (1 / number_of_symbols - 1))
+        return result
+
+    def compute_best_split(self, start: int, end: int) -> float:
+        """
+        Calculate the best split of a node on all features.
+
+        The indices of the node are reordered such that the samples of the left side of the best split come first.
+
+        :param start: Starting index of the node in the indices.
+        :param end: Ending index of the node in the indices.
+        :return: The impurity improvement of the best split, -inf if there is no admissible split.
+        """
+        depth, histogram = self.node_histogram(start, end)
+        number_of_bins = self.number_of_bins
+        total = histogram[:number_of_bins[0]].sum(axis=0)
+
+        self.best_var = -1
+        self.best_split_pos = -1
+        self.max_impurity_improvement = -float("inf")
+        best_bin = -1
+
+        for index, (offset, bins) in enumerate(zip(self.bin_offsets, number_of_bins)):
+            feature_histogram = histogram[offset:offset + bins]
+
+            # numeric features are split between neighbouring bins, symbolic features one value versus the rest
+            if index < self.number_of_numeric_features:
+                left = np.cumsum(feature_histogram, axis=0)[:-1]
+            else:
+                left = feature_histogram
+
+            if len(left) == 0:
+                continue
+
+            improvements = self.impurity_improvements(left, total, index)
+            best_split = int(np.argmax(improvements))
+            if improvements[best_split] > self.max_impurity_improvement:
+                self.max_impurity_improvement = improvements[best_split]
+                self.best_var = index
+                best_bin = best_split
+
+        if self.best_var == -1:
+            return self.max_impurity_improvement
+
+        # move the samples of the left side of the split to the front
+        samples = self.indices[start:end]
+        bins = self.binned_features[samples, self.best_var]
+        goes_left = bins <= best_bin if self.best_var < self.number_of_numeric_features else bins == best_bin
+        number_of_samples_left = int(np.count_nonzero(goes_left))
+        self.indices[start:end] = np.concatenate((samples[goes_left], samples[~goes_left]))
+        self.best_split_pos = number_of_samples_left - 1
+
+        self.remember_children(histogram, depth, ((start, start + number_of_samples_left),
+                                                  (start + number_of_samples_left, end)))
+        self.best_var = int(self.features[self.best_var])
+        return self.max_impurity_improvement
+
+    def remember_children(self, histogram: np.ndarray, depth: int,
+                          children: Tuple[Tuple[int, int], Tuple[int, int]]):
+        """
+        Keep the histogram of a node for its children, if the split is induced and the children are evaluated.
+
+        :param histogram: The histogram of the node.
+        :param depth: The depth of the node.
+        :param children: The ranges of the left and right child in the indices.
+        """
+        if self.max_impurity_improvement <= self.min_impurity_improvement or depth + 1 >= self.max_depth:
+            return
+        family = HistogramFamily(histogram, children)
+        for start, end in children:
+            if end - start >= 2 * self.min_samples_leaf:
+                self.families[(start, end)] = (depth + 1, family)
@@ -1,7 +1,14 @@
 import math
+import mmap
+import multiprocessing
+import os
+import tempfile
 from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
 from typing import Tuple, Union, Optional, List, Iterable, Dict, Any
 
+import networkx as nx
 import numpy as np
 import pandas as pd
 import plotly.graph_objects as go
@@ -9,13 +16,18 @@ from jpt.learning.impurity import Impurity
 from plotly.subplots import make_subplots
 from random_events.product_algebra import VariableMap
 from random_events.variable import Variable
+from scipy.special import logsumexp
 from typing_extensions import Self
 
+from .decision_tree import DecisionTree
+from .histogram_impurity import HistogramImpurity
 from .variables import Continuous, Integer, Symbolic, ScaledContinuous
 from ..nyga_distribution import NygaDistribution
-from ...distributions import (DiracDeltaDistribution, SymbolicDistribution, IntegerDistribution, UnivariateDistribution)
-from ...probabilistic_circuit.nx.probabilistic_circuit import (SumUnit, ProductUnit,
-                                                               ProbabilisticCircuit, UnivariateDiscreteLeaf)
+from ...distributions import (DiracDeltaDistribution, SymbolicDistribution, IntegerDistribution, UnivariateDistribution,
+                              PiecewiseUniformDistribution)
+from ...probabilistic_circuit.nx.probabilistic_circuit import (SumUnit, ProductUnit, Unit,
+                                                               ProbabilisticCircuit, UnivariateDiscreteLeaf,
+                                                               UnivariateContinuousLeaf)
 from ...utils import MissingDict
 
 
@@ -51,6 +63,19 @@ class JPT(ProbabilisticCircuit):
     The maximum depth of the tree.
     """
 
+    max_samples_per_leaf: Optional[int]
+    """
+    The maximum number of samples that the distributions of a leaf are fitted on.
+    Larger leaves are fitted on a random subset of their samples, which bounds the memory of fitting the leaves
+    of data that does not fit into memory. If None, all samples are used.
+    """
+
+    max_bins: Optional[int]
+    """
+    The maximum number of bins that numeric features are quantized into to find splits on histograms
+    (see :class:`HistogramImpurity`). It has to be at most 256. If None, splits are searched on the exact values.
+    """
+
     dependencies: VariableMap
     """
     The dependencies between the variables.
@@ -62,7 +87,7 @@ class JPT(ProbabilisticCircuit):
     """
 
     indices: Optional[np.ndarray] = None
-    impurity: Optional[Impurity] = None
+    impurity: Optional[Union[Impurity, HistogramImpurity]] = None
     c45queue: deque = deque()
     weights: List[float]
 
@@ -71,16 +96,42 @@ class JPT(ProbabilisticCircuit):
     Rather to store the sample indices in the leaves or not.
     """
 
+    n_jobs: int = 1
+    """
+    The number of processes that fit the leaves. If 1, the leaves are fitted as soon as they are induced.
+    """
+
+    leaf_ranges: List[Tuple[int, int]]
+    """
+    The ranges in `indices` of the leaves that are induced but not fitted yet.
+    """
+
     variables_from_init: Tuple[Variable, ...]
     """
     The variables from initialization. Since variables will be overwritten as soon as the model is learned,
     we need to store the variables from initialization here.
     """
 
-    def __init__(self, variables: Iterable[Variable], targets: Optional[Iterable[Variable]] = None,
+    decision_tree: Optional[DecisionTree] = None
+    """
+    The splits that were induced, used to route samples to the leaves.
+    """
+
+    tree_nodes: List[List]
+    """
+    The variable, value, symbolic flag, left and right child of every node while the tree is induced.
+    """
+
+    _symbol_encodings: Optional[Dict[str, pd.Index]] = None
+    """
+    The cached encodings of the symbolic variables by name. See :meth:`symbol_encoding`.
+    """
+
+    def __init__(self, variables: Iterable[Variable] = (), targets: Optional[Iterable[Variable]] = None,
                  features: Optional[Iterable[Variable]] = None, min_samples_leaf: Union[int, float] = 1,
                  min_impurity_improvement: float = 0.0, max_leaves: Union[int, float] = float("inf"),
-                 max_depth: Union[int, float] = float("inf"), dependencies: Optional[VariableMap] = None, ):
+                 max_depth: Union[int, float] = float("inf"), dependencies: Optional[VariableMap] = None,
+                 max_samples_per_leaf: Optional[int] = None, max_bins: Optional[int] = None):
         super().__init__()
         self.variables_from_init = tuple(sorted(variables))
         self.set_targets_and_features(targets, features)
@@ -88,6 +139,8 @@ class JPT(ProbabilisticCircuit):
         self.min_impurity_improvement = min_impurity_improvement
         self.max_leaves = max_leaves
         self.max_depth = max_depth
+        self.max_samples_per_leaf = max_samples_per_leaf
+        self.max_bins = max_bins
 
         if dependencies is None:
             self.dependencies = VariableMap({var: list(self.targets) for var in self.features})
@@ -165,36 +218,137 @@ class JPT(ProbabilisticCircuit):
     def symbolic_features(self):
         return [variable for variable in self.features if isinstance(variable, Symbolic)]
 
-    def preprocess_data(self, data: pd.DataFrame) -> np.ndarray:
+    def symbol_encoding(self, variable: Symbolic) -> pd.Index:
+        """
+        The encoding of the values of a symbolic variable as the positions of the elements in its domain.
+        The encodings are cached, such that data that is preprocessed for fitting and later inference share them.
+
+        :param variable: The symbolic variable.
+        :return: The index of the elements of the domain.
+        """
+        if self._symbol_encodings is None:
+            self._symbol_encodings = dict()
+        if variable.name not in self._symbol_encodings:
+            self._symbol_encodings[variable.name] = pd.Index(variable.domain.all_elements)
+        return self._symbol_encodings[variable.name]
+
+    def encode_symbols(self, variable: Symbolic, column: pd.Series) -> np.ndarray:
+        """
+        Encode a column of a symbolic variable.
+
+        :param variable: The symbolic variable.
+        :param column: The values of the variable.
+        :return: The positions of the values in the domain of the variable.
+        """
+        encoding = self.symbol_encoding(variable)
+
+        # categorical columns only need to encode their categories
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes = column.cat.codes.to_numpy()
+            result = np.where(codes >= 0, encoding.get_indexer(column.cat.categories)[codes], -1)
+        else:
+            result = encoding.get_indexer(column)
+
+        if (result < 0).any():
+            unknown_values = pd.unique(column[result < 0])
+            raise ValueError(f"The values {list(unknown_values)} are not in the domain of variable {variable.name}.")
+        return result
+
+    def preprocess_data(self, data: pd.DataFrame, out: Optional[np.ndarray] = None) -> np.ndarray:
         """
         Preprocess the data to be used in the model.
 
+        Symbolic values are encoded as the positions of the elements in the domain of their variable and scaled
+        continuous values are standardized.
+
         :param data: The data to preprocess.
+        :param out: A preallocated array of shape (len(data), len(variables)) to write the preprocessed data into,
+            e.g. a slice of a memory map. If None, a new array is allocated.
         :return: The preprocessed data.
         """
-
-        result = np.zeros(data.shape)
+        result = np.empty((len(data), len(self.variables_from_init))) if out is None else out
 
         for variable_index, variable in enumerate(self.variables_from_init):
             column = data[variable.name]
-            if isinstance(variable, ScaledContinuous):
-                column = variable.encode(column)
             if isinstance(variable, Symbolic):
-                all_elements = {element: index for index, element in enumerate(variable.domain.all_elements)}
-                column = column.apply(lambda x: all_elements[x])
-            result[:, variable_index] = column
+                result[:, variable_index] = self.encode_symbols(variable, column)
+            elif isinstance(variable, ScaledContinuous):
+                result[:, variable_index] = variable.encode(column.to_numpy(dtype=np.float64))
+            else:
+                result[:, variable_index] = column.to_numpy(dtype=np.float64)
 
         return result
 
-    def fit(self, data: pd.DataFrame) -> Self:
+    def preprocess_chunks(self, chunks: Iterable[pd.DataFrame], filename: str) -> np.memmap:
+        """
+        Preprocess data that does not fit into memory chunk by chunk into a memory mapped file.
+
+        Chunks can come from any source that yields dataframes, e.g. `pd.read_csv(..., chunksize=...)`,
+        `(batch.to_pandas() for batch in pyarrow.parquet.ParquetFile(...).iter_batches())` or the batches of an
+        arrow dataset.
+
+        :param chunks: The chunks of the data.
+        :param filename: The file to write the preprocessed data to. It contains the raw float64 values in row-major
+            order.
+        :return: The preprocessed data as a writable memory map of the file.
+        """
+        number_of_samples = 0
+        with open(filename, "wb") as file:
+            for chunk in chunks:
+                preprocessed_chunk = self.preprocess_data(chunk)
+                preprocessed_chunk.tofile(file)
+                number_of_samples += len(preprocessed_chunk)
+        return np.memmap(filename, dtype=np.float64, mode="r+",
+                         shape=(number_of_samples, len(self.variables_from_init)))
+
+    def fit_from_chunks(self, chunks: Iterable[pd.DataFrame], filename: Optional[str] = None, n_jobs: int = 1) \
+            -> Self:
+        """
+        Fit the model to data that does not fit into memory.
+
+        The chunks are preprocessed into a memory mapped file (see :meth:`preprocess_chunks`), on which the tree is
+        induced. Only the samples of a leaf (at most `max_samples_per_leaf` of them) are loaded into memory to fit
+        the leaf.
+
+        :param chunks: The chunks of the data.
+        :param filename: The file to write the preprocessed data to. If None, a temporary file is used and removed
+            after fitting.
+        :param n_jobs: The number of processes to fit the leaves with.
+        :return: The fitted model.
+        """
+        temporary_directory = tempfile.TemporaryDirectory() if filename is None else None
+        if filename is None:
+            filename = os.path.join(temporary_directory.name, "data.bin")
+        try:
+            preprocessed_data = self.preprocess_chunks(chunks, filename)
+            self.fit(preprocessed_data, n_jobs)
+
+            # release the memory map such that the file can be removed
+            self.impurity = None
+            del preprocessed_data
+        finally:
+            if temporary_directory is not None:
+                temporary_directory.cleanup()
+        return self
+
+    def fit(self, data: Union[pd.DataFrame, np.ndarray], n_jobs: int = 1) -> Self:
         """
         Fit the model to the data.
 
-        :param data: The data to fit the model to.
+        If more than one job is used, the tree is induced first and the leaves are fitted afterward by a pool of
+        processes that share the preprocessed data.
+        The pool uses the spawn start method, hence scripts that fit in parallel need an
+        `if __name__ == "__main__":` guard.
+
+        :param data: The data to fit the model to. Arrays (e.g. memory maps) are taken as already preprocessed
+            data and have to be writable.
+        :param n_jobs: The number of processes to fit the leaves with. -1 uses all CPUs.
         :return: The fitted model.
         """
         root = SumUnit(self)
-        preprocessed_data = self.preprocess_data(data)
+        preprocessed_data = data if isinstance(data, np.ndarray) else self.preprocess_data(data)
+        self.n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        self.leaf_ranges = []
 
         self.total_samples = len(preprocessed_data)
 
@@ -202,14 +356,24 @@ class JPT(ProbabilisticCircuit):
         self.impurity = self.construct_impurity()
         self.impurity.setup(preprocessed_data, self.indices)
 
-        self.c45queue.append((preprocessed_data, 0, len(preprocessed_data), 0))
+        self.tree_nodes = [[-1, 0., False, -1, -1]]
+        self.c45queue.append((preprocessed_data, 0, len(preprocessed_data), 0, 0))
 
         while self.c45queue:
             self.c45(*self.c45queue.popleft())
 
+        self.decision_tree = DecisionTree.from_nodes(self.tree_nodes)
+        self.tree_nodes = []
+
+        if self.leaf_ranges:
+            leaf_nodes = self.create_leaf_nodes_in_parallel(preprocessed_data, self.leaf_ranges)
+            for leaf_node, (start, end) in zip(leaf_nodes, self.leaf_ranges):
+                self.mount_leaf_node(leaf_node, start, end)
+            self.leaf_ranges = []
+
         return self
 
-    def c45(self, data: np.ndarray, start: int, end: int, depth: int):
+    def c45(self, data: np.ndarray, start: int, end: int, depth: int, node: int = 0):
         """
         Construct a DecisionNode or DecomposableProductNode from the data.
 
@@ -217,11 +381,11 @@ class JPT(ProbabilisticCircuit):
         :param start: Starting index in the data.
         :param end: Ending index in the data.
         :param depth: The current depth of the induction
+        :param node: The node of the decision tree that is induced.
         :return: The constructed decision tree node
         """
 
         number_of_samples = end - start
-        root = self.root
         # if the inducing in this step results in inadmissible nodes, skip the impurity calculation
         if depth >= self.max_depth or number_of_samples < 2 * self.min_samples_leaf:
             max_gain = -float("inf")
@@ -231,13 +395,12 @@ class JPT(ProbabilisticCircuit):
         # if the max gain is insufficient
         if max_gain <= self.min_impurity_improvement:
 
-            # create decomposable product node
-            leaf_node = self.create_leaf_node(data[self.indices[start:end]])
-            weight = number_of_samples / len(data)
-            root.add_subcircuit(leaf_node, np.log(weight))
-
-            if self.keep_sample_indices:
-                leaf_node.sample_indices = self.indices[start:end]
+            # create decomposable product node or defer it to the parallel fitting of all leaves
+            if self.n_jobs > 1:
+                self.leaf_ranges.append((start, end))
+            else:
+                leaf_data = data[self.bounded_leaf_samples(self.indices[start:end])]
+                self.mount_leaf_node(self.create_leaf_node(leaf_data), start, end)
 
             # terminate the induction
             return
@@ -245,12 +408,96 @@ class JPT(ProbabilisticCircuit):
         # if the max gain is sufficient
         split_pos = self.impurity.best_split_pos
 
+        # record the split in the decision tree
+        variable = self.impurity.best_var
+        left_samples = self.indices[start:start + split_pos + 1]
+        symbolic = isinstance(self.variables_from_init[variable], Symbolic)
+        if symbolic:
+            value = data[left_samples[0], variable]
+        else:
+            right_samples = self.indices[start + split_pos + 1:end]
+            value = (data[left_samples, variable].max() + data[right_samples, variable].min()) / 2
+        left_node, right_node = len(self.tree_nodes), len(self.tree_nodes) + 1
+        self.tree_nodes[node] = [variable, value, symbolic, left_node, right_node]
+        self.tree_nodes.extend([[-1, 0., False, -1, -1], [-1, 0., False, -1, -1]])
+
         # increase the depth
         new_depth = depth + 1
 
         # append the new induction steps
-        self.c45queue.append((data, start, start + split_pos + 1, new_depth))
-        self.c45queue.append((data, start + split_pos + 1, end, new_depth))
+        self.c45queue.append((data, start, start + split_pos + 1, new_depth, left_node))
+        self.c45queue.append((data, start + split_pos + 1, end, new_depth, right_node))
+
+    def bounded_leaf_samples(self, sample_indices: np.ndarray) -> np.ndarray:
+        """
+        Select the samples that a leaf is fitted on.
+
+        :param sample_indices: The indices of all samples of the leaf.
+        :return: The (sorted, if subsampled) indices of at most `max_samples_per_leaf` samples.
+        """
+        if self.max_samples_per_leaf is None or len(sample_indices) <= self.max_samples_per_leaf:
+            return sample_indices
+        selection = np.random.default_rng(0).choice(sample_indices, self.max_samples_per_leaf, replace=False)
+        return np.sort(selection)
+
+    def mount_leaf_node(self, leaf_node: ProductUnit, start: int, end: int):
+        """
+        Mount a leaf node in the root of the model.
+
+        :param leaf_node: The leaf node.
+        :param start: Starting index of the samples of the leaf in `indices`.
+        :param end: Ending index of the samples of the leaf in `indices`.
+        """
+        weight = (end - start) / self.total_samples
+        self.root.add_subcircuit(leaf_node, np.log(weight))
+        leaf_node.total_samples = end - start
+
+        if self.keep_sample_indices:
+            leaf_node.sample_indices = self.indices[start:end]
+
+    def create_leaf_nodes_in_parallel(self, data: np.ndarray, leaf_ranges: List[Tuple[int, int]]) \
+            -> List[ProductUnit]:
+        """
+        Create the leaf nodes of many leaves in a pool of processes.
+
+        The indices and in-memory data are placed in shared memory, such that every process reads the
+        samples of a leaf from `indices[start:end]` without copying the data.
+        Memory mapped data stays out of core, since every process maps the file itself.
+        The leaves are sent back as JSON, since the variables cannot be pickled.
+
+        :param data: The preprocessed data.
+        :param leaf_ranges: The ranges in `indices` of the samples of every leaf.
+        :return: The leaf nodes in the order of the ranges.
+        """
+        memory_mapped = isinstance(data, np.memmap) and isinstance(data.base, mmap.mmap)
+        shared_data = None if memory_mapped else shared_memory.SharedMemory(create=True, size=max(data.nbytes, 1))
+        shared_indices = shared_memory.SharedMemory(create=True, size=max(self.indices.nbytes, 1))
+        try:
+            if memory_mapped:
+                data.flush()
+                data_description = (data.filename, data.shape, data.dtype.str, data.offset)
+            else:
+                np.ndarray(data.shape, data.dtype, buffer=shared_data.buf)[:] = data
+                data_description = (shared_data.name, data.shape, data.dtype.str)
+            np.ndarray(self.indices.shape, self.indices.dtype, buffer=shared_indices.buf)[:] = self.indices
+
+            variables = [variable.to_json() for variable in self.variables_from_init]
+            initializer_arguments = (variables, self.max_samples_per_leaf, data_description,
+                                     (shared_indices.name, self.indices.shape, self.indices.dtype.str), memory_mapped)
+            chunk_size = max(1, len(leaf_ranges) // (4 * self.n_jobs))
+
+            with ProcessPoolExecutor(self.n_jobs, mp_context=multiprocessing.get_context("spawn"),
+                                     initializer=_initialize_leaf_worker,
+                                     initargs=initializer_arguments) as executor:
+                leaf_circuits = list(executor.map(_create_leaf_node_in_worker, leaf_ranges, chunksize=chunk_size))
+        finally:
+            if shared_data is not None:
+                shared_data.close()
+                shared_data.unlink()
+            shared_indices.close()
+            shared_indices.unlink()
+
+        return [ProbabilisticCircuit.from_json(leaf_circuit).root for leaf_circuit in leaf_circuits]
 
     def create_leaf_node(self, data: np.ndarray) -> ProductUnit:
         """
@@ -263,33 +510,328 @@ class JPT(ProbabilisticCircuit):
         result.total_samples = len(data)
 
         for index, variable in enumerate(self.variables_from_init):
-            if isinstance(variable, Continuous):
-                distribution = NygaDistribution(variable,
-                                                min_likelihood_improvement=variable.min_likelihood_improvement,
-                                                min_samples_per_quantile=variable.min_samples_per_quantile)
-                distribution.fit(data[:, index])
-
-                if isinstance(distribution.root, DiracDeltaDistribution):
-                    distribution.root.density_cap = 1 / variable.minimal_distance
-                distribution = distribution.root
-
-            elif isinstance(variable, Symbolic):
-                distribution = SymbolicDistribution(variable, probabilities=MissingDict(float))
-                distribution.fit_from_indices(data[:, index].astype(int))
-                distribution = UnivariateDiscreteLeaf(distribution)
-
-            elif isinstance(variable, Integer):
-                distribution = IntegerDistribution(variable, probabilities=MissingDict(float))
-                distribution.fit(data[:, index])
-                distribution = UnivariateDiscreteLeaf(distribution)
+            result.add_subcircuit(self.create_distribution(variable, data[:, index]))
+
+        return result
+
+    def create_distribution(self, variable: Variable, data: np.ndarray) -> Unit:
+        """
+        Create the distribution of a variable in a leaf.
+
+        :param variable: The variable.
+        :param data: The preprocessed values of the variable.
+        :return: The root of the distribution.
+        """
+        if isinstance(variable, Continuous):
+            # the compact representation of the nyga distribution needs no unit per quantile
+            nyga_distribution = NygaDistribution(variable,
+                                                 min_likelihood_improvement=variable.min_likelihood_improvement,
+                                                 min_samples_per_quantile=variable.min_samples_per_quantile)
+            distribution = nyga_distribution.compact_distribution(*nyga_distribution.quantiles(data))
+
+            if isinstance(distribution, DiracDeltaDistribution):
+                distribution.density_cap = 1 / variable.minimal_distance
+            distribution = UnivariateContinuousLeaf(distribution)
+
+        elif isinstance(variable, Symbolic):
+            distribution = SymbolicDistribution(variable, probabilities=MissingDict(float))
+            distribution.fit_from_indices(data.astype(int))
+            distribution = UnivariateDiscreteLeaf(distribution)
+
+        elif isinstance(variable, Integer):
+            distribution = IntegerDistribution(variable, probabilities=MissingDict(float))
+            distribution.fit(data)
+            distribution = UnivariateDiscreteLeaf(distribution)
+        else:
+            raise ValueError(f"Variable {variable} is not supported.")
+
+        return distribution
+
+    @property
+    def has_decision_tree(self) -> bool:
+        """
+        :return: Whether the decision tree matches the leaves of the model. Inference that changes the variables or
+            removes leaves invalidates the decision tree.
+        """
+        return (self.decision_tree is not None and tuple(self.variables) == self.variables_from_init and
+                self.decision_tree.number_of_leaves == len(self.root.subcircuits))
+
+    def leaf_index_of_samples(self, data: np.ndarray) -> np.ndarray:
+        """
+        Route samples to the leaves of the model.
+
+        If the model has a decision tree, the samples are routed by its splits.
+        Otherwise, a sample is routed to the leaf whose support contains most of its values.
+        Ties, e.g. between leaves that do not contain the sample at all, are broken by the weighted likelihood of the
+        values that are in the support of the leaf.
+
+        :param data: The preprocessed samples.
+        :return: The index of the leaf of every sample in the subcircuits of the root.
+        """
+        if self.has_decision_tree:
+            return self.decision_tree.route(data)
+
+        super().log_likelihood(data)
+        log_weighted_leaves = self.root.log_weighted_subcircuits
+        number_of_values_in_support = np.zeros((len(log_weighted_leaves), len(data)))
+        log_likelihood_in_support = np.zeros((len(log_weighted_leaves), len(data)))
+
+        for index, (log_weight, leaf) in enumerate(log_weighted_leaves):
+            log_likelihoods = np.stack([subcircuit.result_of_current_query for subcircuit in leaf.subcircuits])
+            in_support = log_likelihoods > -np.inf
+            number_of_values_in_support[index] = in_support.sum(axis=0)
+            log_likelihood_in_support[index] = log_weight + np.where(in_support, log_likelihoods, 0.).sum(axis=0)
+
+        best_support = number_of_values_in_support == number_of_values_in_support.max(axis=0)
+        return np.argmax(np.where(best_support, log_likelihood_in_support, -np.inf), axis=0)
+
+    def partial_fit(self, data: Union[pd.DataFrame, np.ndarray], refit_threshold: float = 0.1,
+                    max_leaf_samples: Optional[int] = None) -> Self:
+        """
+        Update a fitted model with new samples without inducing the tree again.
+
+        The new samples are routed to the leaves (see :meth:`leaf_index_of_samples`).
+        The weights of the leaves and the distributions of integer and symbolic variables are updated exactly.
+        The distributions of continuous variables are refitted if the number of samples of a leaf grew by more than
+        `refit_threshold`. Since the previous samples are not stored in the model, they are refitted on the new samples
+        and as many samples from the current distributions as the leaf had before (at most `max_samples_per_leaf`
+        samples in total). The refitted distributions keep the ends of the support of the current distributions.
+
+        The sample indices of the leaves (see `keep_sample_indices`) are not updated.
+
+        :param data: The new samples. Arrays are taken as already preprocessed data.
+        :param refit_threshold: The relative growth of the number of samples of a leaf that causes a refit.
+        :param max_leaf_samples: If not None, leaves that have more samples than this after the update are induced
+            again on the samples of the leaf, which may split them into multiple leaves.
+        :return: The updated model.
+        """
+        preprocessed_data = data if isinstance(data, np.ndarray) else self.preprocess_data(data)
+        leaf_indices = self.leaf_index_of_samples(preprocessed_data)
+        root = self.root
+        log_weighted_leaves = root.log_weighted_subcircuits
+        total_samples = self.total_samples
+        self.total_samples += len(preprocessed_data)
+
+        for index, (log_weight, leaf) in enumerate(log_weighted_leaves):
+            new_samples = preprocessed_data[leaf_indices == index]
+            number_of_samples = round(np.exp(log_weight) * total_samples)
+            leaf.total_samples = number_of_samples + len(new_samples)
+            if len(new_samples) == 0:
+                continue
+
+            refit = len(new_samples) > refit_threshold * number_of_samples
+            split = max_leaf_samples is not None and leaf.total_samples > max_leaf_samples
+            if refit or split:
+                samples = np.concatenate((self.sample_leaf(leaf, number_of_samples), new_samples))
+                samples = samples[self.bounded_leaf_samples(np.arange(len(samples)))]
+
+            self.update_discrete_distributions(leaf, number_of_samples, new_samples)
+
+            if split:
+                self.split_leaf(leaf, samples)
+            elif refit:
+                self.refit_continuous_distributions(leaf, samples)
+
+        for leaf in root.subcircuits:
+            self.edges[root, leaf]["log_weight"] = np.log(leaf.total_samples / self.total_samples)
+
+        return self
+
+    def sample_leaf(self, leaf: ProductUnit, amount: int) -> np.ndarray:
+        """
+        Sample from a leaf.
+
+        :param leaf: The leaf.
+        :param amount: The number of samples.
+        :return: The samples in the preprocessed format.
+        """
+        result = np.empty((amount, len(self.variables_from_init)))
+        for subcircuit in leaf.subcircuits:
+            result[:, self.variables_from_init.index(subcircuit.variables[0])] = self.sample_distribution(subcircuit,
+                                                                                                         amount)
+        return result
+
+    def sample_distribution(self, distribution: Unit, amount: int) -> np.ndarray:
+        """
+        Sample from the distribution of a variable in a leaf.
+
+        :param distribution: The root of the distribution.
+        :param amount: The number of samples.
+        :return: The samples in the preprocessed format.
+        """
+        if isinstance(distribution, SumUnit):
+            log_weights = distribution.log_weights
+            counts = np.random.multinomial(amount, np.exp(log_weights - logsumexp(log_weights)))
+            return np.concatenate([self.sample_distribution(subcircuit, count)
+                                   for subcircuit, count in zip(distribution.subcircuits, counts)])
+
+        distribution = distribution.distribution
+        result = distribution.sample(amount)[:, 0]
+        if isinstance(distribution, SymbolicDistribution):
+            positions = {hash(element): index for index, element in enumerate(distribution.variable.domain.simple_sets)}
+            result = np.array([positions[value] for value in result], dtype=float)
+        return result
+
+    def update_discrete_distributions(self, leaf: ProductUnit, number_of_samples: int, new_samples: np.ndarray):
+        """
+        Update the distributions of the integer and symbolic variables of a leaf with new samples.
+
+        :param leaf: The leaf.
+        :param number_of_samples: The number of samples the distributions were fitted on.
+        :param new_samples: The new preprocessed samples.
+        """
+        total = number_of_samples + len(new_samples)
+        for subcircuit in leaf.subcircuits:
+            if not isinstance(subcircuit, UnivariateDiscreteLeaf):
+                continue
+
+            distribution = subcircuit.distribution
+            values, counts = np.unique(new_samples[:, self.variables_from_init.index(distribution.variable)],
+                                       return_counts=True)
+            if isinstance(distribution, SymbolicDistribution):
+                simple_sets = distribution.variable.domain.simple_sets
+                values = [simple_sets[int(value)] for value in values]
+
+            probabilities = MissingDict(float)
+            for key, probability in distribution.probabilities.items():
+                probabilities[key] = probability * number_of_samples / total
+            for value, count in zip(values, counts):
+                probabilities[hash(value)] += count / total
+            distribution.probabilities = probabilities
+
+    def refit_continuous_distributions(self, leaf: ProductUnit, samples: np.ndarray):
+        """
+        Refit the distributions of the continuous variables of a leaf.
+
+        :param leaf: The leaf.
+        :param samples: The preprocessed samples to fit the distributions on.
+        """
+        subcircuits = leaf.subcircuits
+        self.remove_edges_from([(leaf, subcircuit) for subcircuit in subcircuits])
+        for subcircuit in subcircuits:
+            variable = subcircuit.variables[0]
+            if isinstance(subcircuit, UnivariateDiscreteLeaf):
+                leaf.add_subcircuit(subcircuit, mount=False)
+                continue
+            # the samples of the previous distribution rarely reach the ends of its support, hence they are kept
+            # such that the samples the distribution was fitted on before stay in the support
+            index = self.variables_from_init.index(variable)
+            values = np.concatenate((samples[:, index], self.support_bounds(subcircuit)))
+            self.remove_nodes_from(nx.descendants(self, subcircuit) | {subcircuit})
+            leaf.add_subcircuit(self.create_distribution(variable, values))
+
+    def support_bounds(self, distribution: Unit) -> np.ndarray:
+        """
+        Calculate the ends of the support of the distribution of a continuous variable in a leaf.
+
+        :param distribution: The root of the distribution.
+        :return: The lowest and the highest value of the support.
+        """
+        leaves = [distribution] if distribution.is_leaf else \
+            [unit for unit in nx.descendants(self, distribution) if unit.is_leaf]
+        bounds = []
+        for unit in leaves:
+            # the breakpoints are more precise than the intervals of the support
+            if isinstance(unit.distribution, PiecewiseUniformDistribution):
+                bounds.extend((unit.distribution.lower, unit.distribution.upper))
             else:
-                raise ValueError(f"Variable {variable} is not supported.")
+                bounds.extend(bound for simple_set in unit.distribution.univariate_support.simple_sets
+                              for bound in (simple_set.lower, simple_set.upper))
+        return np.array([min(bounds), max(bounds)])
+
+    def split_leaf(self, leaf: ProductUnit, samples: np.ndarray):
+        """
+        Induce a leaf again on its samples and replace it by the leaves of the induced tree.
+
+        :param leaf: The leaf.
+        :param samples: The preprocessed samples of the leaf.
+        """
+        model = self.empty_copy()
+        model.fit(samples)
+        root = self.root
+        model_root = model.root
+        if self.has_decision_tree:
+            self.decision_tree = self.decision_tree.replace_leaf(root.subcircuits.index(leaf), model.decision_tree)
+        self.remove_nodes_from(nx.descendants(self, leaf) | {leaf})
+        self.add_edges_and_nodes_from_circuit(model)
+        for new_leaf in model_root.subcircuits:
+            new_leaf.total_samples = leaf.total_samples * new_leaf.total_samples / len(samples)
+            root.add_subcircuit(new_leaf, 0., mount=False)
+        self.remove_node(model_root)
+
+    def log_likelihood(self, events: np.ndarray) -> np.ndarray:
+        """
+        Calculate the log-likelihood of preprocessed samples.
 
-            result.add_subcircuit(distribution)
+        If the model has a decision tree, every sample is routed to the only leaf whose region contains it and only
+        that leaf is evaluated on the sample.
+
+        :param events: The preprocessed samples.
+        :return: The log-likelihood of every sample.
+        """
+        if not self.has_decision_tree:
+            return super().log_likelihood(events)
+
+        leaf_indices = self.decision_tree.route(events)
+        log_weighted_leaves = self.root.log_weighted_subcircuits
+        result = np.full(len(events), -np.inf)
+
+        # group the samples by leaf
+        order = np.argsort(leaf_indices, kind="stable")
+        counts = np.bincount(leaf_indices, minlength=len(log_weighted_leaves))
+        bounds = np.concatenate(([0], np.cumsum(counts)))
+        variable_to_index_map = self.variable_to_index_map
+
+        for index in np.flatnonzero(counts):
+            samples = order[bounds[index]:bounds[index + 1]]
+            log_weight, leaf = log_weighted_leaves[index]
+            result[samples] = log_weight + self.log_likelihood_of_unit(leaf, events[samples], variable_to_index_map)
+        return result
+
+    def log_likelihood_of_unit(self, unit: Unit, events: np.ndarray,
+                               variable_to_index_map: Dict[Variable, int]) -> np.ndarray:
+        """
+        Calculate the log-likelihood of a unit that is the root of a tree shaped part of the circuit, e.g. a leaf of
+        the model.
+
+        :param unit: The unit.
+        :param events: The preprocessed samples.
+        :param variable_to_index_map: The map from variables to the columns of the samples.
+        :return: The log-likelihood of every sample.
+        """
+        if unit.is_leaf:
+            unit.log_likelihood(events[:, [variable_to_index_map[variable] for variable in unit.variables]])
+        else:
+            for subcircuit in unit.subcircuits:
+                self.log_likelihood_of_unit(subcircuit, events, variable_to_index_map)
+            unit.log_forward()
+        return unit.result_of_current_query
+
+    def log_conditional_in_place(self, point: Dict[Variable, Any]) -> Tuple[Optional[Self], float]:
+        """
+        Condition the model on a point in place.
 
+        If the model has a decision tree, the leaves whose region does not contain the numeric values of the point
+        are removed before the conditioning, since their probability is 0.
+        """
+        if self.has_decision_tree:
+            known_values = {self.variables_from_init.index(variable): value for variable, value in point.items()
+                            if isinstance(variable, (Continuous, Integer))}
+            possible_leaves = set(self.decision_tree.leaves_of_point(known_values).tolist())
+            for index, leaf in enumerate(self.root.subcircuits):
+                if index not in possible_leaves:
+                    self.remove_nodes_from(nx.descendants(self, leaf) | {leaf})
+        return super().log_conditional_in_place(point)
+
+    def __copy__(self, precomputed=None):
+        result = super().__copy__(precomputed)
+        result.decision_tree = self.decision_tree
         return result
 
-    def construct_impurity(self) -> Impurity:
+    def construct_impurity(self) -> Union[Impurity, HistogramImpurity]:
+        if self.max_bins is not None:
+            return self.construct_histogram_impurity()
+
         min_samples_leaf = self.min_samples_leaf
 
         numeric_vars = (
@@ -326,6 +868,28 @@ class JPT(ProbabilisticCircuit):
                         n_num_vars_total, numeric_features, symbolic_features, symbols, max_variances,
                         dependency_indices)
 
+    def construct_histogram_impurity(self) -> HistogramImpurity:
+        """
+        Construct the impurity that finds splits on histograms of the binned features.
+        """
+        numeric_targets = [index for index, variable in enumerate(self.variables_from_init)
+                           if variable in self.numeric_targets]
+        symbolic_targets = [index for index, variable in enumerate(self.variables_from_init)
+                            if variable in self.symbolic_targets]
+        numeric_features = [index for index, variable in enumerate(self.variables_from_init)
+                            if variable in self.numeric_features]
+        symbolic_features = [index for index, variable in enumerate(self.variables_from_init)
+                             if variable in self.symbolic_features]
+        symbols = {index: len(variable.domain.simple_sets) for index, variable in enumerate(self.variables_from_init)
+                   if isinstance(variable, Symbolic)}
+        dependencies = {self.variables_from_init.index(variable): [self.variables_from_init.index(dependency)
+                                                                   for dependency in dependencies]
+                        for variable, dependencies in self.dependencies.items()}
+        return HistogramImpurity(self.min_samples_leaf, np.array(numeric_targets, dtype=int),
+                                 np.array(symbolic_targets, dtype=int), np.array(numeric_features, dtype=int),
+                                 np.array(symbolic_features, dtype=int), symbols, dependencies, self.max_bins,
+                                 self.min_impurity_improvement, self.max_depth)
+
     def plot(self, number_of_samples: int = 1000, surface=True) -> List:
         try:
             return super().plot(number_of_samples, surface)
@@ -377,7 +941,9 @@ class JPT(ProbabilisticCircuit):
                                 min_samples_leaf=self.min_samples_leaf,
                                 min_impurity_improvement=self.min_impurity_improvement,
                                 max_depth=self.max_depth,
-                                dependencies=self.dependencies)
+                                dependencies=self.dependencies,
+                                max_samples_per_leaf=self.max_samples_per_leaf,
+                                max_bins=self.max_bins)
         return result
 
     def to_json(self) -> Dict[str, Any]:
@@ -389,8 +955,11 @@ class JPT(ProbabilisticCircuit):
         result["min_impurity_improvement"] = self.min_impurity_improvement
         result["max_leaves"] = self.max_leaves
         result["max_depth"] = self.max_depth
+        result["max_samples_per_leaf"] = self.max_samples_per_leaf
+        result["max_bins"] = self.max_bins
         result["dependencies"] = self._variable_dependencies_to_json()
         result["total_samples"] = self.total_samples
+        result["decision_tree"] = None if self.decision_tree is None else self.decision_tree.to_json()
         return result
 
     @classmethod
@@ -408,8 +977,11 @@ class JPT(ProbabilisticCircuit):
                                     in data["dependencies"].items()})
         result = cls(variables=variable_from_init, targets=targets, features=features,
                      min_samples_leaf=_min_samples_leaf, min_impurity_improvement=min_impurity_improvement,
-                     max_leaves=max_leaves, max_depth=max_depth, dependencies=dependencies)
+                     max_leaves=max_leaves, max_depth=max_depth, dependencies=dependencies,
+                     max_samples_per_leaf=data.get("max_samples_per_leaf"), max_bins=data.get("max_bins"))
         result.total_samples = data["total_samples"]
+        if data.get("decision_tree") is not None:
+            result.decision_tree = DecisionTree.from_json(data["decision_tree"])
         return result
 
     def marginal(self, variables: Iterable[Variable], simplify_if_univariate=True) \
@@ -439,3 +1011,53 @@ class JPT(ProbabilisticCircuit):
         else:
             raise NotImplementedError(f"Variable {variable} not supported.")
         return distribution
+
+
+_leaf_worker: Optional[Tuple[JPT, np.ndarray, np.ndarray, List[shared_memory.SharedMemory]]] = None
+"""
+The model, data, indices and shared memory blocks of a process that fits leaves.
+"""
+
+
+def _attach_shared_array(name: str, shape: Tuple[int, ...], dtype: str) \
+        -> Tuple[np.ndarray, shared_memory.SharedMemory]:
+    """
+    Attach to an array in shared memory.
+
+    :return: The array and the shared memory block that has to be kept alive as long as the array is used.
+    """
+    block = shared_memory.SharedMemory(name=name)
+    return np.ndarray(shape, np.dtype(dtype), buffer=block.buf), block
+
+
+def _initialize_leaf_worker(variables: List[Dict[str, Any]], max_samples_per_leaf: Optional[int], data: Tuple,
+                            indices: Tuple, memory_mapped: bool = False):
+    """
+    Initialize a process that fits leaves, see :meth:`JPT.create_leaf_nodes_in_parallel`.
+
+    :param data: The name, shape and dtype of the data in shared memory or, if `memory_mapped`, the filename, shape,
+        dtype and offset of the memory mapped data.
+    """
+    global _leaf_worker
+    indices, indices_block = _attach_shared_array(*indices)
+    blocks = [indices_block]
+    if memory_mapped:
+        filename, shape, dtype, offset = data
+        data = np.memmap(filename, dtype=np.dtype(dtype), mode="r", shape=shape, offset=offset)
+    else:
+        data, data_block = _attach_shared_array(*data)
+        blocks.append(data_block)
+    model = JPT([Variable.from_json(variable) for variable in variables], max_samples_per_leaf=max_samples_per_leaf)
+    _leaf_worker = (model, data, indices, blocks)
+
+
+def _create_leaf_node_in_worker(leaf_range: Tuple[int, int]) -> Dict[str, Any]:
+    """
+    Fit the leaf of the samples in `indices[start:end]` in a process that fits leaves.
+
+    :return: The circuit of the leaf as JSON.
+    """
+    model, data, indices, _ = _leaf_worker
+    start, end = leaf_range
+    leaf_data = data[model.bounded_leaf_samples(indices[start:end])]
+    return model.create_leaf_node(leaf_data).probabilistic_circuit.to_json()
@@ -22,19 +22,26 @@ def infer_variables_from_dataframe(data: pd.DataFrame, scale_continuous_types: b
     """
     result = []
 
+    # the moments of all numeric columns are calculated at once
+    numeric_columns = [column for column, datatype in zip(data.columns, data.dtypes)
+                       if not isinstance(datatype, pd.CategoricalDtype) and np.issubdtype(datatype, np.number)]
+    means = data[numeric_columns].mean()
+    stds = data[numeric_columns].std()
+
     for column, datatype in zip(data.columns, data.dtypes):
 
-        unique_values = data[column].unique()
+        # handle categorical columns, which know their domain already
+        if isinstance(datatype, pd.CategoricalDtype):
+            variable = Symbolic(column, Set.from_iterable(datatype.categories))
 
         # handle continuous variables
-        if np.issubdtype(datatype, np.number) and datatype != int:
+        elif np.issubdtype(datatype, np.number) and datatype != int:
 
+            unique_values = np.unique(data[column].to_numpy())
             if len(unique_values) == 1:
                 minimal_distance_between_values = 1.
             else:
-                minimal_distance_between_values = np.diff(np.sort(unique_values)).min()
-            mean = data[column].mean()
-            std = data[column].std()
+                minimal_distance_between_values = np.diff(unique_values).min()
 
             # select the correct class type
             if scale_continuous_types:
@@ -43,19 +50,15 @@ def infer_variables_from_dataframe(data: pd.DataFrame, scale_continuous_types: b
             else:
                 variable_class = Continuous
 
-            variable = variable_class(column, mean, std, minimal_distance_between_values, min_likelihood_improvement,
-                                      min_samples_per_quantile)
+            variable = variable_class(column, means[column], stds[column], minimal_distance_between_values,
+                                      min_likelihood_improvement, min_samples_per_quantile)
 
         # handle discrete variables
         elif datatype in [object, int]:
             if datatype == int:
-                mean = data[column].mean()
-                std = data[column].std()
-                variable = Integer(column, mean, std)
+                variable = Integer(column, means[column], stds[column])
             elif datatype == object:
                 unique_values = data[column].unique()
-                # unique_values.sort()
-                # enum = IntEnum(column, {value: index for index, value in enumerate(unique_values)})
                 variable = Symbolic(column, Set.from_iterable(unique_values))
             else:
                 raise ValueError(f"Datatype {datatype} of column {column} is not supported.")
@@ -2,16 +2,20 @@ from __future__ import annotations
 
 import collections
 import dataclasses
-from typing import Optional, List, Deque, Tuple, Dict, Any
+import itertools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, List, Deque, Tuple, Dict, Any, Union
 
 import numpy as np
-import random_events
 from random_events.interval import closed, closed_open, SimpleInterval, Bound
-from random_events.product_algebra import SimpleEvent
+from random_events.product_algebra import SimpleEvent, Event
 from random_events.variable import Continuous, Variable
 from typing_extensions import Self
 
-from probabilistic_model.distributions import DiracDeltaDistribution, UniformDistribution
+from probabilistic_model.distributions import DiracDeltaDistribution, UniformDistribution, \
+    PiecewiseUniformDistribution
 from probabilistic_model.probabilistic_circuit.nx.probabilistic_circuit import SumUnit, ProbabilisticCircuit, \
     UnivariateContinuousLeaf
 
@@ -181,35 +185,28 @@ class InductionStep:
         """
         Compute the best split of the data.
 
-        The best split of the data is computed by evaluating the log likelihood of every possible split and memorizing
-        the best one.
+        The best split of the data is computed by evaluating the log likelihood of every possible split at once and
+        selecting the best one.
 
         :return: The maximum log likelihood and the best split index.
         """
 
-        # initialize the maximum likelihood and the best split index
-        maximum_log_likelihood = -float("inf")
-        best_split_index = None
+        # every possible splitting index
+        split_indices = np.arange(self.begin_index + self.min_samples_per_quantile,
+                                  self.end_index - self.min_samples_per_quantile + 1)
+        if len(split_indices) == 0:
+            return -float("inf"), None
 
-        # calculate the connecting points
-        right_connecting_point = self.right_connecting_point()
-        left_connecting_point = self.left_connecting_point()
+        # calculate the log likelihoods of both sides for all splits
+        log_likelihood = (self.log_likelihood_of_split_side(split_indices, self.left_connecting_point()) +
+                          self.log_likelihood_of_split_side(split_indices, self.right_connecting_point()))
 
-        # for every possible splitting index
-        for split_index in range(self.begin_index + self.min_samples_per_quantile,
-                                 self.end_index - self.min_samples_per_quantile + 1):
-
-            # calculate log likelihoods
-            log_likelihood_left = self.log_likelihood_of_split_side(split_index, left_connecting_point)
-            log_likelihood_right = self.log_likelihood_of_split_side(split_index, right_connecting_point)
-            log_likelihood = (log_likelihood_left + log_likelihood_right)
-
-            # update the maximum likelihood and the best split index
-            if log_likelihood > maximum_log_likelihood:
-                maximum_log_likelihood = log_likelihood
-                best_split_index = split_index
-
-        return maximum_log_likelihood, best_split_index
+        # splits with undefined likelihoods are never the best split
+        log_likelihood = np.where(np.isnan(log_likelihood), -float("inf"), log_likelihood)
+        best = np.argmax(log_likelihood)
+        if log_likelihood[best] == -float("inf"):
+            return -float("inf"), None
+        return log_likelihood[best], int(split_indices[best])
 
     def log_likelihood_without_split(self) -> float:
         """
@@ -220,16 +217,17 @@ class InductionStep:
         log_density = -np.log(self.right_connecting_point() - self.left_connecting_point())
         return self.sum_log_weights() + (self.number_of_samples * log_density)
 
-    def log_likelihood_of_split_side(self, split_index: int, connecting_point: float) -> float:
+    def log_likelihood_of_split_side(self, split_index: Union[int, np.ndarray],
+                                     connecting_point: float) -> Union[float, np.ndarray]:
         """
         Calculate the log likelihood of a split side.
 
         This method automatically determines if this is the left or right side of the split.
 
-        :param split_index: The index of the split.
+        :param split_index: The index of the split or an array of indices of splits.
         :param connecting_point: The connecting point.
 
-        :return: The log likelihood of the split.
+        :return: The log likelihood of the split (for every split).
         """
 
         # calculate the split value
@@ -238,23 +236,25 @@ class InductionStep:
         # calculate the log density
         density = split_value - connecting_point
         is_left = density > 0
-        log_density = np.log(np.abs(density))
 
-        # calculate the log of the weight of this partition in the sum node
-        log_weight_sum_of_split = np.log(
-            self.sum_weights_from_indices(self.begin_index, split_index)) if is_left else np.log(
-            self.sum_weights_from_indices(split_index, self.end_index))
+        with np.errstate(divide="ignore"):
+            log_density = np.log(np.abs(density))
+
+            # calculate the log of the weight of this partition in the sum node
+            log_weight_sum_of_split = np.log(np.where(
+                is_left, self.sum_weights_from_indices(self.begin_index, split_index),
+                self.sum_weights_from_indices(split_index, self.end_index)))
 
         # calculate the log of the sum of the log_weights of both partitions
         log_weight_sum = np.log(self.total_weights)
 
         # calculate the number of samples in this partition
-        number_of_samples = split_index - self.begin_index if is_left else self.end_index - split_index
+        number_of_samples = np.where(is_left, split_index - self.begin_index, self.end_index - split_index)
 
         # calculate the sum of the logarithmic log_weights of the samples in this partition
-        sum_of_log_weights_of_samples = self.sum_log_weights_from_indices(self.begin_index,
-                                                                          split_index) if is_left else self.sum_log_weights_from_indices(
-            split_index, self.end_index)
+        sum_of_log_weights_of_samples = np.where(is_left,
+                                                 self.sum_log_weights_from_indices(self.begin_index, split_index),
+                                                 self.sum_log_weights_from_indices(split_index, self.end_index))
 
         # add the terms together
         log_likelihood = (number_of_samples * (
@@ -294,6 +294,7 @@ class InductionStep:
         Perform one induction step.
 
         :return: The (possibly empty) list of new induction steps.
+            If the list is empty, the samples of this step form a quantile.
         """
 
         # calculate the best likelihood with splitting
@@ -307,17 +308,22 @@ class InductionStep:
             right_induction_step = self.construct_right_induction_step(best_split_index)
             return [left_induction_step, right_induction_step]
 
-        # if the improvement is not good enough
-        else:
-            # calculate the weight of the uniform distribution
-            weight = self.total_weights / self.cumulative_weights[-1]
+        # if the improvement is not good enough, this step is a quantile
+        return []
 
-            # mount a uniform distribution
-            distribution = self.create_uniform_distribution()
-            distribution = UnivariateContinuousLeaf(distribution)
-            self.nyga_distribution.root.add_subcircuit(distribution, np.log(weight))
 
-            return []
+def _quantiles_in_worker(arguments: Tuple[np.ndarray, Optional[np.ndarray], int, float]) \
+        -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Compute the quantiles of one column in a worker process.
+
+    :param arguments: The column, the weights of its rows, the minimal number of samples per quantile and the minimal
+        likelihood improvement.
+    :return: The breakpoints and probabilities of the quantiles.
+    """
+    column, weights, min_samples_per_quantile, min_likelihood_improvement = arguments
+    distribution = NygaDistribution(None, min_samples_per_quantile, min_likelihood_improvement)
+    return distribution.quantiles_of_samples(column, weights)
 
 
 class NygaDistribution(ProbabilisticCircuit):
@@ -351,18 +357,25 @@ class NygaDistribution(ProbabilisticCircuit):
 
         :return: The fitted distribution.
         """
+        return self.mount_quantiles(*self.quantiles(data, weights))
+
+    def quantiles(self, data: np.array, weights: Optional[np.array] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Induce the quantiles of the distribution without creating any units.
+
+        :param data: The data to fit the distribution to.
+        :param weights: The optional weights of the sorted, unique data points.
+
+        :return: The sorted breakpoints of the quantiles and the probability of every quantile.
+            If the data contains only one value, the breakpoints are this value twice.
+        """
 
         # make the data unique and sort it
         sorted_unique_data, counts = np.unique(data, return_counts=True)
 
         # if the data contains only one value
         if len(sorted_unique_data) == 1:
-            # mount a dirac delta distribution and return
-            distribution = DiracDeltaDistribution(self.variable, sorted_unique_data[0])
-            distribution = UnivariateContinuousLeaf(distribution, self)
-            return self
-
-        root = SumUnit(self)
+            return np.repeat(sorted_unique_data, 2), np.ones(1)
 
         # if the log_weights are not given
         if weights is None:
@@ -382,16 +395,135 @@ class NygaDistribution(ProbabilisticCircuit):
 
         # initialize the queue
         induction_steps: Deque[InductionStep] = collections.deque([initial_induction_step])
+        begin_indices = []
 
         # induce the distribution
         while len(induction_steps) > 0:
             induction_step = induction_steps.popleft()
             new_induction_steps = induction_step.induce()
+            if len(new_induction_steps) == 0:
+                begin_indices.append(induction_step.begin_index)
             induction_steps.extend(new_induction_steps)
 
-        self.normalize()
+        # the quantiles partition the data, hence every quantile ends where the next one begins
+        begin_indices = np.sort(begin_indices)
+        end_indices = np.append(begin_indices[1:], len(sorted_unique_data))
+
+        # the connecting points between the quantiles
+        breakpoints = (sorted_unique_data[begin_indices[1:] - 1] + sorted_unique_data[begin_indices[1:]]) / 2
+        breakpoints = np.concatenate(([sorted_unique_data[0]], breakpoints, [sorted_unique_data[-1]]))
+
+        probabilities = (cumulative_weights[end_indices] - cumulative_weights[begin_indices]) / cumulative_weights[-1]
+        return breakpoints, probabilities
+
+    def quantiles_of_samples(self, data: np.ndarray, weights: Optional[np.ndarray] = None) \
+            -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Induce the quantiles of the distribution from samples that are weighted row by row.
+
+        :param data: The samples.
+        :param weights: The optional weights of the samples.
+
+        :return: The sorted breakpoints of the quantiles and the probability of every quantile.
+        """
+        if weights is None:
+            return self.quantiles(data)
+        sorted_unique_data, inverse = np.unique(data, return_inverse=True)
+        return self.quantiles(sorted_unique_data, np.bincount(inverse.reshape(-1), weights))
+
+    def mount_quantiles(self, breakpoints: np.ndarray, probabilities: np.ndarray) -> Self:
+        """
+        Create the units of the distribution from its quantiles at once.
+
+        Every quantile is a uniform distribution on the interval between two consecutive breakpoints, which is
+        right-open except for the last one.
+        Two equal breakpoints describe a dirac delta distribution.
+
+        :param breakpoints: The sorted breakpoints of the quantiles.
+        :param probabilities: The probability of every quantile.
+
+        :return: The distribution.
+        """
+        breakpoints = np.asarray(breakpoints).tolist()
+
+        # if the data contains only one value
+        if breakpoints[0] == breakpoints[-1]:
+            UnivariateContinuousLeaf(DiracDeltaDistribution(self.variable, breakpoints[0]), self)
+            return self
+
+        root = SumUnit(self)
+        leaves = []
+        log_probabilities = []
+        for index, probability in enumerate(np.asarray(probabilities).tolist()):
+
+            # quantiles without mass are gaps in the support
+            if probability <= 0:
+                continue
+
+            right = Bound.CLOSED if index == len(breakpoints) - 2 else Bound.OPEN
+            interval = SimpleInterval(breakpoints[index], breakpoints[index + 1], Bound.CLOSED, right)
+            leaves.append(UnivariateContinuousLeaf(UniformDistribution(self.variable, interval), self))
+            log_probabilities.append(np.log(probability))
+
+        self.add_weighted_edges_from(zip(itertools.repeat(root), leaves, log_probabilities), weight="log_weight")
         return self
 
+    def compact_distribution(self, breakpoints: np.ndarray, probabilities: np.ndarray) \
+            -> Union[PiecewiseUniformDistribution, DiracDeltaDistribution]:
+        """
+        Create the array-based representation of the distribution from its quantiles, without creating any units.
+
+        :param breakpoints: The sorted breakpoints of the quantiles.
+        :param probabilities: The probability of every quantile.
+
+        :return: The piecewise uniform distribution or, if the breakpoints are equal, a dirac delta distribution.
+        """
+        if breakpoints[0] == breakpoints[-1]:
+            return DiracDeltaDistribution(self.variable, float(breakpoints[0]))
+        return PiecewiseUniformDistribution(self.variable, breakpoints, probabilities)
+
+    @staticmethod
+    def fit_many(distributions: List[NygaDistribution], matrix: np.ndarray, weights: Optional[np.ndarray] = None,
+                 n_jobs: int = 1, mount: bool = False) \
+            -> Union[List[Union[PiecewiseUniformDistribution, DiracDeltaDistribution]], List[NygaDistribution]]:
+        """
+        Fit many distributions to the columns of a matrix at once.
+
+        The quantiles of all columns are computed as arrays, in a pool of processes if requested.
+        By default, the result is the array-based representation of every distribution
+        (see :meth:`compact_distribution`), such that no unit is created at all.
+
+        :param distributions: The (empty) distributions to fit, one for every column.
+        :param matrix: The data with one column for every distribution.
+        :param weights: The optional weights of the rows of the matrix.
+        :param n_jobs: The number of processes to compute the quantiles with. -1 uses all CPUs.
+        :param mount: Whether to create the units of the given distributions instead.
+
+        :return: The piecewise uniform (or dirac delta) distributions or, if mounted, the fitted distributions.
+        """
+        matrix = np.asarray(matrix)
+        assert matrix.ndim == 2 and matrix.shape[1] == len(distributions), \
+            "The matrix needs exactly one column for every distribution."
+
+        n_jobs = os.cpu_count() if n_jobs == -1 else n_jobs
+        arguments = [(matrix[:, index], weights, distribution.min_samples_per_quantile,
+                      distribution.min_likelihood_improvement) for index, distribution in enumerate(distributions)]
+
+        if n_jobs > 1 and len(distributions) > 1:
+            with ProcessPoolExecutor(min(n_jobs, len(distributions)),
+                                     mp_context=multiprocessing.get_context("spawn")) as executor:
+                quantiles = list(executor.map(_quantiles_in_worker, arguments))
+        else:
+            quantiles = [_quantiles_in_worker(argument) for argument in arguments]
+
+        if not mount:
+            return [distribution.compact_distribution(breakpoints, probabilities)
+                    for distribution, (breakpoints, probabilities) in zip(distributions, quantiles)]
+
+        for distribution, (breakpoints, probabilities) in zip(distributions, quantiles):
+            distribution.mount_quantiles(breakpoints, probabilities)
+        return distributions
+
     @classmethod
     def parameters_from_json(cls, data: Dict[str, Any]) -> Self:
         variable = Variable.from_json(data["variable"])
@@ -408,13 +540,54 @@ class NygaDistribution(ProbabilisticCircuit):
     def empty_copy(self) -> Self:
         return self.__class__(self.variable, self.min_samples_per_quantile, self.min_likelihood_improvement)
 
+    def to_piecewise_uniform(self) -> PiecewiseUniformDistribution:
+        """
+        Convert this distribution to its array-based representation.
+
+        :return: The piecewise uniform distribution describing the same function.
+        """
+        if isinstance(self.root, SumUnit):
+            log_weights = self.root.log_weights
+            leaves = self.root.subcircuits
+        else:
+            log_weights = np.zeros(1)
+            leaves = [self.root]
+
+        if not all(isinstance(leaf.distribution, UniformDistribution) for leaf in leaves):
+            raise ValueError("Only mixtures of uniform distributions can be converted to piecewise uniform "
+                             "distributions.")
+
+        lowers = np.array([leaf.distribution.lower for leaf in leaves])
+        uppers = np.array([leaf.distribution.upper for leaf in leaves])
+
+        # gaps between the quantiles become bins without mass
+        breakpoints = np.union1d(lowers, uppers)
+        probabilities = np.bincount(np.searchsorted(breakpoints, lowers), np.exp(log_weights),
+                                    minlength=len(breakpoints) - 1)
+        return PiecewiseUniformDistribution(self.variable, breakpoints, probabilities / probabilities.sum())
+
+    @classmethod
+    def from_piecewise_uniform(cls, distribution: PiecewiseUniformDistribution,
+                               min_samples_per_quantile: Optional[int] = 1,
+                               min_likelihood_improvement: Optional[float] = 0.1) -> Self:
+        """
+        Construct a Nyga Distribution from its array-based representation.
+
+        :param distribution: The piecewise uniform distribution.
+        :param min_samples_per_quantile: The minimal number of samples per quantile of the result.
+        :param min_likelihood_improvement: The minimal likelihood improvement of the result.
+        :return: The Nyga Distribution describing the same function.
+        """
+        result = cls(distribution.variable, min_samples_per_quantile, min_likelihood_improvement)
+        return result.mount_quantiles(distribution.breakpoints, distribution.probabilities)
+
     @classmethod
     def from_uniform_mixture(cls, mixture: ProbabilisticCircuit) -> Self:
         """
         Construct a Nyga Distribution from a mixture of uniform distributions.
         The mixture does not have to be deterministic.
 
-        :param mixture: An arbitrary, univariate mixture of uniform distributions
+        :param mixture: An arbitrary, univariate mixture of uniform or piecewise uniform distributions
         :return: A Nyga Distribution describing the same function.
         """
 
@@ -427,7 +600,10 @@ class NygaDistribution(ProbabilisticCircuit):
         all_mixture_points = []
         for leaf in mixture.leaves:
             leaf: UnivariateContinuousLeaf
-            all_mixture_points += [leaf.distribution.interval.lower, leaf.distribution.interval.upper]
+            if isinstance(leaf.distribution, PiecewiseUniformDistribution):
+                all_mixture_points += leaf.distribution.breakpoints.tolist()
+            else:
+                all_mixture_points += [leaf.distribution.interval.lower, leaf.distribution.interval.upper]
 
         all_mixture_points = list(sorted(set(all_mixture_points)))
 
@@ -443,61 +619,50 @@ class NygaDistribution(ProbabilisticCircuit):
 
         return result
 
-    def all_union_of_mixture_points_with(self, other: Self):
+    def all_union_of_mixture_points_with(self, other: Self) -> np.ndarray:
         """
-        Computes all possible union intervals of mixture points when combining two intervals.
+        Compute the union of the mixture points of this and another distribution.
 
-        Returns: list of closed intervals representing all mixture points between distributions
+        :param other: The other distribution.
+        :return: The sorted, unique boundaries of the quantiles of both distributions.
         """
-        all_mixture_points = set()
-        for leaf in self.leaves:
-            leaf: UniformDistribution
-            all_mixture_points.add(leaf.interval.lower)
-            all_mixture_points.add(leaf.interval.upper)
+        return np.union1d(self.to_piecewise_uniform().breakpoints, other.to_piecewise_uniform().breakpoints)
 
-        for leaf in other.leaves:
-            leaf: UniformDistribution
-            all_mixture_points.add(leaf.interval.lower)
-            all_mixture_points.add(leaf.interval.upper)
-
-        all_mixture_points = list(all_mixture_points)
-        all_mixture_points.sort()
-        portion_list = []
-        for i in range(1, len(all_mixture_points) - 1):
-            portion_list += random_events.product_algebra.SimpleInterval(all_mixture_points[i - 1],
-                                                                         all_mixture_points[i])
-        return all_mixture_points
-
-    def event_of_higher_density(self, other: Self, own_node_weights,
-                                other_node_weights) -> random_events.product_algebra.Event:
-
-        sum_own_weights = 0.
-        sum_other_weights = 0.
+    def event_of_higher_density(self, other: Self, own_node_weights: Optional[Dict[int, List[float]]] = None,
+                                other_node_weights: Optional[Dict[int, List[float]]] = None) -> Event:
+        """
+        Construct the event where the density of this distribution is higher than the density of another one.
 
-        all_mixture_points = set()
-        for leaf in self.leaves:
-            leaf: UniformDistribution
-            all_mixture_points.add(leaf.interval.lower)
-            all_mixture_points.add(leaf.interval.upper)
-            sum_own_weights += sum(own_node_weights.get(hash(leaf), [0]))
+        If the distributions are part of larger circuits, their densities are scaled with the weights of the paths to
+        their leaves.
 
-        for leaf in other.leaves:
-            leaf: UniformDistribution
-            all_mixture_points.add(leaf.interval.lower)
-            all_mixture_points.add(leaf.interval.upper)
-            sum_other_weights += sum[other_node_weights.get(hash(leaf), [0])]
+        :param other: The other distribution.
+        :param own_node_weights: The optional weights of the paths to the nodes of this distribution, as computed by
+            :meth:`ProbabilisticCircuit.nodes_weights`.
+        :param other_node_weights: The optional weights of the paths to the nodes of the other distribution.
+        :return: The event.
+        """
+        own_scale = 1. if own_node_weights is None else \
+            sum(sum(own_node_weights.get(hash(leaf), [0])) for leaf in self.leaves)
+        other_scale = 1. if other_node_weights is None else \
+            sum(sum(other_node_weights.get(hash(leaf), [0])) for leaf in other.leaves)
+        return self.to_piecewise_uniform().event_of_higher_density(other.to_piecewise_uniform(), own_scale,
+                                                                   other_scale)
 
-        all_mixture_points = list(all_mixture_points)
-        all_mixture_points.sort()
+    def l1_distance(self, other: Self) -> float:
+        """
+        Calculate the exact L1 distance between the density functions of this and another distribution.
 
-        resulting_event = random_events.product_algebra.SimpleInterval()
+        :param other: The other distribution.
+        :return: The L1 distance.
+        """
+        return self.to_piecewise_uniform().l1_distance(other.to_piecewise_uniform())
 
-        previous_point = -float("inf")
-        for point in all_mixture_points:
-            own_density = self.pdf(point) * sum_own_weights
-            other_density = other.pdf(point) * sum_other_weights
-            if own_density > other_density:
-                current_event = random_events.product_algebra.SimpleInterval(previous_point, point)
-                resulting_event = resulting_event.union(current_event)
+    def kl_divergence(self, other: Self) -> float:
+        """
+        Calculate the exact Kullback-Leibler divergence of another distribution from this distribution.
 
-        return random_events.product_algebra.Event({self.variable: resulting_event})
+        :param other: The other distribution.
+        :return: The divergence.
+        """
+        return self.to_piecewise_uniform().kl_divergence(other.to_piecewise_uniform())
@@ -5,11 +5,13 @@ import numpy as np
 from jax.experimental.sparse import BCOO
 from random_events.variable import Continuous, Symbolic
 from sortedcontainers import SortedSet
-from typing_extensions import List, Self, Type, Iterable, Union
+from typing_extensions import List, Self, Type, Iterable, Union, Dict
 
 from ...distributions import GaussianDistribution
 from ...probabilistic_circuit.jax import SparseSumLayer, ProductLayer, DenseSumLayer
 from ...probabilistic_circuit.jax.discrete_layer import DiscreteLayer
+from ...probabilistic_circuit.jax.einsum_layer import (EinsumLayer, EinsumGaussianInputLayer, EinsumDiscreteInputLayer,
+                                                      EinsumProductLayer, EinsumSumLayer)
 from ...probabilistic_circuit.jax.gaussian_layer import GaussianLayer
 from ...probabilistic_circuit.nx.probabilistic_circuit import ProbabilisticCircuit, SumUnit, ProductUnit, UnivariateContinuousLeaf
 from ...probabilistic_circuit.jax.probabilistic_circuit import ProbabilisticCircuit as JPC, ClassificationCircuit
@@ -161,16 +163,24 @@ class RegionGraph(nx.DiGraph):
 
 
     def as_probabilistic_circuit(self, input_units: int = 5, sum_units: int = 5,
-                                 key=jax.random.PRNGKey(69)) -> Union[JPC, ClassificationCircuit]:
+                                 key=jax.random.PRNGKey(69), tensorized: bool = False) -> Union[JPC, ClassificationCircuit]:
         """
         Convert the region graph to a jax probabilistic circuit.
         :param input_units: The number of input units to use in each input layer.
         :param sum_units: The number of sum units to use in each sum layer.
         :param key: The random key to use for all trainable parameters.
+        :param tensorized: Whether to create a single :class:`EinsumLayer` that evaluates all regions of equal height
+            at once instead of one layer per region and partition.
         :return: The layered circuit in jax.
         """
         root = self.root
 
+        if tensorized:
+            layer = self.as_einsum_layer(input_units, sum_units, key)
+            if self.classes > 1:
+                return ClassificationCircuit(self.variables, layer)
+            return JPC(self.variables, layer)
+
         # create nodes for each region
         for layer in reversed(list(nx.bfs_layers(self, root))):
             for node in layer:
@@ -202,8 +212,10 @@ class RegionGraph(nx.DiGraph):
                         if len(parents) == 0:
                             sum_units = self.classes
 
-                        log_weights = [jnp.log(jax.random.uniform(key, shape=(sum_units, child.layer.number_of_nodes),
-                                                          minval=0.1, maxval=1.)) for child in children]
+                        # the weights of all children are fused into one matrix
+                        number_of_child_nodes = sum(child.layer.number_of_nodes for child in children)
+                        log_weights = jnp.log(jax.random.uniform(key, shape=(sum_units, number_of_child_nodes),
+                                                                 minval=0.1, maxval=1.))
                         node.layer = DenseSumLayer([child.layer for child in children], log_weights=log_weights)
                         node.layer.validate()
 
@@ -224,3 +236,104 @@ class RegionGraph(nx.DiGraph):
             model = JPC(self.variables, root.layer)
 
         return model
+
+    def heights(self) -> Dict[Union[Region, Partition], int]:
+        """
+        :return: The length of the longest path from every node to a leaf.
+        """
+        result = dict()
+        for node in reversed(list(nx.topological_sort(self))):
+            children = list(self.successors(node))
+            result[node] = 1 + max(result[child] for child in children) if children else 0
+        return result
+
+    def as_einsum_layer(self, input_units: int = 5, sum_units: int = 5, key=jax.random.PRNGKey(69)) -> EinsumLayer:
+        """
+        Convert the region graph to a tensorized layer.
+        All regions and partitions with the same height and the same shape are evaluated by one batched operation.
+
+        :param input_units: The number of input units to use in each leaf region.
+        :param sum_units: The number of sum units to use in each inner region.
+        :param key: The random key to use for all trainable parameters.
+        :return: The tensorized layer.
+        """
+        root = self.root
+        heights = self.heights()
+        units: Dict[Union[Region, Partition], int] = dict()
+
+        # the index of every region/partition in the buffer of regions/partitions with the same number of units
+        buffer_index: Dict[Union[Region, Partition], int] = dict()
+        region_buffer_sizes: Dict[int, int] = dict()
+        partition_buffer_sizes: Dict[int, int] = dict()
+
+        def append_to_buffer(nodes, buffer_sizes, number_of_units):
+            start = buffer_sizes.get(number_of_units, 0)
+            for offset, node in enumerate(nodes):
+                buffer_index[node] = start + offset
+                units[node] = number_of_units
+            buffer_sizes[number_of_units] = start + len(nodes)
+
+        # create the stacked input layers
+        leaves = [node for node in self.regions() if heights[node] == 0]
+        continuous_leaves = [leaf for leaf in leaves if isinstance(leaf.variables[0], Continuous)]
+        symbolic_leaves = [leaf for leaf in leaves if isinstance(leaf.variables[0], Symbolic)]
+        if len(continuous_leaves) + len(symbolic_leaves) != len(leaves):
+            raise ValueError(f"Only continuous and symbolic variables are supported.")
+
+        input_layers = []
+        number_of_states = tuple()
+        if continuous_leaves:
+            key, location_key, scale_key = jax.random.split(key, 3)
+            shape = (len(continuous_leaves), input_units)
+            input_layers.append(EinsumGaussianInputLayer(
+                jnp.array([self.variables.index(leaf.variables[0]) for leaf in continuous_leaves]),
+                location=jax.random.uniform(location_key, shape=shape, minval=-1., maxval=1.),
+                log_scale=jnp.log(jax.random.uniform(scale_key, shape=shape, minval=0.5, maxval=3.)), min_scale=0.1))
+            append_to_buffer(continuous_leaves, region_buffer_sizes, input_units)
+
+        if symbolic_leaves:
+            key, probabilities_key = jax.random.split(key)
+            number_of_states = tuple(len(leaf.variables[0].domain.simple_sets) for leaf in symbolic_leaves)
+            log_probabilities = jnp.log(jax.random.uniform(probabilities_key, minval=0.1, maxval=1.,
+                                                           shape=(len(symbolic_leaves), input_units,
+                                                                  max(number_of_states))))
+            padding = np.arange(max(number_of_states)) >= np.array(number_of_states)[:, None]
+            log_probabilities = jnp.where(padding[:, None, :], -jnp.inf, log_probabilities)
+            input_layers.append(EinsumDiscreteInputLayer(
+                jnp.array([self.variables.index(leaf.variables[0]) for leaf in symbolic_leaves]), log_probabilities))
+            append_to_buffer(symbolic_leaves, region_buffer_sizes, input_units)
+
+        # create one product or sum layer for every group of nodes with the same height and shape
+        layers = []
+        for height in range(1, max(heights.values()) + 1):
+            groups = dict()
+            for node in self.nodes:
+                if heights[node] != height:
+                    continue
+                children = list(self.successors(node))
+                child_units = set(units[child] for child in children)
+                assert len(child_units) == 1, "Node lengths must be all equal. Got {}".format(child_units)
+                child_units = child_units.pop()
+                if isinstance(node, Partition):
+                    group = (Partition, len(children), child_units)
+                else:
+                    group = (Region, len(children), child_units, self.classes if node is root else sum_units)
+                groups.setdefault(group, []).append(node)
+
+            for group, nodes in groups.items():
+                child_indices = jnp.array([[buffer_index[child] for child in self.successors(node)] for node in nodes])
+                if group[0] is Partition:
+                    layers.append(EinsumProductLayer(child_indices, group[2]))
+                    append_to_buffer(nodes, partition_buffer_sizes, group[2])
+                else:
+                    _, number_of_children, child_units, number_of_units = group
+                    key, weights_key = jax.random.split(key)
+                    log_weights = jnp.log(jax.random.uniform(weights_key, minval=0.1, maxval=1.,
+                                                             shape=(len(nodes), number_of_units,
+                                                                    number_of_children * child_units)))
+                    layers.append(EinsumSumLayer(child_indices, log_weights))
+                    append_to_buffer(nodes, region_buffer_sizes, number_of_units)
+
+        result = EinsumLayer(input_layers, layers, buffer_index[root], number_of_states)
+        result.validate()
+        return result
@@ -2,3 +2,6 @@ from .utils import *
 from .inner_layer import *
 from .input_layer import *
 from .uniform_layer import *
+from .piecewise_uniform_layer import *
+from .gaussian_layer import *
+from .discrete_layer import *
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import contextlib
+import contextvars
+import json
+import os
+import shutil
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from random_events.utils import SubclassJSONSerializer
+from typing_extensions import Dict, Any, Optional, Union, List, Iterator
+
+CHECKPOINT_FORMAT = "probabilistic_model.checkpoint"
+"""
+The name of the checkpoint format in the manifest.
+"""
+
+CHECKPOINT_VERSION = 1
+"""
+The version of the checkpoint format that is written.
+"""
+
+MANIFEST_FILE = "manifest.json"
+"""
+The name of the manifest file in a checkpoint directory.
+"""
+
+ARRAY_DIRECTORY = "arrays"
+"""
+The name of the directory in a checkpoint directory that contains the array blobs.
+"""
+
+
+class ArrayStore:
+    """
+    A directory of array blobs that arrays are written to or read from while (de)serializing.
+
+    Every array is stored as its own `.npy` file, such that it can be memory mapped on load.
+    Dtypes that numpy cannot store natively (e.g. bfloat16) are stored as unsigned integers of the same width.
+    """
+
+    directory: str
+    """
+    The directory that contains the blobs.
+    """
+
+    mmap: bool
+    """
+    Whether to memory map the blobs on load instead of reading them into memory.
+    """
+
+    number_of_arrays: int
+    """
+    The number of arrays written so far.
+    """
+
+    def __init__(self, directory: str, mmap: bool = True):
+        self.directory = directory
+        self.mmap = mmap
+        self.number_of_arrays = 0
+
+    def put(self, array: Union[jax.Array, np.ndarray]) -> Dict[str, Any]:
+        """
+        Write an array to a new blob.
+
+        :param array: The array.
+        :return: The reference to the blob that is stored in the manifest instead of the array.
+        """
+        array = np.asarray(array)
+        name = f"{self.number_of_arrays}.npy"
+        self.number_of_arrays += 1
+        stored = array.view(f"u{array.dtype.itemsize}") if array.dtype.kind == "V" else array
+        np.save(os.path.join(self.directory, name), stored, allow_pickle=False)
+        return {"array": name, "dtype": array.dtype.name, "shape": list(array.shape)}
+
+    def get(self, reference: Dict[str, Any]) -> jax.Array:
+        """
+        Read the array of a blob.
+
+        :param reference: The reference as created by :meth:`put`.
+        :return: The array.
+        """
+        array = np.load(os.path.join(self.directory, reference["array"]), mmap_mode="r" if self.mmap else None,
+                        allow_pickle=False)
+        if array.dtype.name != reference["dtype"]:
+            array = array.view(jnp.dtype(reference["dtype"]))
+        return jnp.asarray(array)
+
+
+_active_store: contextvars.ContextVar[Optional[ArrayStore]] = contextvars.ContextVar("active_store", default=None)
+"""
+The store that arrays are (de)serialized with in the current context. If None, arrays are (de)serialized as JSON
+lists.
+Every thread and task has its own context, such that concurrent saves and loads do not mix their stores.
+"""
+
+
+@contextlib.contextmanager
+def using_array_store(store: ArrayStore) -> Iterator[ArrayStore]:
+    """
+    Context in which :func:`array_to_json` and :func:`array_from_json` use a store for the arrays.
+
+    :param store: The store.
+    """
+    token = _active_store.set(store)
+    try:
+        yield store
+    finally:
+        _active_store.reset(token)
+
+
+def array_to_json(array: Union[jax.Array, np.ndarray]) -> Union[List, Dict[str, Any]]:
+    """
+    Serialize an array inside a `to_json` method.
+
+    :param array: The array.
+    :return: The array as (nested) list or, while writing a checkpoint, a reference to its blob.
+    """
+    store = _active_store.get()
+    if store is None:
+        return np.asarray(array).tolist()
+    return store.put(array)
+
+
+def array_from_json(data: Union[List, Dict[str, Any]], dtype=None) -> jax.Array:
+    """
+    Deserialize an array inside a `_from_json` method.
+
+    :param data: The array as created by :func:`array_to_json`.
+    :param dtype: The dtype of arrays that are stored as lists. Blobs keep their stored dtype.
+    :return: The array.
+    """
+    if isinstance(data, dict) and "array" in data:
+        store = _active_store.get()
+        if store is None:
+            raise ValueError("Arrays that are stored in a checkpoint can only be loaded with load_checkpoint.")
+        return store.get(data)
+    return jnp.array(data, dtype=dtype)
+
+
+def save_checkpoint(obj: SubclassJSONSerializer, directory: str):
+    """
+    Save an object (e.g. a circuit) as checkpoint.
+
+    The checkpoint is a directory containing a JSON manifest with the structure of the object, as created by its
+    `to_json` method, and one `.npy` blob for every array of the object.
+    The manifest keeps the type tags of :class:`SubclassJSONSerializer`.
+
+    :param obj: The object to save.
+    :param directory: The directory to write the checkpoint into. It is created if it does not exist.
+        An existing checkpoint in the directory is replaced, including all of its blobs.
+    """
+    # write the new checkpoint next to the old one, such that a failed save does not destroy the old one
+    array_directory = os.path.join(directory, ARRAY_DIRECTORY)
+    new_array_directory = array_directory + ".new"
+    shutil.rmtree(new_array_directory, ignore_errors=True)
+    os.makedirs(new_array_directory)
+
+    with using_array_store(ArrayStore(new_array_directory)):
+        data = obj.to_json()
+    manifest = {"format": CHECKPOINT_FORMAT, "version": CHECKPOINT_VERSION, "object": data}
+    with open(os.path.join(directory, MANIFEST_FILE + ".new"), "w") as file:
+        json.dump(manifest, file)
+
+    shutil.rmtree(array_directory, ignore_errors=True)
+    os.replace(new_array_directory, array_directory)
+    os.replace(os.path.join(directory, MANIFEST_FILE + ".new"), os.path.join(directory, MANIFEST_FILE))
+
+
+class Checkpoint:
+    """
+    A checkpoint on disk.
+
+    Only the manifest is read when the checkpoint is opened.
+    Blobs are read (or memory mapped) when the parts of the object that contain them are loaded.
+    """
+
+    directory: str
+    """
+    The directory of the checkpoint.
+    """
+
+    manifest: Dict[str, Any]
+    """
+    The manifest of the checkpoint.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        with open(os.path.join(directory, MANIFEST_FILE)) as file:
+            self.manifest = json.load(file)
+        if self.manifest.get("format") != CHECKPOINT_FORMAT:
+            raise ValueError(f"{directory} does not contain a checkpoint.")
+        if self.manifest["version"] > CHECKPOINT_VERSION:
+            raise ValueError(f"The checkpoint has version {self.manifest['version']}, "
+                             f"but only versions up to {CHECKPOINT_VERSION} are supported.")
+
+    @property
+    def version(self) -> int:
+        return self.manifest["version"]
+
+    def structure(self, *path: Union[str, int]) -> Any:
+        """
+        :param path: The keys and indices that lead from the object to a part of it, e.g. `("root", "child_layers", 0)`.
+        :return: The manifest of the part.
+        """
+        result = self.manifest["object"]
+        for key in path:
+            result = result[key]
+        return result
+
+    def load(self, *path: Union[str, int], mmap: bool = True) -> Any:
+        """
+        Load the object or a part of it.
+
+        :param path: The keys and indices that lead from the object to the part to load, e.g.
+            `("root", "child_layers", 0)` loads the first child layer of the root of a circuit.
+            The part must be a serialized object.
+        :param mmap: Whether to memory map the blobs instead of reading them into memory.
+        :return: The loaded object.
+        """
+        with using_array_store(ArrayStore(os.path.join(self.directory, ARRAY_DIRECTORY), mmap)):
+            return SubclassJSONSerializer.from_json(self.structure(*path))
+
+
+def load_checkpoint(directory: str, mmap: bool = True) -> Any:
+    """
+    Load an object from a checkpoint.
+
+    :param directory: The directory of the checkpoint.
+    :param mmap: Whether to memory map the blobs instead of reading them into memory.
+    :return: The loaded object.
+    """
+    return Checkpoint(directory).load(mmap=mmap)
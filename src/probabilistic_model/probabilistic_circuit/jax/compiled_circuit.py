@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import numpy as np
+import tqdm
+from random_events.variable import Variable
+from sortedcontainers import SortedSet
+from typing_extensions import List, Dict, Tuple, Type, Self, Any
+
+from .inner_layer import Layer, InputLayer, InnerLayer, inverse_class_of
+from ..nx.probabilistic_circuit import Unit, SumUnit, ProbabilisticCircuit as NXProbabilisticCircuit
+
+
+def ranges_of_csr_rows(indptr: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Gather the positions of all entries of the given rows of a CSR structure.
+
+    Example::
+
+        >>> ranges_of_csr_rows(np.array([0, 2, 2, 5]), np.array([0, 2]))
+        array([0, 1, 2, 3, 4])
+
+    :param indptr: The index pointer of the CSR structure.
+    :param rows: The rows to gather.
+    :return: The concatenated positions of the entries of the rows.
+    """
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(counts.sum())
+
+
+@dataclass
+class CompiledCircuit:
+    """
+    Array representation of a networkx probabilistic circuit.
+
+    The nodes are enumerated and the edges are stored as flat arrays of node indices.
+    This representation is used to convert between the networkx and the jax circuits without touching the
+    networkx graph more than once.
+    """
+
+    nodes: List[Unit]
+    """
+    The units of the circuit. The position of a unit in this list is its index.
+    """
+
+    sources: np.ndarray
+    """
+    The indices of the source nodes of every edge.
+    """
+
+    targets: np.ndarray
+    """
+    The indices of the target nodes of every edge.
+    """
+
+    log_weights: np.ndarray
+    """
+    The log weight of every edge. Edges of product units have a log weight of nan.
+    """
+
+    @classmethod
+    def from_nx(cls, pc: NXProbabilisticCircuit) -> Self:
+        """
+        Compile a networkx circuit to its array representation.
+
+        :param pc: The circuit to compile.
+        :return: The compiled circuit.
+        """
+        nodes = list(pc.nodes)
+        node_to_index = {node: index for index, node in enumerate(nodes)}
+        edges = list(pc.edges(data="log_weight", default=np.nan))
+        sources = np.fromiter((node_to_index[source] for source, _, _ in edges), dtype=np.int64, count=len(edges))
+        targets = np.fromiter((node_to_index[target] for _, target, _ in edges), dtype=np.int64, count=len(edges))
+        log_weights = np.fromiter((log_weight for _, _, log_weight in edges), dtype=np.float64, count=len(edges))
+        return cls(nodes, sources, targets, log_weights)
+
+    @property
+    def number_of_nodes(self) -> int:
+        return len(self.nodes)
+
+    def children_csr(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        :return: The index pointer and the edge order that groups the edges by their source in CSR fashion.
+        """
+        order = np.argsort(self.sources, kind="stable")
+        indptr = np.zeros(self.number_of_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.sources, minlength=self.number_of_nodes), out=indptr[1:])
+        return indptr, order
+
+    def depths(self) -> np.ndarray:
+        """
+        Calculate the depth of every node as the length of the longest path from a root to the node.
+        Every child is hence strictly deeper than all of its parents.
+
+        :return: The depth of every node.
+        """
+        indptr, order = self.children_csr()
+        remaining_parents = np.bincount(self.targets, minlength=self.number_of_nodes)
+        result = np.zeros(self.number_of_nodes, dtype=np.int64)
+
+        frontier = np.flatnonzero(remaining_parents == 0)
+        depth = 0
+        while len(frontier) > 0:
+            result[frontier] = depth
+            children = self.targets[order[ranges_of_csr_rows(indptr, frontier)]]
+            remaining_parents -= np.bincount(children, minlength=self.number_of_nodes)
+            frontier = np.unique(children[remaining_parents[children] == 0])
+            depth += 1
+
+        return result
+
+    def scopes(self, variables: SortedSet[Variable], depths: np.ndarray) -> np.ndarray:
+        """
+        Calculate the scope of every node as integer bitset.
+        The n-th bit of a scope is set if the n-th variable of `variables` is in the scope.
+
+        :param variables: The variables of the circuit.
+        :param depths: The depth of every node as calculated by :meth:`depths`.
+        :return: An object array containing the scope of every node.
+        """
+        variable_to_index = {variable: index for index, variable in enumerate(variables)}
+        result = np.zeros(self.number_of_nodes, dtype=object)
+        for index, node in enumerate(self.nodes):
+            if node.is_leaf:
+                for variable in node.distribution.variables:
+                    result[index] |= 1 << variable_to_index[variable]
+
+        # propagate the scopes from the deepest edges upwards
+        source_depths = depths[self.sources]
+        order = np.argsort(-source_depths, kind="stable")
+        boundaries = np.flatnonzero(np.diff(source_depths[order])) + 1
+        for edges in np.split(order, boundaries):
+            if len(edges) > 0:
+                np.bitwise_or.at(result, self.sources[edges], result[self.targets[edges]])
+
+        return result
+
+    def deduplicate(self) -> Self:
+        """
+        Merge structurally identical nodes (hash-consing).
+
+        Leaves are identical if their distributions are equal.
+        Inner units are identical if they have the same type and the same children (after merging) with the same
+        log weights.
+        The edges are redirected to the remaining node and edges of a sum unit that point to the same node after
+        merging are fused by adding their weights.
+
+        :return: The compiled circuit without duplicate nodes.
+        """
+        depths = self.depths()
+        indptr, order = self.children_csr()
+        representatives = np.arange(self.number_of_nodes)
+        canonical_nodes: Dict[Any, int] = dict()
+
+        # visit the deepest nodes first, such that the children of a node are merged before the node itself
+        for index in np.argsort(-depths, kind="stable"):
+            node = self.nodes[index]
+            if node.is_leaf:
+                key = (type(node.distribution), node.distribution)
+                try:
+                    hash(key)
+                except TypeError:
+                    # distributions without structural hash are never merged
+                    key = index
+            else:
+                edges = order[indptr[index]:indptr[index + 1]]
+                children = representatives[self.targets[edges]]
+                if isinstance(node, SumUnit):
+                    children, inverse = np.unique(children, return_inverse=True)
+                    log_weights = np.full(len(children), -np.inf)
+                    np.logaddexp.at(log_weights, inverse.reshape(-1), self.log_weights[edges])
+                    key = (type(node), tuple(children.tolist()), tuple(log_weights.tolist()))
+                else:
+                    key = (type(node), tuple(np.sort(children).tolist()))
+            representatives[index] = canonical_nodes.setdefault(key, index)
+
+        # keep the representatives and the edges that leave them
+        kept = np.flatnonzero(representatives == np.arange(self.number_of_nodes))
+        new_index = np.full(self.number_of_nodes, -1, dtype=np.int64)
+        new_index[kept] = np.arange(len(kept))
+        edges = np.flatnonzero(representatives[self.sources] == self.sources)
+        sources = new_index[self.sources[edges]]
+        targets = new_index[representatives[self.targets[edges]]]
+        log_weights = self.log_weights[edges]
+
+        # fuse the weighted edges that now connect the same nodes
+        weighted = ~np.isnan(log_weights)
+        pairs, inverse = np.unique(np.stack((sources[weighted], targets[weighted]), axis=1), axis=0,
+                                   return_inverse=True)
+        fused_log_weights = np.full(len(pairs), -np.inf)
+        np.logaddexp.at(fused_log_weights, inverse.reshape(-1), log_weights[weighted])
+
+        return self.__class__([self.nodes[index] for index in kept],
+                              np.concatenate((sources[~weighted], pairs[:, 0])),
+                              np.concatenate((targets[~weighted], pairs[:, 1])),
+                              np.concatenate((log_weights[~weighted], fused_log_weights)))
+
+    def layer_types(self) -> Tuple[np.ndarray, List[Type[Layer]]]:
+        """
+        :return: An array containing an integer code for the layer type of every node and the list of layer types
+            that the codes refer to.
+        """
+        node_type_to_layer_type: Dict[Type, Type[Layer]] = dict()
+        layer_type_codes: Dict[Type[Layer], int] = dict()
+        result = np.zeros(self.number_of_nodes, dtype=np.int64)
+        for index, node in enumerate(self.nodes):
+            node_type = type(node.distribution) if node.is_leaf else type(node)
+            layer_type = node_type_to_layer_type.get(node_type)
+            if layer_type is None:
+                layer_type = inverse_class_of(node_type)
+                node_type_to_layer_type[node_type] = layer_type
+            result[index] = layer_type_codes.setdefault(layer_type, len(layer_type_codes))
+        return result, list(layer_type_codes)
+
+    def to_root_layer(self, variables: SortedSet[Variable], progress_bar: bool = False) -> Layer:
+        """
+        Convert the compiled circuit to a layered circuit.
+
+        Nodes are grouped into layers by their depth, layer type and scope.
+        Layers are created from the deepest to the shallowest depth, such that every child layer exists before its
+        parents are created.
+
+        :param variables: The variables of the circuit.
+        :param progress_bar: Whether to show a progress bar.
+        :return: The root layer of the layered circuit.
+        """
+        depths = self.depths()
+        scopes = self.scopes(variables, depths)
+        type_codes, layer_types = self.layer_types()
+        _, scope_codes = np.unique(scopes, return_inverse=True)
+
+        # group the nodes by (depth, type, scope), the deepest group first
+        keys = np.stack((-depths, type_codes, scope_codes.reshape(-1)), axis=1)
+        unique_keys, layer_of_node = np.unique(keys, axis=0, return_inverse=True)
+        layer_of_node = layer_of_node.reshape(-1)
+        number_of_layers = len(unique_keys)
+
+        # calculate the position of every node inside its layer
+        node_order = np.argsort(layer_of_node, kind="stable")
+        layer_sizes = np.bincount(layer_of_node, minlength=number_of_layers)
+        layer_starts = np.cumsum(layer_sizes) - layer_sizes
+        position_of_node = np.empty(self.number_of_nodes, dtype=np.int64)
+        position_of_node[node_order] = np.arange(self.number_of_nodes) - np.repeat(layer_starts, layer_sizes)
+
+        # group the edges by the layer of their source
+        edge_layers = layer_of_node[self.sources]
+        edge_order = np.argsort(edge_layers, kind="stable")
+        edge_indptr = np.zeros(number_of_layers + 1, dtype=np.int64)
+        np.cumsum(np.bincount(edge_layers, minlength=number_of_layers), out=edge_indptr[1:])
+
+        layers: List[Layer] = []
+        for layer_index in (tqdm.trange(number_of_layers, desc="Creating Layers") if progress_bar
+                            else range(number_of_layers)):
+            layer_type = layer_types[unique_keys[layer_index, 1]]
+            node_indices = node_order[layer_starts[layer_index]:layer_starts[layer_index] + layer_sizes[layer_index]]
+
+            if issubclass(layer_type, InputLayer):
+                nodes = [self.nodes[node_index] for node_index in node_indices]
+                layer = layer_type.create_layer_from_nodes_with_same_type_and_scope(nodes, [], progress_bar).layer
+
+            else:
+                edges = edge_order[edge_indptr[layer_index]:edge_indptr[layer_index + 1]]
+                targets = self.targets[edges]
+                child_layer_indices, local_child_layer_indices = np.unique(layer_of_node[targets],
+                                                                           return_inverse=True)
+                layer_type: Type[InnerLayer]
+                layer = layer_type.create_layer_from_edges(
+                    child_layers=[layers[child_layer_index] for child_layer_index in child_layer_indices],
+                    number_of_nodes=len(node_indices),
+                    parent_positions=position_of_node[self.sources[edges]],
+                    child_layer_indices=local_child_layer_indices.reshape(-1),
+                    child_positions=position_of_node[targets],
+                    log_weights=self.log_weights[edges])
+
+            layers.append(layer)
+
+        root_index = np.flatnonzero(depths == 0)
+        assert len(root_index) == 1, f"The circuit must have exactly one root, got {len(root_index)}."
+        return layers[layer_of_node[root_index[0]]]
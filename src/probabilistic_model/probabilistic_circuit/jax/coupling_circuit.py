@@ -5,7 +5,7 @@ import jax
 from jax.tree_util import tree_flatten, tree_unflatten
 
 import equinox as eqx
-from typing_extensions import Tuple, List
+from typing_extensions import Tuple, List, Callable, Optional
 import jax.numpy as jnp
 from .probabilistic_circuit import Layer
 
@@ -25,6 +25,15 @@ class Conditioner:
         """
         raise NotImplementedError
 
+    def generate_parameters_batched(self, x: jax.Array) -> jax.Array:
+        """
+        Generate parameters for a circuit for every row of a batch.
+
+        :param x: The inputs to the conditioner of shape (#samples, #inputs).
+        :return: The parameters of shape (#samples, #parameters).
+        """
+        return jax.vmap(self.generate_parameters)(x)
+
     @property
     @abstractmethod
     def output_length(self):
@@ -89,17 +98,29 @@ class CouplingCircuit(eqx.Module):
         slices = [None] * len(flat_model)
         offset = 0
         for index, leaf in enumerate(flat_model):
-            leaf_length = len(leaf)
+            leaf_length = leaf.size
             slices[index] = (offset, offset + leaf_length)
             offset += leaf_length
 
         return slices
 
+    @cached_property
+    def shapes_of_parameters_for_flat_model(self) -> List[Tuple[int, ...]]:
+        """
+        :return: The shapes of the parameter leaves of the circuit.
+        """
+        flat_model, _ = jax.tree_util.tree_flatten(self.circuit.partition()[0])
+        return [leaf.shape for leaf in flat_model]
+
 
     def create_circuit_from_parameters(self, params: jax.Array) -> Layer:
         """
         Generate a circuit with the structure from self.circuit and the parameters from params.
-        :param params: The parameters to be used in the circuit.
+
+        If `params` has a leading batch axis, every parameter of the resulting circuit has the same leading batch
+        axis. Such a circuit is evaluated with :meth:`batched_log_likelihood`.
+
+        :param params: The parameters to be used in the circuit of shape ([#samples,] #parameters).
         :return: The circuit
         """
 
@@ -110,7 +131,8 @@ class CouplingCircuit(eqx.Module):
         flat_model, flat_tree_def = jax.tree_util.tree_flatten(tree_def)
 
         # slice the parameters such that they match the pytree
-        slices_parameters = [params[start:end] for start, end in self.slices_of_parameters_for_flat_model]
+        slices_parameters = [params[..., start:end].reshape(params.shape[:-1] + shape) for (start, end), shape
+                             in zip(self.slices_of_parameters_for_flat_model, self.shapes_of_parameters_for_flat_model)]
 
         # update the parameters
         params = tree_unflatten(flat_tree_def, slices_parameters)
@@ -130,8 +152,106 @@ class CouplingCircuit(eqx.Module):
         circuit = self.create_circuit_from_parameters(params)
         return circuit.log_likelihood_of_nodes_single(x[self.circuit_columns])
 
+    @staticmethod
+    def batched_log_likelihood(circuit: Layer, x: jax.Array) -> jax.Array:
+        """
+        Evaluate a circuit whose parameters have a leading batch axis, where the n-th sample is evaluated with the
+        n-th parameters.
+
+        :param circuit: The circuit as created by :meth:`create_circuit_from_parameters` from a parameter matrix.
+        :param x: The data of shape (#samples, #variables of the circuit).
+        :return: The log likelihoods of shape (#samples, #nodes).
+        """
+        params, static = eqx.partition(circuit, eqx.is_inexact_array)
+
+        # map over the flat leaves, since sparse arrays in the pytree have their own batching semantics
+        params, treedef = tree_flatten(params)
+        return jax.vmap(lambda p, row: eqx.combine(tree_unflatten(treedef, p), static)
+                        .log_likelihood_of_nodes_single(row))(params, x)
+
     def conditional_log_likelihood(self, x):
-        return jax.vmap(self.conditional_log_likelihood_single)(x)
+        """
+        Calculate the conditional log likelihood of a batch.
+        The conditioner generates the parameter matrix of the entire batch at once and the circuit is assembled once
+        with batched parameters, such that the evaluation is one fused computation.
+
+        :param x: The data.
+        :return: The conditional log likelihood of every node for every sample.
+        """
+        params = self.conditioner.generate_parameters_batched(x[:, self.conditioner_columns])
+        circuit = self.create_circuit_from_parameters(params)
+        return self.batched_log_likelihood(circuit, x[:, self.circuit_columns])
+
+    @staticmethod
+    def batched_log_probability(circuit: Layer, events: jax.Array) -> jax.Array:
+        """
+        Calculate the log-probabilities of box events with a circuit whose parameters have a leading batch axis,
+        where the n-th event is evaluated with the n-th parameters.
+
+        :param circuit: The circuit as created by :meth:`create_circuit_from_parameters` from a parameter matrix.
+        :param events: The events of shape (#samples, #variables of the circuit, 2).
+        :return: The log-probabilities of shape (#samples, #nodes).
+        """
+        params, static = eqx.partition(circuit, eqx.is_inexact_array)
+        params, treedef = tree_flatten(params)
+        return jax.vmap(lambda p, event: eqx.combine(tree_unflatten(treedef, p), static)
+                        .log_probability_of_nodes_single(event))(params, events)
+
+    @staticmethod
+    def batched_sample(circuit: Layer, keys: jax.Array) -> jax.Array:
+        """
+        Draw one sample from the root of a circuit whose parameters have a leading batch axis for every set of
+        parameters.
+
+        :param circuit: The circuit as created by :meth:`create_circuit_from_parameters` from a parameter matrix.
+        :param keys: The random keys of shape (#samples, ...).
+        :return: The samples of shape (#samples, #variables of the circuit).
+        """
+        params, static = eqx.partition(circuit, eqx.is_inexact_array)
+        params, treedef = tree_flatten(params)
+        return jax.vmap(lambda p, key: eqx.combine(tree_unflatten(treedef, p), static)
+                        .sample_from_node_single(key, 0))(params, keys)
+
+    @eqx.filter_jit
+    def conditional_log_probability(self, x: jax.Array, events: jax.Array) -> jax.Array:
+        """
+        Calculate the conditional log-probability of box events over the circuit variables.
+
+        :param x: The data of shape (#samples, #variables). The inputs of the conditioner are selected from it.
+        :param events: The closed intervals of the events over the circuit columns of shape
+            (#samples, #circuit columns, 2) or (#circuit columns, 2) to use the same event for every sample.
+        :return: The conditional log-probability of every node for every sample.
+        """
+        events = jnp.broadcast_to(events, (x.shape[0],) + events.shape[-2:])
+        params = self.conditioner.generate_parameters_batched(x[:, self.conditioner_columns])
+        circuit = self.create_circuit_from_parameters(params)
+        return self.batched_log_probability(circuit, events)
+
+    def conditional_probability(self, x: jax.Array, events: jax.Array) -> jax.Array:
+        """
+        Calculate the conditional probability of box events over the circuit variables.
+
+        :param x: The data of shape (#samples, #variables). The inputs of the conditioner are selected from it.
+        :param events: The closed intervals of the events over the circuit columns of shape
+            (#samples, #circuit columns, 2) or (#circuit columns, 2) to use the same event for every sample.
+        :return: The conditional probability of the root for every sample.
+        """
+        return jnp.exp(self.conditional_log_probability(x, events)[:, 0])
+
+    @eqx.filter_jit
+    def conditional_sample(self, key: jax.Array, x: jax.Array) -> jax.Array:
+        """
+        Draw one sample of the circuit variables for every input of the conditioner.
+        The conditioner generates the parameters of the entire batch at once and the circuit is sampled in one
+        compiled computation.
+
+        :param key: The random key.
+        :param x: The data of shape (#samples, #variables). The inputs of the conditioner are selected from it.
+        :return: The samples of shape (#samples, #circuit columns).
+        """
+        params = self.conditioner.generate_parameters_batched(x[:, self.conditioner_columns])
+        circuit = self.create_circuit_from_parameters(params)
+        return self.batched_sample(circuit, jax.random.split(key, x.shape[0]))
 
     def validate(self):
         """
@@ -154,6 +274,76 @@ class LinearConditioner(eqx.Module, Conditioner):
     def generate_parameters(self, x: jax.Array) -> jax.Array:
         return self.linear(x)
 
+    def generate_parameters_batched(self, x: jax.Array) -> jax.Array:
+        return x @ self.linear.weight.T + self.linear.bias
+
+    @property
+    def output_length(self):
+        return self.linear.out_features
+
+
+class MLPConditioner(eqx.Module, Conditioner):
+    """
+    A conditioner that generates parameters for a circuit with a multi-layer perceptron.
+    """
+
+    mlp: eqx.nn.MLP
+
+    def __init__(self, in_features: int, out_features: int, width_size: int = 64, depth: int = 2,
+                 activation: Callable[[jax.Array], jax.Array] = jax.nn.relu, key: Optional[jax.Array] = None):
+        """
+        :param in_features: The number of inputs.
+        :param out_features: The number of parameters of the circuit.
+        :param width_size: The width of the hidden layers.
+        :param depth: The number of hidden layers.
+        :param activation: The activation function of the hidden layers.
+        :param key: The random key for the initialization.
+        """
+        key = jax.random.PRNGKey(69) if key is None else key
+        self.mlp = eqx.nn.MLP(in_features, out_features, width_size, depth, activation=activation, key=key)
+
+    def generate_parameters(self, x: jax.Array) -> jax.Array:
+        return self.mlp(x)
+
+    @property
+    def output_length(self):
+        return self.mlp.out_size
+
+
+class ResidualConditioner(eqx.Module, Conditioner):
+    """
+    A conditioner that adds the output of a multi-layer perceptron to the output of a linear conditioner.
+
+    The last layer of the perceptron is initialized with zeros, such that the conditioner starts as a linear
+    conditioner and the perceptron only learns the residual non-linearity.
+    """
+
+    linear: eqx.nn.Linear
+    mlp: eqx.nn.MLP
+
+    def __init__(self, in_features: int, out_features: int, width_size: int = 64, depth: int = 2,
+                 activation: Callable[[jax.Array], jax.Array] = jax.nn.relu, key: Optional[jax.Array] = None):
+        """
+        :param in_features: The number of inputs.
+        :param out_features: The number of parameters of the circuit.
+        :param width_size: The width of the hidden layers.
+        :param depth: The number of hidden layers.
+        :param activation: The activation function of the hidden layers.
+        :param key: The random key for the initialization.
+        """
+        key = jax.random.PRNGKey(69) if key is None else key
+        linear_key, mlp_key = jax.random.split(key)
+        self.linear = eqx.nn.Linear(in_features, out_features, key=linear_key)
+        mlp = eqx.nn.MLP(in_features, out_features, width_size, depth, activation=activation, key=mlp_key)
+        self.mlp = eqx.tree_at(lambda m: (m.layers[-1].weight, m.layers[-1].bias), mlp,
+                               (jnp.zeros_like(mlp.layers[-1].weight), jnp.zeros_like(mlp.layers[-1].bias)))
+
+    def generate_parameters(self, x: jax.Array) -> jax.Array:
+        return self.linear(x) + self.mlp(x)
+
+    def generate_parameters_batched(self, x: jax.Array) -> jax.Array:
+        return x @ self.linear.weight.T + self.linear.bias + jax.vmap(self.mlp)(x)
+
     @property
     def output_length(self):
         return self.linear.out_features
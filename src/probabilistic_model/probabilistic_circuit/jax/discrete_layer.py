@@ -5,13 +5,15 @@ from random_events.variable import Symbolic, Variable
 from sortedcontainers import SortedSet
 from typing_extensions import Self, Optional
 
+import equinox as eqx
 import jax
 from . import NXConverterLayer
-from .inner_layer import InputLayer
+from .checkpoint import array_to_json, array_from_json
+from .inner_layer import InputLayer, register_layer
 import jax.numpy as jnp
 
 from ..nx.probabilistic_circuit import Unit
-from ...distributions import SymbolicDistribution
+from ...distributions import SymbolicDistribution, IntegerDistribution, PoissonDistribution
 import tqdm
 import numpy as np
 from ..nx.probabilistic_circuit import ProbabilisticCircuit as NXProbabilisticCircuit, UnivariateDiscreteLeaf
@@ -19,6 +21,7 @@ from ..nx.probabilistic_circuit import ProbabilisticCircuit as NXProbabilisticCi
 from ...utils import MissingDict
 
 
+@register_layer
 class DiscreteLayer(InputLayer):
 
     log_probabilities: jnp.array
@@ -51,8 +54,72 @@ class DiscreteLayer(InputLayer):
     def number_of_nodes(self) -> int:
         return self.log_probabilities.shape[0]
 
+    @property
+    def number_of_states(self) -> int:
+        return self.log_probabilities.shape[1]
+
+    def state_index(self, values: jnp.array) -> Tuple[jnp.array, jnp.array]:
+        """
+        :param values: The values of the variable of arbitrary shape. Fractional values are truncated.
+        :return: The index of the state of every value and whether the value is a state of the layer.
+        """
+        index = values.astype(int)
+        valid = jnp.isfinite(values) & (index >= 0) & (index < self.number_of_states)
+        return jnp.clip(index, 0, self.number_of_states - 1), valid
+
     def log_likelihood_of_nodes_single(self, x: jnp.array) -> jnp.array:
-        return self.normalized_log_probabilities[:, x.astype(int)][:, 0]
+        index, valid = self.state_index(x[0])
+        return jnp.where(valid, self.normalized_log_probabilities[:, index], -jnp.inf)
+
+    def log_likelihood_of_nodes(self, x: jnp.array) -> jnp.array:
+        # normalize once for the entire batch and gather the rows of the states of all samples at once
+        index, valid = self.state_index(x[:, 0])
+        log_likelihoods = jnp.take(self.normalized_log_probabilities.T, index, axis=0)
+        return jnp.where(valid[:, None], log_likelihoods, -jnp.inf)
+
+    def log_likelihood_of_soft_evidence(self, evidence: jnp.array) -> jnp.array:
+        """
+        Calculate the log-likelihood of uncertain evidence, i.e. the log of the expected value of the evidence
+        weights under the distribution of every node.
+        One-hot evidence is the same as the log-likelihood of the state, evidence of ones marginalizes the variable.
+        For soft evidence on the symbolic variables of an entire circuit, see
+        :meth:`ProbabilisticCircuit.log_likelihood_of_soft_evidence`.
+
+        :param evidence: The non-negative weight of every state for every sample of shape (#samples, #states).
+        :return: The log-likelihood of every node for every sample of shape (#samples, #nodes).
+        """
+        return jnp.log(jnp.dot(evidence, jnp.exp(self.normalized_log_probabilities).T))
+
+    def log_likelihood_of_soft_evidence_single(self, x: jnp.array, evidence: jnp.array) -> jnp.array:
+        weights = evidence[self.variables[0], :self.number_of_states]
+        soft_evidence = jnp.log(jnp.dot(jnp.exp(self.normalized_log_probabilities), jnp.nan_to_num(weights)))
+        return jnp.where(jnp.isnan(weights[0]), self.log_likelihood_of_nodes_single(x), soft_evidence)
+
+    def log_probability_of_nodes_single(self, event: jnp.array) -> jnp.array:
+        states = jnp.arange(self.log_probabilities.shape[1])
+        included = (event[0, 0] <= states) & (states <= event[0, 1])
+        return jax.scipy.special.logsumexp(jnp.where(included, self.normalized_log_probabilities, -jnp.inf), axis=1)
+
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        state = jax.random.categorical(key, self.log_probabilities[node])
+        return state[None].astype(self.log_probabilities.dtype)
+
+    def take_nodes(self, indices: np.ndarray) -> Self:
+        return self.__class__(self.variable, self.log_probabilities[indices])
+
+    def sufficient_statistics_single(self, x: jnp.array) -> jnp.array:
+        """
+        :return: The one-hot encoding of the state for every node.
+        """
+        index, valid = self.state_index(x[0])
+        statistics = jax.nn.one_hot(index, self.number_of_states) * valid
+        return jnp.broadcast_to(statistics, self.log_probabilities.shape)
+
+    def maximize(self, statistics: jnp.array, pseudo_count: float = 0.) -> Self:
+        counts = statistics + pseudo_count
+        used = jnp.sum(counts, axis=1, keepdims=True) > 0
+        return eqx.tree_at(lambda l: l.log_probabilities, self,
+                           jnp.where(used, jnp.log(counts), self.log_probabilities))
 
 
     @classmethod
@@ -64,12 +131,14 @@ class DiscreteLayer(InputLayer):
 
         variable: Symbolic = nodes[0].variable
 
-        parameters = np.zeros((len(nodes), len(variable.domain.simple_sets)))
+        # the probabilities are indexed by the hashes of the elements, the states by the position in the domain
+        state_index = {hash(element): index for index, element in enumerate(variable.domain.simple_sets)}
+        parameters = np.zeros((len(nodes), len(state_index)))
 
         for node in (tqdm.tqdm(nodes, desc=f"Creating discrete layer for variable {variable.name}")
                      if progress_bar else nodes):
             for state, value in node.distribution.probabilities.items():
-                parameters[hash_remap[hash(node)], state] = value
+                parameters[hash_remap[hash(node)], state_index[state]] = value
 
 
         result = cls(nodes[0].probabilistic_circuit.variables.index(variable), jnp.log(parameters))
@@ -77,11 +146,11 @@ class DiscreteLayer(InputLayer):
 
     def to_json(self) -> Dict[str, Any]:
         return {**super().to_json(),
-                "variable": self.variable, "log_probabilities": self.log_probabilities.tolist()}
+                "variable": self.variable, "log_probabilities": array_to_json(self.log_probabilities)}
 
     @classmethod
     def _from_json(cls, data: Dict[str, Any]) -> Self:
-        return cls(data["variable"], jnp.array(data["log_probabilities"]))
+        return cls(data["variable"], array_from_json(data["log_probabilities"]))
 
     def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
                 progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
@@ -92,16 +161,193 @@ class DiscreteLayer(InputLayer):
             progress_bar.set_postfix_str(f"Creating discrete distributions for variable {variable.name}")
 
         nodes = [UnivariateDiscreteLeaf(SymbolicDistribution(variable, MissingDict(float,
-            {state: value.item() for state, value in enumerate(log_probabilities)})), result)
-                 for log_probabilities in jnp.exp(self.normalized_log_probabilities)]
+            {hash(element): value for element, value in zip(variable.domain.simple_sets, probabilities)})), result)
+                 for probabilities in np.exp(np.asarray(self.normalized_log_probabilities)).tolist()]
 
         if progress_bar:
             progress_bar.update(self.number_of_nodes)
         return nodes
 
 
+@register_layer
+class IntegerLayer(DiscreteLayer):
+    """
+    A layer that represents distributions over consecutive integers of a single variable.
+    """
+
+    offset: int = eqx.field(static=True, default=0)
+    """
+    The integer that the first state represents. The n-th state represents the integer `offset + n`.
+    """
+
+    def __init__(self, variable: int, log_probabilities: jnp.array, offset: int = 0):
+        super().__init__(variable, log_probabilities)
+        self.offset = offset
+
+    @classmethod
+    def nx_classes(cls) -> Tuple[Type, ...]:
+        return IntegerDistribution,
+
+    @property
+    def states(self) -> jnp.array:
+        """
+        :return: The integers that the states represent.
+        """
+        return jnp.arange(self.log_probabilities.shape[1]) + self.offset
+
+    def state_index(self, values: jnp.array) -> Tuple[jnp.array, jnp.array]:
+        index, valid = super().state_index(values - self.offset)
+        return index, valid & (values == jnp.round(values))
+
+    def log_probability_of_nodes_single(self, event: jnp.array) -> jnp.array:
+        included = (event[0, 0] <= self.states) & (self.states <= event[0, 1])
+        return jax.scipy.special.logsumexp(jnp.where(included, self.normalized_log_probabilities, -jnp.inf), axis=1)
+
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        return super().sample_from_node_single(key, node) + self.offset
 
+    def take_nodes(self, indices: np.ndarray) -> Self:
+        return self.__class__(self.variable, self.log_probabilities[indices], self.offset)
 
+    @classmethod
+    def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[UnivariateDiscreteLeaf],
+                                                         child_layers: List[NXConverterLayer],
+                                                         progress_bar: bool = True) -> \
+            NXConverterLayer:
+        hash_remap = {hash(node): index for index, node in enumerate(nodes)}
 
+        variable = nodes[0].variable
+        values = [value for node in nodes for value in node.distribution.probabilities.keys()]
+        offset = int(min(values))
 
+        parameters = np.zeros((len(nodes), int(max(values)) - offset + 1))
+        for index, node in enumerate(tqdm.tqdm(nodes, desc=f"Creating integer layer for variable {variable.name}")
+                                     if progress_bar else nodes):
+            for value, probability in node.distribution.probabilities.items():
+                parameters[index, int(value) - offset] = probability
 
+        result = cls(nodes[0].probabilistic_circuit.variables.index(variable), jnp.log(parameters), offset)
+        return NXConverterLayer(result, nodes, hash_remap)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {**super().to_json(), "offset": self.offset}
+
+    @classmethod
+    def _from_json(cls, data: Dict[str, Any]) -> Self:
+        return cls(data["variable"], array_from_json(data["log_probabilities"]), data["offset"])
+
+    def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
+              progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
+
+        variable = variables[self.variable]
+
+        if progress_bar:
+            progress_bar.set_postfix_str(f"Creating integer distributions for variable {variable.name}")
+
+        nodes = [UnivariateDiscreteLeaf(IntegerDistribution(variable, MissingDict(float, {
+            self.offset + state: value for state, value in enumerate(probabilities) if value > 0})), result)
+                 for probabilities in np.exp(np.asarray(self.normalized_log_probabilities)).tolist()]
+
+        if progress_bar:
+            progress_bar.update(self.number_of_nodes)
+        return nodes
+
+
+@register_layer
+class PoissonLayer(InputLayer):
+    """
+    A layer that represents Poisson distributions over the non-negative integers of a single variable.
+    """
+
+    log_rate: jnp.array
+    """
+    The logarithm of the rate of every node.
+    """
+
+    def __init__(self, variable: int, log_rate: jnp.array):
+        super().__init__(variable)
+        self.log_rate = log_rate
+
+    def validate(self):
+        assert self.log_rate.ndim == 1, "The log rates must be a vector."
+
+    @classmethod
+    def nx_classes(cls) -> Tuple[Type, ...]:
+        return PoissonDistribution,
+
+    @property
+    def number_of_nodes(self) -> int:
+        return self.log_rate.shape[0]
+
+    @property
+    def rate(self) -> jnp.array:
+        return jnp.exp(self.log_rate)
+
+    def log_likelihood_of_nodes_single(self, x: jnp.array) -> jnp.array:
+        valid = (x[0] >= 0) & (x[0] == jnp.round(x[0]))
+        log_likelihood = x[0] * self.log_rate - self.rate - jax.scipy.special.gammaln(jnp.maximum(x[0], 0.) + 1)
+        return jnp.where(valid, log_likelihood, -jnp.inf)
+
+    def log_probability_of_nodes_single(self, event: jnp.array) -> jnp.array:
+        # P(lower <= X <= upper) = F(floor(upper)) - F(ceil(lower) - 1)
+        cdf_of_upper = jnp.where(jnp.isposinf(event[0, 1]), 1.,
+                                 jax.scipy.stats.poisson.cdf(jnp.floor(event[0, 1]), self.rate))
+        cdf_of_lower = jax.scipy.stats.poisson.cdf(jnp.ceil(event[0, 0]) - 1, self.rate)
+        return jnp.log(jnp.maximum(cdf_of_upper - cdf_of_lower, 0.))
+
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        return jax.random.poisson(key, self.rate[node], (1,)).astype(self.log_rate.dtype)
+
+    def take_nodes(self, indices: np.ndarray) -> Self:
+        return self.__class__(self.variable, self.log_rate[indices])
+
+    def sufficient_statistics_single(self, x: jnp.array) -> jnp.array:
+        """
+        :return: The statistics (1, x) for every node.
+        """
+        return jnp.broadcast_to(jnp.stack([jnp.ones_like(x[0]), x[0]]), (self.number_of_nodes, 2))
+
+    def maximize(self, statistics: jnp.array, pseudo_count: float = 0.) -> Self:
+        used = statistics[:, 0] > 0
+        rate = statistics[:, 1] / jnp.where(used, statistics[:, 0], 1.)
+        log_rate = jnp.log(jnp.maximum(rate, jnp.finfo(rate.dtype).tiny))
+        return eqx.tree_at(lambda l: l.log_rate, self, jnp.where(used, log_rate, self.log_rate))
+
+    def __deepcopy__(self):
+        return self.__class__(self.variable, jnp.copy(self.log_rate))
+
+    @classmethod
+    def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[UnivariateDiscreteLeaf],
+                                                         child_layers: List[NXConverterLayer],
+                                                         progress_bar: bool = True) -> \
+            NXConverterLayer:
+        hash_remap = {hash(node): index for index, node in enumerate(nodes)}
+
+        variable = nodes[0].variable
+        rates = np.array([node.distribution.rate for node in
+                          (tqdm.tqdm(nodes, desc=f"Creating Poisson layer for variable {variable.name}")
+                           if progress_bar else nodes)])
+
+        result = cls(nodes[0].probabilistic_circuit.variables.index(variable), jnp.log(jnp.asarray(rates)))
+        return NXConverterLayer(result, nodes, hash_remap)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {**super().to_json(), "log_rate": array_to_json(self.log_rate)}
+
+    @classmethod
+    def _from_json(cls, data: Dict[str, Any]) -> Self:
+        return cls(data["variable"], array_from_json(data["log_rate"]))
+
+    def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
+              progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
+        variable = variables[self.variable]
+
+        if progress_bar:
+            progress_bar.set_postfix_str(f"Creating Poisson distributions for variable {variable.name}")
+
+        nodes = [UnivariateDiscreteLeaf(PoissonDistribution(variable, rate), result)
+                 for rate in np.asarray(self.rate).tolist()]
+
+        if progress_bar:
+            progress_bar.update(self.number_of_nodes)
+        return nodes
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import equinox as eqx
+import jax
+import jax.numpy as jnp
+import numpy as np
+import tqdm
+from jax.experimental.sparse import BCOO
+from random_events.variable import Variable
+from sortedcontainers import SortedSet
+from typing_extensions import List, Dict, Any, Self, Optional, Tuple, Union
+
+from .checkpoint import array_to_json, array_from_json
+from .discrete_layer import DiscreteLayer
+from .gaussian_layer import GaussianLayer
+from .inner_layer import Layer, DenseSumLayer, ProductLayer
+from ..nx.probabilistic_circuit import Unit, ProbabilisticCircuit as NXProbabilisticCircuit
+
+
+class EinsumGaussianInputLayer(eqx.Module):
+    """
+    Gaussian input units of many leaf regions stacked along a leading region axis.
+    """
+
+    variables: jax.Array
+    """
+    The variable index of every leaf region. The shape is (#regions,).
+    """
+
+    location: jax.Array
+    """
+    The locations of the shape (#regions, #units).
+    """
+
+    log_scale: jax.Array
+    """
+    The logarithmic scales of the shape (#regions, #units).
+    """
+
+    min_scale: float = eqx.field(static=True, default=0.01)
+    """
+    The minimal scale of every unit.
+    """
+
+    @property
+    def scale(self) -> jax.Array:
+        return jnp.exp(self.log_scale) + self.min_scale
+
+    def __call__(self, x: jax.Array) -> jax.Array:
+        """
+        :param x: The data of shape (#samples, #variables).
+        :return: The log likelihoods of shape (#samples, #regions, #units).
+        """
+        return jax.scipy.stats.norm.logpdf(x[:, self.variables, None], loc=self.location, scale=self.scale)
+
+
+class EinsumDiscreteInputLayer(eqx.Module):
+    """
+    Discrete input units of many leaf regions stacked along a leading region axis.
+    """
+
+    variables: jax.Array
+    """
+    The variable index of every leaf region. The shape is (#regions,).
+    """
+
+    log_probabilities: jax.Array
+    """
+    The unnormalized log probabilities of the shape (#regions, #units, #states).
+    Regions with fewer states than the largest domain are padded with -inf.
+    """
+
+    @property
+    def normalized_log_probabilities(self) -> jax.Array:
+        return jax.nn.log_softmax(self.log_probabilities, axis=2)
+
+    def __call__(self, x: jax.Array) -> jax.Array:
+        """
+        :param x: The data of shape (#samples, #variables).
+        :return: The log likelihoods of shape (#samples, #regions, #units).
+        """
+        states = x[:, self.variables].astype(int)
+        regions = jnp.arange(len(self.variables))
+        return self.normalized_log_probabilities[regions[None, :], :, states]
+
+
+class EinsumProductLayer(eqx.Module):
+    """
+    Element-wise products of the units of regions for many partitions with the same number of children.
+    """
+
+    child_indices: jax.Array
+    """
+    The indices of the child regions of every partition. The shape is (#partitions, #children).
+    """
+
+    units: int = eqx.field(static=True)
+    """
+    The number of units of the child regions and hence of the partitions.
+    """
+
+    def __call__(self, regions: jax.Array) -> jax.Array:
+        """
+        :param regions: The log likelihoods of the regions of shape (#samples, #regions, #units).
+        :return: The log likelihoods of the partitions of shape (#samples, #partitions, #units).
+        """
+        return regions[:, self.child_indices].sum(axis=2)
+
+
+class EinsumSumLayer(eqx.Module):
+    """
+    Dense sum units of many regions with the same number of child partitions.
+    The evaluation of all regions is a single log-einsum.
+    """
+
+    child_indices: jax.Array
+    """
+    The indices of the child partitions of every region. The shape is (#regions, #children).
+    """
+
+    log_weights: jax.Array
+    """
+    The unnormalized log weights of the shape (#regions, #units, #children * #units of the children).
+    """
+
+    @property
+    def child_units(self) -> int:
+        """
+        :return: The number of units of the child partitions.
+        """
+        return self.log_weights.shape[2] // self.child_indices.shape[1]
+
+    def __call__(self, partitions: jax.Array) -> jax.Array:
+        """
+        :param partitions: The log likelihoods of the partitions of shape (#samples, #partitions, #units).
+        :return: The log likelihoods of the regions of shape (#samples, #regions, #units).
+        """
+        children = partitions[:, self.child_indices]
+        children = children.reshape(children.shape[0], children.shape[1], -1)
+
+        # shift the log likelihoods such that the exponentiation does not underflow (log-sum-exp trick)
+        maximum = jax.lax.stop_gradient(jnp.max(children, axis=2, keepdims=True))
+        maximum = jnp.where(jnp.isfinite(maximum), maximum, 0.)
+        weights = jax.nn.softmax(self.log_weights, axis=2)
+        likelihood = jnp.einsum("nrc,rsc->nrs", jnp.exp(children - maximum), weights)
+        return jnp.log(likelihood) + maximum
+
+
+class EinsumLayer(Layer):
+    """
+    A tensorized circuit over a region graph in the style of Einsum Networks.
+
+    All leaf regions are evaluated by a few stacked input layers.
+    All partitions and regions with the same height in the region graph are evaluated by a few batched products and
+    einsums, each of which processes many regions at once along a leading region axis.
+    The nodes of this layer are the units of the root region.
+
+    Regions are identified by their index in a buffer that contains all regions with the same number of units.
+    Partitions are identified in the same way.
+
+    Use :meth:`to_layers` to convert this layer to an equivalent circuit of :class:`DenseSumLayer` and
+    :class:`ProductLayer`.
+    """
+
+    input_layers: List[Union[EinsumGaussianInputLayer, EinsumDiscreteInputLayer]]
+    """
+    The input layers. Their regions are the first regions of the region buffer with their number of units.
+    """
+
+    layers: List[Union[EinsumProductLayer, EinsumSumLayer]]
+    """
+    The inner layers in the order of evaluation.
+    The outputs of product layers are appended to the partition buffers, the outputs of sum layers to the region
+    buffers.
+    """
+
+    root_index: int = eqx.field(static=True)
+    """
+    The index of the root region in its region buffer.
+    """
+
+    number_of_states: Tuple[int, ...] = eqx.field(static=True)
+    """
+    The number of states of the variable of every leaf region of the discrete input layers.
+    """
+
+    def __init__(self, input_layers: List[Union[EinsumGaussianInputLayer, EinsumDiscreteInputLayer]],
+                 layers: List[Union[EinsumProductLayer, EinsumSumLayer]], root_index: int,
+                 number_of_states: Tuple[int, ...] = tuple()):
+        super().__init__()
+        self.input_layers = input_layers
+        self.layers = layers
+        self.root_index = root_index
+        self.number_of_states = number_of_states
+
+    @property
+    def variables(self) -> jax.Array:
+        if self._variables is None:
+            object.__setattr__(self, "_variables", jnp.unique(jnp.concatenate([input_layer.variables for input_layer
+                                                                               in self.input_layers])))
+        return self._variables
+
+    def set_variables(self, value: jax.Array):
+        raise AttributeError("Variables of einsum layers are read-only.")
+
+    @property
+    def number_of_nodes(self) -> int:
+        return self.layers[-1].log_weights.shape[1]
+
+    @property
+    def number_of_components(self) -> int:
+        return self.to_layers().number_of_components
+
+    def validate(self):
+        assert isinstance(self.layers[-1], EinsumSumLayer), "The last layer must be a sum layer."
+        for layer in self.layers:
+            if isinstance(layer, EinsumSumLayer):
+                assert layer.log_weights.shape[0] == layer.child_indices.shape[0], \
+                    "The number of weight matrices must match the number of regions."
+
+    def log_likelihood_of_nodes(self, x: jax.Array) -> jax.Array:
+        region_buffers: Dict[int, List[jax.Array]] = dict()
+        partition_buffers: Dict[int, List[jax.Array]] = dict()
+
+        for input_layer in self.input_layers:
+            result = input_layer(x)
+            region_buffers.setdefault(result.shape[2], []).append(result)
+
+        for layer in self.layers:
+            if isinstance(layer, EinsumProductLayer):
+                result = layer(jnp.concatenate(region_buffers[layer.units], axis=1))
+                partition_buffers.setdefault(layer.units, []).append(result)
+            else:
+                result = layer(jnp.concatenate(partition_buffers[layer.child_units], axis=1))
+                region_buffers.setdefault(result.shape[2], []).append(result)
+
+        return jnp.concatenate(region_buffers[self.number_of_nodes], axis=1)[:, self.root_index]
+
+    def log_likelihood_of_nodes_single(self, x: jax.Array) -> jax.Array:
+        return self.log_likelihood_of_nodes(x[None])[0]
+
+    def to_layers(self) -> DenseSumLayer:
+        """
+        Convert this layer to an equivalent circuit of dense sum layers and product layers with one layer per region
+        and partition.
+
+        :return: The root layer of the equivalent circuit.
+        """
+        region_buffers: Dict[int, List[Layer]] = dict()
+        partition_buffers: Dict[int, List[Layer]] = dict()
+
+        discrete_region = 0
+        for input_layer in self.input_layers:
+            for region, variable in enumerate(np.asarray(input_layer.variables).tolist()):
+                if isinstance(input_layer, EinsumGaussianInputLayer):
+                    layer = GaussianLayer(variable, input_layer.location[region], input_layer.log_scale[region],
+                                          jnp.full_like(input_layer.location[region], input_layer.min_scale))
+                else:
+                    layer = DiscreteLayer(variable, input_layer.log_probabilities[region, :,
+                                                    :self.number_of_states[discrete_region]])
+                    discrete_region += 1
+                region_buffers.setdefault(layer.number_of_nodes, []).append(layer)
+
+        for layer in self.layers:
+            child_indices = np.asarray(layer.child_indices)
+            if isinstance(layer, EinsumProductLayer):
+                units = layer.units
+                for children in child_indices:
+                    child_layers = [region_buffers[units][child] for child in children]
+                    edges = BCOO.fromdense(jnp.ones((len(child_layers), units), dtype=int))
+                    edges.data = jnp.tile(jnp.arange(units), len(child_layers))
+                    partition_buffers.setdefault(units, []).append(ProductLayer(child_layers, edges))
+            else:
+                units = layer.child_units
+                for children, log_weights in zip(child_indices, layer.log_weights):
+                    child_layers = [partition_buffers[units][child] for child in children]
+                    region_buffers.setdefault(log_weights.shape[0], []).append(DenseSumLayer(child_layers,
+                                                                                             log_weights))
+
+        return region_buffers[self.number_of_nodes][self.root_index]
+
+    def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
+              progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
+        return self.to_layers().to_nx(variables, result, progress_bar)
+
+    def __deepcopy__(self):
+        return self.__class__.from_json(self.to_json())
+
+    def to_json(self) -> Dict[str, Any]:
+        result = super().to_json()
+        result["input_layers"] = [{"type": "gaussian", "variables": array_to_json(layer.variables),
+                                   "location": array_to_json(layer.location),
+                                   "log_scale": array_to_json(layer.log_scale),
+                                   "min_scale": layer.min_scale}
+                                  if isinstance(layer, EinsumGaussianInputLayer) else
+                                  {"type": "discrete", "variables": array_to_json(layer.variables),
+                                   "log_probabilities": array_to_json(layer.log_probabilities)}
+                                  for layer in self.input_layers]
+        result["layers"] = [{"type": "product", "child_indices": array_to_json(layer.child_indices),
+                             "units": layer.units}
+                            if isinstance(layer, EinsumProductLayer) else
+                            {"type": "sum", "child_indices": array_to_json(layer.child_indices),
+                             "log_weights": array_to_json(layer.log_weights)}
+                            for layer in self.layers]
+        result["root_index"] = self.root_index
+        result["number_of_states"] = list(self.number_of_states)
+        return result
+
+    @classmethod
+    def _from_json(cls, data: Dict[str, Any]) -> Self:
+        input_layers = [EinsumGaussianInputLayer(array_from_json(layer["variables"]),
+                                                 array_from_json(layer["location"]),
+                                                 array_from_json(layer["log_scale"]), layer["min_scale"])
+                        if layer["type"] == "gaussian" else
+                        EinsumDiscreteInputLayer(array_from_json(layer["variables"]),
+                                                 array_from_json(layer["log_probabilities"]))
+                        for layer in data["input_layers"]]
+        layers = [EinsumProductLayer(array_from_json(layer["child_indices"]), layer["units"])
+                  if layer["type"] == "product" else
+                  EinsumSumLayer(array_from_json(layer["child_indices"]), array_from_json(layer["log_weights"]))
+                  for layer in data["layers"]]
+        return cls(input_layers, layers, data["root_index"], tuple(data["number_of_states"]))
@@ -0,0 +1,216 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import equinox as eqx
+import jax
+import jax.numpy as jnp
+from typing_extensions import Callable, List, Optional, Tuple, Any
+
+from .inner_layer import Layer, InputLayer, SumLayer, ProductLayer
+from .training import Trainer
+
+Statistics = Tuple[Any, List["Statistics"]]
+"""
+The expected statistics of a layer and of its child layers.
+The statistics of a layer are the edge flows for sum layers, the expected sufficient statistics for input layers and
+`None` for product layers.
+"""
+
+
+class SufficientStatisticsProbe(Layer):
+    """
+    A wrapper that adds a linear function of the sufficient statistics of a layer to its log-likelihoods.
+    The coefficients of the function are zero, hence the log-likelihoods are unchanged.
+
+    The gradient of the log-likelihood of a circuit w.r.t. the coefficients of a probe is the expectation of the
+    sufficient statistics w.r.t. the posterior of the nodes of the wrapped layer.
+    For inner layers the only statistic is the constant 1 and the gradient is the flow of every node.
+    """
+
+    layer: Layer
+    """
+    The wrapped layer.
+    """
+
+    coefficients: jax.Array
+    """
+    The zero coefficients of shape (#nodes, #statistics).
+    """
+
+    def __init__(self, layer: Layer, coefficients: jax.Array):
+        super().__init__()
+        self.layer = layer
+        self.coefficients = coefficients
+
+    @property
+    def variables(self) -> jax.Array:
+        return self.layer.variables
+
+    @property
+    def number_of_nodes(self) -> int:
+        return self.layer.number_of_nodes
+
+    def statistics_single(self, x: jax.Array) -> jax.Array:
+        if isinstance(self.layer, InputLayer):
+            return self.layer.sufficient_statistics_single(x)
+        return jnp.ones((self.number_of_nodes, 1))
+
+    def log_likelihood_of_nodes_single(self, x: jax.Array) -> jax.Array:
+        return (self.layer.log_likelihood_of_nodes_single(x) +
+                jnp.sum(self.coefficients * self.statistics_single(x), axis=1))
+
+
+def attach_probes(layer: Layer) -> SufficientStatisticsProbe:
+    """
+    Wrap every layer of a circuit in a :class:`SufficientStatisticsProbe`.
+
+    :param layer: The root layer of the circuit.
+    :return: The probed root layer.
+    """
+    if isinstance(layer, InputLayer):
+        number_of_statistics = layer.sufficient_statistics_single(layer.variables).shape[1]
+    elif isinstance(layer, (SumLayer, ProductLayer)):
+        child_layers = [attach_probes(child_layer) for child_layer in layer.child_layers]
+        layer = eqx.tree_at(lambda l: l.child_layers, layer, child_layers)
+        number_of_statistics = 1
+    else:
+        raise NotImplementedError(f"Expectation maximization is not supported for {type(layer).__name__}.")
+    return SufficientStatisticsProbe(layer, jnp.zeros((layer.number_of_nodes, number_of_statistics)))
+
+
+def expected_statistics(probe: SufficientStatisticsProbe, gradient: SufficientStatisticsProbe) -> Statistics:
+    """
+    Extract the expected statistics of every layer from the gradient of the log-likelihood w.r.t. a probed circuit.
+
+    :param probe: The probed circuit.
+    :param gradient: The gradient of the log-likelihood w.r.t. the probed circuit.
+    :return: The expected statistics.
+    """
+    layer, layer_gradient = probe.layer, gradient.layer
+    if isinstance(layer, InputLayer):
+        return gradient.coefficients, []
+
+    child_statistics = [expected_statistics(child_layer, child_gradient) for child_layer, child_gradient
+                        in zip(layer.child_layers, layer_gradient.child_layers)]
+    if isinstance(layer, SumLayer):
+        return layer.edge_flows(layer_gradient.log_weights, gradient.coefficients[:, 0]), child_statistics
+    return None, child_statistics
+
+
+def maximize(layer: Layer, statistics: Statistics, pseudo_count: float = 0.) -> Layer:
+    """
+    Update the parameters of every layer of a circuit from expected statistics (M-step).
+
+    :param layer: The root layer of the circuit.
+    :param statistics: The expected statistics as returned by :func:`expected_statistics`.
+    :param pseudo_count: The pseudo count that is added to the statistics.
+    :return: The updated circuit.
+    """
+    own_statistics, child_statistics = statistics
+    if isinstance(layer, InputLayer):
+        return layer.maximize(own_statistics, pseudo_count)
+
+    child_layers = [maximize(child_layer, child_statistics, pseudo_count)
+                    for child_layer, child_statistics in zip(layer.child_layers, child_statistics)]
+    if isinstance(layer, SumLayer):
+        layer = layer.maximize_log_weights(own_statistics, pseudo_count)
+    return eqx.tree_at(lambda l: l.child_layers, layer, child_layers)
+
+
+def expectation(layer: Layer, weights: jax.Array, x: jax.Array) -> Tuple[jax.Array, Statistics]:
+    """
+    Calculate the expected statistics of all layers of a circuit (E-step).
+    The statistics are the gradients of the log-likelihood w.r.t. the log weights and the probes of the circuit.
+
+    :param layer: The root layer of the circuit.
+    :param weights: The weight of every sample. Padded samples have weight 0.
+    :param x: The data.
+    :return: The weighted sum of the log-likelihoods of the first node and the summed expected statistics.
+    """
+    probe = attach_probes(layer)
+
+    def log_likelihood(p: SufficientStatisticsProbe) -> jax.Array:
+        return jnp.sum(weights * p.log_likelihood_of_nodes(x)[:, 0])
+
+    value, gradient = eqx.filter_value_and_grad(log_likelihood)(probe)
+    return value, expected_statistics(probe, gradient)
+
+
+def constant_step_size(step: jax.Array) -> jax.Array:
+    """
+    The step size of (full batch) EM, where the statistics of every step replace the previous statistics.
+    """
+    return jnp.ones_like(step, dtype=float)
+
+
+def polynomial_step_size(step: jax.Array, decay: float = 0.6) -> jax.Array:
+    """
+    The step size of stochastic EM :math:`(t + 1)^{-decay}`.
+    For decays in (0.5, 1] the step sizes satisfy the Robbins-Monro conditions.
+    """
+    return (step + 1.) ** -decay
+
+
+@dataclass
+class ExpectationMaximization(Trainer):
+    """
+    Closed form expectation maximization (EM) for layered circuits of sum, product and input layers.
+
+    The E-step calculates the expected flows of all sum edges and the expected sufficient statistics of all input
+    nodes by differentiating the log-likelihood of the circuit.
+    The M-step sets the weights to the normalized flows and the parameters of the input layers to their maximum
+    likelihood estimates.
+
+    With mini batches, stochastic EM is performed.
+    The statistics are a running average of the statistics of the mini batches, where the statistics of step `t`
+    enter with the step size `step_size(t)`.
+    The training loop, shuffling, early stopping and checkpointing are inherited from :class:`Trainer`, the
+    optimizer is not used.
+    """
+
+    step_size: Optional[Callable[[jax.Array], jax.Array]] = None
+    """
+    The step size schedule, e.g. an optax schedule.
+    If `None`, :func:`constant_step_size` is used for full batch and :func:`polynomial_step_size` for mini batch EM.
+    """
+
+    pseudo_count: float = 0.
+    """
+    The pseudo count that is added to the average statistics per sample.
+    """
+
+    def __post_init__(self):
+        super().__post_init__()
+        if self.step_size is None:
+            self.step_size = constant_step_size if self.batch_size is None else polynomial_step_size
+
+    def init_state(self, params: List[jax.Array], treedef, static) -> Tuple[Statistics, jax.Array]:
+        """
+        :return: Zero statistics and the step counter.
+        """
+        def statistics_of(p: List[jax.Array], x: jax.Array) -> Statistics:
+            return expectation(self.combine(p, treedef, static), jnp.ones(1), x)[1]
+
+        number_of_variables = len(eqx.combine(jax.tree_util.tree_unflatten(treedef, params), static).variables)
+        statistics = jax.eval_shape(statistics_of, params,
+                                    jax.ShapeDtypeStruct((1, number_of_variables), jnp.float32))
+        return jax.tree_util.tree_map(lambda s: jnp.zeros(s.shape, s.dtype), statistics), jnp.array(0)
+
+    def train_step(self, treedef, static) -> Callable:
+        def step(params: List[jax.Array], state: Tuple[Statistics, jax.Array], weights: jax.Array, x: jax.Array):
+            statistics, t = state
+            model = self.combine(params, treedef, static)
+            log_likelihood, batch_statistics = expectation(model, weights, x)
+
+            # blend the average statistics per sample of the batch into the running statistics
+            total = jnp.sum(weights)
+            step_size = self.step_size(t)
+            statistics = jax.tree_util.tree_map(lambda s, b: (1 - step_size) * s + step_size * b / total,
+                                                statistics, batch_statistics)
+
+            model = maximize(model, statistics, self.pseudo_count)
+            params = jax.tree_util.tree_leaves(eqx.filter(model, eqx.is_inexact_array))
+            return params, (statistics, t + 1), -log_likelihood / total
+
+        return step
@@ -2,18 +2,23 @@ from typing import List, Dict, Any, Optional
 
 import equinox as eqx
 import jax
+import numpy as np
 import tqdm
 from jax import numpy as jnp
+from random_events.interval import SimpleInterval, Bound
 from random_events.variable import Variable
 from sortedcontainers import SortedSet
 from typing_extensions import Type, Tuple, Self
 
-from .inner_layer import NXConverterLayer
+from .checkpoint import array_to_json, array_from_json
+from .inner_layer import NXConverterLayer, register_layer
 from .input_layer import ContinuousLayer
 from ..nx.probabilistic_circuit import Unit, ProbabilisticCircuit as NXProbabilisticCircuit, UnivariateContinuousLeaf
-from ...distributions import GaussianDistribution
+from .utils import simple_intervals_to_open_array
+from ...distributions import GaussianDistribution, TruncatedGaussianDistribution, LogNormalDistribution
 
 
+@register_layer
 class GaussianLayer(ContinuousLayer):
     """
     A layer that represents uniform distributions over a single variable.
@@ -30,7 +35,11 @@ class GaussianLayer(ContinuousLayer):
         self.min_scale = min_scale
 
     def __deepcopy__(self):
-        return GaussianLayer(self.variable, self.location, self.log_scale, self.min_scale)
+        return self.__class__(self.variable, self.location, self.log_scale, self.min_scale)
+
+    def take_nodes(self, indices: np.ndarray) -> Self:
+        return self.__class__(self.variable, self.location[indices], self.log_scale[indices],
+                              self.min_scale[indices])
 
     @classmethod
     def nx_classes(cls) -> Tuple[Type, ...]:
@@ -55,6 +64,35 @@ class GaussianLayer(ContinuousLayer):
     def log_likelihood_of_nodes(self, x: jnp.array) -> jnp.array:
         return jax.vmap(self.log_likelihood_of_nodes_single)(x)
 
+    def log_probability_of_nodes_single(self, event: jnp.array) -> jnp.array:
+        scale = self.scale
+        probability = (jax.scipy.stats.norm.cdf(event[0, 1], loc=self.location, scale=scale) -
+                       jax.scipy.stats.norm.cdf(event[0, 0], loc=self.location, scale=scale))
+        return jnp.log(jnp.maximum(probability, 0.))
+
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        return self.location[node] + self.scale[node] * jax.random.normal(key, (1,), dtype=self.location.dtype)
+
+    def sufficient_statistics_single(self, x: jnp.array) -> jnp.array:
+        """
+        :return: The statistics (1, x, x^2) for every node.
+        """
+        statistics = jnp.stack([jnp.ones_like(x[0]), x[0], x[0] ** 2])
+        return jnp.broadcast_to(statistics, (self.number_of_nodes, 3))
+
+    def maximize(self, statistics: jnp.array, pseudo_count: float = 0.) -> Self:
+        count = statistics[:, 0]
+        used = count > 0
+        count = jnp.where(used, count, 1.)
+        location = statistics[:, 1] / count
+        variance = jnp.maximum(statistics[:, 2] / count - location ** 2, 0.)
+
+        # the scale is bounded from below by the minimal scale
+        log_scale = jnp.log(jnp.maximum(jnp.sqrt(variance) - self.min_scale, jnp.finfo(variance.dtype).tiny))
+
+        layer = eqx.tree_at(lambda l: l.location, self, jnp.where(used, location, self.location))
+        return eqx.tree_at(lambda l: l.log_scale, layer, jnp.where(used, log_scale, self.log_scale))
+
     @classmethod
     def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[UnivariateContinuousLeaf],
                                                          child_layers: List[NXConverterLayer],
@@ -64,9 +102,10 @@ class GaussianLayer(ContinuousLayer):
 
         variable = nodes[0].variable
 
-        parameters = jnp.vstack([(node.distribution.location, node.distribution.scale, 0.01) for node in
-                                 (tqdm.tqdm(nodes, desc=f"Creating guassian layer for variable {variable.name}")
-                                  if progress_bar else nodes)])
+        parameters = np.array([(node.distribution.location, node.distribution.scale, 0.01) for node in
+                               (tqdm.tqdm(nodes, desc=f"Creating guassian layer for variable {variable.name}")
+                                if progress_bar else nodes)])
+        parameters = jnp.asarray(parameters)
 
         result = cls(nodes[0].probabilistic_circuit.variables.index(variable),
                      parameters[:, 0], jnp.log(parameters[:, 1]), parameters[:, 2])
@@ -74,13 +113,13 @@ class GaussianLayer(ContinuousLayer):
 
     def to_json(self) -> Dict[str, Any]:
         return {**super().to_json(),
-                "variable": self.variable, "location": self.location.tolist(),
-                "scale": self.log_scale.tolist(), "min_scale": self.min_scale.tolist()}
+                "variable": self.variable, "location": array_to_json(self.location),
+                "scale": array_to_json(self.log_scale), "min_scale": array_to_json(self.min_scale)}
 
     @classmethod
     def _from_json(cls, data: Dict[str, Any]) -> Self:
-        return cls(data["variable"], jnp.array(data["location"]), jnp.array(data["scale"]),
-                   jnp.array(data["min_scale"]))
+        return cls(data["variable"], array_from_json(data["location"]), array_from_json(data["scale"]),
+                   array_from_json(data["min_scale"]))
 
     def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
               progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
@@ -90,8 +129,192 @@ class GaussianLayer(ContinuousLayer):
             progress_bar.set_postfix_str(f"Creating Gaussian distributions for variable {variable.name}")
 
         nodes = [UnivariateContinuousLeaf(
-            GaussianDistribution(variable=variable, location=location.item(), scale=scale.item()), result)
-            for location, scale in zip(self.location, self.scale)]
+            GaussianDistribution(variable=variable, location=location, scale=scale), result)
+            for location, scale in zip(*(parameter.tolist() for parameter in
+                                         jax.device_get((self.location, self.scale))))]
+
+        if progress_bar:
+            progress_bar.update(self.number_of_nodes)
+
+        return nodes
+
+
+@register_layer
+class TruncatedGaussianLayer(GaussianLayer):
+    """
+    A layer that represents Gaussian distributions that are truncated to an interval over a single variable.
+    """
+
+    interval: jax.Array = eqx.field(static=True)
+    """
+    The interval of the distribution as a array of shape (num_nodes, 2).
+    The first column contains the lower bounds and the second column the upper bounds.
+    The intervals are treated as open intervals (>/< comparator).
+    """
+
+    def __init__(self, variable: int, location: jnp.array, log_scale: jnp.array, min_scale: jnp.array,
+                 interval: jax.Array):
+        super().__init__(variable, location, log_scale, min_scale)
+        self.interval = interval
+
+    def __deepcopy__(self):
+        return self.__class__(self.variable, self.location, self.log_scale, self.min_scale, self.interval.copy())
+
+    def take_nodes(self, indices: np.ndarray) -> Self:
+        return self.__class__(self.variable, self.location[indices], self.log_scale[indices],
+                              self.min_scale[indices], self.interval[indices])
+
+    @classmethod
+    def nx_classes(cls) -> Tuple[Type, ...]:
+        return TruncatedGaussianDistribution,
+
+    def validate(self):
+        super().validate()
+        assert self.interval.shape == (self.number_of_nodes, 2), "The shape of the interval must be (#nodes, 2)."
+
+    @property
+    def lower(self) -> jax.Array:
+        return self.interval[:, 0]
+
+    @property
+    def upper(self) -> jax.Array:
+        return self.interval[:, 1]
+
+    def cdf(self, x: jnp.array) -> jnp.array:
+        """
+        :return: The cdf of the untruncated Gaussians of every node at x.
+        """
+        return jax.scipy.stats.norm.cdf(x, loc=self.location, scale=self.scale)
+
+    @property
+    def log_normalization_constant(self) -> jnp.array:
+        """
+        :return: The logarithm of the probability mass of the untruncated Gaussians inside the intervals.
+        """
+        return jnp.log(self.cdf(self.upper) - self.cdf(self.lower))
+
+    def log_likelihood_of_nodes_single(self, x: jnp.array) -> jnp.array:
+        return jnp.where((self.lower < x) & (x < self.upper), super().log_likelihood_of_nodes_single(x)
+                         - self.log_normalization_constant, -jnp.inf)
+
+    def log_probability_of_nodes_single(self, event: jnp.array) -> jnp.array:
+        probability = (self.cdf(jnp.minimum(event[0, 1], self.upper)) -
+                       self.cdf(jnp.maximum(event[0, 0], self.lower)))
+        return jnp.log(jnp.maximum(probability, 0.)) - self.log_normalization_constant
+
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        # inverse transform sampling inside the interval
+        cdf_of_lower, cdf_of_upper = self.cdf(self.lower)[node], self.cdf(self.upper)[node]
+        quantile = jax.random.uniform(key, (1,), minval=cdf_of_lower, maxval=cdf_of_upper)
+        sample = self.location[node] + self.scale[node] * jax.scipy.special.ndtri(quantile)
+        return jnp.clip(sample, self.lower[node], self.upper[node])
+
+    def sufficient_statistics_single(self, x: jnp.array) -> jnp.array:
+        raise NotImplementedError("The maximum likelihood estimate of truncated Gaussians has no closed form.")
+
+    def maximize(self, statistics: jnp.array, pseudo_count: float = 0.) -> Self:
+        raise NotImplementedError("The maximum likelihood estimate of truncated Gaussians has no closed form.")
+
+    @classmethod
+    def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[UnivariateContinuousLeaf],
+                                                         child_layers: List[NXConverterLayer],
+                                                         progress_bar: bool = True) -> \
+            NXConverterLayer:
+        hash_remap = {hash(node): index for index, node in enumerate(nodes)}
+
+        variable = nodes[0].variable
+
+        nodes_to_convert = (tqdm.tqdm(nodes, desc=f"Creating truncated Gaussian layer for variable {variable.name}")
+                            if progress_bar else nodes)
+        parameters = jnp.asarray(np.array([(node.distribution.location, node.distribution.scale)
+                                           for node in nodes_to_convert]))
+        intervals = simple_intervals_to_open_array([node.distribution.interval for node in nodes])
+
+        result = cls(nodes[0].probabilistic_circuit.variables.index(variable), parameters[:, 0],
+                     jnp.log(parameters[:, 1]), jnp.zeros(len(nodes)), intervals)
+        return NXConverterLayer(result, nodes, hash_remap)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {**super().to_json(), "interval": array_to_json(self.interval)}
+
+    @classmethod
+    def _from_json(cls, data: Dict[str, Any]) -> Self:
+        return cls(data["variable"], array_from_json(data["location"]), array_from_json(data["scale"]),
+                   array_from_json(data["min_scale"]), array_from_json(data["interval"]))
+
+    def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
+              progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
+        variable = variables[self.variable]
+
+        if progress_bar:
+            progress_bar.set_postfix_str(f"Creating truncated Gaussian distributions for variable {variable.name}")
+
+        nodes = [UnivariateContinuousLeaf(
+            TruncatedGaussianDistribution(variable, SimpleInterval(lower, upper, Bound.OPEN, Bound.OPEN),
+                                          location, scale), result)
+            for location, scale, (lower, upper) in zip(*(parameter.tolist() for parameter in
+                                                         jax.device_get((self.location, self.scale, self.interval))))]
+
+        if progress_bar:
+            progress_bar.update(self.number_of_nodes)
+
+        return nodes
+
+
+@register_layer
+class LogNormalLayer(GaussianLayer):
+    """
+    A layer that represents log-normal distributions over a single variable.
+    The location and scale are the parameters of the Gaussian distribution of the logarithm of the variable.
+    """
+
+    @classmethod
+    def nx_classes(cls) -> Tuple[Type, ...]:
+        return LogNormalDistribution,
+
+    def log_likelihood_of_nodes_single(self, x: jnp.array) -> jnp.array:
+        log_x = jnp.log(jnp.maximum(x, jnp.finfo(self.location.dtype).tiny))
+        return jnp.where(x > 0, super().log_likelihood_of_nodes_single(log_x) - log_x, -jnp.inf)
+
+    def log_probability_of_nodes_single(self, event: jnp.array) -> jnp.array:
+        return super().log_probability_of_nodes_single(jnp.log(jnp.maximum(event, 0.)))
+
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        return jnp.exp(super().sample_from_node_single(key, node))
+
+    def sufficient_statistics_single(self, x: jnp.array) -> jnp.array:
+        """
+        :return: The statistics (1, log(x), log(x)^2) for every node.
+        """
+        return super().sufficient_statistics_single(jnp.log(jnp.maximum(x, jnp.finfo(self.location.dtype).tiny)))
+
+    @classmethod
+    def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[UnivariateContinuousLeaf],
+                                                         child_layers: List[NXConverterLayer],
+                                                         progress_bar: bool = True) -> \
+            NXConverterLayer:
+        hash_remap = {hash(node): index for index, node in enumerate(nodes)}
+
+        variable = nodes[0].variable
+        parameters = jnp.asarray(np.array([(node.distribution.location, node.distribution.scale) for node in
+                                           (tqdm.tqdm(nodes, desc=f"Creating log-normal layer for variable "
+                                                                  f"{variable.name}") if progress_bar else nodes)]))
+
+        # the scale is represented exactly, hence there is no minimal scale
+        result = cls(nodes[0].probabilistic_circuit.variables.index(variable), parameters[:, 0],
+                     jnp.log(parameters[:, 1]), jnp.zeros(len(nodes)))
+        return NXConverterLayer(result, nodes, hash_remap)
+
+    def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
+              progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
+        variable = variables[self.variable]
+
+        if progress_bar:
+            progress_bar.set_postfix_str(f"Creating log-normal distributions for variable {variable.name}")
+
+        nodes = [UnivariateContinuousLeaf(LogNormalDistribution(variable, location, scale), result)
+                 for location, scale in zip(*(parameter.tolist() for parameter in
+                                              jax.device_get((self.location, self.scale))))]
 
         if progress_bar:
             progress_bar.update(self.number_of_nodes)
@@ -22,13 +22,48 @@ from sortedcontainers import SortedSet
 from typing_extensions import List, Iterator, Tuple, Union, Type, Dict, Any, Self, Optional
 
 from . import shrink_index_array, embed_sparse_array_in_nan_array
-from .utils import copy_bcoo, sample_from_sparse_probabilities_csc, sparse_remove_rows_and_cols_where_all
+from .checkpoint import array_to_json, array_from_json
+from .utils import (copy_bcoo, sample_from_sparse_probabilities_csc, sparse_remove_rows_and_cols_where_all,
+                    segment_logsumexp)
 from ..nx.probabilistic_circuit import (SumUnit, ProductUnit, Unit,
                                         ProbabilisticCircuit as NXProbabilisticCircuit)
 from jax.scipy.special import logsumexp
 
 
+layer_registry: Dict[Type, Type[Layer]] = dict()
+"""
+The layer classes that the units and distributions of the networkx package are converted to.
+"""
+
+
+def register_layer(layer_class: Type[Layer], nx_classes: Optional[Tuple[Type, ...]] = None) -> Type[Layer]:
+    """
+    Register a layer class as the target of the conversion of networkx units or distributions.
+    Can be used as class decorator.
+
+    :param layer_class: The layer class.
+    :param nx_classes: The classes of the networkx package that are converted to the layer.
+        Defaults to the `nx_classes` of the layer.
+    :return: The layer class.
+    """
+    for nx_class in layer_class.nx_classes() if nx_classes is None else nx_classes:
+        layer_registry[nx_class] = layer_class
+    return layer_class
+
+
 def inverse_class_of(clazz: Type[Unit]) -> Type[Layer]:
+    """
+    Find the layer class that a networkx unit or distribution class is converted to.
+    The most specific registered class wins, e.g. truncated Gaussians are not converted to Gaussian layers.
+    Layers that are not registered are found by their `nx_classes`.
+
+    :param clazz: The class of the unit or distribution.
+    :return: The layer class.
+    """
+    for base in clazz.__mro__:
+        if base in layer_registry:
+            return layer_registry[base]
+
     for subclass in recursive_subclasses(Layer):
         if not inspect.isabstract(subclass):
             if issubclass(clazz, subclass.nx_classes()):
@@ -72,6 +107,38 @@ class Layer(eqx.Module, SubclassJSONSerializer, ABC):
         """
         return jax.vmap(self.log_likelihood_of_nodes_single)(x)
 
+    def log_likelihood_of_soft_evidence_single(self, x: jax.Array, evidence: jax.Array) -> jax.Array:
+        """
+        Calculate the log-likelihood of a sample with uncertain evidence for some symbolic variables.
+
+        :param x: The input vector.
+        :param evidence: The weight of every state of every variable of the circuit of shape
+            (#variables, #states). Rows of nan mean that the variable is observed by x instead.
+        :return: The log-likelihood of every node in the layer.
+        """
+        raise NotImplementedError
+
+    def log_probability_of_nodes_single(self, event: jax.Array) -> jax.Array:
+        """
+        Calculate the log-probability of a box event.
+
+        :param event: The closed intervals of the event for the variables of the layer of shape (#variables, 2).
+            The first column contains the lower bounds and the second column the upper bounds.
+        :return: The log-probability of every node in the layer for the event.
+        """
+        raise NotImplementedError
+
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        """
+        Draw a sample from a single node of the layer.
+        The node may be a traced index, such that sampling can be vectorized over nodes, keys and parameters.
+
+        :param key: The random key.
+        :param node: The index of the node in the layer.
+        :return: The sample over the variables of the layer of shape (#variables,).
+        """
+        raise NotImplementedError
+
     def validate(self):
         """
         Validate the parameters and their layouts.
@@ -126,48 +193,6 @@ class Layer(eqx.Module, SubclassJSONSerializer, ABC):
         """
         raise NotImplementedError
 
-    @staticmethod
-    def create_layers_from_nodes(nodes: List[Unit], child_layers: List[NXConverterLayer],
-                                 progress_bar: bool = True) \
-            -> List[NXConverterLayer]:
-        """
-        Create a layer from a list of nodes.
-        """
-        result = []
-
-        unique_types = set(type(node) if not node.is_leaf else type(node.distribution) for node in nodes)
-        for unique_type in unique_types:
-            nodes_of_current_type = [node for node in nodes if (isinstance(node, unique_type) if not node.is_leaf
-                                                                else isinstance(node.distribution, unique_type))]
-
-            if nodes[0].is_leaf:
-                unique_type = type(nodes_of_current_type[0].distribution)
-
-            layer_type = inverse_class_of(unique_type)
-
-            scopes = [tuple(node.variables) for node in nodes_of_current_type]
-            unique_scopes = set(scopes)
-            for scope in unique_scopes:
-                nodes_of_current_type_and_scope = [node for node in nodes_of_current_type if
-                                                   tuple(node.variables) == scope]
-
-                layer = layer_type.create_layer_from_nodes_with_same_type_and_scope(nodes_of_current_type_and_scope,
-                                                                                    child_layers, progress_bar)
-                result.append(layer)
-
-        return result
-
-    @classmethod
-    @abstractmethod
-    def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[Unit],
-                                                         child_layers: List[NXConverterLayer],
-                                                         progress_bar: bool = True) -> \
-            NXConverterLayer:
-        """
-        Create a layer from a list of nodes with the same type and scope.
-        """
-        raise NotImplementedError
-
     def partition(self) -> Tuple[Any, Any]:
         """
         Partition the layer into the parameters and the static structure.
@@ -183,7 +208,7 @@ class Layer(eqx.Module, SubclassJSONSerializer, ABC):
         """
         parameters, _ = self.partition()
         flattened_parameters, _ = tree_flatten(parameters)
-        number_of_parameters = sum([len(p) for p in flattened_parameters])
+        number_of_parameters = sum([p.size for p in flattened_parameters])
         return number_of_parameters
 
     @property
@@ -209,6 +234,100 @@ class InnerLayer(Layer, ABC):
         self.child_layers = child_layers
         self.variables # initialize the variables of the layer
 
+    @classmethod
+    @abstractmethod
+    def create_layer_from_edges(cls, child_layers: List[Layer], number_of_nodes: int,
+                                parent_positions: np.ndarray, child_layer_indices: np.ndarray,
+                                child_positions: np.ndarray, log_weights: np.ndarray) -> Self:
+        """
+        Create a layer from the edges of a compiled networkx circuit.
+        Every edge is described by the position of its source in this layer, the index of the child layer that
+        contains its target, the position of the target in that child layer and its log weight.
+
+        :param child_layers: The child layers that the edges point into.
+        :param number_of_nodes: The number of nodes in the layer.
+        :param parent_positions: The position of the source of every edge in this layer.
+        :param child_layer_indices: The index of the child layer of every edge.
+        :param child_positions: The position of the target of every edge in its child layer.
+        :param log_weights: The log weight of every edge (nan for unweighted edges).
+        :return: The layer.
+        """
+        raise NotImplementedError
+
+    @property
+    @abstractmethod
+    def nx_unit_class(self) -> Type[Unit]:
+        """
+        :return: The class of the units that represent the nodes of this layer in a networkx circuit.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def edges_to_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        """
+        Export the edges of this layer to host arrays in a single transfer.
+        This is the inverse of :meth:`create_layer_from_edges`.
+
+        :return: The index of the child layer, the position of the source in this layer, the position of the target
+            in its child layer and the normalized log weight of every edge.
+            The log weights are None for unweighted edges.
+        """
+        raise NotImplementedError
+
+    def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
+              progress_bar: Optional[tqdm.tqdm] = None,
+              layer_to_units: Optional[Dict[int, List[Unit]]] = None) -> List[Unit]:
+        """
+        Convert the layer to a networkx circuit.
+        The edges are exported in bulk via :meth:`edges_to_arrays` and added to the networkx circuit at once.
+
+        :param variables: The variables of the circuit.
+        :param result: The resulting circuit to write into
+        :param progress_bar: A progress bar to show the progress.
+        :param layer_to_units: A map from the id of already converted layers to their units.
+            Layers that are children of multiple layers are only converted once.
+
+        :return: The nodes of the networkx circuit.
+        """
+        if layer_to_units is None:
+            layer_to_units = dict()
+
+        if progress_bar:
+            variables_ = [variables[i] for i in self.variables]
+            progress_bar.set_postfix_str(f"Parsing {self.__class__.__name__} of variables {variables_}")
+
+        units = np.empty(self.number_of_nodes, dtype=object)
+        units[:] = [self.nx_unit_class(result) for _ in range(self.number_of_nodes)]
+
+        child_layer_nx = []
+        for child_layer in self.child_layers:
+            if id(child_layer) not in layer_to_units:
+                if isinstance(child_layer, InnerLayer):
+                    child_units = child_layer.to_nx(variables, result, progress_bar, layer_to_units)
+                else:
+                    child_units = child_layer.to_nx(variables, result, progress_bar)
+                layer_to_units[id(child_layer)] = child_units
+            child_layer_nx.append(layer_to_units[id(child_layer)])
+
+        # flatten the units of the child layers such that the targets can be gathered with a single index array
+        child_units = np.empty(sum(len(child_units) for child_units in child_layer_nx), dtype=object)
+        child_units[:] = [unit for child_units in child_layer_nx for unit in child_units]
+        child_offsets = np.cumsum([0] + [len(child_units) for child_units in child_layer_nx])
+
+        child_layer_indices, parent_positions, child_positions, log_weights = self.edges_to_arrays()
+        sources = units[parent_positions]
+        targets = child_units[child_offsets[child_layer_indices] + child_positions]
+
+        if log_weights is None:
+            result.add_edges_from(zip(sources, targets))
+        else:
+            result.add_weighted_edges_from(zip(sources, targets, log_weights.tolist()))
+
+        if progress_bar:
+            progress_bar.update(len(sources))
+
+        return units.tolist()
+
     def set_variables(self, value: jnp.array):
         raise AttributeError("Variables of inner layers are read-only.")
 
@@ -263,10 +382,55 @@ class InputLayer(Layer, ABC):
         result["variable"] = self._variables[0].item()
         return result
 
+    @classmethod
+    @abstractmethod
+    def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[Unit],
+                                                         child_layers: List[NXConverterLayer],
+                                                         progress_bar: bool = True) -> \
+            NXConverterLayer:
+        """
+        Create a layer from a list of nodes with the same type and scope.
+        """
+        raise NotImplementedError
+
     @property
     def variable(self):
         return self._variables[0].item()
 
+    def log_likelihood_of_soft_evidence_single(self, x: jax.Array, evidence: jax.Array) -> jax.Array:
+        return self.log_likelihood_of_nodes_single(x)
+
+    def take_nodes(self, indices: np.ndarray) -> Self:
+        """
+        Create a layer that contains only some of the nodes of this layer.
+
+        :param indices: The indices of the nodes to keep.
+        :return: The layer with the selected nodes in the order of the indices.
+        """
+        raise NotImplementedError
+
+    def sufficient_statistics_single(self, x: jax.Array) -> jax.Array:
+        """
+        Calculate the sufficient statistics of every node for a single sample.
+        The expectation of the statistics w.r.t. the posterior of the nodes is the input of :meth:`maximize`.
+
+        Layers without trainable parameters have no sufficient statistics.
+
+        :param x: The input vector.
+        :return: The sufficient statistics of shape (#nodes, #statistics).
+        """
+        return jnp.zeros((self.number_of_nodes, 0))
+
+    def maximize(self, statistics: jax.Array, pseudo_count: float = 0.) -> Self:
+        """
+        Calculate the closed form maximum likelihood parameters from expected sufficient statistics (M-step).
+
+        :param statistics: The expected sufficient statistics of shape (#nodes, #statistics).
+        :param pseudo_count: The pseudo count that is added to the statistics where applicable.
+        :return: The layer with the updated parameters.
+        """
+        return self
+
 
 class SumLayer(InnerLayer, ABC):
 
@@ -303,7 +467,70 @@ class SumLayer(InnerLayer, ABC):
     def number_of_nodes(self) -> int:
         return self.log_weights[0].shape[0]
 
+    @property
+    def nx_unit_class(self) -> Type[Unit]:
+        return SumUnit
+
+    def normalize_edge_log_weights(self, parent_positions: np.ndarray, log_weights: np.ndarray) -> np.ndarray:
+        """
+        Normalize the log weights of edges on the host such that the weights of every node sum up to 1.
+
+        :param parent_positions: The position of the source of every edge in this layer.
+        :param log_weights: The log weight of every edge.
+        :return: The normalized log weights.
+        """
+        log_weights = log_weights.astype(np.float64)
+        return log_weights - segment_logsumexp(log_weights, parent_positions, self.number_of_nodes)[parent_positions]
+
+    @abstractmethod
+    def log_weighted_sum_single(self, child_layer_log_values: List[jax.Array]) -> jax.Array:
+        """
+        Calculate the logarithm of the weighted sums of the values of the child nodes.
+
+        :param child_layer_log_values: The logarithm of a value (e.g. likelihood or probability) of every node for
+            each child layer.
+        :return: The logarithm of the weighted sum for every node in this layer.
+        """
+        raise NotImplementedError
+
+    def log_probability_of_nodes_single(self, event: jax.Array) -> jax.Array:
+        return self.log_weighted_sum_single([child_layer.log_probability_of_nodes_single(event)
+                                             for child_layer in self.child_layers])
+
+    def log_likelihood_of_soft_evidence_single(self, x: jax.Array, evidence: jax.Array) -> jax.Array:
+        return self.log_weighted_sum_single([child_layer.log_likelihood_of_soft_evidence_single(x, evidence)
+                                             for child_layer in self.child_layers])
+
+    @abstractmethod
+    def edge_flows(self, log_weight_gradients: Union[jax.Array, List[BCOO]],
+                   node_flows: jax.Array) -> Union[jax.Array, List[jax.Array]]:
+        """
+        Calculate the expected number of times every edge is used (the flows of the edges) from the gradient of the
+        log-likelihood w.r.t. the log weights.
+
+        The gradient w.r.t. the unnormalized log weight of an edge is the flow of the edge minus the normalized weight
+        of the edge times the flow of its source node.
 
+        :param log_weight_gradients: The gradient of the log-likelihood w.r.t. the log weights.
+        :param node_flows: The flows of the nodes of this layer.
+        :return: The flows of the edges in the layout of the log weights.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def maximize_log_weights(self, flows: Union[jax.Array, List[jax.Array]], pseudo_count: float = 0.) -> Self:
+        """
+        Set the weights to the normalized flows of the edges (M-step).
+        Nodes that are not used at all keep their weights.
+
+        :param flows: The flows of the edges as returned by :meth:`edge_flows`.
+        :param pseudo_count: The pseudo count that is added to the flow of every edge.
+        :return: The layer with the updated weights.
+        """
+        raise NotImplementedError
+
+
+@register_layer
 class SparseSumLayer(SumLayer):
 
     log_weights: List[BCOO]
@@ -342,12 +569,15 @@ class SparseSumLayer(SumLayer):
         return result
 
     def log_likelihood_of_nodes_single(self, x: jax.Array) -> jax.Array:
-        result = jnp.zeros(self.number_of_nodes, dtype=jnp.float32)
+        return self.log_weighted_sum_single([child_layer.log_likelihood_of_nodes_single(x)
+                                             for child_layer in self.child_layers])
 
-        for log_weights, child_layer in self.log_weighted_child_layers:
-            # get the log likelihoods of the child nodes
-            child_layer_log_likelihood = child_layer.log_likelihood_of_nodes_single(x)
+    def log_weighted_sum_single(self, child_layer_log_likelihoods: List[jax.Array]) -> jax.Array:
+        # accumulate in the precision of the weights and the child log likelihoods
+        result = jnp.zeros(self.number_of_nodes, dtype=jnp.result_type(*[lw.dtype for lw in self.log_weights],
+                                                                       *child_layer_log_likelihoods))
 
+        for log_weights, child_layer_log_likelihood in zip(self.log_weights, child_layer_log_likelihoods):
             # weight the log likelihood of the child nodes by the weight for each node of this layer
             cloned_log_weights = copy_bcoo(log_weights)  # clone the log_weights
 
@@ -359,6 +589,23 @@ class SparseSumLayer(SumLayer):
 
         return jnp.log(result) - self.log_normalization_constants
 
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        edge_key, child_key = jax.random.split(key)
+
+        # choose one of the outgoing edges of the node, the edges of other nodes are impossible
+        log_weights = jnp.concatenate([jnp.where(lw.indices[:, 0] == node, lw.data, -jnp.inf)
+                                       for lw in self.log_weights])
+        edge = jax.random.categorical(edge_key, log_weights)
+        child_position = jnp.concatenate([lw.indices[:, 1] for lw in self.log_weights])[edge]
+        child_layer_index = jnp.searchsorted(np.cumsum([lw.nse for lw in self.log_weights]), edge, side="right")
+
+        # sample every child layer and select the sample of the child layer of the chosen edge
+        samples = [child_layer.sample_from_node_single(child_layer_key,
+                                                       jnp.minimum(child_position, child_layer.number_of_nodes - 1))
+                   for child_layer_key, child_layer in zip(jax.random.split(child_key, len(self.child_layers)),
+                                                           self.child_layers)]
+        return jnp.stack(samples)[child_layer_index]
+
     def __deepcopy__(self):
         child_layers = [child_layer.__deepcopy__() for child_layer in self.child_layers]
         log_weights = [copy_bcoo(log_weight) for log_weight in self.log_weights]
@@ -366,97 +613,122 @@ class SparseSumLayer(SumLayer):
 
     def to_json(self) -> Dict[str, Any]:
         result = super().to_json()
-        result["log_weights"] = [(lw.data.tolist(), lw.indices.tolist(), lw.shape) for lw in self.log_weights]
+        result["log_weights"] = [(array_to_json(lw.data), array_to_json(lw.indices), lw.shape)
+                                 for lw in self.log_weights]
         return result
 
     @classmethod
     def _from_json(cls, data: Dict[str, Any]) -> Self:
         child_layer = [Layer.from_json(child_layer) for child_layer in data["child_layers"]]
-        log_weights = [BCOO((jnp.array(lw[0]), jnp.array(lw[1])), shape=lw[2],
+        log_weights = [BCOO((array_from_json(lw[0]), array_from_json(lw[1])), shape=lw[2],
                             indices_sorted=True, unique_indices=True) for lw in data["log_weights"]]
         return cls(child_layer, log_weights)
 
     @classmethod
-    def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[SumUnit],
-                                                         child_layers: List[NXConverterLayer],
-                                                         progress_bar: bool = True) -> \
-            NXConverterLayer:
-
-        result_hash_remap = {hash(node): index for index, node in enumerate(nodes)}
-        variables = jnp.array(
-            [nodes[0].probabilistic_circuit.variables.index(variable) for variable in nodes[0].variables])
-
-        number_of_nodes = len(nodes)
-
-        # filter the child layers to only contain layers with the same scope as this one
-        filtered_child_layers = [child_layer for child_layer in child_layers if (child_layer.layer.variables ==
-                                                                                 variables).all()]
-        log_weights = []
-
-        # for every possible child layer
-        for child_layer in filtered_child_layers:
-
-            # initialize indices and values for sparse weight matrix
-            indices = []
-            values = []
-
-            # gather indices and log log_weights
-            for index, node in enumerate(tqdm.tqdm(nodes, desc="Calculating log_weights for sum node")
-                                         if progress_bar else nodes):
-                for weight, subcircuit in node.log_weighted_subcircuits:
-                    if hash(subcircuit) in child_layer.hash_remap:
-                        indices.append((index, child_layer.hash_remap[hash(subcircuit)]))
-                        values.append((weight))
-
-            # assemble sparse log weight matrix
-            log_weights.append(BCOO((jnp.array(values), jnp.array(indices)),
-                                    shape=(number_of_nodes,
-                                           child_layer.layer.number_of_nodes)))
-
-        sum_layer = cls([cl.layer for cl in filtered_child_layers], log_weights)
-        return NXConverterLayer(sum_layer, nodes, result_hash_remap)
-
-    def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
-              progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
-
-        variables_ = [variables[i] for i in self.variables]
+    def create_layer_from_edges(cls, child_layers: List[Layer], number_of_nodes: int,
+                                parent_positions: np.ndarray, child_layer_indices: np.ndarray,
+                                child_positions: np.ndarray, log_weights: np.ndarray) -> Self:
+
+        # sort the edges by child layer, row and column such that every child layer is a contiguous, sorted block
+        order = np.lexsort((child_positions, parent_positions, child_layer_indices))
+        indices = np.stack((parent_positions[order], child_positions[order]), axis=1)
+        log_weights = log_weights[order]
+        boundaries = np.searchsorted(child_layer_indices[order], np.arange(len(child_layers) + 1))
+
+        # assemble a sparse log weight matrix for every child layer
+        sparse_log_weights = [BCOO((jnp.asarray(log_weights[start:end]), jnp.asarray(indices[start:end])),
+                                   shape=(number_of_nodes, child_layer.number_of_nodes),
+                                   indices_sorted=True, unique_indices=True)
+                              for start, end, child_layer in zip(boundaries[:-1], boundaries[1:], child_layers)]
+
+        return cls(child_layers, sparse_log_weights)
+
+    def edge_flows(self, log_weight_gradients: List[BCOO], node_flows: jax.Array) -> List[jax.Array]:
+        log_normalization_constants = self.log_normalization_constants
+        return [gradient.data + jnp.exp(log_weights.data - log_normalization_constants[log_weights.indices[:, 0]])
+                * node_flows[log_weights.indices[:, 0]]
+                for log_weights, gradient in zip(self.log_weights, log_weight_gradients)]
+
+    def maximize_log_weights(self, flows: List[jax.Array], pseudo_count: float = 0.) -> Self:
+        flows = [jnp.maximum(flow, 0.) + pseudo_count for flow in flows]
+        total = jnp.zeros(self.number_of_nodes, dtype=flows[0].dtype)
+        for flow, log_weights in zip(flows, self.log_weights):
+            total = total.at[log_weights.indices[:, 0]].add(flow)
+
+        log_weights = [BCOO((jnp.where(total[lw.indices[:, 0]] > 0, jnp.log(flow), lw.data), lw.indices),
+                            shape=lw.shape, indices_sorted=lw.indices_sorted, unique_indices=lw.unique_indices)
+                       for flow, lw in zip(flows, self.log_weights)]
+        return eqx.tree_at(lambda layer: layer.log_weights, self, log_weights)
+
+    def edges_to_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        data, indices = jax.device_get(([lw.data for lw in self.log_weights], [lw.indices for lw in self.log_weights]))
+        child_layer_indices = np.repeat(np.arange(len(self.log_weights)), [len(d) for d in data])
+        indices = np.concatenate(indices).reshape(-1, 2).astype(np.int64)
+        log_weights = self.normalize_edge_log_weights(indices[:, 0], np.concatenate(data))
+        return child_layer_indices, indices[:, 0], indices[:, 1], log_weights
 
-        if progress_bar:
-            progress_bar.set_postfix_str(f"Parsing Sum Layer for variables {variables_}")
-
-        units = [SumUnit(result) for _ in range(self.number_of_nodes)]
-
-        child_layer_nx = [cl.to_nx(variables, result, progress_bar) for cl in self.child_layers]
+class DenseSumLayer(SumLayer):
+    """
+    A sum layer where every node is connected to every node of every child layer.
 
-        for log_weights, child_layer in zip(self.log_weights, child_layer_nx):
+    The weights of all child layers are fused into a single dense matrix, such that the evaluation of the layer
+    consists of one matrix product.
+    """
 
-            # extract the log_weights for the child layer
-            for ((row, col), log_weight) in zip(log_weights.indices, log_weights.data):
-                units[row].add_subcircuit(child_layer[col], log_weight.item(), False)
-                if progress_bar:
-                    progress_bar.update()
+    log_weights: jax.Array
+    """
+    The unnormalized log weights of shape (#nodes, #nodes of all child layers).
+    The columns are the nodes of the child layers in the order of the child layers.
+    """
 
-        [unit.normalize() for unit in units]
+    child_offsets: Tuple[int, ...] = eqx.field(static=True)
+    """
+    The column in `log_weights` where the nodes of each child layer start.
+    The last entry is the total number of columns.
+    """
 
-        return units
+    child_layers: Union[List[[ProductLayer]], List[InputLayer]]
 
-class DenseSumLayer(SumLayer):
+    def __init__(self, child_layers: List[Layer], log_weights: Union[jax.Array, List[jax.Array]]):
+        """
+        :param child_layers: The child layers.
+        :param log_weights: Either the fused log weight matrix or a list of log weight matrices, one for each child
+            layer, that will be fused.
+        """
+        if isinstance(log_weights, (list, tuple)):
+            log_weights = jnp.concatenate(log_weights, axis=1)
+        super().__init__(child_layers, log_weights)
+        self.child_offsets = tuple(np.cumsum([0] + [child_layer.number_of_nodes
+                                                    for child_layer in child_layers]).tolist())
 
+    @classmethod
+    def create_layer_from_edges(cls, child_layers: List[Layer], number_of_nodes: int,
+                                parent_positions: np.ndarray, child_layer_indices: np.ndarray,
+                                child_positions: np.ndarray, log_weights: np.ndarray) -> Self:
+        raise NotImplementedError
 
+    def validate(self):
+        assert self.log_weights.shape == (self.number_of_nodes, self.child_offsets[-1]), \
+            "The shape of the log weights must match the number of nodes of this layer and of the child layers."
+        for start, end, child_layer in zip(self.child_offsets[:-1], self.child_offsets[1:], self.child_layers):
+            assert end - start == child_layer.number_of_nodes, "The number of nodes must match the number of log_weights."
+            assert (child_layer.variables == self.variables).all(), "The variables must match."
 
-    log_weights: List[jnp.array]
-    child_layers: Union[List[[ProductLayer]], List[InputLayer]]
+    @property
+    def log_weighted_child_layers(self) -> Iterator[Tuple[jax.Array, Layer]]:
+        """
+        :returns: Yields the blocks of the log weights and the child layers zipped together.
+        """
+        for start, end, child_layer in zip(self.child_offsets[:-1], self.child_offsets[1:], self.child_layers):
+            yield self.log_weights[:, start:end], child_layer
 
-    @classmethod
-    def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[Unit], child_layers: List[NXConverterLayer],
-                                                         progress_bar: bool = True) -> \
-            NXConverterLayer:
-        raise NotImplementedError
+    @property
+    def number_of_nodes(self) -> int:
+        return self.log_weights.shape[0]
 
     @property
     def number_of_components(self) -> int:
-        return sum([cl.number_of_components for cl in self.child_layers]) + sum([math.prod(lw.shape)
-                                                                                 for lw in self.log_weights])
+        return sum([cl.number_of_components for cl in self.child_layers]) + math.prod(self.log_weights.shape)
 
     @classmethod
     def nx_classes(cls) -> Tuple[Type, ...]:
@@ -467,77 +739,97 @@ class DenseSumLayer(SumLayer):
         """
         :return: The concatenated log_weights of the child layers for each node.
         """
-        return jnp.concatenate(self.log_weights, axis=1)
+        return self.log_weights
 
     @property
     def log_normalization_constants(self) -> jax.Array:
-        return logsumexp(self.concatenated_log_weights, 1)
+        return logsumexp(self.log_weights, 1)
 
     @property
     def normalized_weights(self):
         """
         :return: The normalized log_weights of the child layers for each node.
         """
-        return jnp.exp(self.concatenated_log_weights - self.log_normalization_constants.reshape(-1, 1))
+        return jax.nn.softmax(self.log_weights, axis=1)
 
     def log_likelihood_of_nodes_single(self, x: jax.Array) -> jax.Array:
-        result = jnp.zeros(self.number_of_nodes, dtype=jnp.float32)
-
-        for log_weights, child_layer in self.log_weighted_child_layers:
-            # get the log likelihoods of the child nodes
-            child_layer_log_likelihood = child_layer.log_likelihood_of_nodes_single(x)
-
-            # weight the log likelihood of the child nodes by the weight for each node of this layer
-            log_likelihood = log_weights + child_layer_log_likelihood
-            log_likelihood = jnp.exp(logsumexp(log_likelihood, 1))
-            result += log_likelihood
-
-        return jnp.log(result) - self.log_normalization_constants
+        return self.log_weighted_sum_single([child_layer.log_likelihood_of_nodes_single(x)
+                                             for child_layer in self.child_layers])
+
+    def log_weighted_sum_single(self, child_layer_log_likelihoods: List[jax.Array]) -> jax.Array:
+        child_layer_log_likelihood = jnp.concatenate(child_layer_log_likelihoods)
+
+        # shift the log likelihoods such that the exponentiation does not underflow (log-sum-exp trick)
+        maximum = jax.lax.stop_gradient(jnp.max(child_layer_log_likelihood))
+        maximum = jnp.where(jnp.isfinite(maximum), maximum, 0.)
+        likelihood = jnp.dot(self.normalized_weights, jnp.exp(child_layer_log_likelihood - maximum))
+        return jnp.log(likelihood) + maximum
+
+    def log_likelihood_of_nodes(self, x: jax.Array) -> jax.Array:
+        # calculate the normalized weights once for the entire batch
+        normalized_weights = self.normalized_weights
+        child_layer_log_likelihood = jnp.concatenate([child_layer.log_likelihood_of_nodes(x)
+                                                      for child_layer in self.child_layers], axis=1)
+        maximum = jax.lax.stop_gradient(jnp.max(child_layer_log_likelihood, axis=1, keepdims=True))
+        maximum = jnp.where(jnp.isfinite(maximum), maximum, 0.)
+        likelihood = jnp.dot(jnp.exp(child_layer_log_likelihood - maximum), normalized_weights.T)
+        return jnp.log(likelihood) + maximum
+
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        edge_key, child_key = jax.random.split(key)
+
+        # choose a column of the fused weight matrix and locate it in the child layers
+        column = jax.random.categorical(edge_key, self.log_weights[node])
+        child_layer_index = jnp.searchsorted(np.asarray(self.child_offsets[1:]), column, side="right")
+        child_position = column - jnp.asarray(self.child_offsets)[child_layer_index]
+
+        samples = [child_layer.sample_from_node_single(child_layer_key,
+                                                       jnp.minimum(child_position, child_layer.number_of_nodes - 1))
+                   for child_layer_key, child_layer in zip(jax.random.split(child_key, len(self.child_layers)),
+                                                           self.child_layers)]
+        return jnp.stack(samples)[child_layer_index]
+
+    def edge_flows(self, log_weight_gradients: jax.Array, node_flows: jax.Array) -> jax.Array:
+        return log_weight_gradients + self.normalized_weights * node_flows[:, None]
+
+    def maximize_log_weights(self, flows: jax.Array, pseudo_count: float = 0.) -> Self:
+        flows = jnp.maximum(flows, 0.) + pseudo_count
+        used = jnp.sum(flows, axis=1, keepdims=True) > 0
+        return eqx.tree_at(lambda layer: layer.log_weights, self, jnp.where(used, jnp.log(flows), self.log_weights))
 
     def __deepcopy__(self):
         child_layers = [child_layer.__deepcopy__() for child_layer in self.child_layers]
-        log_weights = [jnp.copy(log_weight) for log_weight in self.log_weights]
-        return self.__class__(child_layers, log_weights)
+        return self.__class__(child_layers, jnp.copy(self.log_weights))
 
     def to_json(self) -> Dict[str, Any]:
         result = super().to_json()
-        result["log_weights"] = [lw.tolist() for lw in self.log_weights]
+        result["log_weights"] = array_to_json(self.log_weights)
         return result
 
     @classmethod
     def _from_json(cls, data: Dict[str, Any]) -> Self:
         child_layer = [Layer.from_json(child_layer) for child_layer in data["child_layers"]]
-        log_weights = [jnp.asarray(lw) for lw in data["log_weights"]]
+        log_weights = data["log_weights"]
+
+        # support the legacy format where every child layer has its own weight matrix
+        if (isinstance(log_weights, list) and len(log_weights) > 0 and len(log_weights[0]) > 0
+                and isinstance(log_weights[0][0], list)):
+            log_weights = [jnp.asarray(lw) for lw in log_weights]
+        else:
+            log_weights = array_from_json(log_weights)
         return cls(child_layer, log_weights)
 
-
-    def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
-              progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
-
-        variables_ = [variables[i] for i in self.variables]
-
-        if progress_bar:
-            progress_bar.set_postfix_str(f"Parsing Dense Sum Layer for variables {variables_}")
-
-        units = [SumUnit(result) for _ in range(self.number_of_nodes)]
-
-        child_layer_nx = [cl.to_nx(variables, result, progress_bar) for cl in self.child_layers]
-
-        for log_weights, child_layer in zip(self.log_weights, child_layer_nx):
-            # extract the log_weights for the child layer
-            for row in range(log_weights.shape[0]):
-                for col in range(log_weights.shape[1]):
-                    units[row].add_subcircuit(child_layer[col], jnp.exp(log_weights[row, col]).item(), False)
-
-                    if progress_bar:
-                        progress_bar.update()
-
-        [unit.normalize() for unit in units]
-
-        return units
-
+    def edges_to_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        log_weights = np.asarray(self.log_weights)
+        parent_positions, columns = np.indices(log_weights.shape).reshape(2, -1)
+        child_offsets = np.asarray(self.child_offsets)
+        child_layer_indices = np.searchsorted(child_offsets, columns, side="right") - 1
+        child_positions = columns - child_offsets[child_layer_indices]
+        log_weights = self.normalize_edge_log_weights(parent_positions, log_weights.reshape(-1))
+        return child_layer_indices, parent_positions, child_positions, log_weights
 
 
+@register_layer
 class ProductLayer(InnerLayer):
     """
     A layer that represents the product of multiple other units.
@@ -598,12 +890,31 @@ class ProductLayer(InnerLayer):
         return self._variables
 
     def log_likelihood_of_nodes_single(self, x: jax.Array) -> jax.Array:
-        result = jnp.zeros(self.number_of_nodes, dtype=jnp.float32)
+        # calculate the log likelihood over the columns of the child layers
+        # x only contains the variables of this layer, hence the child variables are located in them
+        return self.log_product_single([layer.log_likelihood_of_nodes_single(
+            x[jnp.searchsorted(self.variables, layer.variables)]) for layer in self.child_layers])
+
+    def log_probability_of_nodes_single(self, event: jax.Array) -> jax.Array:
+        return self.log_product_single([layer.log_probability_of_nodes_single(
+            event[jnp.searchsorted(self.variables, layer.variables)]) for layer in self.child_layers])
+
+    def log_likelihood_of_soft_evidence_single(self, x: jax.Array, evidence: jax.Array) -> jax.Array:
+        # the evidence is indexed by the variables of the circuit, hence it is passed on as it is
+        return self.log_product_single([layer.log_likelihood_of_soft_evidence_single(
+            x[jnp.searchsorted(self.variables, layer.variables)], evidence) for layer in self.child_layers])
 
-        for edges, layer in zip(self.edges, self.child_layers):
-            # calculate the log likelihood over the columns of the child layer
-            ll = layer.log_likelihood_of_nodes_single(x[layer.variables])  # shape: #child_nodes
+    def log_product_single(self, child_layer_log_likelihoods: List[jax.Array]) -> jax.Array:
+        """
+        Calculate the logarithm of the products of the values of the child nodes.
+
+        :param child_layer_log_likelihoods: The logarithm of a value (e.g. likelihood or probability) of every node
+            for each child layer.
+        :return: The logarithm of the product for every node in this layer.
+        """
+        result = jnp.zeros(self.number_of_nodes, dtype=jnp.result_type(*child_layer_log_likelihoods))
 
+        for edges, ll in zip(self.edges, child_layer_log_likelihoods):
             # gather the ll at the indices of the nodes that are required for the edges
             ll = ll[edges.data]  # shape: #len(edges.values())
 
@@ -612,6 +923,21 @@ class ProductLayer(InnerLayer):
 
         return result
 
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        child_positions = self.edges.todense()
+        has_edge = BCOO((jnp.ones(self.edges.nse, dtype=int), self.edges.indices), shape=self.edges.shape).todense() > 0
+
+        samples = [child_layer.sample_from_node_single(child_layer_key, child_positions[index, node])
+                   for index, (child_layer_key, child_layer) in
+                   enumerate(zip(jax.random.split(key, len(self.child_layers)), self.child_layers))]
+
+        # write the samples of the child layers that the node is connected to into the columns of their variables
+        result = jnp.zeros(len(self.variables), dtype=jnp.result_type(*samples))
+        for index, (sample, child_layer) in enumerate(zip(samples, self.child_layers)):
+            columns = jnp.searchsorted(self.variables, child_layer.variables)
+            result = result.at[columns].set(jnp.where(has_edge[index, node], sample, result[columns]))
+        return result
+
     def __deepcopy__(self):
         child_layers = [child_layer.__deepcopy__() for child_layer in self.child_layers]
         edges = copy_bcoo(self.edges)
@@ -619,73 +945,36 @@ class ProductLayer(InnerLayer):
 
     def to_json(self) -> Dict[str, Any]:
         result = super().to_json()
-        result["edges"] = (self.edges.data.tolist(), self.edges.indices.tolist(), self.edges.shape)
+        result["edges"] = (array_to_json(self.edges.data), array_to_json(self.edges.indices), self.edges.shape)
         return result
 
     @classmethod
     def _from_json(cls, data: Dict[str, Any]) -> Self:
         child_layer = [Layer.from_json(child_layer) for child_layer in data["child_layers"]]
-        edges = BCOO((jnp.array(data["edges"][0]), jnp.array(data["edges"][1])), shape=data["edges"][2],
+        edges = BCOO((array_from_json(data["edges"][0]), array_from_json(data["edges"][1])), shape=data["edges"][2],
                      indices_sorted=True, unique_indices=True)
         return cls(child_layer, edges)
 
     @classmethod
-    def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[Unit],
-                                                         child_layers: List[NXConverterLayer],
-                                                         progress_bar: bool = True) -> \
-            NXConverterLayer:
-
-        hash_remap = {hash(node): index for index, node in enumerate(nodes)}
-        number_of_nodes = len(nodes)
-
-        edge_indices = []
-        edge_values = []
-        if progress_bar:
-            progress_bar = tqdm.tqdm(total=number_of_nodes, desc="Assembling Product Layer")
-        # for every node in the nodes for this layer
-        for node_index, node in enumerate(nodes):
-
-            # for every child layer
-            for child_layer_index, child_layer in enumerate(child_layers):
-                cl_variables = SortedSet(
-                    [node.probabilistic_circuit.variables[index] for index in child_layer.layer.variables])
-
-                # for every subcircuit
-                for subcircuit_index, subcircuit in enumerate(node.subcircuits):
-                    # if the scopes are compatible
-                    if cl_variables == subcircuit.variables:
-                        # add the edge
-                        edge_indices.append([child_layer_index, node_index])
-                        edge_values.append(child_layer.hash_remap[hash(subcircuit)])
-            if progress_bar:
-                progress_bar.update(1)
-
-        # assemble sparse edge tensor
-        edges = (BCOO((jnp.array(edge_values), jnp.array(edge_indices)), shape=(len(child_layers), number_of_nodes)).
-                 sort_indices().sum_duplicates(remove_zeros=False))
-        layer = cls([cl.layer for cl in child_layers], edges)
-        return NXConverterLayer(layer, nodes, hash_remap)
+    def create_layer_from_edges(cls, child_layers: List[Layer], number_of_nodes: int,
+                                parent_positions: np.ndarray, child_layer_indices: np.ndarray,
+                                child_positions: np.ndarray, log_weights: np.ndarray) -> Self:
 
-    def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
-              progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
-
-        if result is None:
-            result = NXProbabilisticCircuit()
-
-        variables_ = [variables[i] for i in self.variables]
-        if progress_bar:
-            progress_bar.set_postfix_str(f"Parsing Product Layer of variables {variables_}")
+        # assemble sparse edge tensor with sorted indices
+        order = np.lexsort((parent_positions, child_layer_indices))
+        indices = np.stack((child_layer_indices[order], parent_positions[order]), axis=1)
+        edges = BCOO((jnp.asarray(child_positions[order]), jnp.asarray(indices)),
+                     shape=(len(child_layers), number_of_nodes), indices_sorted=True, unique_indices=True)
+        return cls(child_layers, edges)
 
-        units = [ProductUnit(result) for _ in range(self.number_of_nodes)]
-
-        child_layer_nx = [cl.to_nx(variables, result, progress_bar) for cl in self.child_layers]
-        for (row, col), data in zip(self.edges.indices, self.edges.data):
-            units[col].add_subcircuit(child_layer_nx[row][data], mount=False)
-
-            if progress_bar:
-                progress_bar.update()
+    @property
+    def nx_unit_class(self) -> Type[Unit]:
+        return ProductUnit
 
-        return units
+    def edges_to_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]:
+        indices, child_positions = jax.device_get((self.edges.indices, self.edges.data))
+        indices = indices.reshape(-1, 2).astype(np.int64)
+        return indices[:, 0], indices[:, 1], child_positions.astype(np.int64), None
 
 
 @dataclass
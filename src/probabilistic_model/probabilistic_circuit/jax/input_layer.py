@@ -5,13 +5,15 @@ from typing import List, Dict, Any
 
 import equinox as eqx
 import jax
+import numpy as np
 import tqdm
 from jax import numpy as jnp
 from random_events.variable import Variable
 from sortedcontainers import SortedSet
 from typing_extensions import Tuple, Type, Self, Optional
 
-from .inner_layer import InputLayer, NXConverterLayer
+from .checkpoint import array_to_json, array_from_json
+from .inner_layer import InputLayer, NXConverterLayer, register_layer
 from ..nx.probabilistic_circuit import Unit, ProbabilisticCircuit as NXProbabilisticCircuit, UnivariateContinuousLeaf
 from ...distributions import DiracDeltaDistribution
 
@@ -72,13 +74,17 @@ class ContinuousLayerWithFiniteSupport(ContinuousLayer, ABC):
 
     def to_json(self) -> Dict[str, Any]:
         result = super().to_json()
-        result["interval"] = self.interval.tolist()
+        result["interval"] = array_to_json(self.interval)
         return result
 
     def __deepcopy__(self):
         return self.__class__(self.variables[0].item(), self.interval.copy())
 
+    def take_nodes(self, indices: np.ndarray) -> Self:
+        return self.__class__(self.variable, self.interval[indices])
 
+
+@register_layer
 class DiracDeltaLayer(ContinuousLayer):
     """
     A layer that represents Dirac delta distributions over a single variable.
@@ -113,6 +119,12 @@ class DiracDeltaLayer(ContinuousLayer):
     def log_likelihood_of_nodes_single(self, x: jax.Array) -> jax.Array:
         return jnp.where(x == self.location, jnp.log(self.density_cap), -jnp.inf)
 
+    def log_probability_of_nodes_single(self, event: jax.Array) -> jax.Array:
+        return jnp.where((event[0, 0] <= self.location) & (self.location <= event[0, 1]), 0., -jnp.inf)
+
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        return jnp.asarray(self.location)[node][None]
+
     @classmethod
     def nx_classes(cls) -> Tuple[Type, ...]:
         return DiracDeltaDistribution,
@@ -130,13 +142,16 @@ class DiracDeltaLayer(ContinuousLayer):
 
     def to_json(self) -> Dict[str, Any]:
         result = super().to_json()
-        result["location"] = self.location.tolist()
-        result["density_cap"] = self.density_cap.tolist()
+        result["location"] = array_to_json(self.location)
+        result["density_cap"] = array_to_json(self.density_cap)
         return result
 
     @classmethod
     def _from_json(cls, data: Dict[str, Any]) -> Self:
-        return cls(data["variable"], jnp.array(data["location"]), jnp.array(data["density_cap"]))
+        return cls(data["variable"], array_from_json(data["location"]), array_from_json(data["density_cap"]))
+
+    def take_nodes(self, indices: np.ndarray) -> Self:
+        return self.__class__(self.variable, self.location[indices], self.density_cap[indices])
 
     def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
               progress_bar: Optional[tqdm.tqdm] = None) -> List[
@@ -146,7 +161,11 @@ class DiracDeltaLayer(ContinuousLayer):
         if progress_bar:
             progress_bar.set_postfix_str(f"Creating Dirac Delta distributions for variable {variable.name}")
 
-        nodes = [UnivariateContinuousLeaf(DiracDeltaDistribution(variable, location.item(), density_cap.item()), result)
-                 for location, density_cap in zip(self.location, self.density_cap)]
-        progress_bar.update(self.number_of_nodes)
+        locations, density_caps = jax.device_get((self.location, self.density_cap))
+        nodes = [UnivariateContinuousLeaf(DiracDeltaDistribution(variable, location, density_cap), result)
+                 for location, density_cap in zip(locations.tolist(), density_caps.tolist())]
+
+        if progress_bar:
+            progress_bar.update(self.number_of_nodes)
+
         return nodes
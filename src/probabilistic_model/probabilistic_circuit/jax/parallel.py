@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import equinox as eqx
+import jax
+import jax.numpy as jnp
+import numpy as np
+from jax.sharding import Mesh, NamedSharding, PartitionSpec
+from typing_extensions import Optional, Sequence, Tuple
+
+from .inner_layer import Layer
+
+DATA_AXIS = "data"
+"""
+The name of the mesh axis that the samples are sharded along.
+"""
+
+
+def data_parallel_mesh(devices: Optional[Sequence[jax.Device]] = None) -> Mesh:
+    """
+    Create a one dimensional mesh for data parallelism.
+
+    On CPU, multiple devices can be simulated by setting the environment variable
+    `XLA_FLAGS=--xla_force_host_platform_device_count=N` before jax is imported.
+
+    :param devices: The devices to use. If `None`, all available devices are used.
+    :return: The mesh with the axis :data:`DATA_AXIS`.
+    """
+    return Mesh(np.asarray(jax.devices() if devices is None else devices), (DATA_AXIS,))
+
+
+def batch_sharding(mesh: Mesh, batch_axis: int = 0) -> NamedSharding:
+    """
+    :param mesh: The mesh.
+    :param batch_axis: The axis of the arrays that enumerates the samples.
+    :return: The sharding that splits arrays along the batch axis across all devices of the mesh.
+    """
+    return NamedSharding(mesh, PartitionSpec(*([None] * batch_axis), DATA_AXIS))
+
+
+def replicated_sharding(mesh: Mesh) -> NamedSharding:
+    """
+    :param mesh: The mesh.
+    :return: The sharding that places a full copy of arrays on every device of the mesh.
+    """
+    return NamedSharding(mesh, PartitionSpec())
+
+
+def round_up_to_multiple(size: int, multiple: int) -> int:
+    """
+    :return: The smallest multiple of `multiple` that is at least `size`.
+    """
+    return -(-size // multiple) * multiple
+
+
+def pad_to_multiple(x: np.ndarray, multiple: int) -> Tuple[np.ndarray, int]:
+    """
+    Pad an array along the first axis with repetitions of its first row, such that its length is a multiple.
+
+    :param x: The array.
+    :param multiple: The multiple, e.g. the number of devices.
+    :return: The padded array and the original length.
+    """
+    length = len(x)
+    padding = round_up_to_multiple(length, multiple) - length
+    if padding == 0:
+        return x, length
+    return np.concatenate((x, np.repeat(x[:1], padding, axis=0))), length
+
+
+def log_likelihood_of_nodes(layer: Layer, x: np.ndarray, mesh: Optional[Mesh] = None) -> jax.Array:
+    """
+    Calculate the log-likelihood of all nodes of a layer with the samples sharded across the devices of a mesh and
+    the parameters replicated on every device.
+
+    :param layer: The layer.
+    :param x: The data.
+    :param mesh: The mesh. If `None`, a mesh over all available devices is used.
+    :return: The log-likelihoods of shape (#samples, #nodes).
+    """
+    mesh = mesh or data_parallel_mesh()
+    params, static = eqx.partition(layer, eqx.is_inexact_array)
+    params, treedef = jax.tree_util.tree_flatten(params)
+    params = jax.device_put(params, replicated_sharding(mesh))
+
+    x, length = pad_to_multiple(np.asarray(x), mesh.size)
+    x = jax.device_put(x, batch_sharding(mesh))
+
+    # close over the static structure such that the jit cache never compares it
+    evaluate = jax.jit(lambda p, data: eqx.combine(jax.tree_util.tree_unflatten(treedef, p), static)
+                       .log_likelihood_of_nodes(data))
+    return evaluate(params, x)[:length]
+
+
+def sample_from_node(layer: Layer, key: jax.Array, amount: int, node: int = 0,
+                     mesh: Optional[Mesh] = None) -> jax.Array:
+    """
+    Draw samples from a node of a layer with the random keys of the samples sharded across the devices of a mesh and
+    the parameters replicated on every device.
+
+    :param layer: The layer.
+    :param key: The random key.
+    :param amount: The number of samples.
+    :param node: The index of the node in the layer.
+    :param mesh: The mesh. If `None`, a mesh over all available devices is used.
+    :return: The samples of shape (#samples, #variables of the layer).
+    """
+    mesh = mesh or data_parallel_mesh()
+    params, static = eqx.partition(layer, eqx.is_inexact_array)
+    params, treedef = jax.tree_util.tree_flatten(params)
+    params = jax.device_put(params, replicated_sharding(mesh))
+
+    keys = jax.random.split(key, round_up_to_multiple(amount, mesh.size))
+    keys = jax.device_put(keys, batch_sharding(mesh))
+
+    # close over the static structure such that the jit cache never compares it
+    def sample(p, sample_keys):
+        model = eqx.combine(jax.tree_util.tree_unflatten(treedef, p), static)
+        return jax.vmap(lambda sample_key: model.sample_from_node_single(sample_key, jnp.asarray(node)))(sample_keys)
+
+    return jax.jit(sample)(params, keys)[:amount]
@@ -0,0 +1,202 @@
+from typing import List, Dict, Any, Optional
+
+import equinox as eqx
+import jax
+import numpy as np
+import tqdm
+from jax import numpy as jnp
+from random_events.variable import Variable
+from sortedcontainers import SortedSet
+from typing_extensions import Type, Tuple, Self
+
+from .checkpoint import array_to_json, array_from_json
+from .inner_layer import NXConverterLayer, register_layer
+from .input_layer import ContinuousLayer
+from ..nx.probabilistic_circuit import Unit, ProbabilisticCircuit as NXProbabilisticCircuit, UnivariateContinuousLeaf
+from ...distributions import PiecewiseUniformDistribution
+
+
+@register_layer
+class PiecewiseUniformLayer(ContinuousLayer):
+    """
+    A layer that represents piecewise uniform distributions over a single variable.
+
+    Nodes with fewer bins than others are padded with bins of zero width and zero mass at their upper end.
+    """
+
+    breakpoints: jax.Array = eqx.field(static=True)
+    """
+    The sorted breakpoints of the bins of every node of shape (#nodes, #bins + 1).
+    """
+
+    log_probabilities: jax.Array
+    """
+    The logarithm of the probability mass of every bin of shape (#nodes, #bins).
+    """
+
+    def __init__(self, variable: int, breakpoints: jax.Array, log_probabilities: jax.Array):
+        super().__init__(variable)
+        self.breakpoints = breakpoints
+        self.log_probabilities = log_probabilities
+
+    @classmethod
+    def nx_classes(cls) -> Tuple[Type, ...]:
+        return PiecewiseUniformDistribution,
+
+    def validate(self):
+        assert self.breakpoints.shape == (self.number_of_nodes, self.number_of_bins + 1), \
+            "There has to be exactly one more breakpoint than bins for every node."
+
+    @property
+    def number_of_nodes(self) -> int:
+        return self.log_probabilities.shape[0]
+
+    @property
+    def number_of_bins(self) -> int:
+        return self.log_probabilities.shape[1]
+
+    @property
+    def lower(self) -> jax.Array:
+        return self.breakpoints[:, 0]
+
+    @property
+    def upper(self) -> jax.Array:
+        return self.breakpoints[:, -1]
+
+    @property
+    def widths(self) -> jax.Array:
+        return jnp.diff(self.breakpoints, axis=1)
+
+    @property
+    def number_of_used_bins(self) -> jax.Array:
+        """
+        :return: The number of bins of every node without the padding.
+        """
+        return jnp.sum(self.widths > 0, axis=1)
+
+    @property
+    def normalized_log_probabilities(self) -> jax.Array:
+        # the padding never gets any mass, even if the log probabilities are generated by a conditioner
+        log_probabilities = jnp.where(self.widths > 0, self.log_probabilities, -jnp.inf)
+        return log_probabilities - jax.scipy.special.logsumexp(log_probabilities, axis=1, keepdims=True)
+
+    @property
+    def log_densities(self) -> jax.Array:
+        widths = self.widths
+        return jnp.where(widths > 0, self.normalized_log_probabilities - jnp.log(jnp.where(widths > 0, widths, 1.)),
+                         -jnp.inf)
+
+    def bin_indices(self, x: jax.Array) -> jax.Array:
+        """
+        :param x: A value of the variable or one value for every node.
+        :return: The index of the bin of every node that the value falls into, clipped to the used bins.
+        """
+        index = jnp.sum(self.breakpoints[:, 1:] <= jnp.atleast_1d(x)[:, None], axis=1)
+        return jnp.clip(index, 0, self.number_of_used_bins - 1)
+
+    def cdf_of_nodes_single(self, x: jax.Array) -> jax.Array:
+        """
+        :param x: A value of the variable.
+        :return: The cdf of every node at the value.
+        """
+        x = jnp.clip(x, self.lower, self.upper)
+        index = self.bin_indices(x)[:, None]
+        cumulative_probabilities = jnp.cumsum(jnp.exp(self.normalized_log_probabilities), axis=1) - \
+            jnp.exp(self.normalized_log_probabilities)
+        result = (jnp.take_along_axis(cumulative_probabilities, index, axis=1) +
+                  jnp.exp(jnp.take_along_axis(self.log_densities, index, axis=1)) *
+                  (x[:, None] - jnp.take_along_axis(self.breakpoints, index, axis=1)))
+        return jnp.clip(result[:, 0], 0., 1.)
+
+    def log_likelihood_of_nodes_single(self, x: jax.Array) -> jax.Array:
+        inside = (self.lower <= x[0]) & (x[0] <= self.upper)
+        log_densities = jnp.take_along_axis(self.log_densities, self.bin_indices(x[0])[:, None], axis=1)[:, 0]
+        return jnp.where(inside, log_densities, -jnp.inf)
+
+    def log_likelihood_of_nodes(self, x: jax.Array) -> jax.Array:
+        return jax.vmap(self.log_likelihood_of_nodes_single)(x)
+
+    def log_probability_of_nodes_single(self, event: jax.Array) -> jax.Array:
+        probability = self.cdf_of_nodes_single(event[0, 1]) - self.cdf_of_nodes_single(event[0, 0])
+        return jnp.log(jnp.maximum(probability, 0.))
+
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        # inverse transform sampling, where bins without mass are never selected
+        probabilities = jnp.exp(self.normalized_log_probabilities[node])
+        cumulative_probabilities = jnp.cumsum(probabilities) - probabilities
+        quantile = jax.random.uniform(key, (1,), dtype=self.log_probabilities.dtype)
+        index = jnp.clip(jnp.searchsorted(cumulative_probabilities, quantile, side="right") - 1,
+                         0, self.number_of_used_bins[node] - 1)
+        sample = (self.breakpoints[node, index] +
+                  (quantile - cumulative_probabilities[index]) / jnp.exp(self.log_densities[node, index]))
+        return jnp.minimum(sample, self.upper[node])
+
+    def take_nodes(self, indices: np.ndarray) -> Self:
+        return self.__class__(self.variable, self.breakpoints[indices], self.log_probabilities[indices])
+
+    def sufficient_statistics_single(self, x: jax.Array) -> jax.Array:
+        """
+        :return: The one-hot encoding of the bin for every node.
+        """
+        inside = (self.lower <= x[0]) & (x[0] <= self.upper)
+        return jax.nn.one_hot(self.bin_indices(x[0]), self.number_of_bins) * inside[:, None]
+
+    def maximize(self, statistics: jax.Array, pseudo_count: float = 0.) -> Self:
+        # the padding never gets any mass
+        counts = jnp.where(self.widths > 0, statistics + pseudo_count, 0.)
+        used = jnp.sum(counts, axis=1, keepdims=True) > 0
+        return eqx.tree_at(lambda l: l.log_probabilities, self,
+                           jnp.where(used, jnp.log(counts), self.log_probabilities))
+
+    @classmethod
+    def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[UnivariateContinuousLeaf],
+                                                         child_layers: List[NXConverterLayer],
+                                                         progress_bar: bool = True) -> \
+            NXConverterLayer:
+        hash_remap = {hash(node): index for index, node in enumerate(nodes)}
+
+        variable = nodes[0].variable
+        number_of_bins = max(len(node.distribution.probabilities) for node in nodes)
+
+        # pad the breakpoints with the upper bound and the probabilities with empty bins
+        breakpoints = np.zeros((len(nodes), number_of_bins + 1))
+        probabilities = np.zeros((len(nodes), number_of_bins))
+        for index, node in enumerate(tqdm.tqdm(nodes, desc=f"Creating piecewise uniform layer for variable "
+                                                           f"{variable.name}") if progress_bar else nodes):
+            distribution: PiecewiseUniformDistribution = node.distribution
+            breakpoints[index] = distribution.upper
+            breakpoints[index, :len(distribution.breakpoints)] = distribution.breakpoints
+            probabilities[index, :len(distribution.probabilities)] = distribution.probabilities
+
+        with np.errstate(divide="ignore"):
+            log_probabilities = np.log(probabilities)
+        result = cls(nodes[0].probabilistic_circuit.variables.index(variable), jnp.asarray(breakpoints),
+                     jnp.asarray(log_probabilities))
+        return NXConverterLayer(result, nodes, hash_remap)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {**super().to_json(), "breakpoints": array_to_json(self.breakpoints),
+                "log_probabilities": array_to_json(self.log_probabilities)}
+
+    @classmethod
+    def _from_json(cls, data: Dict[str, Any]) -> Self:
+        return cls(data["variable"], array_from_json(data["breakpoints"]), array_from_json(data["log_probabilities"]))
+
+    def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
+              progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
+        variable = variables[self.variable]
+
+        if progress_bar:
+            progress_bar.set_postfix_str(f"Creating piecewise uniform distributions for variable {variable.name}")
+
+        breakpoints, probabilities, number_of_used_bins = jax.device_get(
+            (self.breakpoints, jnp.exp(self.normalized_log_probabilities), self.number_of_used_bins))
+        nodes = [UnivariateContinuousLeaf(PiecewiseUniformDistribution(
+            variable, node_breakpoints[:used + 1], node_probabilities[:used]), result)
+            for node_breakpoints, node_probabilities, used in zip(np.asarray(breakpoints), np.asarray(probabilities),
+                                                                  np.asarray(number_of_used_bins).tolist())]
+
+        if progress_bar:
+            progress_bar.update(self.number_of_nodes)
+
+        return nodes
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import equinox as eqx
+import jax
+import jax.numpy as jnp
+from random_events.utils import SubclassJSONSerializer
+from typing_extensions import Dict, Any, Self, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass(frozen=True)
+class PrecisionPolicy(SubclassJSONSerializer):
+    """
+    The floating point precision of the parameters of a circuit.
+
+    The parameters (log weights, locations, log scales and log probabilities) of all layers are stored in the
+    parameter dtype, e.g. bfloat16 to halve the memory and the memory bandwidth of large circuits.
+    Before a circuit is evaluated, the parameters are cast to the compute dtype, such that log-sum-exp
+    accumulations happen in (at least) float32.
+
+    Float64 requires 64-bit mode of jax, e.g. `jax.config.update("jax_enable_x64", True)` or the context
+    `jax.experimental.enable_x64()`. Otherwise, jax silently falls back to float32.
+    """
+
+    parameter_dtype: str = "float32"
+    """
+    The dtype that the parameters are stored in.
+    """
+
+    compute_dtype: str = "float32"
+    """
+    The dtype that the parameters are cast to for the evaluation of the circuit.
+    """
+
+    @staticmethod
+    def cast(tree: T, dtype: str) -> T:
+        """
+        Cast all floating point arrays of a pytree, e.g. a layer, to a dtype.
+        Integer arrays (e.g. indices) and static fields are not touched.
+
+        :param tree: The pytree.
+        :param dtype: The dtype.
+        :return: The cast pytree.
+        """
+        return jax.tree_util.tree_map(lambda leaf: leaf.astype(dtype) if eqx.is_inexact_array(leaf) else leaf, tree)
+
+    def store(self, tree: T) -> T:
+        """
+        :return: The pytree with all floating point arrays in the parameter dtype.
+        """
+        return self.cast(tree, self.parameter_dtype)
+
+    def compute(self, tree: T) -> T:
+        """
+        :return: The pytree with all floating point arrays in the compute dtype.
+        """
+        return self.cast(tree, self.compute_dtype)
+
+    def to_json(self) -> Dict[str, Any]:
+        return {**super().to_json(), "parameter_dtype": self.parameter_dtype, "compute_dtype": self.compute_dtype}
+
+    @classmethod
+    def _from_json(cls, data: Dict[str, Any]) -> Self:
+        return cls(data["parameter_dtype"], data["compute_dtype"])
+
+
+float32_policy = PrecisionPolicy()
+"""
+Store and compute in float32.
+"""
+
+bfloat16_policy = PrecisionPolicy("bfloat16", "float32")
+"""
+Store in bfloat16 and compute in float32.
+"""
+
+float16_policy = PrecisionPolicy("float16", "float32")
+"""
+Store in float16 and compute in float32.
+"""
+
+float64_policy = PrecisionPolicy("float64", "float64")
+"""
+Store and compute in float64, e.g. for validation runs. Requires 64-bit mode of jax.
+"""
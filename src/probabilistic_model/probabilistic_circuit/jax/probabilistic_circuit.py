@@ -6,19 +6,27 @@ from typing import Dict, Any
 import numpy as np
 import optax
 from jax.experimental.sparse import BCOO
+from jax.sharding import Mesh
 from random_events.product_algebra import SimpleEvent
 from random_events.utils import SubclassJSONSerializer
 from random_events.variable import Variable, Symbolic
 from sortedcontainers import SortedSet
-from typing_extensions import Tuple, Self, List, Optional
+from typing_extensions import Tuple, Self, List, Optional, Callable
 
 from . import ProductLayer, SparseSumLayer, InputLayer, InnerLayer
 from .discrete_layer import DiscreteLayer
-from .inner_layer import Layer, NXConverterLayer
+from .einsum_layer import EinsumLayer
+from .training import Trainer, TrainingHistory, negative_log_likelihood, cross_entropy
+from .expectation_maximization import ExpectationMaximization
+from .parallel import log_likelihood_of_nodes, sample_from_node
+from .precision import PrecisionPolicy
+from .pruning import prune, PruningReport
+from .compiled_circuit import CompiledCircuit
+from .checkpoint import save_checkpoint, load_checkpoint
+from .inner_layer import Layer
 from ..nx.probabilistic_circuit import ProbabilisticCircuit as NXProbabilisticCircuit
 import jax
 import tqdm
-import networkx as nx
 import jax.numpy as jnp
 import equinox as eqx
 
@@ -38,40 +46,102 @@ class ProbabilisticCircuit(SubclassJSONSerializer):
     The root layer of the circuit.
     """
 
-    def __init__(self, variables: SortedSet, root: Layer):
+    precision: Optional[PrecisionPolicy]
+    """
+    The precision policy of the parameters. If `None`, the parameters are used as they are.
+    """
+
+    def __init__(self, variables: SortedSet, root: Layer, precision: Optional[PrecisionPolicy] = None):
+        """
+        :param variables: The variables of the circuit.
+        :param root: The root layer of the circuit.
+        :param precision: The precision policy. If given, the parameters of the root are cast to its parameter dtype.
+        """
         self.variables = variables
-        self.root = root
+        self.root = root if precision is None else precision.store(root)
+        self.precision = precision
+
+    @property
+    def compute_root(self) -> Layer:
+        """
+        :return: The root layer with its parameters in the compute dtype of the precision policy.
+        """
+        return self.root if self.precision is None else self.precision.compute(self.root)
+
+    def log_likelihood(self, x: jax.Array, mesh: Optional[Mesh] = None) -> jax.Array:
+        """
+        Calculate the log-likelihood of the samples.
+
+        :param x: The data.
+        :param mesh: The mesh for data parallel inference, see :func:`data_parallel_mesh`.
+            If given, the samples are sharded across the devices of the mesh.
+        :return: The log-likelihood of every sample.
+        """
+        if mesh is not None:
+            return log_likelihood_of_nodes(self.compute_root, x, mesh)[:, 0]
+        return self.compute_root.log_likelihood_of_nodes(x)[:, 0]
+
+    def log_likelihood_of_soft_evidence(self, x: jax.Array, evidence: Dict[Symbolic, jax.Array]) -> jax.Array:
+        """
+        Calculate the log-likelihood of samples with uncertain evidence for some symbolic variables.
 
-    def log_likelihood(self, x: jax.Array) -> jax.Array:
-        return self.root.log_likelihood_of_nodes(x)[:, 0]
+        The likelihood of a sample is the expected value of the evidence weights of the symbolic variables under the
+        distribution of the circuit given the values of the other variables.
+        One-hot evidence is the same as observing the state, evidence of ones marginalizes the variable.
+
+        :param x: The data. The values of the variables with soft evidence are ignored.
+        :param evidence: The non-negative weight of every state (in the order of the domain) of a symbolic variable
+            for every sample of shape (#samples, #states).
+        :return: The log-likelihood of every sample.
+        """
+        for variable in evidence:
+            if not isinstance(variable, Symbolic):
+                raise NotImplementedError(f"Soft evidence is only supported for symbolic variables, got {variable}.")
+
+        # the evidence of all variables is stacked into one array, where nan marks the variables without evidence
+        number_of_states = max([len(variable.domain.simple_sets) for variable in self.variables
+                                if isinstance(variable, Symbolic)], default=1)
+        stacked_evidence = jnp.full((len(x), len(self.variables), number_of_states), jnp.nan)
+        for variable, weights in evidence.items():
+            weights = jnp.asarray(weights)
+            stacked_evidence = stacked_evidence.at[:, self.variables.index(variable), :weights.shape[1]].set(weights)
+
+        root = self.compute_root
+        return jax.vmap(root.log_likelihood_of_soft_evidence_single)(jnp.asarray(x), stacked_evidence)[:, 0]
+
+    def sample(self, amount: int, key: jax.Array = jax.random.PRNGKey(69), mesh: Optional[Mesh] = None) -> jax.Array:
+        """
+        Draw samples from the circuit.
+
+        :param amount: The number of samples.
+        :param key: The random key.
+        :param mesh: The mesh for data parallel sampling, see :func:`data_parallel_mesh`.
+            If given, the samples are drawn on all devices of the mesh.
+        :return: The samples of shape (#samples, #variables).
+        """
+        if mesh is not None:
+            return sample_from_node(self.compute_root, key, amount, 0, mesh)
+        root = self.compute_root
+        return jax.vmap(lambda sample_key: root.sample_from_node_single(sample_key, jnp.asarray(0)))(
+            jax.random.split(key, amount))
 
     @classmethod
-    def from_nx(cls, pc: NXProbabilisticCircuit, progress_bar: bool = False) -> ProbabilisticCircuit:
+    def from_nx(cls, pc: NXProbabilisticCircuit, progress_bar: bool = False,
+                deduplicate: bool = True) -> ProbabilisticCircuit:
         """
         Convert a probabilistic circuit to a layered circuit.
         The result expresses the same distribution as `pc`.
 
         :param pc: The probabilistic circuit.
         :param progress_bar: Whether to show a progress bar.
+        :param deduplicate: Whether to merge identical leaves and identical sum and product units into one node,
+            see :meth:`CompiledCircuit.deduplicate`.
         :return: The layered circuit.
         """
-
-        # calculate the depth of each node
-        node_to_depth_map = {node: len(path) for node, path in nx.single_source_shortest_path(pc, pc.root).items()}
-
-        # group nodes by depth
-        layer_to_nodes_map = {depth: [node for node, n_depth in node_to_depth_map.items() if depth == n_depth] for depth
-                              in set(node_to_depth_map.values())}
-        reversed_layers_to_nodes_map = dict(reversed(layer_to_nodes_map.items()))
-
-        # create layers from nodes
-        child_layers: List[NXConverterLayer] = []
-        for layer_index, nodes in (tqdm.tqdm(reversed_layers_to_nodes_map.items(), desc="Creating Layers") if progress_bar
-                                                     else reversed_layers_to_nodes_map.items()):
-
-            child_layers = Layer.create_layers_from_nodes(nodes, child_layers, progress_bar)
-        root = child_layers[0].layer
-
+        compiled_circuit = CompiledCircuit.from_nx(pc)
+        if deduplicate:
+            compiled_circuit = compiled_circuit.deduplicate()
+        root = compiled_circuit.to_root_layer(pc.variables, progress_bar)
         return cls(pc.variables, root)
 
     def to_nx(self, progress_bar: bool = True) -> NXProbabilisticCircuit:
@@ -94,46 +164,105 @@ class ProbabilisticCircuit(SubclassJSONSerializer):
         result = super().to_json()
         result["variables"] = [variable.to_json() for variable in self.variables]
         result["root"] = self.root.to_json()
+        if self.precision is not None:
+            result["precision"] = self.precision.to_json()
         return result
 
     @classmethod
     def _from_json(cls, data: Dict[str, Any]) -> Self:
         variables = SortedSet(Variable.from_json(variable) for variable in data["variables"])
         root = Layer.from_json(data["root"])
-        return cls(variables, root)
+        precision = PrecisionPolicy.from_json(data["precision"]) if "precision" in data else None
+        return cls(variables, root, precision)
 
-    def fit(self, data: jax.Array, epochs: int = 100,
-            optimizer: Optional[optax.GradientTransformation] = None, **kwargs) -> None:
+    def save_checkpoint(self, directory: str):
         """
-        Fit the circuit to the data using generative training with the negative average log-likelihood as loss.
+        Save the circuit as binary checkpoint. See :func:`save_checkpoint` for details.
 
-        :param data: The data.
-        :param epochs: The number of epochs.
-        :param optimizer: The optimizer to use.
-        If `None`, the Adam optimizer with a learning rate of 1e-3 is used.
+        :param directory: The directory to write the checkpoint into.
         """
+        save_checkpoint(self, directory)
 
-        @eqx.filter_jit
-        def loss(p, x):
-            ll = p.log_likelihood_of_nodes(x)
-            return -jnp.mean(ll)
-
-        if optimizer is None:
-            optimizer = optax.adam(1e-3)
+    @classmethod
+    def load_checkpoint(cls, directory: str, mmap: bool = True) -> Self:
+        """
+        Load a circuit from a binary checkpoint. See :func:`load_checkpoint` for details.
 
-        opt_state = optimizer.init(eqx.filter(self.root, eqx.is_inexact_array))
+        :param directory: The directory of the checkpoint.
+        :param mmap: Whether to memory map the arrays instead of reading them into memory.
+        :return: The circuit.
+        """
+        return load_checkpoint(directory, mmap)
 
-        progress_bar = tqdm.tqdm(range(epochs), desc="Fitting")
+    def prune(self, threshold: float, data: Optional[np.ndarray] = None) -> Tuple[ProbabilisticCircuit, PruningReport]:
+        """
+        Remove the sum edges with a normalized weight below a threshold and all nodes that are no longer reachable.
+        See :func:`prune` for details.
 
-        for epoch in progress_bar:
-            loss_value, grads = eqx.filter_value_and_grad(loss)(self.root, data)
+        :param threshold: The minimal normalized weight of a sum edge.
+        :param data: Optional data to report the change of the average log-likelihood on.
+        :return: The pruned circuit and the report.
+        """
+        root, report = prune(self.compute_root, threshold, data)
+        return self.__class__(self.variables, root, self.precision), report
 
-            updates, opt_state = optimizer.update(
-                grads, opt_state, eqx.filter(self.root, eqx.is_inexact_array)
-            )
-            self.root = eqx.apply_updates(self.root, updates)
-            progress_bar.set_postfix_str(f"Neg. Avg. LL.: {loss_value}")
+    def fit(self, data: jax.Array, epochs: int = 100,
+            optimizer: Optional[optax.GradientTransformation] = None, batch_size: Optional[int] = None,
+            validation_data: Optional[jax.Array] = None, patience: Optional[int] = None,
+            key: jax.Array = jax.random.PRNGKey(69), checkpoint_path: Optional[str] = None,
+            progress_bar: bool = True, mesh: Optional[Mesh] = None, **kwargs) -> TrainingHistory:
+        """
+        Fit the circuit to the data using generative training with the negative average log-likelihood as loss.
 
+        :param data: The data. Numpy memory maps are supported.
+        :param epochs: The maximum number of epochs.
+        :param optimizer: The optimizer to use.
+        If `None`, the Adam optimizer with a learning rate of 1e-3 is used.
+        :param batch_size: The mini batch size. If `None`, full batch training is performed.
+        :param validation_data: Data for early stopping and model selection.
+        :param patience: The number of epochs without improvement after which training stops.
+        :param key: The random key for shuffling.
+        :param checkpoint_path: The path to write the best model to.
+        :param progress_bar: Whether to show a progress bar.
+        :param mesh: The mesh for data parallel training, see :func:`data_parallel_mesh`.
+        :return: The training history.
+        """
+        trainer = Trainer(negative_log_likelihood, optimizer, epochs, batch_size, key=key, patience=patience,
+                          checkpoint_path=checkpoint_path, progress_bar=progress_bar, mesh=mesh,
+                          precision=self.precision)
+        self.root, history = trainer.fit(self.root, data,
+                                         validation_data=None if validation_data is None else (validation_data,))
+        return history
+
+    def fit_em(self, data: jax.Array, epochs: int = 100, batch_size: Optional[int] = None,
+               step_size: Optional[Callable[[jax.Array], jax.Array]] = None, pseudo_count: float = 0.,
+               validation_data: Optional[jax.Array] = None, patience: Optional[int] = None,
+               key: jax.Array = jax.random.PRNGKey(69), checkpoint_path: Optional[str] = None,
+               progress_bar: bool = True, mesh: Optional[Mesh] = None) -> TrainingHistory:
+        """
+        Fit the circuit to the data using closed form expectation maximization.
+
+        :param data: The data. Numpy memory maps are supported.
+        :param epochs: The maximum number of epochs.
+        :param batch_size: The mini batch size. If `None`, full batch EM is performed, otherwise stochastic EM.
+        :param step_size: The step size schedule of stochastic EM.
+        :param pseudo_count: The pseudo count that is added to the average statistics per sample.
+        :param validation_data: Data for early stopping and model selection.
+        :param patience: The number of epochs without improvement after which training stops.
+        :param key: The random key for shuffling.
+        :param checkpoint_path: The path to write the best model to.
+        :param progress_bar: Whether to show a progress bar.
+        :param mesh: The mesh for data parallel training, see :func:`data_parallel_mesh`.
+        :return: The training history.
+        """
+        trainer = ExpectationMaximization(negative_log_likelihood, epochs=epochs, batch_size=batch_size, key=key,
+                                          patience=patience, checkpoint_path=checkpoint_path,
+                                          progress_bar=progress_bar, mesh=mesh, precision=self.precision,
+                                          step_size=step_size,
+                                          pseudo_count=pseudo_count)
+        self.root, history = trainer.fit(self.root, data,
+                                         validation_data=None if validation_data is None else (validation_data,))
+        return history
 
 
 class ClassificationCircuit(ProbabilisticCircuit):
@@ -171,6 +300,9 @@ class ClassificationCircuit(ProbabilisticCircuit):
             class_probabilities = jnp.ones(number_of_classes) / number_of_classes
 
         copied_root = self.root.__deepcopy__()
+        if isinstance(copied_root, EinsumLayer):
+            copied_root = copied_root.to_layers()
+
         # update variable indices
         for layer in copied_root.all_layers():
             if isinstance(layer, InputLayer):
@@ -199,41 +331,36 @@ class ClassificationCircuit(ProbabilisticCircuit):
         for layer in root.all_layers():
             layer.variables # trigger the setter
 
-        return ProbabilisticCircuit(new_variables, root)
+        return ProbabilisticCircuit(new_variables, root, self.precision)
 
     def to_nx(self, progress_bar: bool = True) -> NXProbabilisticCircuit:
         raise NotImplementedError("ClassificationCircuit does not support to_nx. "
                                   "Call 'to_probabilistic_circuit' first.")
 
     def fit(self, data: jax.Array, labels: jax.Array, epochs: int = 100,
-                       optimizer: Optional[optax.GradientTransformation] = None) -> None:
+            optimizer: Optional[optax.GradientTransformation] = None, batch_size: Optional[int] = None,
+            validation_data: Optional[Tuple[jax.Array, jax.Array]] = None, patience: Optional[int] = None,
+            key: jax.Array = jax.random.PRNGKey(69), checkpoint_path: Optional[str] = None,
+            progress_bar: bool = True, mesh: Optional[Mesh] = None) -> TrainingHistory:
         """
         Fit the circuit to the data using generative training with the cross-entropy as loss.
 
         :param data: The data.
         :param labels: The labels.
-        :param epochs: The number of epochs.
+        :param epochs: The maximum number of epochs.
         :param optimizer: The optimizer to use.
         If `None`, the Adam optimizer with a learning rate of 1e-3 is used.
+        :param batch_size: The mini batch size. If `None`, full batch training is performed.
+        :param validation_data: Data and labels for early stopping and model selection.
+        :param patience: The number of epochs without improvement after which training stops.
+        :param key: The random key for shuffling.
+        :param checkpoint_path: The path to write the best model to.
+        :param progress_bar: Whether to show a progress bar.
+        :param mesh: The mesh for data parallel training, see :func:`data_parallel_mesh`.
+        :return: The training history.
         """
-
-        @eqx.filter_jit
-        def loss(p, x, y):
-            log_probs = p.log_likelihood_of_nodes(x)
-            return -jnp.mean(log_probs[y])
-
-        if optimizer is None:
-            optimizer = optax.adam(1e-3)
-
-        opt_state = optimizer.init(eqx.filter(self.root, eqx.is_inexact_array))
-
-        progress_bar = tqdm.tqdm(range(epochs), desc="Fitting")
-
-        for epoch in progress_bar:
-            loss_value, grads = eqx.filter_value_and_grad(loss)(self.root, data, labels)
-
-            updates, opt_state = optimizer.update(
-                grads, opt_state, eqx.filter(self.root, eqx.is_inexact_array)
-            )
-            self.root = eqx.apply_updates(self.root, updates)
-            progress_bar.set_postfix_str(f"Cross Entropy: {loss_value}")
\ No newline at end of file
+        trainer = Trainer(cross_entropy, optimizer, epochs, batch_size, key=key, patience=patience,
+                          checkpoint_path=checkpoint_path, progress_bar=progress_bar, mesh=mesh,
+                          precision=self.precision)
+        self.root, history = trainer.fit(self.root, data, labels, validation_data=validation_data)
+        return history
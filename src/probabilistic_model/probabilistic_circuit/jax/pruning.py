@@ -0,0 +1,214 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+import jax.numpy as jnp
+import numpy as np
+from jax.experimental.sparse import BCOO
+from typing_extensions import Dict, List, Optional, Tuple
+
+from .inner_layer import Layer, InnerLayer, InputLayer, SparseSumLayer, DenseSumLayer, ProductLayer
+
+
+@dataclass
+class PruningReport:
+    """
+    The effect of pruning a circuit.
+    """
+
+    number_of_components_before: int
+    """
+    The number of components (leaves + edges) before pruning.
+    """
+
+    number_of_components_after: int
+    """
+    The number of components (leaves + edges) after pruning.
+    """
+
+    average_log_likelihood_before: Optional[float] = None
+    """
+    The average log-likelihood of the data before pruning. `None` if no data is given.
+    """
+
+    average_log_likelihood_after: Optional[float] = None
+    """
+    The average log-likelihood of the data after pruning. `None` if no data is given.
+    """
+
+    @property
+    def compression(self) -> float:
+        """
+        :return: The factor by which the circuit shrunk.
+        """
+        return self.number_of_components_before / self.number_of_components_after
+
+    @property
+    def log_likelihood_change(self) -> Optional[float]:
+        """
+        :return: The change of the average log-likelihood of the data. `None` if no data is given.
+        """
+        if self.average_log_likelihood_before is None:
+            return None
+        return self.average_log_likelihood_after - self.average_log_likelihood_before
+
+
+def layers_in_topological_order(root: Layer) -> List[Layer]:
+    """
+    :param root: The root layer of a circuit.
+    :return: Every (possibly shared) layer of the circuit exactly once, every layer before its child layers.
+    """
+    visited = set()
+    postorder: List[Layer] = []
+
+    def visit(layer: Layer):
+        if id(layer) in visited:
+            return
+        visited.add(id(layer))
+        if isinstance(layer, InnerLayer):
+            for child_layer in layer.child_layers:
+                visit(child_layer)
+        postorder.append(layer)
+
+    visit(root)
+    return postorder[::-1]
+
+
+def kept_sum_edges(layer: SparseSumLayer | DenseSumLayer, used: np.ndarray, threshold: float) \
+        -> List[np.ndarray] | np.ndarray:
+    """
+    Determine the edges of a sum layer whose normalized weight is at least the threshold.
+    The edge with the largest weight of every node is always kept, such that no node loses all of its children.
+    Edges of unused nodes are never kept.
+
+    :param layer: The sum layer.
+    :param used: The mask of the nodes of the layer that are used by a parent.
+    :param threshold: The threshold.
+    :return: The mask of the kept edges in the layout of the log weights.
+    """
+    if isinstance(layer, DenseSumLayer):
+        weights = np.asarray(layer.normalized_weights, dtype=np.float64)
+        return used[:, None] & ((weights >= threshold) | (weights >= weights.max(axis=1, keepdims=True)))
+
+    log_normalization_constants = np.asarray(layer.log_normalization_constants, dtype=np.float64)
+    indices = [np.asarray(log_weights.indices) for log_weights in layer.log_weights]
+    weights = [np.exp(np.asarray(log_weights.data, dtype=np.float64) - log_normalization_constants[index[:, 0]])
+               for log_weights, index in zip(layer.log_weights, indices)]
+
+    maximum = np.zeros(layer.number_of_nodes)
+    for weight, index in zip(weights, indices):
+        np.maximum.at(maximum, index[:, 0], weight)
+
+    return [used[index[:, 0]] & ((weight >= threshold) | (weight >= maximum[index[:, 0]]))
+            for weight, index in zip(weights, indices)]
+
+
+def prune(root: Layer, threshold: float, data: Optional[np.ndarray] = None) -> Tuple[Layer, PruningReport]:
+    """
+    Remove the sum edges with a normalized weight below a threshold and all nodes that are no longer reachable.
+
+    The removal cascades through the circuit: product nodes, sum nodes and input nodes that are not referenced by
+    any remaining edge are removed, the remaining nodes are reindexed and child layers without remaining nodes are
+    removed.
+    Dense sum layers cannot drop single edges; their pruned edges get a log weight of -inf and only the columns
+    of removed nodes are removed.
+
+    :param root: The root layer of the circuit.
+    :param threshold: The minimal normalized weight of a sum edge.
+    :param data: Optional data to report the change of the average log-likelihood on.
+    :return: The pruned root layer and the report.
+    """
+    order = layers_in_topological_order(root)
+    used: Dict[int, np.ndarray] = {id(root): np.ones(root.number_of_nodes, dtype=bool)}
+    kept_edges: Dict[int, List[np.ndarray] | np.ndarray] = dict()
+
+    def mark(layer: Layer, positions: np.ndarray):
+        used.setdefault(id(layer), np.zeros(layer.number_of_nodes, dtype=bool))[positions] = True
+
+    # mark the used nodes from the root to the leaves
+    for layer in order:
+        used_nodes = used.get(id(layer))
+        if used_nodes is None or isinstance(layer, InputLayer):
+            continue
+
+        if isinstance(layer, SparseSumLayer):
+            kept = kept_sum_edges(layer, used_nodes, threshold)
+            for keep, log_weights, child_layer in zip(kept, layer.log_weights, layer.child_layers):
+                mark(child_layer, np.asarray(log_weights.indices)[keep, 1])
+        elif isinstance(layer, DenseSumLayer):
+            kept = kept_sum_edges(layer, used_nodes, threshold)
+            for start, end, child_layer in zip(layer.child_offsets[:-1], layer.child_offsets[1:],
+                                               layer.child_layers):
+                mark(child_layer, np.flatnonzero(kept[:, start:end].any(axis=0)))
+        elif isinstance(layer, ProductLayer):
+            indices, positions = np.asarray(layer.edges.indices), np.asarray(layer.edges.data)
+            kept = used_nodes[indices[:, 1]]
+            for child_layer_index, child_layer in enumerate(layer.child_layers):
+                mark(child_layer, positions[kept & (indices[:, 0] == child_layer_index)])
+        else:
+            raise NotImplementedError(f"Pruning is not supported for {type(layer).__name__}.")
+        kept_edges[id(layer)] = kept
+
+    # rebuild the used layers from the leaves to the root
+    new_layers: Dict[int, Layer] = dict()
+    new_positions: Dict[int, np.ndarray] = {key: np.cumsum(value) - 1 for key, value in used.items()}
+    for layer in reversed(order):
+        used_nodes = used.get(id(layer))
+        if used_nodes is None or not used_nodes.any():
+            continue
+        positions = new_positions[id(layer)]
+        number_of_nodes = int(used_nodes.sum())
+
+        if isinstance(layer, InputLayer):
+            new_layers[id(layer)] = layer.take_nodes(np.flatnonzero(used_nodes))
+
+        elif isinstance(layer, SparseSumLayer):
+            child_layers, log_weights = [], []
+            for keep, child_log_weights, child_layer in zip(kept_edges[id(layer)], layer.log_weights,
+                                                            layer.child_layers):
+                if not keep.any():
+                    continue
+                indices = np.asarray(child_log_weights.indices)[keep]
+                indices = np.stack((positions[indices[:, 0]], new_positions[id(child_layer)][indices[:, 1]]), axis=1)
+                child_layers.append(new_layers[id(child_layer)])
+                log_weights.append(BCOO((child_log_weights.data[keep], jnp.asarray(indices)),
+                                        shape=(number_of_nodes, child_layers[-1].number_of_nodes),
+                                        indices_sorted=child_log_weights.indices_sorted,
+                                        unique_indices=child_log_weights.unique_indices))
+            new_layers[id(layer)] = SparseSumLayer(child_layers, log_weights)
+
+        elif isinstance(layer, DenseSumLayer):
+            kept = kept_edges[id(layer)][used_nodes]
+            layer_log_weights = layer.log_weights[np.flatnonzero(used_nodes)]
+            child_layers, log_weights = [], []
+            for start, child_layer in zip(layer.child_offsets[:-1], layer.child_layers):
+                child_used = used.get(id(child_layer))
+                columns = start + np.flatnonzero(child_used) if child_used is not None else np.array([], dtype=int)
+                if not kept[:, columns].any():
+                    continue
+                child_layers.append(new_layers[id(child_layer)])
+                log_weights.append(jnp.where(kept[:, columns], layer_log_weights[:, columns], -jnp.inf))
+            new_layers[id(layer)] = DenseSumLayer(child_layers, log_weights)
+
+        else:
+            indices, child_positions = np.asarray(layer.edges.indices), np.asarray(layer.edges.data)
+            keep = used_nodes[indices[:, 1]]
+            indices, child_positions = indices[keep], child_positions[keep]
+            child_layer_indices, local_child_layer_indices = np.unique(indices[:, 0], return_inverse=True)
+            local_child_layer_indices = local_child_layer_indices.reshape(-1)
+            child_layers = [layer.child_layers[child_layer_index] for child_layer_index in child_layer_indices]
+            for local_child_layer_index, child_layer in enumerate(child_layers):
+                edges_of_child_layer = local_child_layer_indices == local_child_layer_index
+                child_positions[edges_of_child_layer] = \
+                    new_positions[id(child_layer)][child_positions[edges_of_child_layer]]
+            edges = BCOO((jnp.asarray(child_positions),
+                          jnp.asarray(np.stack((local_child_layer_indices, positions[indices[:, 1]]), axis=1))),
+                         shape=(len(child_layers), number_of_nodes))
+            new_layers[id(layer)] = ProductLayer([new_layers[id(child_layer)] for child_layer in child_layers], edges)
+
+    pruned = new_layers[id(root)]
+    report = PruningReport(root.number_of_components, pruned.number_of_components)
+    if data is not None:
+        report.average_log_likelihood_before = float(jnp.mean(root.log_likelihood_of_nodes(data)[:, 0]))
+        report.average_log_likelihood_after = float(jnp.mean(pruned.log_likelihood_of_nodes(data)[:, 0]))
+    return pruned, report
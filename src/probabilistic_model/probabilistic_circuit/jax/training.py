@@ -0,0 +1,429 @@
+from __future__ import annotations
+
+import collections
+from dataclasses import dataclass, field
+
+import equinox as eqx
+import jax
+import jax.numpy as jnp
+import numpy as np
+import optax
+import tqdm
+from jax.sharding import Mesh, Sharding
+from typing_extensions import Callable, Iterable, Iterator, List, Optional, Tuple, Any, Union
+
+from .inner_layer import Layer
+from .parallel import batch_sharding, replicated_sharding, round_up_to_multiple
+from .precision import PrecisionPolicy
+
+Batch = Tuple[np.ndarray, ...]
+"""
+A batch is a tuple of arrays with the same length, e.g. (data,) or (data, labels).
+"""
+
+
+def negative_log_likelihood(model: Layer, weights: jax.Array, x: jax.Array) -> jax.Array:
+    """
+    The weighted negative average log-likelihood of the first node of a layer.
+
+    :param model: The layer.
+    :param weights: The weight of every sample. Padded samples have weight 0.
+    :param x: The data.
+    :return: The loss.
+    """
+    ll = model.log_likelihood_of_nodes(x)[:, 0]
+    return -jnp.sum(weights * ll) / jnp.sum(weights)
+
+
+def cross_entropy(model: Layer, weights: jax.Array, x: jax.Array, y: jax.Array) -> jax.Array:
+    """
+    The weighted generative cross-entropy of a layer, where the n-th node of the layer belongs to the n-th class.
+
+    :param model: The layer.
+    :param weights: The weight of every sample. Padded samples have weight 0.
+    :param x: The data.
+    :param y: The class labels.
+    :return: The loss.
+    """
+    log_probabilities = model.log_likelihood_of_nodes(x)
+    ll = jnp.take_along_axis(log_probabilities, y.astype(int)[:, None], axis=1)[:, 0]
+    return -jnp.sum(weights * ll) / jnp.sum(weights)
+
+
+def prefetch_to_device(iterator: Iterable[Any], size: int = 2, sharding: Optional[Sharding] = None) -> Iterator[Any]:
+    """
+    Move the elements of an iterator to the device(s) ahead of time.
+    While the current element is processed, the transfer of the next `size - 1` elements is already in flight.
+
+    :param iterator: The iterator over pytrees of host arrays.
+    :param size: The number of elements to keep on the device.
+    :param sharding: The sharding of every array. If `None`, the arrays are moved to the default device.
+    :return: An iterator over the same pytrees on the device(s).
+    """
+    queue = collections.deque()
+    for element in iterator:
+        queue.append(jax.device_put(element, sharding))
+        if len(queue) >= size:
+            yield queue.popleft()
+    while queue:
+        yield queue.popleft()
+
+
+def pad_batch(batch: Batch, batch_size: int) -> Tuple[np.ndarray, Batch]:
+    """
+    Pad a batch to the batch size.
+
+    :param batch: The batch.
+    :param batch_size: The batch size.
+    :return: The weights of the samples (0 for padded samples) and the padded batch.
+    :raises ValueError: If the batch is empty or longer than the batch size.
+    """
+    length = len(batch[0])
+    if not 0 < length <= batch_size:
+        raise ValueError(f"A batch of {length} samples cannot be padded to the batch size {batch_size}.")
+    weights = np.zeros(batch_size, dtype=np.float32)
+    weights[:length] = 1.
+    if length == batch_size:
+        return weights, tuple(np.asarray(array) for array in batch)
+
+    # pad with repetitions of real samples such that the padding cannot produce non-finite gradients
+    indices = np.arange(batch_size) % length
+    return weights, tuple(np.asarray(array)[indices] for array in batch)
+
+
+def split_batch(batch: Batch, batch_size: int) -> Iterator[Batch]:
+    """
+    Split a batch into batches of at most the batch size.
+
+    :param batch: The batch.
+    :param batch_size: The batch size.
+    :return: An iterator over the non-empty parts of the batch.
+    """
+    for start in range(0, len(batch[0]), batch_size):
+        yield tuple(array[start:start + batch_size] for array in batch)
+
+
+@dataclass
+class TrainingHistory:
+    """
+    The losses recorded during training.
+    """
+
+    loss: List[float] = field(default_factory=list)
+    """
+    The average training loss of every epoch.
+    """
+
+    validation_loss: List[float] = field(default_factory=list)
+    """
+    The validation loss after every epoch. Empty if no validation data is given.
+    """
+
+    best_epoch: int = -1
+    """
+    The epoch with the best (validation) loss.
+    """
+
+
+@dataclass
+class Trainer:
+    """
+    Mini-batch training engine for layered circuits.
+
+    Every epoch the data is (optionally) shuffled and split into mini batches.
+    Chunks of `batches_per_chunk` mini batches are moved to the device ahead of time and processed by a single
+    jitted `jax.lax.scan` over fused loss, gradient and optimizer update steps.
+    This avoids the Python dispatch overhead per step.
+    """
+
+    loss: Callable[..., jax.Array] = negative_log_likelihood
+    """
+    The loss function. It is called with the model, the sample weights and the arrays of a batch.
+    """
+
+    optimizer: Optional[optax.GradientTransformation] = None
+    """
+    The optimizer. If `None`, Adam with a learning rate of 1e-3 is used.
+    """
+
+    epochs: int = 100
+    """
+    The maximum number of epochs.
+    """
+
+    batch_size: Optional[int] = None
+    """
+    The batch size. If `None`, full batch training is performed.
+    """
+
+    shuffle: bool = True
+    """
+    Whether to shuffle the data every epoch.
+    """
+
+    key: jax.Array = field(default_factory=lambda: jax.random.PRNGKey(69))
+    """
+    The random key used for shuffling.
+    """
+
+    batches_per_chunk: int = 32
+    """
+    The number of mini batches that are transferred to the device and scanned over at once.
+    """
+
+    patience: Optional[int] = None
+    """
+    The number of epochs without improvement of the (validation) loss after which training stops.
+    If `None`, training runs for all epochs.
+    """
+
+    checkpoint_path: Optional[str] = None
+    """
+    The path to write the best model to, using `eqx.tree_serialise_leaves`.
+    Restore it with `eqx.tree_deserialise_leaves(checkpoint_path, model)`.
+    """
+
+    progress_bar: bool = True
+    """
+    Whether to show a progress bar.
+    """
+
+    mesh: Optional[Mesh] = None
+    """
+    The mesh for data parallel training, see :func:`data_parallel_mesh`.
+    If given, the samples of every mini batch are sharded across the devices of the mesh and the parameters are
+    replicated on every device.
+    XLA inserts the all-reduce of the gradients.
+    The batch size is rounded up to a multiple of the number of devices.
+    """
+
+    precision: Optional[PrecisionPolicy] = None
+    """
+    The precision policy. If given, the optimization keeps master parameters and the optimizer state in its compute
+    dtype, such that small updates are not rounded away.
+    The model is evaluated with the master parameters rounded to the parameter dtype and the trained model is
+    stored in the parameter dtype.
+    """
+
+    def __post_init__(self):
+        if self.optimizer is None:
+            self.optimizer = optax.adam(1e-3)
+
+    def combine(self, params: List[jax.Array], treedef, static) -> Layer:
+        """
+        Reassemble the model from the parameter leaves for evaluation.
+
+        :param params: The parameter leaves.
+        :param treedef: The tree structure of the parameters.
+        :param static: The static part of the model.
+        :return: The model with its parameters rounded to the parameter dtype and cast to the compute dtype of the
+            precision policy.
+        """
+        model = eqx.combine(jax.tree_util.tree_unflatten(treedef, params), static)
+        return model if self.precision is None else self.precision.compute(self.precision.store(model))
+
+    def stored_model(self, params: List[jax.Array], treedef, static) -> Layer:
+        """
+        Reassemble the model from the parameter leaves for storage.
+
+        :param params: The parameter leaves.
+        :param treedef: The tree structure of the parameters.
+        :param static: The static part of the model.
+        :return: The model with its parameters in the parameter dtype of the precision policy.
+        """
+        model = eqx.combine(jax.tree_util.tree_unflatten(treedef, params), static)
+        return model if self.precision is None else self.precision.store(model)
+
+    def init_state(self, params: List[jax.Array], treedef, static) -> Any:
+        """
+        Create the initial state of the optimization, e.g. the optimizer state.
+
+        :param params: The parameter leaves.
+        :param treedef: The tree structure of the parameters.
+        :param static: The static part of the model.
+        :return: The state that is passed to and returned by every step.
+        """
+        return self.optimizer.init(params)
+
+    def train_step(self, treedef, static) -> Callable:
+        """
+        Create the function that performs one optimization step on a mini batch.
+
+        The parameters are handled as flat list of arrays, such that neither jit caches nor the optimizer ever compare
+        the (static) structures of different models.
+
+        :param treedef: The tree structure of the parameters.
+        :param static: The static part of the model.
+        :return: A function that maps the parameter leaves, the optimizer state, the sample weights and the arrays of
+            a batch to the updated parameter leaves, the updated optimizer state and the loss.
+        """
+        def step(params: List[jax.Array], opt_state, weights: jax.Array, *arrays: jax.Array):
+            def loss(p):
+                return self.loss(self.combine(p, treedef, static), weights, *arrays)
+
+            loss_value, grads = jax.value_and_grad(loss)(params)
+            updates, opt_state = self.optimizer.update(grads, opt_state, params)
+            return optax.apply_updates(params, updates), opt_state, loss_value
+
+        return step
+
+    def train_chunk(self, treedef, static) -> Callable:
+        """
+        Create the jitted function that performs one optimization step for every mini batch of a chunk using
+        `jax.lax.scan`.
+        The function maps the parameters, the optimizer state, the sample weights of shape (#batches, batch_size)
+        and the arrays of shape (#batches, batch_size, ...) to the updated parameters, the updated optimizer state and
+        the loss of every mini batch.
+
+        :param treedef: The tree structure of the parameters.
+        :param static: The static part of the model.
+        :return: The jitted function.
+        """
+        train_step = self.train_step(treedef, static)
+
+        def step(carry, batch):
+            params, opt_state = carry
+            params, opt_state, loss_value = train_step(params, opt_state, *batch)
+            return (params, opt_state), loss_value
+
+        @jax.jit
+        def chunk(params, opt_state, weights: jax.Array, *arrays: jax.Array):
+            (params, opt_state), losses = jax.lax.scan(step, (params, opt_state), (weights,) + arrays)
+            return params, opt_state, losses
+
+        return chunk
+
+    def evaluate(self, treedef, static) -> Callable:
+        """
+        Create the jitted loss function.
+
+        :param treedef: The tree structure of the parameters.
+        :param static: The static part of the model.
+        :return: A function that maps the parameter leaves, the sample weights and the arrays of a batch to the loss.
+        """
+        return jax.jit(lambda params, weights, *arrays: self.loss(self.combine(params, treedef, static), weights,
+                                                                  *arrays))
+
+    def chunks(self, arrays: Union[Batch, Callable[[], Iterable[Batch]]], batch_size: int,
+               key: jax.Array) -> Iterator[Tuple[np.ndarray, Batch]]:
+        """
+        Create the chunks of one epoch.
+
+        :param arrays: Either a tuple of (memory mapped) arrays with the same length or a callable that returns an
+            iterable over batches. Batches that are longer than the batch size are split and empty ones are skipped.
+        :param batch_size: The batch size.
+        :param key: The random key for shuffling.
+        :return: An iterator over the sample weights and the stacked batches of every chunk.
+        """
+        if callable(arrays):
+            # batches of a loader may be longer than the batch size or empty
+            batches = (pad_batch(part, batch_size) for batch in arrays() for part in split_batch(batch, batch_size))
+        else:
+            number_of_samples = len(arrays[0])
+            indices = (np.asarray(jax.random.permutation(key, number_of_samples)) if self.shuffle
+                       else np.arange(number_of_samples))
+            batches = (pad_batch(tuple(array[np.sort(indices[start:start + batch_size])] for array in arrays),
+                                 batch_size)
+                       for start in range(0, number_of_samples, batch_size))
+
+        chunk = []
+        for batch in batches:
+            chunk.append(batch)
+            if len(chunk) == self.batches_per_chunk:
+                yield self.stack_chunk(chunk)
+                chunk = []
+        if chunk:
+            yield self.stack_chunk(chunk)
+
+    @staticmethod
+    def stack_chunk(chunk: List[Tuple[np.ndarray, Batch]]) -> Tuple[np.ndarray, Batch]:
+        weights = np.stack([weights for weights, _ in chunk])
+        arrays = tuple(np.stack(arrays) for arrays in zip(*[batch for _, batch in chunk]))
+        return weights, arrays
+
+    @staticmethod
+    def validation_loss(evaluate: Callable, params, arrays: Batch, batch_size: int) -> float:
+        """
+        Calculate the loss on the validation data in batches.
+
+        :param evaluate: The loss function created by :meth:`evaluate`.
+        :param params: The parameters of the model.
+        :param arrays: The validation arrays.
+        :param batch_size: The batch size.
+        :return: The average validation loss.
+        """
+        total, count = jnp.zeros(()), 0.
+        for start in range(0, len(arrays[0]), batch_size):
+            weights, batch = pad_batch(tuple(array[start:start + batch_size] for array in arrays), batch_size)
+            total += evaluate(params, weights, *batch) * weights.sum()
+            count += weights.sum()
+        return float(total) / count
+
+    def fit(self, model: Layer, *arrays: Union[np.ndarray, jax.Array, Callable[[], Iterable[Batch]]],
+            validation_data: Optional[Batch] = None) -> Tuple[Layer, TrainingHistory]:
+        """
+        Fit a layer to data.
+
+        :param model: The layer to train.
+        :param arrays: The training arrays (e.g. data or data and labels) with the same length.
+            Numpy memory maps are supported, only the current chunk is loaded into memory.
+            Alternatively, a single callable that returns a fresh iterable over batches for every epoch.
+        :param validation_data: The validation arrays.
+            If given, the model with the best validation loss is returned.
+        :return: The trained layer and the training history.
+        """
+        if len(arrays) == 1 and callable(arrays[0]):
+            arrays = arrays[0]
+            batch_size = self.batch_size or next(len(batch[0]) for batch in arrays() if len(batch[0]) > 0)
+        else:
+            batch_size = self.batch_size or len(arrays[0])
+
+        sharding = None
+        if self.mesh is not None:
+            batch_size = round_up_to_multiple(batch_size, self.mesh.size)
+            sharding = batch_sharding(self.mesh, batch_axis=1)
+
+        # the master parameters and the optimizer state live in the compute dtype
+        if self.precision is not None:
+            model = self.precision.compute(model)
+
+        params, static = eqx.partition(model, eqx.is_inexact_array)
+        params, treedef = jax.tree_util.tree_flatten(params)
+        train_chunk, evaluate = self.train_chunk(treedef, static), self.evaluate(treedef, static)
+        opt_state = self.init_state(params, treedef, static)
+        if self.mesh is not None:
+            params, opt_state = jax.device_put((params, opt_state), replicated_sharding(self.mesh))
+        history = TrainingHistory()
+        best_loss, best_params = np.inf, params
+        key = self.key
+
+        progress_bar = tqdm.trange(self.epochs, desc="Fitting", disable=not self.progress_bar)
+        for epoch in progress_bar:
+            key, epoch_key = jax.random.split(key)
+
+            # accumulate on the device such that no chunk waits for the transfer of the loss of the previous one
+            total, count = jnp.zeros(()), jnp.zeros(())
+            for weights, batches in prefetch_to_device(self.chunks(arrays, batch_size, epoch_key),
+                                                         sharding=sharding):
+                params, opt_state, losses = train_chunk(params, opt_state, weights, *batches)
+                batch_weights = weights.sum(axis=1)
+                total += jnp.sum(losses * batch_weights)
+                count += jnp.sum(batch_weights)
+            history.loss.append(float(total / count))
+
+            current_loss = history.loss[-1]
+            if validation_data is not None:
+                current_loss = self.validation_loss(evaluate, params, validation_data, batch_size)
+                history.validation_loss.append(current_loss)
+            progress_bar.set_postfix_str(f"Loss: {current_loss}")
+
+            if current_loss < best_loss:
+                best_loss, best_params, history.best_epoch = current_loss, params, epoch
+                if self.checkpoint_path is not None:
+                    eqx.tree_serialise_leaves(self.checkpoint_path, self.stored_model(params, treedef, static))
+            elif self.patience is not None and epoch - history.best_epoch >= self.patience:
+                break
+
+        if validation_data is not None:
+            params = best_params
+        return self.stored_model(params, treedef, static), history
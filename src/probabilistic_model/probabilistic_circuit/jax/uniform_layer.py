@@ -1,6 +1,7 @@
 from typing import List, Dict, Any, Optional
 
 import jax
+import numpy as np
 import random_events
 import tqdm
 from jax import numpy as jnp
@@ -9,13 +10,15 @@ from random_events.variable import Variable
 from sortedcontainers import SortedSet
 from typing_extensions import Type, Tuple, Self
 
-from .inner_layer import NXConverterLayer
+from .checkpoint import array_from_json
+from .inner_layer import NXConverterLayer, register_layer
 from .input_layer import ContinuousLayerWithFiniteSupport
-from .utils import simple_interval_to_open_array
+from .utils import simple_intervals_to_open_array
 from ..nx.probabilistic_circuit import Unit, ProbabilisticCircuit as NXProbabilisticCircuit, UnivariateContinuousLeaf
 from ...distributions import UniformDistribution
 
 
+@register_layer
 class UniformLayer(ContinuousLayerWithFiniteSupport):
     """
     A layer that represents uniform distributions over a single variable.
@@ -44,6 +47,13 @@ class UniformLayer(ContinuousLayerWithFiniteSupport):
     def log_likelihood_of_nodes(self, x: jnp.array) -> jnp.array:
         return jax.vmap(self.log_likelihood_of_nodes_single)(x)
 
+    def log_probability_of_nodes_single(self, event: jnp.array) -> jnp.array:
+        length = jnp.minimum(event[0, 1], self.upper) - jnp.maximum(event[0, 0], self.lower)
+        return jnp.log(jnp.maximum(length, 0.)) + self.log_pdf_value()
+
+    def sample_from_node_single(self, key: jax.Array, node: jax.Array) -> jax.Array:
+        return jax.random.uniform(key, (1,), minval=self.lower[node], maxval=self.upper[node])
+
     @classmethod
     def create_layer_from_nodes_with_same_type_and_scope(cls, nodes: List[UnivariateContinuousLeaf],
                                                          child_layers: List[NXConverterLayer],
@@ -53,16 +63,17 @@ class UniformLayer(ContinuousLayerWithFiniteSupport):
 
         variable = nodes[0].variable
 
-        intervals = jnp.vstack([simple_interval_to_open_array(node.distribution.interval) for node in
-                                (tqdm.tqdm(nodes, desc=f"Creating uniform layer for variable {variable.name}")
-                                 if progress_bar else nodes)])
+        intervals = [node.distribution.interval for node in
+                     (tqdm.tqdm(nodes, desc=f"Creating uniform layer for variable {variable.name}")
+                      if progress_bar else nodes)]
+        intervals = simple_intervals_to_open_array(intervals)
 
         result = cls(nodes[0].probabilistic_circuit.variables.index(variable), intervals)
         return NXConverterLayer(result, nodes, hash_remap)
 
     @classmethod
     def _from_json(cls, data: Dict[str, Any]) -> Self:
-        return cls(data["variable"], jnp.array(data["interval"]))
+        return cls(data["variable"], array_from_json(data["interval"]))
 
     def to_nx(self, variables: SortedSet[Variable], result: NXProbabilisticCircuit,
               progress_bar: Optional[tqdm.tqdm] = None) -> List[Unit]:
@@ -73,11 +84,11 @@ class UniformLayer(ContinuousLayerWithFiniteSupport):
 
         nodes = [UnivariateContinuousLeaf(
             UniformDistribution(variable=variable,
-                                interval=random_events.interval.SimpleInterval(lower.item(), upper.item(),
+                                interval=random_events.interval.SimpleInterval(lower, upper,
                                                                                random_events.interval.Bound.OPEN,
                                                                                random_events.interval.Bound.OPEN)),
             result)
-            for lower, upper in self.interval]
+            for lower, upper in np.asarray(self.interval).tolist()]
 
         if progress_bar:
             progress_bar.update(self.number_of_nodes)
@@ -4,7 +4,7 @@ from jax.experimental.sparse import BCOO, BCSR, CSC, CSR
 from random_events.interval import SimpleInterval, Bound
 import jax
 from scipy.sparse import csr_matrix, csr_array, csc_array
-from typing_extensions import Tuple
+from typing_extensions import Tuple, List
 
 from probabilistic_model.utils import timeit_print
 
@@ -27,6 +27,22 @@ def simple_interval_to_open_array(interval: SimpleInterval) -> jnp.array:
     return jnp.array([lower, upper])
 
 
+def simple_intervals_to_open_array(intervals: List[SimpleInterval]) -> jnp.array:
+    """
+    Vectorized version of :func:`simple_interval_to_open_array`.
+
+    :param intervals: The intervals to convert.
+    :return: An array of shape (len(intervals), 2) containing the open lower and upper bounds.
+    """
+    lower = jnp.asarray(np.array([interval.lower for interval in intervals]), dtype=float)
+    upper = jnp.asarray(np.array([interval.upper for interval in intervals]), dtype=float)
+    left_closed = jnp.asarray(np.array([interval.left == Bound.CLOSED for interval in intervals], dtype=bool))
+    right_closed = jnp.asarray(np.array([interval.right == Bound.CLOSED for interval in intervals], dtype=bool))
+    lower = jnp.where(left_closed, jnp.nextafter(lower, lower - 1), lower)
+    upper = jnp.where(right_closed, jnp.nextafter(upper, upper + 1), upper)
+    return jnp.stack((lower, upper), axis=1)
+
+
 def create_bcoo_indices_from_row_lengths(row_lengths: np.array) -> np.array:
     """
     Create the indices of a BCOO array with the given row lengths.
@@ -238,3 +254,21 @@ def sparse_remove_rows_and_cols_where_all(array: BCOO, value: float) -> BCOO:
     result = BCOO((values[valid_elements], valid_indices), shape=new_shape, indices_sorted=array.indices_sorted,
                   unique_indices=array.unique_indices)
     return result
+
+
+def segment_logsumexp(values: np.ndarray, segments: np.ndarray, number_of_segments: int) -> np.ndarray:
+    """
+    Calculate the logsumexp of the values that belong to the same segment on the host.
+
+    :param values: The values.
+    :param segments: The segment of every value.
+    :param number_of_segments: The number of segments.
+    :return: The logsumexp of every segment. Empty segments result in -inf.
+    """
+    maximum = np.full(number_of_segments, -np.inf)
+    np.maximum.at(maximum, segments, values)
+    maximum[~np.isfinite(maximum)] = 0.
+    sums = np.zeros(number_of_segments)
+    np.add.at(sums, segments, np.exp(values - maximum[segments]))
+    with np.errstate(divide="ignore"):
+        return maximum + np.log(sums)
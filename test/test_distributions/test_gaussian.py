@@ -323,5 +323,37 @@ class TruncatedGaussianSamplingTestCase(unittest.TestCase):
         self.assertEqual(len(samples), 1000)
 
 
+class LogNormalDistributionTestCase(unittest.TestCase):
+    x = Continuous("x")
+    distribution: LogNormalDistribution = LogNormalDistribution(x, 0., 0.5)
+
+    def test_support(self):
+        self.assertEqual(self.distribution.univariate_support, open(0, np.inf))
+        self.assertEqual(self.distribution.likelihood(np.array([[-1.], [0.]])).tolist(), [0., 0.])
+
+    def test_mode(self):
+        mode, likelihood = self.distribution.univariate_log_mode()
+        self.assertEqual(mode, singleton(np.exp(-0.25)))
+
+    def test_moment(self):
+        expectation = self.distribution.expectation(self.distribution.variables)[self.x]
+        self.assertAlmostEqual(expectation, np.exp(0.125))
+        variance = self.distribution.variance(self.distribution.variables)[self.x]
+        self.assertAlmostEqual(variance, (np.exp(0.25) - 1) * np.exp(0.25))
+
+    def test_sample(self):
+        samples = self.distribution.sample(100)
+        self.assertTrue(all(self.distribution.likelihood(samples) > 0))
+
+    def test_scale(self):
+        distribution = self.distribution.__copy__()
+        # the attribute scale shadows the method on instances
+        LogNormalDistribution.scale(distribution, {self.x: 2.})
+        self.assertAlmostEqual(distribution.cdf(np.array([[2.]]))[0], self.distribution.cdf(np.array([[1.]]))[0])
+
+    def test_serialization(self):
+        self.assertEqual(SubclassJSONSerializer.from_json(self.distribution.to_json()), self.distribution)
+
+
 if __name__ == '__main__':
     unittest.main()
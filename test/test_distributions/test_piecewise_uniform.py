@@ -0,0 +1,142 @@
+import unittest
+
+from random_events.interval import *
+from random_events.product_algebra import *
+from random_events.utils import SubclassJSONSerializer
+
+from probabilistic_model.distributions.distributions import DiracDeltaDistribution
+from probabilistic_model.distributions.piecewise_uniform import PiecewiseUniformDistribution
+
+
+class PiecewiseUniformDistributionTestCase(unittest.TestCase):
+    x: Continuous = Continuous("x")
+    distribution: PiecewiseUniformDistribution = PiecewiseUniformDistribution(x, np.array([0., 1., 3., 4.]),
+                                                                              np.array([0.2, 0.4, 0.4]))
+
+    def test_densities(self):
+        self.assertTrue(np.allclose(self.distribution.densities, [0.2, 0.2, 0.4]))
+
+    def test_support(self):
+        self.assertEqual(self.distribution.univariate_support, closed(0, 4))
+
+    def test_support_with_gap(self):
+        distribution = PiecewiseUniformDistribution(self.x, np.array([0., 1., 3., 4.]), np.array([0.5, 0., 0.5]))
+        self.assertEqual(distribution.univariate_support, closed_open(0, 1) | closed(3, 4))
+
+    def test_likelihood(self):
+        pdf = self.distribution.likelihood(np.array([-1, 0, 1, 3.5, 4, 5]).reshape(-1, 1))
+        self.assertTrue(np.allclose(pdf, [0, 0.2, 0.2, 0.4, 0.4, 0]))
+
+    def test_cdf(self):
+        cdf = self.distribution.cdf(np.array([-1, 0.5, 2, 3.5, 5]).reshape(-1, 1))
+        self.assertTrue(np.allclose(cdf, [0, 0.1, 0.4, 0.8, 1]))
+
+    def test_inverse_cdf(self):
+        q = np.array([0., 0.1, 0.4, 0.8, 1.])
+        self.assertTrue(np.allclose(self.distribution.inverse_cdf(q), [0, 0.5, 2, 3.5, 4]))
+
+    def test_probability(self):
+        event = SimpleEvent({self.x: closed(0, 1) | closed(3, 3.5)}).as_composite_set()
+        self.assertAlmostEqual(self.distribution.probability(event), 0.4)
+
+    def test_mode(self):
+        mode, likelihood = self.distribution.mode()
+        self.assertEqual(mode, SimpleEvent({self.x: closed(3, 4)}).as_composite_set())
+        self.assertAlmostEqual(likelihood, 0.4)
+
+    def test_sample(self):
+        np.random.seed(69)
+        samples = self.distribution.sample(1000)
+        self.assertEqual(samples.shape, (1000, 1))
+        self.assertTrue(np.all(self.distribution.likelihood(samples) > 0))
+        self.assertAlmostEqual(np.mean(samples < 1), 0.2, delta=0.05)
+
+    def test_moment(self):
+        expectation = self.distribution.moment(VariableMap({self.x: 1}), VariableMap({self.x: 0}))
+        self.assertAlmostEqual(expectation[self.x], 0.2 * 0.5 + 0.4 * 2 + 0.4 * 3.5)
+        variance = self.distribution.moment(VariableMap({self.x: 2}), expectation)
+        samples = np.linspace(0, 4, 400001)
+        pdf = self.distribution.likelihood(samples.reshape(-1, 1))
+        expected_variance = np.sum(pdf * (samples - expectation[self.x]) ** 2) * (samples[1] - samples[0])
+        self.assertAlmostEqual(variance[self.x], expected_variance, delta=1e-4)
+
+    def test_truncation(self):
+        event = SimpleEvent({self.x: closed(0.5, 3.5)}).as_composite_set()
+        truncated, log_probability = self.distribution.log_truncated(event)
+        self.assertAlmostEqual(np.exp(log_probability), 0.7)
+        self.assertTrue(np.allclose(truncated.breakpoints, [0.5, 1, 3, 3.5]))
+        self.assertTrue(np.allclose(truncated.probabilities, np.array([0.1, 0.4, 0.2]) / 0.7))
+
+    def test_truncation_without_intersection(self):
+        event = SimpleEvent({self.x: closed(5, 6)}).as_composite_set()
+        truncated, probability = self.distribution.truncated(event)
+        self.assertIsNone(truncated)
+        self.assertEqual(probability, 0)
+
+    def test_truncation_with_singleton(self):
+        event = SimpleEvent({self.x: singleton(1)}).as_composite_set()
+        truncated, probability = self.distribution.truncated(event)
+        self.assertIsNone(truncated)
+
+        conditional, probability = self.distribution.conditional({self.x: 1.})
+        self.assertIsInstance(conditional, DiracDeltaDistribution)
+        self.assertAlmostEqual(probability, 0.2)
+
+    def test_truncation_with_composite_interval(self):
+        event = SimpleEvent({self.x: closed(0.5, 1) | closed(3.5, 5)}).as_composite_set()
+        truncated, log_probability = self.distribution.log_truncated(event)
+        self.assertAlmostEqual(np.exp(log_probability), 0.3)
+        self.assertTrue(np.allclose(truncated.breakpoints, [0.5, 1, 3, 3.5, 4]))
+        self.assertTrue(np.allclose(truncated.probabilities, np.array([0.1, 0, 0, 0.2]) / 0.3))
+
+    def test_l1_distance(self):
+        other = PiecewiseUniformDistribution(self.x, np.array([0., 4.]), np.array([1.]))
+        self.assertAlmostEqual(self.distribution.l1_distance(other), 0.3)
+        self.assertAlmostEqual(other.l1_distance(self.distribution), 0.3)
+        self.assertAlmostEqual(self.distribution.total_variation_distance(other), 0.15)
+        self.assertEqual(self.distribution.l1_distance(self.distribution), 0)
+
+    def test_l1_distance_of_disjoint_supports(self):
+        other = PiecewiseUniformDistribution(self.x, np.array([5., 6.]), np.array([1.]))
+        self.assertAlmostEqual(self.distribution.l1_distance(other), 2)
+
+    def test_kl_divergence(self):
+        other = PiecewiseUniformDistribution(self.x, np.array([0., 4.]), np.array([1.]))
+        self.assertAlmostEqual(self.distribution.kl_divergence(other), 0.6 * np.log(0.8) + 0.4 * np.log(1.6))
+        self.assertEqual(self.distribution.kl_divergence(self.distribution), 0)
+
+        other = PiecewiseUniformDistribution(self.x, np.array([0., 3.]), np.array([1.]))
+        self.assertEqual(self.distribution.kl_divergence(other), np.inf)
+
+    def test_event_of_higher_density(self):
+        other = PiecewiseUniformDistribution(self.x, np.array([0., 4.]), np.array([1.]))
+        event = self.distribution.event_of_higher_density(other)
+        self.assertEqual(event, SimpleEvent({self.x: closed(3, 4)}).as_composite_set())
+        event = other.event_of_higher_density(self.distribution)
+        self.assertEqual(event, SimpleEvent({self.x: closed_open(0, 3)}).as_composite_set())
+        event = other.event_of_higher_density(self.distribution, other_scale=0.5)
+        self.assertEqual(event, SimpleEvent({self.x: closed(0, 4)}).as_composite_set())
+
+    def test_serialization(self):
+        serialized = self.distribution.to_json()
+        deserialized = SubclassJSONSerializer.from_json(serialized)
+        self.assertEqual(self.distribution, deserialized)
+
+    def test_copy(self):
+        copy = self.distribution.__copy__()
+        self.assertEqual(copy, self.distribution)
+        self.assertIsNot(copy.breakpoints, self.distribution.breakpoints)
+
+    def test_translation(self):
+        distribution = self.distribution.__copy__()
+        distribution.translate({self.x: 2.})
+        self.assertTrue(np.allclose(distribution.breakpoints, [2, 3, 5, 6]))
+
+    def test_plot(self):
+        fig = go.Figure(data=self.distribution.plot())
+        self.assertIsNotNone(fig)
+        # fig.show()
+
+
+if __name__ == '__main__':
+    unittest.main()
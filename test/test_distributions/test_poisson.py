@@ -0,0 +1,71 @@
+import unittest
+
+from random_events.utils import SubclassJSONSerializer
+from scipy.stats import poisson
+
+from probabilistic_model.distributions.poisson import *
+
+
+class PoissonDistributionTestCase(unittest.TestCase):
+    x = Integer("x")
+    distribution: PoissonDistribution = PoissonDistribution(x, 3.)
+
+    def test_likelihood(self):
+        likelihood = self.distribution.likelihood(np.array([[-1.], [0.], [2.], [2.5]]))
+        self.assertTrue(np.allclose(likelihood, [0., poisson.pmf(0, 3.), poisson.pmf(2, 3.), 0.]))
+
+    def test_probability(self):
+        event = SimpleEvent({self.x: closed_open(1, 3) | open_closed(4, 5)}).as_composite_set()
+        expected = poisson.pmf(1, 3.) + poisson.pmf(2, 3.) + poisson.pmf(5, 3.)
+        self.assertAlmostEqual(self.distribution.probability(event), expected)
+        self.assertAlmostEqual(self.distribution.probability(self.distribution.support), 1.)
+
+    def test_mode(self):
+        mode, likelihood = self.distribution.mode()
+        self.assertEqual(mode, SimpleEvent({self.x: singleton(2) | singleton(3)}).as_composite_set())
+        self.assertAlmostEqual(likelihood, poisson.pmf(3, 3.))
+
+    def test_moment(self):
+        self.assertAlmostEqual(self.distribution.expectation([self.x])[self.x], 3.)
+        self.assertAlmostEqual(self.distribution.variance([self.x])[self.x], 3.)
+
+    def test_truncation(self):
+        event = SimpleEvent({self.x: closed(2, np.inf)}).as_composite_set()
+        truncated, log_probability = self.distribution.log_truncated(event)
+        self.assertIsInstance(truncated, IntegerDistribution)
+        self.assertAlmostEqual(np.exp(log_probability), poisson.sf(1, 3.))
+        self.assertAlmostEqual(truncated.probabilities[2], poisson.pmf(2, 3.) / poisson.sf(1, 3.))
+        self.assertEqual(truncated.probabilities[1], 0.)
+
+    def test_truncation_in_the_tail(self):
+        distribution = PoissonDistribution(self.x, 100.)
+        event = SimpleEvent({self.x: closed(190, 200)}).as_composite_set()
+        truncated, log_probability = distribution.log_truncated(event)
+        self.assertEqual(sorted(truncated.probabilities.keys()), list(range(190, 201)))
+        self.assertAlmostEqual(log_probability, np.log(poisson.sf(189, 100.) - poisson.sf(200, 100.)))
+
+        distribution = PoissonDistribution(self.x, 2.)
+        event = SimpleEvent({self.x: closed(18, 30)}).as_composite_set()
+        truncated, _ = distribution.log_truncated(event)
+        self.assertEqual(sorted(truncated.probabilities.keys()), list(range(18, 31)))
+        self.assertAlmostEqual(truncated.probabilities[19], poisson.pmf(19, 2.) / poisson.sf(17, 2.))
+
+        event = SimpleEvent({self.x: closed(18, np.inf)}).as_composite_set()
+        truncated, _ = distribution.log_truncated(event)
+        self.assertAlmostEqual(truncated.probabilities[19], poisson.pmf(19, 2.) / poisson.sf(17, 2.))
+
+    def test_conditional(self):
+        conditional, probability = self.distribution.conditional({self.x: 2})
+        self.assertEqual(conditional.probabilities[2], 1.)
+        self.assertAlmostEqual(probability, poisson.pmf(2, 3.))
+
+    def test_sample(self):
+        samples = self.distribution.sample(100)
+        self.assertTrue(all(self.distribution.likelihood(samples) > 0))
+
+    def test_serialization(self):
+        self.assertEqual(SubclassJSONSerializer.from_json(self.distribution.to_json()), self.distribution)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+import equinox as eqx
+import jax
+import jax.numpy as jnp
+import numpy as np
+from jax.experimental.sparse import BCOO
+from random_events.variable import Continuous, Integer
+from sortedcontainers import SortedSet
+
+from probabilistic_model.probabilistic_circuit.jax import SparseSumLayer, DenseSumLayer, ProductLayer, UniformLayer
+from probabilistic_model.probabilistic_circuit.jax.checkpoint import (Checkpoint, save_checkpoint, load_checkpoint,
+                                                                      CHECKPOINT_VERSION, MANIFEST_FILE,
+                                                                      ARRAY_DIRECTORY, ArrayStore, array_to_json,
+                                                                      using_array_store)
+from probabilistic_model.probabilistic_circuit.jax.discrete_layer import IntegerLayer
+from probabilistic_model.probabilistic_circuit.jax.gaussian_layer import GaussianLayer
+from probabilistic_model.probabilistic_circuit.jax.inner_layer import Layer
+from probabilistic_model.probabilistic_circuit.jax.precision import bfloat16_policy
+from probabilistic_model.probabilistic_circuit.jax.probabilistic_circuit import ProbabilisticCircuit
+
+
+class CheckpointTestCase(unittest.TestCase):
+    x = Continuous("x")
+    y = Continuous("y")
+    z = Integer("z")
+    data = np.column_stack([np.random.normal(0., 1., 20), np.random.uniform(0., 1., 20),
+                            np.random.randint(1, 4, 20)]).astype(float)
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        x = GaussianLayer(0, jnp.array([-1., 1.]), jnp.log(jnp.array([1., 2.])), jnp.array([0.01, 0.01]))
+        y = UniformLayer(1, jnp.array([[-0.1, 1.1], [0., 2.]]))
+        z = IntegerLayer(2, jnp.log(jnp.array([[0.2, 0.3, 0.5], [0.5, 0.5, 0.]])), 1)
+        edges = BCOO((jnp.array([0, 1, 0, 1, 0, 1]), jnp.array([[0, 0], [0, 1], [1, 0], [1, 1], [2, 0], [2, 1]])),
+                     shape=(3, 2))
+        product_layer = ProductLayer([x, y, z], edges)
+        log_weights = BCOO((jnp.log(jnp.array([0.3, 0.7])), jnp.array([[0, 0], [0, 1]])), shape=(1, 2))
+        self.model = ProbabilisticCircuit(SortedSet([self.x, self.y, self.z]),
+                                          SparseSumLayer([product_layer], [log_weights]))
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        self.model.save_checkpoint(self.directory.name)
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, MANIFEST_FILE)))
+        restored = ProbabilisticCircuit.load_checkpoint(self.directory.name)
+        self.assertIsInstance(restored, ProbabilisticCircuit)
+        self.assertEqual(restored.variables, self.model.variables)
+        self.assertTrue(np.allclose(restored.log_likelihood(self.data), self.model.log_likelihood(self.data)))
+
+    def test_manifest_contains_no_arrays(self):
+        save_checkpoint(self.model, self.directory.name)
+        with open(os.path.join(self.directory.name, MANIFEST_FILE)) as file:
+            manifest = json.load(file)
+        self.assertEqual(manifest["version"], CHECKPOINT_VERSION)
+        self.assertEqual(manifest["object"]["type"], self.model.to_json()["type"])
+        gaussian = manifest["object"]["root"]["child_layers"][0]["child_layers"][0]
+        self.assertEqual(gaussian["location"]["shape"], [2])
+
+    def test_partial_loading(self):
+        save_checkpoint(self.model, self.directory.name)
+        checkpoint = Checkpoint(self.directory.name)
+        layer = checkpoint.load("root", "child_layers", 0, "child_layers", 1)
+        self.assertIsInstance(layer, UniformLayer)
+        self.assertTrue(np.allclose(layer.interval, [[-0.1, 1.1], [0., 2.]]))
+
+    def test_without_mmap(self):
+        save_checkpoint(self.model.root, self.directory.name)
+        restored = load_checkpoint(self.directory.name, mmap=False)
+        self.assertIsInstance(restored, Layer)
+        self.assertTrue(np.allclose(restored.log_likelihood_of_nodes(self.data),
+                                    self.model.root.log_likelihood_of_nodes(self.data)))
+
+    def test_bfloat16(self):
+        model = ProbabilisticCircuit(self.model.variables, self.model.root, bfloat16_policy)
+        model.save_checkpoint(self.directory.name)
+        restored = ProbabilisticCircuit.load_checkpoint(self.directory.name)
+        dtypes = {leaf.dtype for leaf in jax.tree_util.tree_leaves(eqx.filter(restored.root, eqx.is_inexact_array))}
+        self.assertEqual(dtypes, {jnp.dtype(jnp.bfloat16)})
+        self.assertTrue(np.allclose(restored.log_likelihood(self.data), model.log_likelihood(self.data)))
+
+    def test_dense_sum_layer(self):
+        x = GaussianLayer(0, jnp.array([-1., 1.]), jnp.zeros(2), jnp.array([0.01, 0.01]))
+        layer = DenseSumLayer([x], jnp.log(jnp.array([[0.3, 0.7], [0.5, 0.5]])))
+        save_checkpoint(layer, self.directory.name)
+        restored = load_checkpoint(self.directory.name)
+        self.assertTrue(np.allclose(restored.log_weights, layer.log_weights))
+
+    def test_unsupported_version(self):
+        save_checkpoint(self.model, self.directory.name)
+        path = os.path.join(self.directory.name, MANIFEST_FILE)
+        with open(path) as file:
+            manifest = json.load(file)
+        manifest["version"] = CHECKPOINT_VERSION + 1
+        with open(path, "w") as file:
+            json.dump(manifest, file)
+        with self.assertRaises(ValueError):
+            load_checkpoint(self.directory.name)
+
+    def test_overwrite(self):
+        save_checkpoint(self.model, self.directory.name)
+        layer = DenseSumLayer([GaussianLayer(0, jnp.zeros(2), jnp.zeros(2), jnp.array([0.01, 0.01]))],
+                              jnp.zeros((1, 2)))
+        save_checkpoint(layer, self.directory.name)
+
+        # the blobs of the previous checkpoint are removed
+        self.assertEqual(len(os.listdir(os.path.join(self.directory.name, ARRAY_DIRECTORY))), 4)
+        self.assertEqual(sorted(os.listdir(self.directory.name)), [ARRAY_DIRECTORY, MANIFEST_FILE])
+        self.assertIsInstance(load_checkpoint(self.directory.name), DenseSumLayer)
+
+    def test_store_is_local_to_the_thread(self):
+        entered, done = threading.Event(), threading.Event()
+
+        def save():
+            with using_array_store(ArrayStore(self.directory.name)):
+                entered.set()
+                done.wait()
+
+        thread = threading.Thread(target=save)
+        thread.start()
+        entered.wait()
+        try:
+            self.assertIsInstance(array_to_json(jnp.zeros(2)), list)
+        finally:
+            done.set()
+            thread.join()
+
+    def test_json_is_unchanged(self):
+        data = self.model.to_json()
+        self.assertIsInstance(data["root"]["log_weights"][0][0], list)
+        restored = ProbabilisticCircuit.from_json(data)
+        self.assertTrue(np.allclose(restored.log_likelihood(self.data), self.model.log_likelihood(self.data)))
+
+
+if __name__ == '__main__':
+    unittest.main()
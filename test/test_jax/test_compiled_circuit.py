@@ -0,0 +1,140 @@
+import unittest
+
+import numpy as np
+from random_events.variable import Continuous
+from scipy.special import logsumexp
+
+from probabilistic_model.distributions import DiracDeltaDistribution
+from probabilistic_model.probabilistic_circuit.jax import ProductLayer, SparseSumLayer
+from probabilistic_model.probabilistic_circuit.jax.compiled_circuit import CompiledCircuit, ranges_of_csr_rows
+from probabilistic_model.probabilistic_circuit.nx.helper import leaf
+from probabilistic_model.probabilistic_circuit.nx.probabilistic_circuit import (SumUnit, ProductUnit,
+                                                                                ProbabilisticCircuit as NXProbabilisticCircuit)
+
+
+class CompiledCircuitTestCase(unittest.TestCase):
+    x = Continuous("x")
+    y = Continuous("y")
+
+    def setUp(self):
+        self.sum1 = SumUnit()
+        self.prod1, self.prod2 = ProductUnit(), ProductUnit()
+        self.d_x1 = leaf(DiracDeltaDistribution(self.x, 0, 1))
+        self.d_x2 = leaf(DiracDeltaDistribution(self.x, 1, 2))
+        self.d_y1 = leaf(DiracDeltaDistribution(self.y, 2, 3))
+        self.sum2 = SumUnit()
+
+        self.sum1.add_subcircuit(self.prod1, np.log(0.4))
+        self.sum1.add_subcircuit(self.prod2, np.log(0.6))
+
+        # the leaf d_y1 is reachable by paths of different lengths
+        self.prod1.add_subcircuit(self.sum2)
+        self.prod1.add_subcircuit(self.d_y1)
+        self.prod2.add_subcircuit(self.d_x2)
+        self.prod2.add_subcircuit(self.d_y1)
+        self.sum2.add_subcircuit(self.d_x1, np.log(0.3))
+        self.sum2.add_subcircuit(self.d_x2, np.log(0.7))
+
+        self.model = self.sum1.probabilistic_circuit
+        self.compiled = CompiledCircuit.from_nx(self.model)
+
+    def index(self, node) -> int:
+        return next(index for index, other in enumerate(self.compiled.nodes) if other is node)
+
+    def test_ranges_of_csr_rows(self):
+        indptr = np.array([0, 2, 2, 5])
+        self.assertEqual(ranges_of_csr_rows(indptr, np.array([0, 2])).tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(ranges_of_csr_rows(indptr, np.array([2])).tolist(), [2, 3, 4])
+        self.assertEqual(ranges_of_csr_rows(indptr, np.array([1])).tolist(), [])
+
+    def test_from_nx(self):
+        self.assertEqual(self.compiled.number_of_nodes, len(self.model.nodes))
+        self.assertEqual(len(self.compiled.sources), len(self.model.edges))
+        sum_edges = ~np.isnan(self.compiled.log_weights)
+        self.assertEqual(sum_edges.sum(), 4)
+        self.assertTrue(np.all(np.isin(self.compiled.sources[sum_edges],
+                                       [self.index(self.sum1), self.index(self.sum2)])))
+
+    def test_depths(self):
+        depths = self.compiled.depths()
+        self.assertEqual(depths[self.index(self.sum1)], 0)
+        self.assertEqual(depths[self.index(self.prod1)], 1)
+        self.assertEqual(depths[self.index(self.sum2)], 2)
+        self.assertEqual(depths[self.index(self.d_x1)], 3)
+        self.assertEqual(depths[self.index(self.d_x2)], 3)
+        self.assertEqual(depths[self.index(self.d_y1)], 2)
+        self.assertTrue(np.all(depths[self.compiled.sources] < depths[self.compiled.targets]))
+
+    def test_scopes(self):
+        scopes = self.compiled.scopes(self.model.variables, self.compiled.depths())
+        self.assertEqual(scopes[self.index(self.d_x1)], 0b01)
+        self.assertEqual(scopes[self.index(self.d_y1)], 0b10)
+        self.assertEqual(scopes[self.index(self.sum2)], 0b01)
+        self.assertEqual(scopes[self.index(self.prod1)], 0b11)
+        self.assertEqual(scopes[self.index(self.sum1)], 0b11)
+
+    def test_to_root_layer(self):
+        root = self.compiled.to_root_layer(self.model.variables)
+        self.assertIsInstance(root, SparseSumLayer)
+        self.assertEqual(root.number_of_nodes, 1)
+        product_layer = root.child_layers[0]
+        self.assertIsInstance(product_layer, ProductLayer)
+        self.assertEqual(product_layer.number_of_nodes, 2)
+
+        samples = np.array([[0., 2.], [1., 2.], [1., 3.]])
+        result = np.exp(np.asarray(root.log_likelihood_of_nodes(samples))[:, 0])
+        expected = np.array([0.4 * 0.3 * 1 * 3, 0.4 * 0.7 * 2 * 3 + 0.6 * 2 * 3, 0.])
+        self.assertTrue(np.allclose(result, expected))
+
+    def test_to_nx_with_shared_layers(self):
+        root = self.compiled.to_root_layer(self.model.variables)
+        nx_model = NXProbabilisticCircuit()
+        root.to_nx(self.model.variables, nx_model)
+
+        # the leaf layer of x is a child of the sum and the product layer, but must only be converted once
+        self.assertEqual(len(nx_model.nodes), len(self.model.nodes))
+        self.assertEqual(len(nx_model.edges), len(self.model.edges))
+        self.assertAlmostEqual(np.exp(logsumexp(nx_model.root.log_weights)), 1.)
+
+
+class DeduplicationTestCase(unittest.TestCase):
+    x = Continuous("x")
+    y = Continuous("y")
+
+    def setUp(self):
+        # two products of identical, but distinct leaves
+        self.sum1 = SumUnit()
+        self.prod1, self.prod2, self.prod3 = ProductUnit(), ProductUnit(), ProductUnit()
+        self.sum1.add_subcircuit(self.prod1, np.log(0.3))
+        self.sum1.add_subcircuit(self.prod2, np.log(0.5))
+        self.sum1.add_subcircuit(self.prod3, np.log(0.2))
+        self.prod1.add_subcircuit(leaf(DiracDeltaDistribution(self.x, 0, 1)))
+        self.prod1.add_subcircuit(leaf(DiracDeltaDistribution(self.y, 2, 3)))
+        self.prod2.add_subcircuit(leaf(DiracDeltaDistribution(self.x, 0, 1)))
+        self.prod2.add_subcircuit(leaf(DiracDeltaDistribution(self.y, 2, 3)))
+        self.prod3.add_subcircuit(leaf(DiracDeltaDistribution(self.x, 0, 1)))
+        self.prod3.add_subcircuit(leaf(DiracDeltaDistribution(self.y, 1, 3)))
+        self.model = self.sum1.probabilistic_circuit
+        self.compiled = CompiledCircuit.from_nx(self.model)
+
+    def test_deduplicate(self):
+        deduplicated = self.compiled.deduplicate()
+
+        # one sum, two products and three distinct leaves remain
+        self.assertEqual(deduplicated.number_of_nodes, 6)
+        self.assertEqual(len(deduplicated.sources), 2 + 4)
+
+        # the edges to the merged product are fused
+        sum_edges = ~np.isnan(deduplicated.log_weights)
+        self.assertTrue(np.allclose(np.sort(np.exp(deduplicated.log_weights[sum_edges])), [0.2, 0.8]))
+
+    def test_likelihood_is_unchanged(self):
+        root = self.compiled.deduplicate().to_root_layer(self.model.variables)
+        samples = np.array([[0., 2.], [0., 1.], [1., 2.]])
+        result = np.exp(np.asarray(root.log_likelihood_of_nodes(samples))[:, 0])
+        self.assertTrue(np.allclose(result, [0.8 * 3, 0.2 * 3, 0.]))
+        self.assertEqual(root.child_layers[0].number_of_nodes, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
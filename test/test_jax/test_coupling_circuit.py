@@ -7,14 +7,16 @@ from jax.tree_util import tree_flatten, tree_map
 
 from probabilistic_model.learning.jpt.jpt import JPT
 from probabilistic_model.learning.jpt.variables import infer_variables_from_dataframe
-from probabilistic_model.probabilistic_circuit.jax import UniformLayer, SparseSumLayer
+from probabilistic_model.probabilistic_circuit.jax import UniformLayer, SparseSumLayer, DenseSumLayer
 from probabilistic_model.probabilistic_circuit.jax.coupling_circuit import Conditioner, CouplingCircuit, \
-    LinearConditioner
+    LinearConditioner, MLPConditioner, ResidualConditioner
 
 import equinox as eqx
 import jax.numpy as jnp
 from jax.experimental.sparse import BCOO
 import pandas as pd
+from random_events.interval import closed
+from random_events.product_algebra import SimpleEvent
 import optax
 import plotly.graph_objects as go
 import tqdm
@@ -89,6 +91,44 @@ class CouplingCircuitTestCase(unittest.TestCase):
         params = cc.conditioner.generate_parameters(jnp.array([0.1]))
         cc.create_circuit_from_parameters(params)
 
+    def test_batched_matches_single(self):
+        cc = CouplingCircuit(LinearConditioner(1, 2), jnp.array([0]), self.sum_layer, jnp.array([0]))
+        batched = cc.conditional_log_likelihood(self.data)
+        single = jax.vmap(cc.conditional_log_likelihood_single)(self.data)
+        self.assertTrue(jnp.allclose(batched, single))
+
+    def test_batched_parameters_of_dense_layer(self):
+        dense_layer = DenseSumLayer([self.uniform_layer], jnp.zeros((2, 2)))
+        cc = CouplingCircuit(LinearConditioner(1, 4), jnp.array([0]), dense_layer, jnp.array([0]))
+        cc.validate()
+        params = cc.conditioner.generate_parameters_batched(self.data[:3])
+        circuit = cc.create_circuit_from_parameters(params)
+        self.assertEqual(circuit.log_weights.shape, (3, 2, 2))
+        self.assertEqual(cc.conditional_log_likelihood(self.data).shape, (len(self.data), 2))
+
+    def test_conditional_probability(self):
+        cc = CouplingCircuit(MLPConditioner(1, 2, 8, 1), jnp.array([0]), self.sum_layer, jnp.array([1]))
+        cc.validate()
+        # the conditioner inputs are selected from the full rows, hence the second column is ignored
+        rows = jnp.concatenate([self.data, jnp.full_like(self.data, 100.)], axis=1)
+        probability = cc.conditional_probability(rows, jnp.array([[0., 1.]]))
+        weights = jax.nn.softmax(cc.conditioner.generate_parameters_batched(self.data), axis=1)
+        self.assertTrue(jnp.allclose(probability, weights[:, 0] / 1.02, atol=1e-5))
+
+    def test_conditional_sample(self):
+        cc = CouplingCircuit(MLPConditioner(1, 2, 8, 1), jnp.array([0]), self.sum_layer, jnp.array([1]))
+        x = jnp.zeros((2000, 2))
+        samples = cc.conditional_sample(jax.random.PRNGKey(0), x)
+        self.assertEqual(samples.shape, (2000, 1))
+        weight = jax.nn.softmax(cc.conditioner.generate_parameters(x[0, cc.conditioner_columns]))[0]
+        self.assertAlmostEqual(jnp.mean(samples < 1.5), weight, delta=0.05)
+
+    def test_residual_conditioner_starts_linear(self):
+        conditioner = ResidualConditioner(1, 2, 8, 1)
+        self.assertTrue(jnp.allclose(conditioner.generate_parameters_batched(self.data),
+                                     jax.vmap(conditioner.linear)(self.data)))
+        self.assertEqual(conditioner.output_length, 2)
+
 class CouplingCircuit4DTestCase(unittest.TestCase):
 
     number_of_variables = 4
@@ -118,6 +158,24 @@ class CouplingCircuit4DTestCase(unittest.TestCase):
         cls.cc.validate()
         cls.data = jnp.array(df)
 
+    def test_conditional_sample(self):
+        samples = self.cc.conditional_sample(jax.random.PRNGKey(0), self.data[:100])
+        self.assertEqual(samples.shape, (100, len(self.cc.circuit_columns)))
+        self.assertTrue(jnp.all(self.cc.circuit.log_likelihood_of_nodes(samples)[:, 0] > -jnp.inf))
+
+    def test_conditional_probability(self):
+        x = self.data[:10]
+        everything = jnp.array([[-jnp.inf, jnp.inf]] * len(self.cc.circuit_columns))
+        self.assertTrue(jnp.allclose(self.cc.conditional_probability(x, everything), 1., atol=1e-4))
+        nothing = jnp.array([[100., 101.]] * len(self.cc.circuit_columns))
+        self.assertTrue(jnp.allclose(self.cc.conditional_probability(x, nothing), 0.))
+
+    def test_log_probability_matches_nx(self):
+        event = SimpleEvent({variable: closed(-1., 0.5) for variable in self.jpt.variables})
+        intervals = jnp.array([[-1., 0.5]] * len(self.jpt.variables))
+        probability = jnp.exp(self.cc.circuit.log_probability_of_nodes_single(intervals)[0])
+        self.assertAlmostEqual(probability, self.jpt.probability_of_simple_event(event), delta=1e-4)
+
     def test_learning(self):
 
         @eqx.filter_jit
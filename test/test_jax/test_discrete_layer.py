@@ -1,16 +1,21 @@
 import unittest
 from enum import IntEnum
 
+import jax
 import jax.numpy as jnp
+import numpy as np
+from random_events.interval import SimpleInterval
 from random_events.set import Set
-from random_events.variable import Symbolic
+from random_events.variable import Symbolic, Integer, Continuous
+from scipy.stats import poisson
 from sortedcontainers import SortedSet
 
-from probabilistic_model.distributions import SymbolicDistribution
-from probabilistic_model.probabilistic_circuit.jax.discrete_layer import DiscreteLayer
+from probabilistic_model.distributions import SymbolicDistribution, IntegerDistribution, PoissonDistribution, \
+    UniformDistribution
+from probabilistic_model.probabilistic_circuit.jax.discrete_layer import DiscreteLayer, IntegerLayer, PoissonLayer
 from probabilistic_model.probabilistic_circuit.jax.probabilistic_circuit import ProbabilisticCircuit
 from probabilistic_model.probabilistic_circuit.nx.probabilistic_circuit import \
-    ProbabilisticCircuit as NXProbabilisticCircuit, SumUnit, UnivariateDiscreteLeaf
+    ProbabilisticCircuit as NXProbabilisticCircuit, SumUnit, ProductUnit, UnivariateDiscreteLeaf, UnivariateContinuousLeaf
 from probabilistic_model.utils import MissingDict
 
 
@@ -73,6 +78,153 @@ class DiscreteLayerTestCase(unittest.TestCase):
             distribution: SymbolicDistribution = node.distribution
             self.assertAlmostEqual(sum(distribution.probabilities.values()), 1., places=5)
 
+    def test_log_likelihood_of_invalid_states(self):
+        result = self.model.log_likelihood_of_nodes(jnp.array([[3.], [-1.], [jnp.nan]]))
+        self.assertTrue(jnp.all(result == -jnp.inf))
+        self.assertTrue(jnp.all(self.model.log_likelihood_of_nodes_single(jnp.array([3.])) == -jnp.inf))
+
+    def test_log_likelihood_of_soft_evidence(self):
+        x = jnp.array([0., 1., 2.]).reshape(-1, 1)
+        one_hot = jax.nn.one_hot(x[:, 0].astype(int), 3)
+        self.assertTrue(jnp.allclose(self.model.log_likelihood_of_soft_evidence(one_hot),
+                                     self.model.log_likelihood_of_nodes(x), atol=1e-5))
+
+        # evidence of ones marginalizes the variable, partial evidence weights the states
+        evidence = jnp.array([[1., 1., 1.], [0.5, 0.5, 0.]])
+        result = jnp.exp(self.model.log_likelihood_of_soft_evidence(evidence))
+        correct = jnp.array([[1., 1.], [0.5 * 1 / 3, 0.5 * 3 / 7 + 0.5 * 4 / 7]])
+        self.assertTrue(jnp.allclose(result, correct, atol=1e-5))
+
+    def test_string_symbols(self):
+        y = Symbolic("y", Set.from_iterable(["b", "a", "c"]))
+        states = [element.element for element in y.domain.simple_sets]
+        d1 = UnivariateDiscreteLeaf(SymbolicDistribution(y, MissingDict(float, {hash("a"): 0.25, hash("c"): 0.75})))
+        d2 = UnivariateDiscreteLeaf(SymbolicDistribution(y, MissingDict(float, {hash("b"): 1.})))
+        s = SumUnit()
+        s.add_subcircuit(d1, np.log(0.5))
+        s.add_subcircuit(d2, np.log(0.5))
+        jax_pc = ProbabilisticCircuit.from_nx(s.probabilistic_circuit)
+        layer = jax_pc.root.child_layers[0]
+        probabilities = np.exp(np.asarray(layer.normalized_log_probabilities))
+        self.assertAlmostEqual(probabilities[0, states.index("c")], 0.75, places=5)
+        self.assertAlmostEqual(probabilities[1, states.index("b")], 1., places=5)
+
+        nx_pc = jax_pc.to_nx(progress_bar=False)
+        leaves = [node for node in nx_pc.nodes() if isinstance(node, UnivariateDiscreteLeaf)]
+        self.assertEqual({leaf.distribution.probabilities[hash("b")] for leaf in leaves}, {0., 1.})
+
+
+class SoftEvidenceTestCase(unittest.TestCase):
+    x = Symbolic("x", Set.from_iterable(Animal))
+    y = Continuous("y")
+
+    def setUp(self):
+        s = SumUnit()
+        for log_weight, probabilities, interval in [(np.log(0.4), {0: 0.2, 1: 0.8}, SimpleInterval(-1., 2.)),
+                                                    (np.log(0.6), {0: 0.5, 2: 0.5}, SimpleInterval(1., 4.))]:
+            p = ProductUnit()
+            s.add_subcircuit(p, log_weight)
+            p.add_subcircuit(UnivariateDiscreteLeaf(SymbolicDistribution(self.x, MissingDict(float, probabilities))))
+            p.add_subcircuit(UnivariateContinuousLeaf(UniformDistribution(self.y, interval)))
+        self.nx_pc = s.probabilistic_circuit
+        self.jax_pc = ProbabilisticCircuit.from_nx(self.nx_pc)
+
+    def test_log_likelihood_of_soft_evidence(self):
+        y = np.array([0., 1.5, 2.5])
+        evidence = np.array([[1., 0., 0.], [0.3, 0.3, 0.6], [1., 1., 1.]])
+        result = self.jax_pc.log_likelihood_of_soft_evidence(np.stack((np.full(3, np.nan), y), axis=1),
+                                                             {self.x: evidence})
+
+        # weight the likelihoods of the states in the nx circuit
+        likelihoods = np.stack([self.nx_pc.likelihood(np.stack((np.full(3, state), y), axis=1))
+                                for state in range(3)], axis=1)
+        self.assertTrue(np.allclose(np.exp(result), np.sum(evidence * likelihoods, axis=1), atol=1e-5))
+
+        # evidence of ones marginalizes the variable
+        marginal = self.nx_pc.marginal([self.y])
+        self.assertTrue(np.allclose(result[2], marginal.log_likelihood(y[2:].reshape(-1, 1))[0], atol=1e-5))
+
+    def test_log_likelihood_without_soft_evidence(self):
+        data = np.array([[0., 0.], [2., 2.5]])
+        self.assertTrue(np.allclose(self.jax_pc.log_likelihood_of_soft_evidence(data, {}),
+                                    self.nx_pc.log_likelihood(data), atol=1e-5))
+
+    def test_soft_evidence_for_continuous_variables(self):
+        with self.assertRaises(NotImplementedError):
+            self.jax_pc.log_likelihood_of_soft_evidence(np.zeros((1, 2)), {self.y: np.ones((1, 1))})
+
+
+class IntegerLayerTestCase(unittest.TestCase):
+    x = Integer("x")
+
+    def setUp(self):
+        d1 = UnivariateDiscreteLeaf(IntegerDistribution(self.x, MissingDict(float, {-1: 0.5, 1: 0.5})))
+        d2 = UnivariateDiscreteLeaf(IntegerDistribution(self.x, MissingDict(float, {2: 0.25, 3: 0.75})))
+        s = SumUnit()
+        s.add_subcircuit(d1, np.log(0.4))
+        s.add_subcircuit(d2, np.log(0.6))
+        self.nx_pc = s.probabilistic_circuit
+        self.jax_pc = ProbabilisticCircuit.from_nx(self.nx_pc)
+
+    def test_from_nx(self):
+        layer = self.jax_pc.root.child_layers[0]
+        self.assertIsInstance(layer, IntegerLayer)
+        self.assertEqual(layer.offset, -1)
+        self.assertEqual(layer.log_probabilities.shape, (2, 5))
+
+    def test_log_likelihood(self):
+        x = np.array([[-2.], [-1.], [0.], [1.], [2.], [3.], [2.5], [7.]])
+        result = np.exp(np.asarray(self.jax_pc.log_likelihood(x)))
+        self.assertTrue(np.allclose(result, [0., 0.2, 0., 0.2, 0.15, 0.45, 0., 0.]))
+
+    def test_probability_and_sample(self):
+        probability = jnp.exp(self.jax_pc.root.log_probability_of_nodes_single(jnp.array([[0., 2.]]))[0])
+        self.assertAlmostEqual(probability, 0.2 + 0.15, delta=1e-5)
+        samples = jax.vmap(self.jax_pc.root.sample_from_node_single, (0, None))(
+            jax.random.split(jax.random.PRNGKey(0), 100), 0)
+        self.assertTrue(jnp.all(jnp.isin(samples, jnp.array([-1., 1., 2., 3.]))))
+
+    def test_to_nx(self):
+        x = np.array([[-1.], [1.], [2.], [3.]])
+        self.assertTrue(np.allclose(self.jax_pc.to_nx(False).log_likelihood(x), self.nx_pc.log_likelihood(x)))
+
+
+class PoissonLayerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.model = PoissonLayer(0, jnp.log(jnp.array([1., 4.])))
+
+    def test_log_likelihood(self):
+        x = jnp.array([[-1.], [0.], [3.], [1.5]])
+        expected = np.stack([poisson.logpmf([-1, 0, 3, 1.5], rate) for rate in (1., 4.)], axis=1)
+        self.assertTrue(np.allclose(self.model.log_likelihood_of_nodes(x), expected, atol=1e-5))
+
+    def test_probability(self):
+        probability = jnp.exp(self.model.log_probability_of_nodes_single(jnp.array([[0.5, 3.]])))
+        expected = [poisson.cdf(3, rate) - poisson.cdf(0, rate) for rate in (1., 4.)]
+        self.assertTrue(np.allclose(probability, expected, atol=1e-5))
+        everything = jnp.exp(self.model.log_probability_of_nodes_single(jnp.array([[-jnp.inf, jnp.inf]])))
+        self.assertTrue(jnp.allclose(everything, 1.))
+
+    def test_maximize(self):
+        samples = jnp.array([[1.], [2.], [6.]])
+        statistics = jax.vmap(self.model.sufficient_statistics_single)(samples).sum(0)
+        self.assertTrue(jnp.allclose(self.model.maximize(statistics).rate, 3.))
+
+    def test_nx_conversion(self):
+        x = Integer("x")
+        s = SumUnit()
+        s.add_subcircuit(UnivariateDiscreteLeaf(PoissonDistribution(x, 1.)), np.log(0.4))
+        s.add_subcircuit(UnivariateDiscreteLeaf(PoissonDistribution(x, 4.)), np.log(0.6))
+        nx_pc = s.probabilistic_circuit
+        jax_pc = ProbabilisticCircuit.from_nx(nx_pc)
+        self.assertIsInstance(jax_pc.root.child_layers[0], PoissonLayer)
+
+        data = np.array([[0.], [1.], [3.], [7.]])
+        self.assertTrue(np.allclose(jax_pc.log_likelihood(data), nx_pc.log_likelihood(data), atol=1e-5))
+        self.assertTrue(np.allclose(jax_pc.to_nx(False).log_likelihood(data), nx_pc.log_likelihood(data),
+                                    atol=1e-5))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,90 @@
+import unittest
+
+import jax.numpy as jnp
+import numpy as np
+from jax.experimental.sparse import BCOO
+
+from probabilistic_model.probabilistic_circuit.jax import SparseSumLayer, DenseSumLayer, ProductLayer, UniformLayer
+from probabilistic_model.probabilistic_circuit.jax.discrete_layer import DiscreteLayer
+from probabilistic_model.probabilistic_circuit.jax.expectation_maximization import (ExpectationMaximization,
+                                                                                    expectation, attach_probes)
+from probabilistic_model.probabilistic_circuit.jax.gaussian_layer import GaussianLayer
+
+
+class UniformMixtureTestCase(unittest.TestCase):
+    data = np.vstack((np.random.uniform(0, 1, (100, 1)),
+                      np.random.uniform(2, 3, (200, 1))))
+
+    def setUp(self):
+        uniform_layer = UniformLayer(0, jnp.array([[-0.01, 1.01],
+                                                   [1.99, 3.01]]))
+        self.model = SparseSumLayer([uniform_layer], [BCOO((jnp.array([0., 0.]), jnp.array([[0, 0], [0, 1]])),
+                                                           shape=(1, 2))])
+
+    def weights(self, model: SparseSumLayer) -> np.ndarray:
+        weights = np.exp(np.asarray(model.log_weights[0].data))
+        return weights / weights.sum()
+
+    def test_edge_flows(self):
+        _, (flows, _) = expectation(self.model, jnp.ones(len(self.data)), jnp.asarray(self.data))
+        self.assertTrue(np.allclose(flows[0], [100., 200.], atol=1e-3))
+
+    def test_full_batch(self):
+        trainer = ExpectationMaximization(epochs=1, progress_bar=False)
+        model, _ = trainer.fit(self.model, self.data)
+
+        # the components do not overlap, hence one step is enough
+        self.assertTrue(np.allclose(self.weights(model), [1 / 3, 2 / 3], atol=1e-4))
+
+    def test_stochastic(self):
+        trainer = ExpectationMaximization(epochs=5, batch_size=32, progress_bar=False)
+        model, history = trainer.fit(self.model, self.data)
+        self.assertEqual(len(history.loss), 5)
+        self.assertTrue(np.allclose(self.weights(model), [1 / 3, 2 / 3], atol=0.05))
+
+
+class GaussianMixtureTestCase(unittest.TestCase):
+
+    def setUp(self):
+        np.random.seed(69)
+        self.data = np.concatenate((np.random.normal(-2., 0.5, (300, 2)),
+                                    np.random.normal(3., 1., (700, 2))))
+
+        x = GaussianLayer(0, jnp.array([-1., 1.]), jnp.log(jnp.array([1., 1.])), jnp.array([0.01, 0.01]))
+        y = GaussianLayer(1, jnp.array([-1., 1.]), jnp.log(jnp.array([1., 1.])), jnp.array([0.01, 0.01]))
+        edges = BCOO((jnp.array([0, 1, 0, 1]), jnp.array([[0, 0], [0, 1], [1, 0], [1, 1]])), shape=(2, 2))
+        product_layer = ProductLayer([x, y], edges)
+        self.model = DenseSumLayer([product_layer], jnp.zeros((1, 2)))
+
+    def test_fit(self):
+        trainer = ExpectationMaximization(epochs=30, progress_bar=False)
+        model, history = trainer.fit(self.model, self.data)
+
+        # every step of full batch EM does not decrease the likelihood
+        self.assertTrue(np.all(np.diff(history.loss) <= 1e-5))
+
+        weights = np.asarray(model.normalized_weights)[0]
+        self.assertTrue(np.allclose(weights, [0.3, 0.7], atol=0.02))
+        x = model.child_layers[0].child_layers[0]
+        self.assertTrue(np.allclose(x.location, [-2., 3.], atol=0.1))
+        self.assertTrue(np.allclose(x.scale, [0.5, 1.], atol=0.1))
+
+    def test_attach_probes(self):
+        probe = attach_probes(self.model)
+        self.assertTrue(np.allclose(probe.log_likelihood_of_nodes(self.data[:5]),
+                                    self.model.log_likelihood_of_nodes(self.data[:5])))
+        self.assertEqual(probe.layer.child_layers[0].layer.child_layers[0].coefficients.shape, (2, 3))
+
+
+class DiscreteTestCase(unittest.TestCase):
+
+    def test_counts(self):
+        data = np.array([[0.], [1.], [1.], [2.], [2.], [2.]])
+        model = DenseSumLayer([DiscreteLayer(0, jnp.zeros((1, 3)))], jnp.zeros((1, 1)))
+        model, _ = ExpectationMaximization(epochs=1, progress_bar=False).fit(model, data)
+        probabilities = np.exp(np.asarray(model.child_layers[0].normalized_log_probabilities))
+        self.assertTrue(np.allclose(probabilities, [[1 / 6, 2 / 6, 3 / 6]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,16 @@
 import unittest
 
+import jax
 import jax.numpy as jnp
+import numpy as np
+from random_events.interval import closed, SimpleInterval
 from random_events.variable import Continuous
+from scipy.stats import lognorm
 
-from probabilistic_model.probabilistic_circuit.jax.gaussian_layer import GaussianLayer, GaussianDistribution
+from probabilistic_model.distributions import TruncatedGaussianDistribution, LogNormalDistribution
+from probabilistic_model.probabilistic_circuit.jax.gaussian_layer import (GaussianLayer, GaussianDistribution,
+                                                                          TruncatedGaussianLayer, LogNormalLayer)
+from probabilistic_model.probabilistic_circuit.jax.inner_layer import inverse_class_of, Layer
 from probabilistic_model.probabilistic_circuit.jax.probabilistic_circuit import ProbabilisticCircuit
 from probabilistic_model.probabilistic_circuit.nx.probabilistic_circuit import \
     SumUnit, UnivariateContinuousLeaf
@@ -43,5 +50,82 @@ class GaussianLayerTestCase(unittest.TestCase):
         self.assertTrue(jnp.allclose(gaussian_layer.scale, jnp.array([1.0, 1.01])))
 
 
+class TruncatedGaussianLayerTestCase(unittest.TestCase):
+    x = Continuous("x")
+
+    def setUp(self):
+        t1 = UnivariateContinuousLeaf(TruncatedGaussianDistribution(self.x, closed(-1., 1.).simple_sets[0], 0., 1.))
+        t2 = UnivariateContinuousLeaf(TruncatedGaussianDistribution(self.x, SimpleInterval(0., 3.), 2., 0.5))
+        s = SumUnit()
+        s.add_subcircuit(t1, np.log(0.3))
+        s.add_subcircuit(t2, np.log(0.7))
+        self.nx_pc = s.probabilistic_circuit
+        self.jax_pc = ProbabilisticCircuit.from_nx(self.nx_pc)
+
+    def test_registry(self):
+        self.assertIs(inverse_class_of(TruncatedGaussianDistribution), TruncatedGaussianLayer)
+        self.assertIs(inverse_class_of(GaussianDistribution), GaussianLayer)
+
+    def test_log_likelihood(self):
+        self.assertIsInstance(self.jax_pc.root.child_layers[0], TruncatedGaussianLayer)
+        x = np.array([[-2.], [-0.5], [0.5], [2.5], [4.]])
+        self.assertTrue(np.allclose(self.jax_pc.log_likelihood(x), self.nx_pc.log_likelihood(x), atol=1e-5))
+
+    def test_probability_and_sample(self):
+        layer: TruncatedGaussianLayer = self.jax_pc.root.child_layers[0]
+        probability = jnp.exp(layer.log_probability_of_nodes_single(jnp.array([[-jnp.inf, jnp.inf]])))
+        self.assertTrue(jnp.allclose(probability, 1., atol=1e-5))
+
+        samples = jax.vmap(layer.sample_from_node_single, (0, None))(jax.random.split(jax.random.PRNGKey(0), 100), 1)
+        self.assertTrue(jnp.all((samples > 0.) & (samples < 3.)))
+
+    def test_serialization(self):
+        layer = self.jax_pc.root.child_layers[0]
+        restored = Layer.from_json(layer.to_json())
+        self.assertIsInstance(restored, TruncatedGaussianLayer)
+        self.assertTrue(jnp.allclose(restored.interval, layer.interval))
+
+        x = np.array([[-0.5], [0.5], [2.5]])
+        self.assertTrue(np.allclose(self.jax_pc.to_nx(False).log_likelihood(x), self.nx_pc.log_likelihood(x),
+                                    atol=1e-5))
+
+    def test_fit_em(self):
+        with self.assertRaises(NotImplementedError):
+            self.jax_pc.fit_em(np.array([[0.], [0.5], [2.]]), epochs=1, progress_bar=False)
+
+
+class LogNormalLayerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.model = LogNormalLayer(0, jnp.array([0., 1.]), jnp.log(jnp.array([1., 0.5])), jnp.zeros(2))
+
+    def test_log_likelihood(self):
+        x = jnp.array([[-1.], [0.5], [2.]])
+        expected = np.stack([lognorm.logpdf(np.asarray(x[:, 0]), s=0.5 if node else 1.,
+                                            scale=np.exp(node)) for node in (0, 1)], axis=1)
+        self.assertTrue(np.allclose(self.model.log_likelihood_of_nodes(x), expected, atol=1e-5))
+
+    def test_probability_and_sample(self):
+        probability = jnp.exp(self.model.log_probability_of_nodes_single(jnp.array([[-1., 1.]])))
+        self.assertTrue(np.allclose(probability, [0.5, lognorm.cdf(1., s=0.5, scale=np.e)], atol=1e-5))
+        samples = jax.vmap(self.model.sample_from_node_single, (0, None))(
+            jax.random.split(jax.random.PRNGKey(0), 100), 0)
+        self.assertTrue(jnp.all(samples > 0))
+
+    def test_nx_conversion(self):
+        x = Continuous("x")
+        s = SumUnit()
+        s.add_subcircuit(UnivariateContinuousLeaf(LogNormalDistribution(x, 0., 1.)), np.log(0.3))
+        s.add_subcircuit(UnivariateContinuousLeaf(LogNormalDistribution(x, 1., 0.5)), np.log(0.7))
+        nx_pc = s.probabilistic_circuit
+        jax_pc = ProbabilisticCircuit.from_nx(nx_pc)
+        self.assertIsInstance(jax_pc.root.child_layers[0], LogNormalLayer)
+
+        data = np.array([[-1.], [0.5], [2.], [4.]])
+        self.assertTrue(np.allclose(jax_pc.log_likelihood(data), nx_pc.log_likelihood(data), atol=1e-5))
+        self.assertTrue(np.allclose(jax_pc.to_nx(False).log_likelihood(data), nx_pc.log_likelihood(data),
+                                    atol=1e-5))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,105 @@
+import os
+import subprocess
+import sys
+import textwrap
+import unittest
+
+import jax.numpy as jnp
+import numpy as np
+import optax
+from jax.experimental.sparse import BCOO
+
+import jax
+from random_events.variable import Continuous
+from sortedcontainers import SortedSet
+
+from probabilistic_model.probabilistic_circuit.jax import SparseSumLayer, UniformLayer
+from probabilistic_model.probabilistic_circuit.jax.gaussian_layer import GaussianLayer
+from probabilistic_model.probabilistic_circuit.jax.parallel import (data_parallel_mesh, log_likelihood_of_nodes,
+                                                                    pad_to_multiple, sample_from_node)
+from probabilistic_model.probabilistic_circuit.jax.probabilistic_circuit import ProbabilisticCircuit
+from probabilistic_model.probabilistic_circuit.jax.training import Trainer
+
+MULTI_DEVICE_SCRIPT = textwrap.dedent("""
+    import jax
+    import jax.numpy as jnp
+    import numpy as np
+    import optax
+    from jax.experimental.sparse import BCOO
+
+    from probabilistic_model.probabilistic_circuit.jax import SparseSumLayer, UniformLayer
+    from probabilistic_model.probabilistic_circuit.jax.gaussian_layer import GaussianLayer
+    from probabilistic_model.probabilistic_circuit.jax.parallel import (data_parallel_mesh, log_likelihood_of_nodes,
+                                                                        sample_from_node)
+    from probabilistic_model.probabilistic_circuit.jax.training import Trainer
+
+    assert len(jax.devices()) == 4
+    model = SparseSumLayer([UniformLayer(0, jnp.array([[0., 1.], [0.5, 2.]]))],
+                           [BCOO((jnp.array([0., 0.]), jnp.array([[0, 0], [0, 1]])), shape=(1, 2))])
+    data = np.random.uniform(0., 2., (101, 1))
+    mesh = data_parallel_mesh()
+
+    result = log_likelihood_of_nodes(model, data, mesh)
+    assert len(result.sharding.device_set) == 4
+    assert np.allclose(result, model.log_likelihood_of_nodes(data))
+
+    trainer = Trainer(optimizer=optax.sgd(0.1), epochs=3, batch_size=20, shuffle=False, progress_bar=False)
+    _, history = trainer.fit(model, data)
+    trainer.mesh = mesh
+    _, parallel_history = trainer.fit(model, data)
+    assert np.allclose(history.loss, parallel_history.loss, atol=1e-5), (history.loss, parallel_history.loss)
+
+    gaussian = SparseSumLayer([GaussianLayer(0, jnp.array([-1., 1.]), jnp.zeros(2), jnp.array([0.01, 0.01]))],
+                              [BCOO((jnp.log(jnp.array([0.3, 0.7])), jnp.array([[0, 0], [0, 1]])), shape=(1, 2))])
+    samples = sample_from_node(gaussian, jax.random.PRNGKey(0), 101, mesh=mesh)
+    assert samples.shape == (101, 1)
+    assert len(samples.sharding.device_set) == 4
+""")
+
+
+class ParallelTestCase(unittest.TestCase):
+    data = np.random.uniform(0., 2., (51, 1))
+
+    def setUp(self):
+        uniform_layer = UniformLayer(0, jnp.array([[0., 1.], [0.5, 2.]]))
+        self.model = SparseSumLayer([uniform_layer], [BCOO((jnp.array([0., 0.]), jnp.array([[0, 0], [0, 1]])),
+                                                           shape=(1, 2))])
+
+    def test_pad_to_multiple(self):
+        padded, length = pad_to_multiple(np.array([[1.], [2.], [3.]]), 4)
+        self.assertEqual(length, 3)
+        self.assertEqual(padded[:, 0].tolist(), [1., 2., 3., 1.])
+
+    def test_log_likelihood_of_nodes(self):
+        result = log_likelihood_of_nodes(self.model, self.data, data_parallel_mesh())
+        self.assertTrue(np.allclose(result, self.model.log_likelihood_of_nodes(self.data)))
+
+    def test_fit(self):
+        trainer = Trainer(optimizer=optax.sgd(0.1), epochs=3, batch_size=10, shuffle=False, progress_bar=False)
+        _, history = trainer.fit(self.model, self.data)
+        trainer.mesh = data_parallel_mesh()
+        _, parallel_history = trainer.fit(self.model, self.data)
+        self.assertTrue(np.allclose(history.loss, parallel_history.loss, atol=1e-5))
+
+    def test_sample_from_node(self):
+        model = SparseSumLayer([GaussianLayer(0, jnp.array([-1., 1.]), jnp.zeros(2), jnp.array([0.01, 0.01]))],
+                               [BCOO((jnp.log(jnp.array([0.3, 0.7])), jnp.array([[0, 0], [0, 1]])), shape=(1, 2))])
+        key = jax.random.PRNGKey(0)
+        samples = sample_from_node(model, key, 51, mesh=data_parallel_mesh())
+        self.assertEqual(samples.shape, (51, 1))
+        self.assertTrue(np.all(np.isfinite(model.log_likelihood_of_nodes(samples))))
+
+        circuit = ProbabilisticCircuit(SortedSet([Continuous("x")]), model)
+        self.assertTrue(np.allclose(circuit.sample(51, key, mesh=data_parallel_mesh()), samples))
+        self.assertEqual(circuit.sample(1000).shape, (1000, 1))
+        self.assertAlmostEqual(float(jnp.mean(circuit.sample(1000) > 0)), 0.7, delta=0.05)
+
+    def test_multiple_devices(self):
+        environment = dict(os.environ, XLA_FLAGS="--xla_force_host_platform_device_count=4", JAX_PLATFORMS="cpu")
+        result = subprocess.run([sys.executable, "-c", MULTI_DEVICE_SCRIPT], env=environment, capture_output=True,
+                                text=True)
+        self.assertEqual(result.returncode, 0, result.stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,72 @@
+import unittest
+
+import jax
+import jax.numpy as jnp
+import numpy as np
+from random_events.variable import Continuous
+
+from probabilistic_model.distributions import PiecewiseUniformDistribution
+from probabilistic_model.probabilistic_circuit.jax.inner_layer import inverse_class_of, Layer
+from probabilistic_model.probabilistic_circuit.jax.piecewise_uniform_layer import PiecewiseUniformLayer
+from probabilistic_model.probabilistic_circuit.jax.probabilistic_circuit import ProbabilisticCircuit
+from probabilistic_model.probabilistic_circuit.nx.probabilistic_circuit import SumUnit, UnivariateContinuousLeaf
+
+
+class PiecewiseUniformLayerTestCase(unittest.TestCase):
+    x = Continuous("x")
+
+    def setUp(self):
+        p1 = PiecewiseUniformDistribution(self.x, np.array([0., 1., 3., 4.]), np.array([0.2, 0.4, 0.4]))
+        p2 = PiecewiseUniformDistribution(self.x, np.array([2., 5.]), np.array([1.]))
+        s = SumUnit()
+        s.add_subcircuit(UnivariateContinuousLeaf(p1), np.log(0.3))
+        s.add_subcircuit(UnivariateContinuousLeaf(p2), np.log(0.7))
+        self.nx_pc = s.probabilistic_circuit
+        self.jax_pc = ProbabilisticCircuit.from_nx(self.nx_pc)
+        self.layer: PiecewiseUniformLayer = self.jax_pc.root.child_layers[0]
+
+    def test_registry(self):
+        self.assertIs(inverse_class_of(PiecewiseUniformDistribution), PiecewiseUniformLayer)
+        self.assertIsInstance(self.layer, PiecewiseUniformLayer)
+        self.layer.validate()
+        self.assertEqual(self.layer.breakpoints.shape, (2, 4))
+        self.assertTrue(jnp.all(self.layer.number_of_used_bins == jnp.array([3, 1])))
+
+    def test_log_likelihood(self):
+        x = np.array([[-1.], [0.], [0.5], [2.5], [3.], [4.], [4.5], [6.]])
+        self.assertTrue(np.allclose(self.jax_pc.log_likelihood(x), self.nx_pc.log_likelihood(x), atol=1e-5))
+
+    def test_probability(self):
+        events = jnp.array([[[-jnp.inf, jnp.inf]], [[0.5, 3.5]], [[2.5, 6.]], [[5., 6.]]])
+        probabilities = jnp.exp(jax.vmap(self.layer.log_probability_of_nodes_single)(events))
+        expected = [[1., 1.], [0.7, 0.5], [0.5, 5 / 6], [0., 0.]]
+        self.assertTrue(np.allclose(probabilities, expected, atol=1e-5))
+
+    def test_sample(self):
+        keys = jax.random.split(jax.random.PRNGKey(69), 1000)
+        samples = jax.vmap(self.layer.sample_from_node_single, (0, None))(keys, 0)
+        self.assertTrue(jnp.all((samples >= 0.) & (samples <= 4.)))
+        self.assertAlmostEqual(float(jnp.mean(samples < 1.)), 0.2, delta=0.05)
+
+    def test_fit_em(self):
+        data = np.array([[0.5], [0.5], [3.5], [2.5], [4.5]])
+        statistics = jnp.sum(jax.vmap(self.layer.sufficient_statistics_single)(data), axis=0)
+        layer = self.layer.maximize(statistics)
+        self.assertTrue(np.allclose(jnp.exp(layer.normalized_log_probabilities[0]), [0.5, 0.25, 0.25], atol=1e-5))
+        self.assertTrue(np.allclose(jnp.exp(layer.normalized_log_probabilities[1]), [1., 0., 0.], atol=1e-5))
+
+    def test_serialization(self):
+        restored = Layer.from_json(self.layer.to_json())
+        self.assertIsInstance(restored, PiecewiseUniformLayer)
+        self.assertTrue(jnp.allclose(restored.breakpoints, self.layer.breakpoints))
+
+        nx_pc = self.jax_pc.to_nx(False)
+        leaves = [leaf.distribution for leaf in nx_pc.leaves]
+        self.assertTrue(all(isinstance(leaf, PiecewiseUniformDistribution) for leaf in leaves))
+        self.assertEqual(sorted(len(leaf.probabilities) for leaf in leaves), [1, 3])
+        x = np.array([[0.5], [2.5], [4.5]])
+        self.assertTrue(np.allclose(nx_pc.log_likelihood(x), self.nx_pc.log_likelihood(x), atol=1e-5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+
+import equinox as eqx
+import jax
+import jax.numpy as jnp
+import numpy as np
+import optax
+from jax.experimental import enable_x64
+from jax.experimental.sparse import BCOO
+from random_events.variable import Continuous
+from sortedcontainers import SortedSet
+
+from probabilistic_model.probabilistic_circuit.jax import SparseSumLayer, ProductLayer
+from probabilistic_model.probabilistic_circuit.jax.gaussian_layer import GaussianLayer
+from probabilistic_model.probabilistic_circuit.jax.precision import (PrecisionPolicy, bfloat16_policy,
+                                                                     float64_policy)
+from probabilistic_model.probabilistic_circuit.jax.probabilistic_circuit import ProbabilisticCircuit
+
+
+class PrecisionTestCase(unittest.TestCase):
+    x = Continuous("x")
+    y = Continuous("y")
+    data = np.random.normal(0., 1., (50, 2))
+
+    def root(self) -> SparseSumLayer:
+        x = GaussianLayer(0, jnp.array([-1., 1.]), jnp.log(jnp.array([1., 2.])), jnp.array([0.01, 0.01]))
+        y = GaussianLayer(1, jnp.array([0., 2.]), jnp.log(jnp.array([0.5, 1.])), jnp.array([0.01, 0.01]))
+        edges = BCOO((jnp.array([0, 1, 0, 1]), jnp.array([[0, 0], [0, 1], [1, 0], [1, 1]])), shape=(2, 2))
+        product_layer = ProductLayer([x, y], edges)
+        log_weights = BCOO((jnp.log(jnp.array([0.3, 0.7])), jnp.array([[0, 0], [0, 1]])), shape=(1, 2))
+        return SparseSumLayer([product_layer], [log_weights])
+
+    def dtypes(self, model: ProbabilisticCircuit):
+        return {leaf.dtype for leaf in jax.tree_util.tree_leaves(eqx.filter(model.root, eqx.is_inexact_array))}
+
+    def test_storage_and_compute(self):
+        model = ProbabilisticCircuit(SortedSet([self.x, self.y]), self.root(), bfloat16_policy)
+        self.assertEqual(self.dtypes(model), {jnp.dtype(jnp.bfloat16)})
+
+        reference = ProbabilisticCircuit(SortedSet([self.x, self.y]), self.root())
+        result = model.log_likelihood(self.data)
+        self.assertEqual(result.dtype, jnp.float32)
+        self.assertTrue(np.allclose(result, reference.log_likelihood(self.data), atol=0.05))
+
+    def test_serialization(self):
+        model = ProbabilisticCircuit(SortedSet([self.x, self.y]), self.root(), bfloat16_policy)
+        restored = ProbabilisticCircuit.from_json(model.to_json())
+        self.assertEqual(restored.precision, bfloat16_policy)
+        self.assertEqual(self.dtypes(restored), {jnp.dtype(jnp.bfloat16)})
+        self.assertEqual(PrecisionPolicy.from_json(bfloat16_policy.to_json()), bfloat16_policy)
+
+    def test_fit(self):
+        model = ProbabilisticCircuit(SortedSet([self.x, self.y]), self.root(), bfloat16_policy)
+        history = model.fit(self.data, epochs=10, optimizer=optax.adam(0.05), progress_bar=False)
+        self.assertLess(history.loss[-1], history.loss[0])
+        self.assertEqual(self.dtypes(model), {jnp.dtype(jnp.bfloat16)})
+
+    def test_fit_with_small_learning_rate(self):
+        data = np.random.normal(3., 1., (100, 1))
+        root = GaussianLayer(0, jnp.array([0.5]), jnp.zeros(1), jnp.array([0.01]))
+        model = ProbabilisticCircuit(SortedSet([self.x]), root, bfloat16_policy)
+        reference = ProbabilisticCircuit(SortedSet([self.x]), root)
+        model.fit(data, epochs=50, optimizer=optax.adam(1e-3), progress_bar=False)
+        reference.fit(data, epochs=50, optimizer=optax.adam(1e-3), progress_bar=False)
+
+        # the updates are far below the resolution of bfloat16 and accumulate in the float32 master parameters
+        self.assertEqual(model.root.location.dtype, jnp.bfloat16)
+        self.assertGreater(float(model.root.location[0]), 0.53)
+        self.assertAlmostEqual(float(model.root.location[0]), float(reference.root.location[0]), delta=0.01)
+
+    def test_fit_em(self):
+        model = ProbabilisticCircuit(SortedSet([self.x, self.y]), self.root(), bfloat16_policy)
+        model.fit_em(self.data, epochs=3, progress_bar=False)
+        self.assertEqual(self.dtypes(model), {jnp.dtype(jnp.bfloat16)})
+
+    def test_float64(self):
+        with enable_x64():
+            model = ProbabilisticCircuit(SortedSet([self.x, self.y]), self.root(), float64_policy)
+            self.assertEqual(self.dtypes(model), {jnp.dtype(jnp.float64)})
+            result = model.log_likelihood(self.data)
+            self.assertEqual(result.dtype, jnp.float64)
+
+
+if __name__ == '__main__':
+    unittest.main()
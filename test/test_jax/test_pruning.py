@@ -0,0 +1,97 @@
+import unittest
+
+import jax.numpy as jnp
+import numpy as np
+from jax.experimental.sparse import BCOO
+from random_events.variable import Continuous
+from sortedcontainers import SortedSet
+
+from probabilistic_model.distributions import DiracDeltaDistribution
+from probabilistic_model.probabilistic_circuit.jax import SparseSumLayer, DenseSumLayer, ProductLayer
+from probabilistic_model.probabilistic_circuit.jax.gaussian_layer import GaussianLayer
+from probabilistic_model.probabilistic_circuit.jax.probabilistic_circuit import ProbabilisticCircuit
+from probabilistic_model.probabilistic_circuit.jax.pruning import prune
+from probabilistic_model.probabilistic_circuit.nx.helper import leaf
+from probabilistic_model.probabilistic_circuit.nx.probabilistic_circuit import SumUnit, ProductUnit
+
+
+class SparsePruningTestCase(unittest.TestCase):
+    x = Continuous("x")
+    y = Continuous("y")
+    data = np.random.normal(0., 1., (100, 2))
+
+    def setUp(self):
+        x = GaussianLayer(0, jnp.array([-1., 0., 1.]), jnp.zeros(3), jnp.full(3, 0.01))
+        y = GaussianLayer(1, jnp.array([-2., 0., 2.]), jnp.zeros(3), jnp.full(3, 0.01))
+        edges = BCOO((jnp.array([0, 1, 2, 0, 1, 2]), jnp.array([[0, 0], [0, 1], [0, 2], [1, 0], [1, 1], [1, 2]])),
+                     shape=(2, 3))
+        product_layer = ProductLayer([x, y], edges)
+        log_weights = BCOO((jnp.log(jnp.array([0.001, 0.499, 0.5])), jnp.array([[0, 0], [0, 1], [0, 2]])),
+                           shape=(1, 3))
+        self.model = ProbabilisticCircuit(SortedSet([self.x, self.y]), SparseSumLayer([product_layer], [log_weights]))
+
+    def test_prune(self):
+        pruned, report = self.model.prune(0.01, self.data)
+        product_layer = pruned.root.child_layers[0]
+        self.assertEqual(product_layer.number_of_nodes, 2)
+        self.assertEqual(product_layer.child_layers[0].location.tolist(), [0., 1.])
+        self.assertEqual(product_layer.child_layers[1].location.tolist(), [0., 2.])
+        self.assertEqual(pruned.root.log_weights[0].indices.tolist(), [[0, 0], [0, 1]])
+        self.assertGreater(report.compression, 1.)
+        self.assertLess(abs(report.log_likelihood_change), 0.01)
+
+    def test_nothing_to_prune(self):
+        pruned, report = self.model.prune(0.)
+        self.assertEqual(report.number_of_components_before, report.number_of_components_after)
+        self.assertIsNone(report.log_likelihood_change)
+        self.assertTrue(np.allclose(pruned.log_likelihood(self.data), self.model.log_likelihood(self.data)))
+
+    def test_keeps_largest_edge(self):
+        pruned, _ = self.model.prune(0.9)
+        self.assertEqual(pruned.root.log_weights[0].nse, 1)
+        self.assertEqual(pruned.root.child_layers[0].child_layers[0].location.tolist(), [1.])
+
+
+class SharedLayerPruningTestCase(unittest.TestCase):
+    x = Continuous("x")
+    y = Continuous("y")
+
+    def test_prune_dag(self):
+        sum1, sum2 = SumUnit(), SumUnit()
+        prod1, prod2 = ProductUnit(), ProductUnit()
+        d_x1 = leaf(DiracDeltaDistribution(self.x, 0, 1))
+        d_x2 = leaf(DiracDeltaDistribution(self.x, 1, 2))
+        d_y1 = leaf(DiracDeltaDistribution(self.y, 2, 3))
+        sum1.add_subcircuit(prod1, np.log(0.4))
+        sum1.add_subcircuit(prod2, np.log(0.6))
+        prod1.add_subcircuit(sum2)
+        prod1.add_subcircuit(d_y1)
+        prod2.add_subcircuit(d_x2)
+        prod2.add_subcircuit(d_y1)
+        sum2.add_subcircuit(d_x1, np.log(0.3))
+        sum2.add_subcircuit(d_x2, np.log(0.7))
+        model = ProbabilisticCircuit.from_nx(sum1.probabilistic_circuit)
+
+        pruned, report = model.prune(0.35)
+        self.assertLess(report.number_of_components_after, report.number_of_components_before)
+
+        # the leaf of x at 0 is gone, the shared leaf of x at 1 now has the full weight of the inner sum
+        samples = np.array([[0., 2.], [1., 2.]])
+        result = np.exp(np.asarray(pruned.log_likelihood(samples)))
+        self.assertTrue(np.allclose(result, [0., 0.4 * 2 * 3 + 0.6 * 2 * 3]))
+
+
+class DensePruningTestCase(unittest.TestCase):
+
+    def test_prune_dense(self):
+        x = GaussianLayer(0, jnp.array([-1., 0., 1.]), jnp.zeros(3), jnp.full(3, 0.01))
+        log_weights = jnp.log(jnp.array([[0.98, 0.01, 0.01], [0.01, 0.01, 0.98]]))
+        pruned, _ = prune(DenseSumLayer([x], log_weights), 0.05)
+
+        self.assertEqual(pruned.child_layers[0].location.tolist(), [-1., 1.])
+        self.assertEqual(pruned.log_weights.shape, (2, 2))
+        self.assertTrue(np.allclose(pruned.normalized_weights, [[1., 0.], [0., 1.]]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -139,6 +139,39 @@ class DiracDenseSumUnitTestCase(unittest.TestCase):
         result = jnp.log(jnp.array([0., 0.4]))
         assert jnp.allclose(l, result)
 
+    def test_fused_log_weights(self):
+        self.assertEqual(self.sum_layer.log_weights.shape, (2, 7))
+        self.assertEqual(self.sum_layer.child_offsets, (0, 2, 3, 6, 7))
+        blocks = [log_weights.shape for log_weights, _ in self.sum_layer.log_weighted_child_layers]
+        self.assertEqual(blocks, [(2, 2), (2, 1), (2, 3), (2, 1)])
+
+    def test_ll_single_equals_batched(self):
+        data = jnp.array([0., 1., 2., 3., 4., 5., 6.]).reshape(-1, 1)
+        batched = self.sum_layer.log_likelihood_of_nodes(data)
+        single = jax.vmap(self.sum_layer.log_likelihood_of_nodes_single)(data)
+        self.assertTrue(jnp.allclose(batched, single))
+
+    def test_serialization(self):
+        json_dict = self.sum_layer.to_json()
+        deserialized = DenseSumLayer.from_json(json_dict)
+        self.assertTrue(jnp.allclose(deserialized.log_weights, self.sum_layer.log_weights, equal_nan=True))
+        self.assertEqual(deserialized.child_offsets, self.sum_layer.child_offsets)
+
+        # legacy format with one weight matrix per child layer
+        json_dict["log_weights"] = [log_weights.tolist() for log_weights, _ in
+                                    self.sum_layer.log_weighted_child_layers]
+        deserialized = DenseSumLayer.from_json(json_dict)
+        self.assertTrue(jnp.allclose(deserialized.log_weights, self.sum_layer.log_weights, equal_nan=True))
+
+    def test_to_nx(self):
+        nx_model = NXProbabilisticCircuit()
+        units = self.sum_layer.to_nx(SortedSet([self.x]), nx_model)
+        self.assertEqual(len(units), 2)
+        self.assertEqual(len(nx_model.edges), 2 * 7)
+        weights = [np.exp(log_weight) for log_weight, _ in units[0].log_weighted_subcircuits]
+        self.assertTrue(np.allclose(weights, [0, 0.1, 0.2, 0.3, 0, 0.4, 0]))
+        locations = [subcircuit.distribution.location for subcircuit in units[1].subcircuits]
+        self.assertEqual(locations, [0., 1., 2., 3., 4., 5., 6.])
 
 
 class NygaDistributionTestCase(unittest.TestCase):
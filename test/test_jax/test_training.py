@@ -0,0 +1,100 @@
+import os
+import tempfile
+import unittest
+
+import equinox as eqx
+import jax
+import jax.numpy as jnp
+import numpy as np
+import optax
+from jax.experimental.sparse import BCOO
+
+from probabilistic_model.probabilistic_circuit.jax import SparseSumLayer, UniformLayer
+from probabilistic_model.probabilistic_circuit.jax.training import Trainer, pad_batch, negative_log_likelihood
+
+
+class TrainerTestCase(unittest.TestCase):
+    data = np.vstack((np.random.uniform(0, 1, (100, 1)),
+                      np.random.uniform(2, 3, (200, 1))))
+
+    def setUp(self):
+        uniform_layer = UniformLayer(0, jnp.array([[-0.01, 1.01],
+                                                   [1.99, 3.01]]))
+        self.model = SparseSumLayer([uniform_layer], [BCOO((jnp.array([0., 0.]), jnp.array([[0, 0], [0, 1]])),
+                                                           shape=(1, 2))])
+
+    def assert_weights(self, model: SparseSumLayer):
+        weights = jnp.exp(model.log_weights[0].data)
+        weights /= jnp.sum(weights)
+        self.assertAlmostEqual(weights[0], 1 / 3, delta=0.02)
+        self.assertAlmostEqual(weights[1], 2 / 3, delta=0.02)
+
+    def test_pad_batch(self):
+        weights, (batch,) = pad_batch((np.array([[1.], [2.]]),), 5)
+        self.assertEqual(weights.tolist(), [1., 1., 0., 0., 0.])
+        self.assertEqual(batch[:, 0].tolist(), [1., 2., 1., 2., 1.])
+
+    def test_pad_invalid_batch(self):
+        with self.assertRaises(ValueError):
+            pad_batch((np.zeros((6, 1)),), 5)
+        with self.assertRaises(ValueError):
+            pad_batch((np.zeros((0, 1)),), 5)
+
+    def test_loader_with_uneven_batches(self):
+        def loader():
+            yield self.data[:50],
+            yield self.data[50:50],
+            yield self.data[50:],
+
+        trainer = Trainer(negative_log_likelihood, optax.adam(0.05), epochs=20, batches_per_chunk=2,
+                          progress_bar=False)
+        chunks = list(trainer.chunks(loader, 50, jax.random.PRNGKey(0)))
+        self.assertEqual(sum(weights.sum() for weights, _ in chunks), len(self.data))
+        model, _ = trainer.fit(self.model, loader)
+        self.assert_weights(model)
+
+    def test_mini_batch(self):
+        trainer = Trainer(negative_log_likelihood, optax.adam(0.01), epochs=30, batch_size=32, batches_per_chunk=4,
+                          progress_bar=False)
+        model, history = trainer.fit(self.model, self.data)
+        self.assertEqual(len(history.loss), 30)
+        self.assertLess(history.loss[-1], history.loss[0])
+        self.assert_weights(model)
+
+    def test_memmap(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "data.npy")
+            np.save(path, self.data)
+            data = np.load(path, mmap_mode="r")
+            trainer = Trainer(negative_log_likelihood, optax.adam(0.05), epochs=20, batch_size=64,
+                              progress_bar=False)
+            model, _ = trainer.fit(self.model, data)
+        self.assert_weights(model)
+
+    def test_loader(self):
+        def loader():
+            for start in range(0, len(self.data), 50):
+                yield self.data[start:start + 50],
+
+        trainer = Trainer(negative_log_likelihood, optax.adam(0.05), epochs=20, progress_bar=False)
+        model, _ = trainer.fit(self.model, loader)
+        self.assert_weights(model)
+
+    def test_early_stopping_and_checkpoint(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "model.eqx")
+            trainer = Trainer(negative_log_likelihood, optax.sgd(0.), epochs=20, batch_size=100, patience=3,
+                              checkpoint_path=path, progress_bar=False)
+            model, history = trainer.fit(self.model, self.data, validation_data=(self.data,))
+            self.assertTrue(os.path.exists(path))
+            restored = eqx.tree_deserialise_leaves(path, self.model)
+
+        # nothing can improve with a learning rate of 0, hence training stops after the patience is exhausted
+        self.assertEqual(history.best_epoch, 0)
+        self.assertEqual(len(history.loss), 4)
+        self.assertEqual(len(history.validation_loss), 4)
+        self.assertTrue(jnp.allclose(restored.log_weights[0].data, model.log_weights[0].data))
+
+
+if __name__ == '__main__':
+    unittest.main()
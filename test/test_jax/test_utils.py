@@ -4,13 +4,13 @@ import jax.numpy as jnp
 import jax.random
 import numpy as np
 from jax.experimental.sparse import BCOO, BCSR
-from random_events.interval import SimpleInterval
+from random_events.interval import SimpleInterval, Bound
 from scipy.sparse import coo_array
 
 from probabilistic_model.probabilistic_circuit.jax import create_bcsr_indices_from_row_lengths, shrink_index_array, \
     sparse_remove_rows_and_cols_where_all
 from probabilistic_model.probabilistic_circuit.jax.utils import copy_bcoo, simple_interval_to_open_array, \
-    create_bcoo_indices_from_row_lengths, sample_from_sparse_probabilities_csc
+    create_bcoo_indices_from_row_lengths, sample_from_sparse_probabilities_csc, simple_intervals_to_open_array
 
 
 class BCOOTestCase(unittest.TestCase):
@@ -74,6 +74,12 @@ class IntervalConversionTestCase(unittest.TestCase):
         array = simple_interval_to_open_array(simple_interval)
         self.assertTrue(jnp.allclose(array, jnp.array([0, 1])))
 
+    def test_simple_intervals_to_open_array(self):
+        intervals = [SimpleInterval(0, 1, Bound.OPEN, Bound.CLOSED), SimpleInterval(2, 3, Bound.CLOSED, Bound.OPEN)]
+        array = simple_intervals_to_open_array(intervals)
+        expected = jnp.vstack([simple_interval_to_open_array(interval) for interval in intervals])
+        self.assertTrue(jnp.all(array == expected))
+
 
 if __name__ == '__main__':
     unittest.main()
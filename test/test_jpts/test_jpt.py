@@ -1,10 +1,13 @@
 import unittest
 import json
 import math
+import os
 import random
 import tempfile
 from datetime import datetime
 from enum import IntEnum, Enum
+from multiprocessing import shared_memory
+from unittest import mock
 
 import numpy as np
 import pandas as pd
@@ -17,7 +20,10 @@ from random_events.interval import closed
 from random_events.product_algebra import SimpleEvent
 from random_events.variable import Variable, Continuous
 
-from probabilistic_model.distributions import GaussianDistribution
+from probabilistic_model.distributions import GaussianDistribution, PiecewiseUniformDistribution, \
+    DiscreteDistribution
+from probabilistic_model.learning.jpt.decision_tree import DecisionTree
+from probabilistic_model.learning.jpt.histogram_impurity import HistogramImpurity, quantize
 from probabilistic_model.learning.jpt.jpt import JPT
 from probabilistic_model.learning.jpt.variables import (ScaledContinuous, infer_variables_from_dataframe, Integer,
                                                         Symbolic)
@@ -94,6 +100,12 @@ class InferFromDataFrameTestCase(unittest.TestCase):
         real, integer, symbol = infer_variables_from_dataframe(self.data, scale_continuous_types=False)
         self.assertNotIsInstance(real, ScaledContinuous)
 
+    def test_infer_from_categorical(self):
+        data = pd.DataFrame({"symbol": pd.Categorical(["a", "b", "a"], categories=["a", "b", "c"])})
+        symbol, = infer_variables_from_dataframe(data)
+        self.assertIsInstance(symbol, Symbolic)
+        self.assertEqual(set(symbol.domain.all_elements), {"a", "b", "c"})
+
     def test_unknown_type(self):
         df = pd.DataFrame()
         df["time"] = [datetime.now()]
@@ -101,6 +113,33 @@ class InferFromDataFrameTestCase(unittest.TestCase):
             infer_variables_from_dataframe(df)
 
 
+class DecisionTreeTestCase(unittest.TestCase):
+    # x <= 0 ? leaf 0 : (s == 1 ? leaf 1 : leaf 2)
+    tree = DecisionTree([0, -1, 1, -1, -1], [0., 0., 1., 0., 0.], [False, False, True, False, False],
+                        [1, -1, 3, -1, -1], [2, -1, 4, -1, -1], [-1, 0, -1, 1, 2])
+
+    def test_route(self):
+        data = np.array([[-1., 1.], [0., 0.], [1., 1.], [1., 2.]])
+        self.assertEqual(self.tree.route(data).tolist(), [0, 0, 1, 2])
+
+    def test_leaves_of_point(self):
+        self.assertEqual(self.tree.leaves_of_point({0: 1.}).tolist(), [1, 2])
+        self.assertEqual(self.tree.leaves_of_point({1: 2.}).tolist(), [0, 2])
+        self.assertEqual(self.tree.leaves_of_point({}).tolist(), [0, 1, 2])
+
+    def test_replace_leaf(self):
+        subtree = DecisionTree([1, -1, -1], [0., 0., 0.], [False, False, False], [1, -1, -1], [2, -1, -1],
+                               [-1, 0, 1])
+        result = self.tree.replace_leaf(0, subtree)
+        self.assertEqual(result.number_of_leaves, 4)
+        data = np.array([[-1., -1.], [-1., 1.], [1., 1.], [1., 2.]])
+        self.assertEqual(result.route(data).tolist(), [2, 3, 0, 1])
+
+    def test_serialization(self):
+        result = DecisionTree.from_json(self.tree.to_json())
+        self.assertEqual(result.to_json(), self.tree.to_json())
+
+
 class JPTTestCase(unittest.TestCase):
     data: pd.DataFrame
     real: ScaledContinuous
@@ -129,7 +168,7 @@ class JPTTestCase(unittest.TestCase):
 
         self.assertEqual(len(leaf_node.subcircuits), 3)
         self.assertIsInstance(leaf_node.subcircuits[0].distribution, IntegerDistribution)
-        self.assertIsInstance(leaf_node.subcircuits[1], SumUnit)
+        self.assertIsInstance(leaf_node.subcircuits[1].distribution, PiecewiseUniformDistribution)
         self.assertIsInstance(leaf_node.subcircuits[2].distribution, SymbolicDistribution)
 
         # check that all likelihoods are greater than 0
@@ -155,6 +194,194 @@ class JPTTestCase(unittest.TestCase):
 
         self.assertTrue(all(likelihood > 0))
 
+    def test_fit_in_parallel(self):
+        self.model._min_samples_leaf = 10
+        self.model.keep_sample_indices = True
+        self.model.fit(self.data)
+        parallel_model = JPT([self.real, self.integer, self.symbol], min_samples_leaf=10)
+        parallel_model.keep_sample_indices = True
+        parallel_model.fit(self.data, n_jobs=2)
+
+        self.assertEqual(len(parallel_model.root.subcircuits), len(self.model.root.subcircuits))
+        for leaf, parallel_leaf in zip(self.model.root.subcircuits, parallel_model.root.subcircuits):
+            self.assertEqual(leaf.sample_indices.tolist(), parallel_leaf.sample_indices.tolist())
+            self.assertEqual(leaf.total_samples, parallel_leaf.total_samples)
+
+        preprocessed_data = self.model.preprocess_data(self.data)
+        self.assertTrue(np.allclose(parallel_model.log_likelihood(preprocessed_data),
+                                    self.model.log_likelihood(preprocessed_data)))
+
+    def test_fit_from_chunks(self):
+        self.model._min_samples_leaf = 10
+        self.model.fit(self.data)
+        chunked_model = JPT([self.real, self.integer, self.symbol], min_samples_leaf=10)
+        chunked_model.fit_from_chunks(self.data.iloc[index:index + 30] for index in range(0, len(self.data), 30))
+        self.assertIsNone(chunked_model.impurity)
+
+        self.assertEqual(len(chunked_model.root.subcircuits), len(self.model.root.subcircuits))
+        preprocessed_data = self.model.preprocess_data(self.data)
+        self.assertTrue(np.allclose(chunked_model.log_likelihood(preprocessed_data),
+                                    self.model.log_likelihood(preprocessed_data)))
+
+    def test_fit_from_chunks_in_parallel(self):
+        self.model._min_samples_leaf = 10
+        self.model.fit(self.data)
+        chunked_model = JPT([self.real, self.integer, self.symbol], min_samples_leaf=10)
+
+        # only the indices are placed in shared memory, the memory mapped data is opened by every process
+        with mock.patch.object(shared_memory, "SharedMemory", wraps=shared_memory.SharedMemory) as shared_memory_class:
+            chunked_model.fit_from_chunks((self.data.iloc[index:index + 30] for index in range(0, len(self.data), 30)),
+                                          n_jobs=2)
+        self.assertEqual(shared_memory_class.call_count, 1)
+
+        preprocessed_data = self.model.preprocess_data(self.data)
+        self.assertTrue(np.allclose(chunked_model.log_likelihood(preprocessed_data),
+                                    self.model.log_likelihood(preprocessed_data)))
+
+    def test_preprocess_categorical_data(self):
+        data = self.data.astype({"symbol": "category"})
+        self.assertTrue(np.all(self.model.preprocess_data(data) == self.model.preprocess_data(self.data)))
+
+    def test_preprocess_data_into_preallocated_array(self):
+        result = np.zeros((len(self.data), 3), order="F")
+        self.assertIs(self.model.preprocess_data(self.data, out=result), result)
+        self.assertTrue(np.all(result == self.model.preprocess_data(self.data)))
+
+    def test_preprocess_unknown_symbol(self):
+        data = self.data.copy()
+        data["symbol"] = data["symbol"].astype(object)
+        data.loc[0, "symbol"] = "unknown"
+        with self.assertRaises(ValueError):
+            self.model.preprocess_data(data)
+
+    def test_preprocess_chunks(self):
+        with tempfile.TemporaryDirectory() as directory:
+            result = self.model.preprocess_chunks([self.data.iloc[:40], self.data.iloc[40:]],
+                                                  os.path.join(directory, "data.bin"))
+            self.assertIsInstance(result, np.memmap)
+            self.assertTrue(np.allclose(result, self.model.preprocess_data(self.data)))
+            del result
+
+    def test_max_samples_per_leaf(self):
+        model = JPT([self.real, self.integer, self.symbol], min_impurity_improvement=1, max_samples_per_leaf=20)
+        model.fit(self.data)
+        self.assertEqual(model.root.subcircuits[0].total_samples, 100)
+        self.assertEqual(len(model.bounded_leaf_samples(np.arange(100))), 20)
+        self.assertEqual(len(model.bounded_leaf_samples(np.arange(10))), 10)
+
+    def test_fit_on_histograms(self):
+        self.model._min_samples_leaf = 5
+        self.model.keep_sample_indices = True
+        self.model.fit(self.data)
+        binned_model = JPT([self.real, self.integer, self.symbol], min_samples_leaf=5, max_bins=256)
+        binned_model.keep_sample_indices = True
+        binned_model.fit(self.data)
+        self.assertIsInstance(binned_model.impurity, HistogramImpurity)
+        self.assertEqual(binned_model.impurity.binned_features.dtype, np.uint8)
+
+        # every distinct value gets its own bin, hence the splits are the same as on the exact values
+        leaves = sorted(sorted(leaf.sample_indices.tolist()) for leaf in self.model.root.subcircuits)
+        binned_leaves = sorted(sorted(leaf.sample_indices.tolist()) for leaf in binned_model.root.subcircuits)
+        self.assertEqual(leaves, binned_leaves)
+
+    def test_fit_on_few_bins(self):
+        model = JPT([self.real, self.integer, self.symbol], min_samples_leaf=5, max_bins=4)
+        model.fit(self.data)
+        self.assertTrue(all(len(edges) < 4 for edges in model.impurity.bin_edges))
+        self.assertTrue(all(model.likelihood(model.preprocess_data(self.data)) > 0))
+
+    def test_quantize(self):
+        self.assertEqual(quantize(np.array([3., 1., 2., 1.]), 256).tolist(), [2., 3.])
+        edges = quantize(np.random.normal(size=1000), 16)
+        self.assertEqual(len(edges), 15)
+        self.assertTrue(np.all(np.diff(edges) > 0))
+
+    def test_partial_fit(self):
+        model = JPT([self.real, self.integer, self.symbol], min_samples_leaf=10)
+        model.fit(self.data.iloc[:60])
+        number_of_leaves = len(model.root.subcircuits)
+        model.partial_fit(self.data.iloc[60:])
+
+        self.assertEqual(model.total_samples, 100)
+        self.assertEqual(len(model.root.subcircuits), number_of_leaves)
+        self.assertAlmostEqual(np.exp(model.root.log_weights).sum(), 1.)
+        self.assertEqual(sum(leaf.total_samples for leaf in model.root.subcircuits), 100)
+        self.assertTrue(all(model.likelihood(model.preprocess_data(self.data.iloc[60:])) > 0))
+
+    def test_partial_fit_keeps_support_of_refitted_leaves(self):
+        np.random.seed(69)
+        data = pd.DataFrame(np.random.normal(2, 4, (1000, 2)), columns=["x", "y"])
+        variables = infer_variables_from_dataframe(data, scale_continuous_types=False, min_samples_per_quantile=20)
+        model = JPT(variables, min_samples_leaf=100)
+        model.fit(data[:500])
+        model.partial_fit(data[500:], refit_threshold=0.)
+        self.assertTrue(np.all(model.log_likelihood(model.preprocess_data(data)) > -np.inf))
+
+    def test_partial_fit_updates_discrete_distributions_exactly(self):
+        model = JPT([self.real, self.integer, self.symbol], min_impurity_improvement=1)
+        model.fit(self.data.iloc[:60])
+        model.partial_fit(self.data.iloc[60:], refit_threshold=float("inf"))
+        full_model = JPT([self.real, self.integer, self.symbol], min_impurity_improvement=1)
+        full_model.fit(self.data)
+
+        for subcircuit, full_subcircuit in zip(model.root.subcircuits[0].subcircuits,
+                                               full_model.root.subcircuits[0].subcircuits):
+            if isinstance(getattr(subcircuit, "distribution", None), DiscreteDistribution):
+                probabilities = subcircuit.distribution.probabilities
+                full_probabilities = full_subcircuit.distribution.probabilities
+                self.assertEqual(set(probabilities.keys()), set(full_probabilities.keys()))
+                for key, probability in full_probabilities.items():
+                    self.assertAlmostEqual(probabilities[key], probability)
+
+    def test_partial_fit_splits_large_leaves(self):
+        model = JPT([self.real, self.integer, self.symbol], min_samples_leaf=30)
+        model.fit(self.data.iloc[:50])
+        self.assertEqual(len(model.root.subcircuits), 1)
+        model.partial_fit(self.data.iloc[50:], max_leaf_samples=80)
+        self.assertGreater(len(model.root.subcircuits), 1)
+        self.assertAlmostEqual(np.exp(model.root.log_weights).sum(), 1.)
+        self.assertAlmostEqual(sum(leaf.total_samples for leaf in model.root.subcircuits), 100)
+
+    def test_decision_tree(self):
+        self.model._min_samples_leaf = 10
+        self.model.keep_sample_indices = True
+        self.model.fit(self.data)
+        self.assertTrue(self.model.has_decision_tree)
+        self.assertEqual(self.model.decision_tree.number_of_leaves, len(self.model.root.subcircuits))
+
+        leaf_indices = self.model.decision_tree.route(self.model.preprocess_data(self.data))
+        for index, leaf in enumerate(self.model.root.subcircuits):
+            self.assertEqual(set(np.flatnonzero(leaf_indices == index)), set(leaf.sample_indices))
+
+    def test_log_likelihood_with_decision_tree(self):
+        self.model._min_samples_leaf = 10
+        self.model.fit(self.data)
+        preprocessed_data = self.model.preprocess_data(self.data)
+        log_likelihood = ProbabilisticCircuit.log_likelihood(self.model, preprocessed_data)
+        self.assertTrue(np.allclose(self.model.log_likelihood(preprocessed_data), log_likelihood))
+
+        deserialized = JPT.from_json(self.model.to_json())
+        self.assertTrue(deserialized.has_decision_tree)
+        self.assertTrue(np.allclose(deserialized.log_likelihood(preprocessed_data), log_likelihood))
+
+    def test_conditional_with_decision_tree(self):
+        self.model._min_samples_leaf = 10
+        self.model.fit(self.data)
+        conditional, log_probability = self.model.log_conditional({self.real: 1.})
+        expected_conditional, expected_log_probability = ProbabilisticCircuit.log_conditional_in_place(
+            self.model.__copy__(), {self.real: 1.})
+        self.assertAlmostEqual(log_probability, expected_log_probability)
+        self.assertEqual(len(conditional.nodes), len(expected_conditional.nodes))
+
+    def test_decision_tree_after_partial_fit(self):
+        model = JPT([self.real, self.integer, self.symbol], min_samples_leaf=30)
+        model.fit(self.data.iloc[:50])
+        model.partial_fit(self.data.iloc[50:], max_leaf_samples=80)
+        self.assertTrue(model.has_decision_tree)
+        preprocessed_data = model.preprocess_data(self.data)
+        self.assertTrue(np.allclose(model.log_likelihood(preprocessed_data),
+                                    ProbabilisticCircuit.log_likelihood(model, preprocessed_data)))
+
     def test_preprocessing_and_compare_to_jpt(self):
         variables = old_infer_from_dataframe(self.data, scale_numeric_types=False, precision=0.)
         original_jpt = OldJPT(variables, min_samples_leaf=self.model.min_samples_leaf,
@@ -213,6 +440,11 @@ class JPTTestCase(unittest.TestCase):
         deserialized = JPT.from_json(serialized)
         self.assertEqual(self.model, deserialized)
 
+    def test_serialization_of_max_bins(self):
+        model = JPT([self.real, self.integer, self.symbol], max_bins=32)
+        self.assertEqual(JPT.parameters_from_json(model.to_json()).max_bins, 32)
+        self.assertEqual(model.empty_copy().max_bins, 32)
+
 
 class BreastCancerTestCase(unittest.TestCase):
     data: pd.DataFrame
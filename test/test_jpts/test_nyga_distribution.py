@@ -4,11 +4,13 @@ import numpy as np
 import plotly.graph_objects as go
 from numpy import testing
 from random_events.interval import closed, closed_open
+from random_events.product_algebra import SimpleEvent
 from random_events.utils import SubclassJSONSerializer
 from random_events.variable import Continuous
 from scipy.special import logsumexp
 
-from probabilistic_model.distributions import UniformDistribution, DiracDeltaDistribution
+from probabilistic_model.distributions import UniformDistribution, DiracDeltaDistribution, \
+    PiecewiseUniformDistribution
 from probabilistic_model.learning.nyga_distribution import NygaDistribution, InductionStep
 from probabilistic_model.probabilistic_circuit.nx.probabilistic_circuit import SumUnit, \
     UnivariateContinuousLeaf, leaf
@@ -96,6 +98,14 @@ class InductionStepTestCase(unittest.TestCase):
         likelihood_of_split_right = self.induction_step.log_likelihood_of_split_side(5, 9)
         self.assertAlmostEqual(likelihood_of_split_right, -1.79, delta=0.01)
 
+    def test_likelihood_of_splits_vectorized(self):
+        split_indices = np.arange(1, 6)
+        for connecting_point in [1, 9]:
+            result = self.induction_step.log_likelihood_of_split_side(split_indices, connecting_point)
+            correct = [self.induction_step.log_likelihood_of_split_side(index, connecting_point)
+                       for index in split_indices]
+            testing.assert_allclose(result, correct)
+
     def test_compute_best_split(self):
         maximum, index = self.induction_step.compute_best_split()
         self.assertEqual(index, 3)
@@ -197,6 +207,114 @@ class InductionStepTestCase(unittest.TestCase):
         self.assertEqual(len(distribution.leaves), 3)
         self.assertEqual(distribution.root, solution_by_hand.root)
 
+    def test_quantiles(self):
+        np.random.seed(69)
+        data = np.random.normal(0, 1, 100)
+        distribution = self.induction_step.nyga_distribution
+        breakpoints, probabilities = distribution.quantiles(data)
+        self.assertEqual(len(breakpoints), len(probabilities) + 1)
+        self.assertTrue(np.all(np.diff(breakpoints) > 0))
+        self.assertEqual(breakpoints[0], data.min())
+        self.assertEqual(breakpoints[-1], data.max())
+        self.assertAlmostEqual(probabilities.sum(), 1.)
+
+        distribution.fit(data)
+        self.assertEqual(len(distribution.root.subcircuits), len(probabilities))
+        testing.assert_allclose(np.exp(distribution.root.log_weights), probabilities)
+
+    def test_fit_many(self):
+        np.random.seed(69)
+        y = Continuous("y")
+        data = np.column_stack((np.random.normal(0, 1, 200), np.ones(200)))
+        distributions = NygaDistribution.fit_many([NygaDistribution(self.variable, min_likelihood_improvement=0.01),
+                                                   NygaDistribution(y)], data)
+        expected = NygaDistribution(self.variable, min_likelihood_improvement=0.01).fit(data[:, 0])
+        points = np.linspace(-3, 3, 50).reshape(-1, 1)
+        self.assertIsInstance(distributions[0], PiecewiseUniformDistribution)
+        testing.assert_allclose(distributions[0].log_likelihood(points), expected.log_likelihood(points), rtol=1e-4)
+        self.assertIsInstance(distributions[1], DiracDeltaDistribution)
+        self.assertEqual(distributions[1].variable, y)
+
+    def test_fit_many_and_mount(self):
+        np.random.seed(69)
+        data = np.random.normal(0, 1, (200, 1))
+        distribution, = NygaDistribution.fit_many([NygaDistribution(self.variable)], data, mount=True)
+        self.assertIsInstance(distribution, NygaDistribution)
+        self.assertEqual(distribution.root, NygaDistribution(self.variable).fit(data[:, 0]).root)
+
+    def test_fit_many_with_weights(self):
+        np.random.seed(69)
+        data = np.random.normal(0, 1, (50, 1)).round(1)
+        weights = np.random.randint(1, 4, 50)
+        distribution, = NygaDistribution.fit_many([NygaDistribution(self.variable)], data, weights)
+        expected = NygaDistribution(self.variable).fit(np.repeat(data[:, 0], weights))
+        points = np.linspace(-3, 3, 50).reshape(-1, 1)
+        testing.assert_allclose(distribution.log_likelihood(points), expected.log_likelihood(points), rtol=1e-4)
+
+    def test_fit_many_in_parallel(self):
+        np.random.seed(69)
+        data = np.random.normal(0, 1, (100, 2))
+        variables = [self.variable, Continuous("y")]
+        distributions = NygaDistribution.fit_many([NygaDistribution(variable) for variable in variables], data,
+                                                  n_jobs=2)
+        for index, (variable, distribution) in enumerate(zip(variables, distributions)):
+            expected = NygaDistribution(variable)
+            self.assertEqual(distribution, expected.compact_distribution(*expected.quantiles(data[:, index])))
+
+    def test_to_piecewise_uniform(self):
+        np.random.seed(69)
+        data = np.random.normal(0, 1, 100)
+        distribution = self.induction_step.nyga_distribution
+        distribution.fit(data)
+        piecewise_uniform = distribution.to_piecewise_uniform()
+        self.assertIsInstance(piecewise_uniform, PiecewiseUniformDistribution)
+        self.assertEqual(len(piecewise_uniform.probabilities), len(distribution.root.subcircuits))
+
+        points = np.linspace(-3, 3, 100).reshape(-1, 1)
+        testing.assert_allclose(piecewise_uniform.log_likelihood(points), distribution.log_likelihood(points))
+        testing.assert_allclose(piecewise_uniform.cdf(points), distribution.cdf(points))
+
+        converted = NygaDistribution.from_piecewise_uniform(piecewise_uniform)
+        self.assertEqual(converted.leaves, distribution.leaves)
+        testing.assert_allclose(converted.root.log_weights, distribution.root.log_weights)
+
+    def test_to_piecewise_uniform_with_gap(self):
+        distribution = NygaDistribution(self.variable)
+        distribution.mount_quantiles(np.array([0., 1., 2., 4.]), np.array([0.5, 0., 0.5]))
+        self.assertEqual(len(distribution.root.subcircuits), 2)
+
+        piecewise_uniform = distribution.to_piecewise_uniform()
+        testing.assert_allclose(piecewise_uniform.breakpoints, [0, 1, 2, 4])
+        testing.assert_allclose(piecewise_uniform.probabilities, [0.5, 0, 0.5])
+
+    def test_event_of_higher_density(self):
+        distribution = NygaDistribution(self.variable).mount_quantiles(np.array([0., 1., 3., 4.]),
+                                                                        np.array([0.2, 0.4, 0.4]))
+        other = NygaDistribution(self.variable).mount_quantiles(np.array([0., 4.]), np.array([1.]))
+        testing.assert_allclose(distribution.all_union_of_mixture_points_with(other), [0, 1, 3, 4])
+
+        event = distribution.event_of_higher_density(other)
+        self.assertEqual(event, SimpleEvent({self.variable: closed(3, 4)}).as_composite_set())
+
+        # scale the other distribution down as if it was reached with weight 0.5
+        other_node_weights = {hash(leaf): [0.5] for leaf in other.leaves}
+        event = distribution.event_of_higher_density(other, other_node_weights=other_node_weights)
+        self.assertEqual(event, SimpleEvent({self.variable: closed(0, 4)}).as_composite_set())
+
+    def test_distances(self):
+        np.random.seed(69)
+        distribution = NygaDistribution(self.variable, min_likelihood_improvement=0.01)
+        distribution.fit(np.random.normal(0, 1, 200))
+        other = NygaDistribution(self.variable, min_likelihood_improvement=0.01)
+        other.fit(np.random.normal(0.5, 1, 200))
+
+        l1 = distribution.l1_distance(other)
+        event = distribution.event_of_higher_density(other)
+        self.assertAlmostEqual(l1, 2 * (distribution.probability(event) - other.probability(event)))
+        self.assertAlmostEqual(distribution.l1_distance(distribution), 0)
+        self.assertEqual(distribution.kl_divergence(distribution), 0)
+        self.assertGreater(distribution.kl_divergence(other), 0)
+
 
 class FittedNygaDistributionTestCase(unittest.TestCase):
     x: Continuous = Continuous("x")
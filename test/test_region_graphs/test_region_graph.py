@@ -8,6 +8,7 @@ from random_events.set import Set
 from scipy.special import logsumexp
 
 from probabilistic_model.learning.region_graph.region_graph import *
+from probabilistic_model.probabilistic_circuit.jax.einsum_layer import EinsumLayer
 from probabilistic_model.probabilistic_circuit.nx.probabilistic_circuit import UnivariateDiscreteLeaf
 
 np.random.seed(420)
@@ -58,6 +59,61 @@ class RandomRegionGraphLearningTestCase(unittest.TestCase):
                 self.assertGreater(distribution.scale, 0.)
 
 
+class NestedRegionGraphTestCase(unittest.TestCase):
+    variables = SortedSet([Continuous(str(i)) for i in range(8)] + [Symbolic("target", Set.from_iterable(Target))])
+    region_graph = RegionGraph(variables, partitions=2, depth=2, repetitions=3)
+    region_graph = region_graph.create_random_region_graph()
+
+    data = np.random.uniform(0, 1, (50, len(variables)))
+    data[:, -1] = np.random.randint(2, size=len(data))
+
+    def test_log_likelihood_equals_nx(self):
+        model = self.region_graph.as_probabilistic_circuit(input_units=3, sum_units=3)
+        nx_model = model.to_nx(False)
+        self.assertTrue(np.allclose(model.log_likelihood(jnp.array(self.data)), nx_model.log_likelihood(self.data),
+                                    atol=1e-4))
+
+
+class TensorizedRegionGraphTestCase(unittest.TestCase):
+    variables = SortedSet([Continuous(str(i)) for i in range(8)] + [Symbolic("target", Set.from_iterable(Target))])
+    region_graph = RegionGraph(variables, partitions=2, depth=2, repetitions=3)
+    region_graph = region_graph.create_random_region_graph()
+
+    data = np.random.uniform(0, 1, (50, len(variables)))
+    data[:, -1] = np.random.randint(2, size=len(data))
+
+    def test_structure(self):
+        model = self.region_graph.as_probabilistic_circuit(input_units=3, sum_units=3, tensorized=True)
+        self.assertIsInstance(model.root, EinsumLayer)
+        self.assertEqual(model.root.number_of_nodes, 1)
+        # one layer per height instead of one layer per region and partition
+        self.assertLess(len(model.root.layers), len(self.region_graph.nodes))
+
+    def test_log_likelihood_equals_layers(self):
+        model = self.region_graph.as_probabilistic_circuit(input_units=3, sum_units=3, tensorized=True)
+        layered_model = JPC(self.variables, model.root.to_layers())
+        data = jnp.array(self.data)
+        self.assertTrue(jnp.allclose(model.log_likelihood(data), layered_model.log_likelihood(data), atol=1e-4))
+
+    def test_learning(self):
+        model = self.region_graph.as_probabilistic_circuit(input_units=3, sum_units=3, tensorized=True)
+        data = jnp.array(self.data)
+        ll_before = model.log_likelihood(data).mean()
+        model.fit(data, epochs=10, optimizer=optax.adamw(0.01))
+        self.assertGreater(model.log_likelihood(data).mean(), ll_before)
+
+        nx_model = model.to_nx(False)
+        for node in nx_model.nodes():
+            if isinstance(node, SumUnit):
+                self.assertAlmostEqual(logsumexp(node.log_weights), 0., places=5)
+
+    def test_serialization(self):
+        model = self.region_graph.as_probabilistic_circuit(input_units=3, sum_units=3, tensorized=True)
+        deserialized = JPC.from_json(model.to_json())
+        data = jnp.array(self.data)
+        self.assertTrue(jnp.allclose(model.log_likelihood(data), deserialized.log_likelihood(data)))
+
+
 class ClassificationTestCase(unittest.TestCase):
     features = SortedSet([Continuous(f"x{i}") for i in range(4)])
     target = Symbolic("target", Set.from_iterable(Target))
@@ -84,6 +140,17 @@ class ClassificationTestCase(unittest.TestCase):
                          element in self.target.domain}
         self.assertAlmostEqual(sum(probabilities.values()), 1.0)
 
+    def test_tensorized_classification(self):
+        data = jnp.array(np.random.uniform(0, 1, (100, len(self.features))))
+        labels = jnp.array(np.random.randint(2, size=len(data)))
+        model = self.region_graph.as_probabilistic_circuit(input_units=5, sum_units=5, tensorized=True)
+        self.assertIsInstance(model, ClassificationCircuit)
+        self.assertEqual(model.root.number_of_nodes, 2)
+        model.fit(data, labels=labels, epochs=10, optimizer=optax.adamw(0.01))
+        pc = model.as_probabilistic_circuit(self.target)
+        self.assertEqual(pc.variables, self.features | SortedSet([self.target]))
+        self.assertTrue(pc.to_nx(False).is_decomposable())
+
 
 if __name__ == '__main__':
     unittest.main()